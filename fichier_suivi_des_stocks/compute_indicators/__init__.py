@@ -10,6 +10,7 @@ from . import (
 from . import (
     queries,
     file_utils,
+    shared_inputs,
     utils,
 )
 
@@ -19,5 +20,6 @@ __all__ = [
     "prevision",
     "queries",
     "file_utils",
+    "shared_inputs",
     "utils",
 ]
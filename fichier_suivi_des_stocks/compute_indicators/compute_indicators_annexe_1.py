@@ -1,4 +1,3 @@
-import math
 from typing import Tuple
 
 import numpy as np
@@ -7,6 +6,28 @@ from IPython.display import display
 from sqlalchemy import Engine
 
 
+def aggregate_by_product(df: pd.DataFrame, code_col: str, qty_col: str) -> pd.Series:
+    """
+    Somme des quantités d'un export par code produit, en un seul parcours de l'export.
+
+    Args:
+        df (pd.DataFrame): Export contenant une ligne par mouvement.
+        code_col (str): Colonne du code produit.
+        qty_col (str): Colonne de la quantité à sommer.
+
+    Returns:
+        pd.Series: Quantité totale indexée par code produit.
+    """
+    return df.groupby(code_col, sort=False)[qty_col].sum()
+
+
+def map_product_aggregate(codes: pd.Series, aggregate: pd.Series) -> pd.Series:
+    """
+    Reporte un agrégat par produit sur les codes de l'état de stock (0 pour les produits absents de l'export).
+    """
+    return codes.map(aggregate).fillna(0)
+
+
 def get_etat_stock_current_month(
     df_etat_stock: pd.DataFrame,
     df_stock_detaille: pd.DataFrame,
@@ -49,69 +70,54 @@ def get_etat_stock_current_month(
         KeyError: Si les colonnes attendues ne sont pas présentes dans les DataFrames d'entrée.
         Exception: Pour toute erreur lors de la conversion des types de colonnes.
     """
-    try:
-        df_etat_stock["Distribution effectuée"] = df_etat_stock["code_produit"].apply(
-            lambda x: df_distribution.loc[df_distribution.Article == x, "Quantité livrée"].sum()  # type: ignore
-        )
-    except KeyError:
-        df_etat_stock["Distribution effectuée"] = df_etat_stock["code_produit"].apply(
-            lambda x: df_distribution.loc[df_distribution.Article == x, "Qté livrée"].sum()  # type: ignore
-        )
+    codes = df_etat_stock["code_produit"]
+
+    qty_col = "Quantité livrée" if "Quantité livrée" in df_distribution.columns else "Qté livrée"
+    df_etat_stock["Distribution effectuée"] = map_product_aggregate(
+        codes, aggregate_by_product(df_distribution, "Article", qty_col)
+    )
 
     # A modifier ici
     date_report_dt = pd.to_datetime(date_report, format="%Y-%m-%d")
 
-    df_etat_stock["Quantité reçue entrée en stock"] = df_etat_stock["code_produit"].apply(
-        lambda x: df_receptions.loc[
-            (df_receptions["Nouveau code"] == x)
-            & (df_receptions["Date_entree_machine"].dt.month == date_report_dt.month)
-            & (df_receptions["Date_entree_machine"].dt.year == date_report_dt.year),
-            "Quantité réceptionnée",
-        ].sum()  # type: ignore
+    mask_month = (df_receptions["Date_entree_machine"].dt.month == date_report_dt.month) & (
+        df_receptions["Date_entree_machine"].dt.year == date_report_dt.year
+    )
+    receptions_month = df_receptions.loc[mask_month]
+    df_etat_stock["Quantité reçue entrée en stock"] = map_product_aggregate(
+        codes, aggregate_by_product(receptions_month, "Nouveau code", "Quantité réceptionnée")
     )
 
     code_col = [col for col in df_ppi.columns if "CODE" in str(col).upper()][0]
-    df_etat_stock["Quantité de PPI"] = df_etat_stock["code_produit"].apply(
-        lambda x: df_ppi.loc[df_ppi[code_col] == x, "Quantité"].sum()  # type: ignore
+    df_etat_stock["Quantité de PPI"] = map_product_aggregate(
+        codes, aggregate_by_product(df_ppi, code_col, "Quantité")
     )
 
     code_col = [col for col in df_prelevement.columns if "CODE" in str(col).upper()][0]
-    df_etat_stock["Quantité prélévée en Contrôle Qualité (CQ)"] = df_etat_stock[
-        "code_produit"
-    ].apply(lambda x: df_prelevement.loc[df_prelevement[code_col] == x, "Quantité"].sum())  # type: ignore
+    df_etat_stock["Quantité prélévée en Contrôle Qualité (CQ)"] = map_product_aggregate(
+        codes, aggregate_by_product(df_prelevement, code_col, "Quantité")
+    )
 
     df_etat_stock["Ajustement de stock"] = np.nan
 
     code_col = [col for col in df_stock_detaille.columns if "CODE" in str(col).upper()][0]
     # col_stock_theo = [col for col in df_etat_stock.columns if 'Stock Théorique fin' in str(col)][0]
 
-    df_etat_stock["Stock Théorique Final SAGE"] = df_etat_stock["code_produit"].apply(
-        lambda x: df_stock_detaille.loc[df_stock_detaille[code_col] == x, "Qté \nPhysique"].sum()  # type: ignore
+    df_etat_stock["Stock Théorique Final SAGE"] = map_product_aggregate(
+        codes, aggregate_by_product(df_stock_detaille, code_col, "Qté \nPhysique")
     )
 
     # del df_distribution, df_ppi, df_prelevement ,df_receptions, df_stock_detaille
 
-    df_etat_stock["Stock Théorique Final Attendu"] = df_etat_stock.apply(
-        lambda row: (
-            np.nan
-            if pd.isna(row["Stock Théorique Final SAGE"])
-            else (
-                -row["Distribution effectuée"]
-                + row["Quantité reçue entrée en stock"]
-                - row["Quantité de PPI"]
-                - row["Quantité prélévée en Contrôle Qualité (CQ)"]
-            )
-            if pd.isna(row["stock_theorique_mois_precedent"])
-            else (
-                row["stock_theorique_mois_precedent"]
-                - row["Distribution effectuée"]
-                + row["Quantité reçue entrée en stock"]
-                - row["Quantité de PPI"]
-                - row["Quantité prélévée en Contrôle Qualité (CQ)"]
-            )
-        ),
-        axis=1,
+    mouvements = (
+        -df_etat_stock["Distribution effectuée"]
+        + df_etat_stock["Quantité reçue entrée en stock"]
+        - df_etat_stock["Quantité de PPI"]
+        - df_etat_stock["Quantité prélévée en Contrôle Qualité (CQ)"]
     )
+    df_etat_stock["Stock Théorique Final Attendu"] = (
+        df_etat_stock["stock_theorique_mois_precedent"].fillna(0) + mouvements
+    ).where(df_etat_stock["Stock Théorique Final SAGE"].notna())
 
     df_etat_stock["ECARTS"] = (
         df_etat_stock["Stock Théorique Final SAGE"] - df_etat_stock["Stock Théorique Final Attendu"]
@@ -128,6 +134,69 @@ def get_etat_stock_current_month(
     return df_etat_stock.round(0)
 
 
+def month_number(dates: pd.Series) -> pd.Series:
+    """Numéro absolu du mois (année * 12 + mois) de chaque date."""
+    return dates.dt.year * 12 + dates.dt.month - 1
+
+
+def is_month_start(dates: pd.Series) -> pd.Series:
+    """Indique les dates tombant exactement sur un début de mois (à minuit)."""
+    return dates.dt.is_month_start & (dates == dates.dt.normalize())
+
+
+def sum_history_window(
+    df_current: pd.DataFrame,
+    df_histo: pd.DataFrame,
+    value_col: str,
+    drop_first_month: bool = True,
+) -> np.ndarray:
+    """
+    Somme, pour chaque produit, des valeurs d'historique des mois retenus.
+
+    L'historique est pivoté en une matrice produits x mois ; les mois retenus pour chaque produit sont
+    ceux (en début de mois) compris entre `date_report_prev_min` et `date_report`, sans le premier mois
+    (`drop_first_month`) ou sans le dernier. Ils sont marqués par un masque booléen et sommés en une
+    seule réduction.
+
+    Args:
+        df_current (pd.DataFrame): Produits du mois courant avec `id_dim_produit_stock_track_pk`,
+            `date_report_prev_min` et `date_report`.
+        df_histo (pd.DataFrame): Historique avec `id_dim_produit_stock_track_pk`, `date_report_prev` et
+            `value_col`.
+        value_col (str): Colonne à sommer.
+        drop_first_month (bool, optional): Exclut le premier mois de la fenêtre, sinon le dernier.
+            Defaults to True.
+
+    Returns:
+        np.ndarray: Somme par produit (NaN pour les produits sans historique).
+    """
+    product_ids = df_current["id_dim_produit_stock_track_pk"].to_numpy()
+
+    # Seules les dates en début de mois correspondent à un mois de la fenêtre
+    df_histo = df_histo.loc[is_month_start(df_histo["date_report_prev"])]
+    history = df_histo.groupby(
+        [df_histo["id_dim_produit_stock_track_pk"], month_number(df_histo["date_report_prev"])]
+    )[value_col].sum()
+    history = history.unstack(fill_value=0) if not history.empty else pd.DataFrame()
+
+    months = history.columns.to_numpy(dtype=float)
+    matrix = history.reindex(product_ids).to_numpy(dtype=float)
+    matrix = np.nan_to_num(matrix) if matrix.size else np.zeros((len(product_ids), 0))
+
+    # Bornes de la fenêtre : premier début de mois >= date_report_prev_min, mois de date_report
+    start = df_current["date_report_prev_min"]
+    first = month_number(start) + (~is_month_start(start)).astype(int)
+    last = month_number(df_current["date_report"])
+    first, last = (first + 1, last) if drop_first_month else (first, last - 1)
+
+    mask = (months >= first.to_numpy(dtype=float)[:, None]) & (
+        months <= last.to_numpy(dtype=float)[:, None]
+    )
+    totals = (matrix * mask).sum(axis=1)
+
+    return np.where(start.isna().to_numpy(), np.nan, totals)
+
+
 def get_dmm_current_month(
     df_etat_stock: pd.DataFrame,
     programme: str,
@@ -222,24 +291,6 @@ def get_dmm_current_month(
         how="left",
     )
 
-    def compute_distributions(row, auto_computed_dmm: bool = True):
-        if pd.isna(row.nbre_mois_consideres):
-            return np.nan
-        try:
-            # Générer la série des mois (en début de mois) entre date_report_prev_min et date_report
-            months = pd.date_range(start=row.date_report_prev_min, end=row.date_report, freq="MS")
-            months = months[1:] if auto_computed_dmm else months[:-1]
-            # Somme des distributions validées pour les mois correspondants
-            total = df_dmm_histo.loc[
-                (df_dmm_histo.id_dim_produit_stock_track_pk == row.id_dim_produit_stock_track_pk)
-                & (df_dmm_histo.date_report_prev.isin(months)),
-                "dmm",
-            ].sum()  # type: ignore
-            value = total + row.dmm if auto_computed_dmm else total
-            return value
-        except Exception:
-            return np.nan
-
     # Vectorisation de la mise à jour de nbre_mois_consideres :
     # 1. Pour les lignes où nbre_mois_consideres est NaN et dmm n'est pas NaN, on assigne 1.
     df_dmm_current["nbre_mois_consideres"] = np.where(
@@ -253,19 +304,21 @@ def get_dmm_current_month(
     )
     df_dmm_current.loc[mask, "nbre_mois_consideres"] += 1 if auto_computed_dmm else 0
 
-    df_dmm_current["distributions_mois_consideres"] = df_dmm_current.apply(
-        lambda row: compute_distributions(row, auto_computed_dmm), axis=1
+    # Somme des distributions validées des mois retenus (mois courant inclus en calcul automatique)
+    total = sum_history_window(
+        df_dmm_current, df_dmm_histo, "dmm", drop_first_month=auto_computed_dmm
+    )
+    if auto_computed_dmm:
+        total = total + df_dmm_current["dmm"].to_numpy(dtype=float)
+    df_dmm_current["distributions_mois_consideres"] = np.where(
+        df_dmm_current["nbre_mois_consideres"].isna(), np.nan, total
     )
 
     # Calcul de la DMM calculée
-    df_dmm_current["dmm_calculee"] = df_dmm_current.apply(
-        lambda row: (
-            row.distributions_mois_consideres / row.nbre_mois_consideres
-            if pd.notna(row.nbre_mois_consideres) and row.nbre_mois_consideres != 0
-            else np.nan
-        ),
-        axis=1,
-    )
+    nbre_mois = df_dmm_current["nbre_mois_consideres"]
+    df_dmm_current["dmm_calculee"] = (
+        df_dmm_current["distributions_mois_consideres"] / nbre_mois
+    ).where(nbre_mois.notna() & (nbre_mois != 0))
 
     df_dmm_current["commentaire"] = ""
 
@@ -376,13 +429,11 @@ def get_cmm_current_month(
 
     df_cmm_current["CONSO"] = df_cmm_current["CONSO"].fillna(0)
 
-    df_cmm_current["cmm"] = df_cmm_current.apply(
-        lambda row: (
-            math.ceil(row.CONSO / row.facteur_de_conversion)
-            if not pd.isna(row.facteur_de_conversion) and row.facteur_de_conversion != 0
-            else 0
-        ),
-        axis=1,
+    facteur = df_cmm_current["facteur_de_conversion"]
+    df_cmm_current["cmm"] = (
+        np.ceil(df_cmm_current["CONSO"] / facteur)
+        .where(facteur.notna() & (facteur != 0), 0)
+        .astype(int)
     )
 
     df_cmm_current.drop(columns="CONSO", inplace=True)
@@ -434,24 +485,6 @@ def get_cmm_current_month(
         how="left",
     )
 
-    def compute_consommations(row, auto_computed_cmm: bool = True):
-        if pd.isna(row.nbre_mois_consideres):
-            return np.nan
-        try:
-            # Générer la série des mois (en début de mois) entre date_report_prev_min et date_report
-            months = pd.date_range(start=row.date_report_prev_min, end=row.date_report, freq="MS")
-            months = months[1:] if auto_computed_cmm else months[1:]
-            # Somme des distributions validées pour les mois correspondants
-            total = df_cmm_histo.loc[
-                (df_cmm_histo.id_dim_produit_stock_track_pk == row.id_dim_produit_stock_track_pk)
-                & (df_cmm_histo.date_report_prev.isin(months)),
-                "cmm",
-            ].sum()
-            value = total + row.cmm if auto_computed_cmm else total
-            return value
-        except Exception:
-            return np.nan
-
     # Vectorisation de la mise à jour de nbre_mois_consideres :
     df_cmm_current["nbre_mois_consideres"] = np.where(
         df_cmm_current["nbre_mois_consideres"].isna() & df_cmm_current["cmm"].notna(),
@@ -464,17 +497,18 @@ def get_cmm_current_month(
 
     df_cmm_current.loc[mask, "nbre_mois_consideres"] += 1 if auto_computed_cmm else 0
 
-    df_cmm_current["conso_mois_consideres"] = df_cmm_current.apply(
-        lambda row: compute_consommations(row, auto_computed_cmm), axis=1
+    # Somme des consommations validées des mois retenus (le premier mois de l'historique est toujours
+    # exclu, le mois courant n'est ajouté qu'en calcul automatique)
+    total = sum_history_window(df_cmm_current, df_cmm_histo, "cmm", drop_first_month=True)
+    if auto_computed_cmm:
+        total = total + df_cmm_current["cmm"].to_numpy(dtype=float)
+    df_cmm_current["conso_mois_consideres"] = np.where(
+        df_cmm_current["nbre_mois_consideres"].isna(), np.nan, total
     )
 
-    df_cmm_current["cmm_calculee"] = df_cmm_current.apply(
-        lambda row: (
-            row.conso_mois_consideres / row.nbre_mois_consideres
-            if not pd.isna(row.nbre_mois_consideres) and row.nbre_mois_consideres != 0
-            else np.nan
-        ),
-        axis=1,
+    nbre_mois = df_cmm_current["nbre_mois_consideres"]
+    df_cmm_current["cmm_calculee"] = (df_cmm_current["conso_mois_consideres"] / nbre_mois).where(
+        nbre_mois.notna() & (nbre_mois != 0)
     )
 
     df_cmm_current["commentaire"] = ""
@@ -49,56 +49,99 @@ def format_date_updated_plan_approv(
 def update_stocks(df_prevision_other_month, df_plan_approv):
     """
     Cette fonction permet d'avoir les prévisions
+
+    Les quantités du plan d'approvisionnement sont agrégées une seule fois par (produit, mois), puis le
+    stock prévisionnel de chaque période est calculé pour tous les produits à la fois à partir de celui
+    de la période précédente (voir `project_stocks`).
     """
-    for i in range(len(df_prevision_other_month)):
-        row = df_prevision_other_month.iloc[i]
-        if row["PERIOD"] != row["date_report"]:
-            code_produit = row["code_produit"]
-            id_dim_produit_stock_track_pk = row["id_dim_produit_stock_track_pk"]
-            period = row["PERIOD"]
-
-            prev_period = period - pd.DateOffset(months=1)
-
-            df_plan_filtered = df_plan_approv.loc[
-                (df_plan_approv["Standard product code"] == code_produit)
-                & (df_plan_approv["Date updated"] == period)
-            ]
-
-            df_prev_filtered = df_prevision_other_month.loc[
-                (df_prevision_other_month.PERIOD == prev_period)
-                & (
-                    df_prevision_other_month.id_dim_produit_stock_track_pk
-                    == id_dim_produit_stock_track_pk
-                )
-            ]
-
-            if not df_prev_filtered.empty:
-                stock_prev_central = df_prev_filtered["stock_prev_central"].iloc[0]
-                stock_prev_national = df_prev_filtered["stock_prev_national"].iloc[0]
-            else:
-                stock_prev_central = "ND"
-                stock_prev_national = "ND"
-
-            quantite = (
-                df_plan_filtered["Quantité harmonisée (SAGE)"].sum()
-                if not df_plan_filtered.empty
-                else 0
-            )
-            row["stock_prev_central"] = compute_projected_stock(
-                previous_stock=stock_prev_central,
-                quantite=quantite,
-                consommation=row["dmm_central_annexe_2"],
-            )
-            row["stock_prev_national"] = compute_projected_stock(
-                previous_stock=stock_prev_national,
-                quantite=quantite,
-                consommation=row["cmm_national_annexe_2"],
-            )
-
-            df_prevision_other_month.iloc[i] = row
+    periods = df_prevision_other_month["PERIOD"]
+    ids = df_prevision_other_month["id_dim_produit_stock_track_pk"]
+
+    # Une quantité non numérique rend la somme du (produit, mois) non calculable ("ND") ; les quantités
+    # manquantes sont ignorées et un (produit, mois) absent du plan vaut 0
+    quantites = df_plan_approv["Quantité harmonisée (SAGE)"]
+    numeric = pd.to_numeric(quantites, errors="coerce")
+    sums = (
+        pd.DataFrame({"quantite": numeric, "invalide": numeric.isna() & quantites.notna()})
+        .groupby(
+            [df_plan_approv["Standard product code"], df_plan_approv["Date updated"]], sort=False
+        )
+        .agg({"quantite": "sum", "invalide": "any"})
+    )
+    sums.loc[sums["invalide"], "quantite"] = np.nan
+    keys = pd.MultiIndex.from_arrays([df_prevision_other_month["code_produit"], periods])
+    quantite = to_float_array(sums["quantite"].reindex(keys, fill_value=0))
+
+    # Position de la ligne de la période précédente du même produit (première occurrence)
+    positions = pd.Series(np.arange(len(periods)), index=pd.MultiIndex.from_arrays([ids, periods]))
+    positions = positions[~positions.index.duplicated()]
+    prev_position = positions.reindex(
+        pd.MultiIndex.from_arrays([ids, periods - pd.DateOffset(months=1)])
+    ).to_numpy()
+
+    to_update = (periods != df_prevision_other_month["date_report"]).to_numpy()
+    period_order = [
+        (periods == period).to_numpy() for period in np.sort(periods[to_update].unique())
+    ]
+
+    for col, conso_col in [
+        ("stock_prev_central", "dmm_central_annexe_2"),
+        ("stock_prev_national", "cmm_national_annexe_2"),
+    ]:
+        stock = to_float_array(df_prevision_other_month[col])
+        consommation = to_float_array(df_prevision_other_month[conso_col])
+
+        for in_period in period_order:
+            rows = np.flatnonzero(to_update & in_period)
+            has_prev = ~np.isnan(prev_position[rows])
+            previous_stock = np.full(len(rows), np.nan)
+            previous_stock[has_prev] = stock[prev_position[rows][has_prev].astype(int)]
+            stock[rows] = project_stocks(previous_stock, quantite[rows], consommation[rows])
+
+        values = df_prevision_other_month[col].to_numpy(dtype=object).copy()
+        values[to_update] = to_stock_values(stock[to_update])
+        df_prevision_other_month[col] = pd.Series(
+            values, index=df_prevision_other_month.index
+        ).infer_objects()
+
     return df_prevision_other_month.round(0)
 
 
+def to_float_array(values) -> np.ndarray:
+    """Convertit des valeurs en flottants, "ND" et les valeurs non numériques devenant NaN."""
+    return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float, copy=True)
+
+
+def to_stock_values(stock: np.ndarray) -> np.ndarray:
+    """
+    Convertit des stocks calculés en entiers Python, NaN devenant "ND". La conversion passe par
+    `int` (comme `int(round(x))` dans `compute_projected_stock`) : un cast en int64 déborderait
+    silencieusement au-delà de 2**63.
+    """
+    values = np.full(len(stock), "ND", dtype=object)
+    available = ~np.isnan(stock)
+    values[available] = [int(value) for value in stock[available].tolist()]
+    return values
+
+
+def project_stocks(
+    previous_stock: np.ndarray, quantite: np.ndarray, consommation: np.ndarray
+) -> np.ndarray:
+    """
+    Version vectorisée de `compute_projected_stock` : NaN tient lieu de "ND" en entrée comme en sortie.
+    """
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        projected = np.maximum(0.0, previous_stock - 1.0) + quantite / consommation
+    valid = (
+        np.isfinite(previous_stock)
+        & np.isfinite(quantite)
+        & np.isfinite(consommation)
+        & (consommation != 0)
+        & np.isfinite(projected)
+    )
+    return np.where(valid, np.rint(projected), np.nan)
+
+
 def compute_projected_stock(previous_stock, quantite, consommation):
     """
     Calcule un stock prévisionnel en évitant les divisions invalides et les overflows.
@@ -127,6 +170,19 @@ def compute_projected_stock(previous_stock, quantite, consommation):
         return "ND"
 
 
+def compute_stock_months(sdu: pd.Series, consommation: pd.Series) -> pd.Series:
+    """
+    Stock disponible exprimé en mois de consommation : 0 sans stock, "ND" si la consommation est nulle
+    ou absente.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = to_float_array(sdu) / to_float_array(consommation)
+    with_consommation = (consommation.notna() & (consommation != 0)).to_numpy()
+    values = to_stock_values(np.where(with_consommation, np.rint(ratio), np.nan))
+    values[(sdu.isna() | (sdu == 0)).to_numpy()] = 0
+    return pd.Series(values, index=sdu.index).infer_objects()
+
+
 def get_prevision_current_month(
     df_plan_approv: pd.DataFrame,
     date_report: str,
@@ -134,9 +190,13 @@ def get_prevision_current_month(
     engine,
     schema_name: str = "suivi_stock",
 ) -> pd.DataFrame:
-    df_plan_approv["Date updated"] = df_plan_approv["Date updated"].apply(
-        lambda x: pd.to_datetime(format_date_updated_plan_approv(x), format="%Y-%m-%d")
-    )
+    # Chaque libellé de mois distinct n'est converti qu'une fois
+    dates_updated = df_plan_approv["Date updated"]
+    parsed_dates = {
+        date: pd.to_datetime(format_date_updated_plan_approv(date), format="%Y-%m-%d")
+        for date in dates_updated.dropna().unique()
+    }
+    df_plan_approv["Date updated"] = pd.to_datetime(dates_updated.map(parsed_dates))
 
     df_stock_track = pd.read_sql(
         f"""SELECT prod.*, st.*
@@ -164,26 +224,12 @@ def get_prevision_current_month(
         ]
     ].sort_values("code_produit")
 
-    df_prevision["stock_prev_central"] = df_prevision.apply(
-        lambda row: (
-            0
-            if row.sdu_central_annexe_2 == 0 or pd.isna(row.sdu_central_annexe_2)
-            else round(row.sdu_central_annexe_2 / row.dmm_central_annexe_2)
-            if row.dmm_central_annexe_2 != 0 and not pd.isna(row.dmm_central_annexe_2)
-            else "ND"
-        ),
-        axis=1,
+    df_prevision["stock_prev_central"] = compute_stock_months(
+        df_prevision["sdu_central_annexe_2"], df_prevision["dmm_central_annexe_2"]
     )
 
-    df_prevision["stock_prev_national"] = df_prevision.apply(
-        lambda row: (
-            0
-            if row.sdu_national_annexe_2 == 0 or pd.isna(row.sdu_national_annexe_2)
-            else round(row.sdu_national_annexe_2 / row.cmm_national_annexe_2)
-            if row.cmm_national_annexe_2 != 0 and not pd.isna(row.cmm_national_annexe_2)
-            else "ND"
-        ),
-        axis=1,
+    df_prevision["stock_prev_national"] = compute_stock_months(
+        df_prevision["sdu_national_annexe_2"], df_prevision["cmm_national_annexe_2"]
     )
 
     df_period = pd.DataFrame(
@@ -215,8 +261,8 @@ def get_prevision_current_month(
         "cmm_national_annexe_2",
     ]
     for col in cols:
-        df_prevision_other_month[col] = df_prevision_other_month.apply(
-            lambda row: row[col] if row.PERIOD == pd.to_datetime(date_report) else np.nan, axis=1
+        df_prevision_other_month[col] = df_prevision_other_month[col].where(
+            df_prevision_other_month["PERIOD"] == pd.to_datetime(date_report)
         )
 
     df_prevision_other_month.rename(
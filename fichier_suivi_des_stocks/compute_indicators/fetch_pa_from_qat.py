@@ -1,10 +1,19 @@
 import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Iterable
 
 import pandas as pd
 import polars as pl
 import requests
+from requests.adapters import HTTPAdapter
+
+from .qat_cache import QatSnapshotCache
+
+logger = logging.getLogger(__name__)
 
 AUTH_URL = "https://api.quantificationanalytics.org/authenticate"
 VERSION_URL = (
@@ -26,6 +35,13 @@ DEFAULT_HEADERS = {
     "Origin": "https://www.quantificationanalytics.org",
 }
 
+# Extraction concurrente : programmes QAT traités simultanément et reprise des erreurs transitoires
+MAX_WORKERS = 4
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 2.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+CONNECT_TIMEOUT = 10
+
 COLS = [
     "shipmentId",
     "shipmentQty",
@@ -58,8 +74,10 @@ COLS = [
 ]
 
 
-def get_auth_headers(credentials: dict[str, str]) -> dict[str, str]:
-    response = requests.post(
+def get_auth_headers(
+    credentials: dict[str, str], session: requests.Session | None = None
+) -> dict[str, str]:
+    response = (session or requests).post(
         AUTH_URL,
         headers=DEFAULT_HEADERS,
         data=json.dumps(credentials),
@@ -76,6 +94,79 @@ def get_auth_headers(credentials: dict[str, str]) -> dict[str, str]:
     }
 
 
+class QatClient:
+    """
+    Client de l'API QAT partagé par les extractions concurrentes.
+
+    Toutes les requêtes passent par une même session HTTP (connexions réutilisées) avec un même jeton
+    d'authentification. Un jeton refusé (401) n'est renouvelé qu'une fois, même si plusieurs requêtes
+    concurrentes le constatent. Les erreurs transitoires (connexion, délai dépassé, 429 et 5xx) sont
+    reprises après un délai croissant.
+    """
+
+    def __init__(
+        self,
+        credentials: dict[str, str],
+        pool_size: int = MAX_WORKERS,
+        max_retries: int = MAX_RETRIES,
+        backoff_seconds: float = BACKOFF_SECONDS,
+    ):
+        self.credentials = credentials
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._headers: dict[str, str] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def headers(self) -> dict[str, str]:
+        with self._lock:
+            if self._headers is None:
+                self._headers = get_auth_headers(self.credentials, self.session)
+            return self._headers
+
+    def _refresh_headers(self, rejected_headers: dict[str, str]) -> None:
+        with self._lock:
+            # Le jeton a pu être renouvelé entre-temps par une autre requête
+            if self._headers is rejected_headers:
+                self._headers = get_auth_headers(self.credentials, self.session)
+
+    def request(self, method: str, url: str, timeout: float, **kwargs) -> requests.Response:
+        refreshed = False
+        attempt = 0
+        while True:
+            headers = self.headers
+            retry_after = None
+            try:
+                response = self.session.request(
+                    method, url, headers=headers, timeout=(CONNECT_TIMEOUT, timeout), **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                if response.status_code == 401 and not refreshed:
+                    self._refresh_headers(headers)
+                    refreshed = True
+                    continue
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response
+                retry_after = response.headers.get("Retry-After")
+
+            delay = self.backoff_seconds * 2**attempt
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self.session.close()
+
+
 def resolve_program_ids(programme_id: str | int | Iterable[int]) -> list[int]:
     if isinstance(programme_id, int):
         return [programme_id]
@@ -93,13 +184,12 @@ def resolve_program_ids(programme_id: str | int | Iterable[int]) -> list[int]:
     return [int(program_id) for program_id in programme_id]
 
 
-def get_latest_version_metadata(program_id: int, headers: dict[str, str]) -> tuple[int, str]:
-    version_response = requests.get(
+def get_latest_version_metadata(program_id: int, client: QatClient) -> tuple[int, str]:
+    version_response = client.request(
+        "GET",
         VERSION_URL.format(program_id=program_id),
-        headers=headers,
         timeout=60,
     )
-    version_response.raise_for_status()
 
     df_version = pd.json_normalize(version_response.json())
     if df_version.empty:
@@ -113,7 +203,7 @@ def get_latest_version_metadata(program_id: int, headers: dict[str, str]) -> tup
 def fetch_shipment_details(
     program_id: int,
     version_id: int,
-    headers: dict[str, str],
+    client: QatClient,
     start_date: str,
     stop_date: str,
 ) -> pd.DataFrame:
@@ -124,13 +214,12 @@ def fetch_shipment_details(
         "stopDate": stop_date,
         "reportView": "1",
     }
-    shipment_response = requests.post(
+    shipment_response = client.request(
+        "POST",
         SHIPMENT_DETAILS_URL,
-        headers=headers,
         data=json.dumps(payload),
         timeout=120,
     )
-    shipment_response.raise_for_status()
 
     details = shipment_response.json().get("shipmentDetailsList", [])
     return pd.json_normalize(details)
@@ -207,32 +296,72 @@ def extract_pa(
     programme_id: str | int | Iterable[int],
     credentials: dict[str, str],
     date_report: str,
+    client: QatClient | None = None,
+    max_workers: int = MAX_WORKERS,
+    cache: QatSnapshotCache | None = None,
+    offline: bool = False,
 ) -> pd.DataFrame:
-    headers = get_auth_headers(credentials)
     program_ids = resolve_program_ids(programme_id)
 
     year = datetime.strptime(date_report, "%Y-%m-%d").year
     start_date: str = f"{year}-01-01"
     stop_date: str = f"{year + 1}-12-31"
 
-    frames: list[pl.DataFrame] = []
-    for program_id in program_ids:
-        version_id, created_date = get_latest_version_metadata(program_id, headers)
+    if offline and cache is None:
+        raise ValueError("L'extraction hors ligne nécessite un cache des plans QAT.")
+
+    # Le client (session et jeton) peut être partagé entre plusieurs extractions (exécution par lot)
+    own_client = client is None and not offline
+    if own_client:
+        client = QatClient(credentials, pool_size=max_workers)
+
+    def _extract_program(program_id: int) -> pl.DataFrame:
+        if offline:
+            # Version en vigueur à la fin du mois du rapport, telle qu'elle a été mise en cache
+            eomonth = (pd.to_datetime(date_report) + pd.offsets.MonthEnd(0)).strftime("%Y-%m-%d")
+            df_pa = cache.get_as_of(program_id, start_date, stop_date, eomonth)
+            if df_pa is None:
+                raise FileNotFoundError(
+                    f"Aucune version en cache pour programId={program_id} au {eomonth}"
+                )
+            return df_pa
+
+        version_id, created_date = get_latest_version_metadata(program_id, client)
+        if cache is not None:
+            df_pa = cache.get(program_id, version_id, start_date, stop_date)
+            if df_pa is not None:
+                return df_pa
+
         shipment_df = fetch_shipment_details(
             program_id=program_id,
             version_id=version_id,
-            headers=headers,
+            client=client,
             start_date=start_date,
             stop_date=stop_date,
         )
-        frames.append(
-            transform_pa_dataframe(
-                shipment_df=shipment_df,
-                version_id=version_id,
-                created_date=created_date,
-                program_id=program_id,
-            )
+        df_pa = transform_pa_dataframe(
+            shipment_df=shipment_df,
+            version_id=version_id,
+            created_date=created_date,
+            program_id=program_id,
         )
+        if cache is not None:
+            try:
+                cache.put(df_pa, program_id, version_id, created_date, start_date, stop_date)
+            except (OSError, TypeError, ValueError, pl.exceptions.PolarsError) as e:
+                # Le cache ne doit jamais bloquer l'extraction
+                logger.warning(
+                    f"Impossible de mettre en cache le plan QAT programId={program_id}: {e}"
+                )
+        return df_pa
+
+    # Les programmes QAT sont extraits simultanément, chacun avec ses propres reprises
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(program_ids)))) as executor:
+            frames: list[pl.DataFrame] = list(executor.map(_extract_program, program_ids))
+    finally:
+        if own_client:
+            client.close()
 
     if not frames:
         return pl.DataFrame().to_pandas()
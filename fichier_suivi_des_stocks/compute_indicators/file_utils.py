@@ -1,13 +1,16 @@
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path, PosixPath
 
 import numpy as np
 import pandas as pd
+import polars as pl
 from openhexa.sdk import workspace
 
 from .fetch_pa_from_qat import extract_pa
+from .qat_cache import QAT_CACHE_DIR, QatSnapshotCache
 
 
 def process_pa_files(
@@ -15,6 +18,9 @@ def process_pa_files(
     fp_map_prod: PosixPath,
     programme: str,
     date_report: str,
+    df_qat: pd.DataFrame | None = None,
+    df_map_prod: pd.DataFrame | None = None,
+    qat_offline: bool = False,
 ) -> pd.DataFrame:
     """
     Process and merge plan approval files with product mapping data.
@@ -23,6 +29,12 @@ def process_pa_files(
         fp_map_prod (PosixPath): Path to the Excel file containing product mapping data.
         programme (str): The sheet name in the Excel file to be used for product mapping.
         date_report (str): The date of the report in the format "YYYY-MM-DD".
+        df_qat (pd.DataFrame, optional): Plan already extracted from QAT (batch mode), used instead of
+            a new extraction.
+        df_map_prod (pd.DataFrame, optional): Mapping sheet of the programme already loaded (batch mode),
+            used instead of reading `fp_map_prod`.
+        qat_offline (bool, optional): Read the QAT plan from the local snapshot cache only (version
+            in force at the end of the report month), without calling the QAT API. Defaults to False.
     Returns:
         pd.DataFrame: A DataFrame containing the processed and merged data.
     """
@@ -32,63 +44,52 @@ def process_pa_files(
         == Path(workspace.files_path)
         / f"Fichier Suivi de Stock/data/{programme}/Plan d'Approvisionnement"
     ):
-        conn = workspace.get_connection("qat")
-        credentials = {"username": conn.username, "password": conn.password}  # type: ignore
-        df_plan_approv = extract_pa(
-            programme_id=programme, credentials=credentials, date_report=date_report
-        )
-        df_plan_approv["date de réception"] = df_plan_approv["date de réception"].apply(
-            lambda d: datetime.strptime(d, "%Y-%m-%d")
+        if df_qat is not None:
+            df_plan_approv = df_qat.copy()
+        else:
+            if qat_offline:
+                credentials = {}
+            else:
+                conn = workspace.get_connection("qat")
+                credentials = {"username": conn.username, "password": conn.password}  # type: ignore
+            df_plan_approv = extract_pa(
+                programme_id=programme,
+                credentials=credentials,
+                date_report=date_report,
+                cache=QatSnapshotCache(Path(workspace.files_path) / QAT_CACHE_DIR),
+                offline=qat_offline,
+            )
+        df_plan_approv["date de réception"] = pd.to_datetime(
+            df_plan_approv["date de réception"], format="%Y-%m-%d"
         )
 
     else:
-        # Liste pour accumuler les données
-        data = []
-
-        # Fonction pour traiter un fichier unique
-        def _process_pa_file(fichier):
-            nonlocal data
-            version = None
-            with open(file=fichier) as file:
-                for line in file.readlines():
-                    if version is None and "version" in line.lower():
-                        try:
-                            version = line.split(":")[-1].replace('"', "").strip()
-                            list_element = _process_pa_version(version)
-                        except IndexError:
-                            version = ""
-
-                    if len(line.split(",", 16)) == 17:
-                        data.append(
-                            [col.replace('"', "").strip() for col in line.split(",", 16)]
-                            + list_element
-                        )
-
         if os.path.isdir(fp_plan_approv):
-            for root, _, files in os.walk(fp_plan_approv):
-                for file in files:
-                    if file.endswith(".csv"):
-                        _process_pa_file(os.path.join(root, file))
+            fichiers = [
+                os.path.join(root, file)
+                for root, _, files in os.walk(fp_plan_approv)
+                for file in files
+                if file.endswith(".csv")
+            ]
         else:
-            _process_pa_file(fp_plan_approv)
+            fichiers = [fp_plan_approv]
+        if not fichiers:
+            raise FileNotFoundError(
+                f"Aucun fichier CSV de plan d'approvisionnement dans {fp_plan_approv}"
+            )
 
-        df_plan_approv = pd.DataFrame(
-            data[1:], columns=data[0][:-2] + ["version_pa", "date_extraction_pa"]
-        )
+        # Les fichiers d'un dossier sont lus en parallèle (la lecture polars libère le GIL)
+        with ThreadPoolExecutor(max_workers=min(len(fichiers), os.cpu_count() or 1)) as executor:
+            frames = list(executor.map(_read_pa_csv, fichiers))
 
-        # Bad index
-        bad_index = df_plan_approv.loc[
-            df_plan_approv["ID de produit QAT / Identifiant de produit (prévision)"]
-            == "ID de produit QAT / Identifiant de produit (prévision)"
-        ].index
+        # Les colonnes du premier fichier font référence (comme l'en-tête de la première ligne lue)
+        columns = frames[0].columns
+        df_plan_approv = pl.concat(
+            [frame.rename(dict(zip(frame.columns, columns))) for frame in frames], how="vertical"
+        ).to_pandas()
 
-        df_plan_approv.drop(index=bad_index, inplace=True)
-
-        for col in ["ID de produit QAT / Identifiant de produit (prévision)", "ID de l`envoi QAT"]:
-            try:
-                df_plan_approv[col] = df_plan_approv[col].astype("Int64")
-            except Exception:
-                pass
+        for col in PA_ID_COLUMNS:
+            df_plan_approv[col] = df_plan_approv[col].astype("Int64")
 
     for col in [
         "Coût unitaire de produit (USD)",
@@ -102,8 +103,8 @@ def process_pa_files(
             pass
 
     try:
-        df_plan_approv["date de réception"] = df_plan_approv["date de réception"].apply(
-            lambda date_str: datetime.strptime(date_str, "%d-%b-%Y")
+        df_plan_approv["date de réception"] = pd.to_datetime(
+            df_plan_approv["date de réception"], format="%d-%b-%Y"
         )
     except Exception:
         pass
@@ -112,7 +113,10 @@ def process_pa_files(
     df_plan_approv = df_plan_approv.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
 
     # Charger le fichier de mappage des produits
-    df_map_prod = pd.read_excel(fp_map_prod, sheet_name=programme)  # ou pd.read_csv selon le type
+    if df_map_prod is None:
+        df_map_prod = pd.read_excel(fp_map_prod, sheet_name=programme)  # ou pd.read_csv selon le type
+    else:
+        df_map_prod = df_map_prod.copy()
     df_map_prod.columns = (
         df_map_prod.columns.str.replace("Ã©", "é").str.replace("â", "").str.rstrip().str.lstrip()
     )
@@ -163,8 +167,8 @@ def process_pa_files(
         .fillna(0)
     )
 
-    df_plan_approv["code_and_date_concate"] = df_plan_approv.apply(
-        lambda row: _get_code_and_date_concate(row), axis=1
+    df_plan_approv["code_and_date_concate"] = _get_code_and_date_concate(
+        df_plan_approv["Standard product code"], df_plan_approv["DATE"]
     )
 
     return df_plan_approv
@@ -233,23 +237,97 @@ def process_etat_stock_npsp(
     return df_etat_stock_npsp
 
 
-def _get_code_and_date_concate(row):
-    try:
-        if not pd.isna(row["Standard product code"]):
-            return (
-                str(int(row["Standard product code"]))
-                + "_"
-                + str(row["DATE"]).replace(" 00:00:00", "")
-            )
-        elif pd.isna(row["Standard product code"]) and not pd.isna(row["DATE"]):
-            return "_" + str(row["DATE"]).replace(" 00:00:00", "")
-        else:
-            return np.nan
-    except Exception:
-        try:
-            return "_" + str(row["DATE"]).replace(" 00:00:00", "")
-        except Exception:
-            return np.nan
+def _get_code_and_date_concate(codes: pd.Series, dates: pd.Series) -> pd.Series:
+    """
+    Builds the "<standard product code>_<date>" key of each shipment.
+
+    The code part is left empty when the code is missing or not numeric, the key is NaN when both
+    the code and the date are missing.
+    """
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        dates_str = dates.astype(str).fillna("NaT")
+    else:
+        dates_str = dates.map(str)
+    dates_str = dates_str.str.replace(" 00:00:00", "", regex=False)
+
+    codes_num = pd.to_numeric(codes, errors="coerce")
+    valid = codes.notna() & np.isfinite(codes_num)
+    if codes.dtype == object:
+        # Seules les chaînes représentant un entier sont des codes valides
+        is_str = codes.map(lambda code: isinstance(code, str))
+        valid &= ~is_str | codes.astype(str).str.strip().str.fullmatch(r"[+-]?\d+")
+
+    prefix = pd.Series("_", index=codes.index, dtype=object)
+    prefix[valid] = codes_num[valid].astype("int64").astype(str) + "_"
+
+    return (prefix + dates_str).where(codes.notna() | dates.notna(), np.nan)
+
+
+# Export CSV QAT "Détails de l'envoi" : 17 colonnes, la dernière (Notes) pouvant contenir des virgules
+PA_CSV_N_COLUMNS = 17
+PA_ID_COLUMNS = ["ID de produit QAT / Identifiant de produit (prévision)", "ID de l`envoi QAT"]
+PA_FLOAT_COLUMNS = [
+    "Coût unitaire de produit (USD)",
+    "Coût du fret (USD)",
+    "Quantité",
+    "Coût total (USD)",
+]
+
+
+def _read_pa_csv(fichier) -> pl.DataFrame:
+    """
+    Reads one QAT shipment details CSV export.
+
+    The preamble is scanned line by line until the 17-column header to get the plan version. The
+    lines from the header on are then split at once by polars on their first 16 commas, so that the
+    commas of the last column (Notes) are kept, with ids and costs cast to numbers and the reception
+    date parsed (values that cannot be converted are left empty). Lines with fewer than 17 columns
+    are skipped.
+    Args:
+        fichier: Path to the CSV export.
+
+    Returns:
+        pl.DataFrame: The 17 columns of the export plus `version_pa` and `date_extraction_pa`.
+    """
+    version, lines = "", None
+    with open(file=fichier) as file:
+        for line in file:
+            if not version and "version" in line.lower():
+                version = line.split(":")[-1].replace('"', "").strip()
+            if len(line.split(",", PA_CSV_N_COLUMNS - 1)) == PA_CSV_N_COLUMNS:
+                lines = [line, *file.read().splitlines()]
+                break
+    if lines is None:
+        raise ValueError(f"En-tête à {PA_CSV_N_COLUMNS} colonnes introuvable dans {fichier}")
+
+    version_number, version_date = _process_pa_version(version)
+
+    fields = (
+        pl.Series(lines, dtype=pl.String)
+        .str.replace_all('"', "", literal=True)
+        .str.splitn(",", PA_CSV_N_COLUMNS)
+        .struct.unnest()
+    )
+    # Les lignes à moins de 17 colonnes n'ont pas de dernière colonne
+    df = fields.slice(1).filter(pl.col(fields.columns[-1]).is_not_null())
+    df.columns = list(fields.row(0))
+    df = df.rename({col: col.strip() for col in df.columns})
+    first_col = df.columns[0]
+
+    date_col = "date de réception"
+    return (
+        df.with_columns(pl.all().str.strip_chars())
+        # Lignes vides et en-têtes répétés
+        .filter(~pl.all_horizontal(pl.all().is_null()) & pl.col(first_col).ne_missing(first_col))
+        .with_columns(
+            pl.col(PA_ID_COLUMNS).cast(pl.Int64, strict=False),
+            pl.col(PA_FLOAT_COLUMNS).cast(pl.Float64, strict=False),
+            pl.col(date_col).str.strptime(pl.Datetime("us"), "%d-%b-%Y", strict=False),
+            pl.lit(version_number, dtype=pl.Int64).alias("version_pa"),
+            pl.lit(version_date, dtype=pl.Datetime("us")).alias("date_extraction_pa"),
+        )
+        .with_columns(pl.col(pl.String).fill_null(""))
+    )
 
 
 DATE_EXTRACT_PATTERN = re.compile(r"\((\w{3,9} \d{1,2} \d{4})\)")
@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import polars as pl
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+# Dossier du cache dans le workspace (relatif à `workspace.files_path`)
+QAT_CACHE_DIR = "Fichier Suivi de Stock/data/cache/qat"
+
+
+class QatSnapshotCache:
+    """
+    Cache local des plans d'approvisionnement extraits de QAT, au format Parquet.
+
+    Une version QAT publiée ne change plus : chaque instantané est identifié par l'ID du programme
+    QAT, l'ID de la version et la période extraite. Un index JSON conserve pour chaque instantané
+    la date de création de la version, ce qui permet de retrouver hors ligne la version en vigueur
+    à une date donnée. Seules les `keep_versions` dernières versions de chaque programme et période
+    sont conservées.
+
+    Le dossier peut être partagé par plusieurs exécutions simultanées : chaque opération relit
+    l'index sous un verrou de fichier avant de le modifier, pour ne pas écraser les entrées
+    enregistrées entre-temps par une autre exécution.
+    """
+
+    INDEX_FILE = "index.json"
+    LOCK_FILE = "index.lock"
+
+    def __init__(self, cache_dir: str | Path, keep_versions: int = 3):
+        """
+        Args:
+            cache_dir: Répertoire du cache (créé si nécessaire), par exemple `QAT_CACHE_DIR`
+            keep_versions: Nombre de versions conservées par programme et période
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.keep_versions = keep_versions
+        self._index_path = self.cache_dir / self.INDEX_FILE
+        self._lock_path = self.cache_dir / self.LOCK_FILE
+        self._index = self._load_index()
+        # Les programmes d'une extraction sont traités en parallèle
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(program_id: int, version_id: int, start_date: str, stop_date: str) -> str:
+        return f"{program_id}_{version_id}_{start_date}_{stop_date}"
+
+    def get(
+        self, program_id: int, version_id: int, start_date: str, stop_date: str
+    ) -> pl.DataFrame | None:
+        """Retourne l'instantané d'une version, ou None s'il n'est pas en cache."""
+        key = self.make_key(program_id, version_id, start_date, stop_date)
+        with self._locked_index():
+            path = self._path(key)
+            if key not in self._index or not path.exists():
+                self._drop(key)
+                self._save_index()
+                return None
+            self._index[key]["last_access"] = time.time()
+            self._save_index()
+            # Lu sous le verrou : une autre exécution ne peut pas l'évincer pendant la lecture
+            return pl.read_parquet(path)
+
+    def get_as_of(
+        self, program_id: int, start_date: str, stop_date: str, date: str
+    ) -> pl.DataFrame | None:
+        """
+        Retourne hors ligne l'instantané de la dernière version créée au plus tard à `date`
+        (format "YYYY-MM-DD"), ou None si aucune version de cette période n'est en cache.
+        """
+        with self._locked_index():
+            entries = [
+                (entry["created_date"], entry["version_id"])
+                for entry in self._index.values()
+                if entry["program_id"] == program_id
+                and entry["start_date"] == start_date
+                and entry["stop_date"] == stop_date
+                and entry["created_date"] <= date
+            ]
+        if not entries:
+            return None
+        _, version_id = max(entries)
+        return self.get(program_id, version_id, start_date, stop_date)
+
+    def put(
+        self,
+        df: pl.DataFrame,
+        program_id: int,
+        version_id: int,
+        created_date: str,
+        start_date: str,
+        stop_date: str,
+    ) -> None:
+        """Enregistre l'instantané d'une version puis supprime les versions les plus anciennes."""
+        key = self.make_key(program_id, version_id, start_date, stop_date)
+        with self._locked_index():
+            path = self._path(key)
+            df.write_parquet(path)
+            now = time.time()
+            self._index[key] = {
+                "program_id": program_id,
+                "version_id": version_id,
+                "created_date": created_date,
+                "start_date": start_date,
+                "stop_date": stop_date,
+                "cached_at": now,
+                "last_access": now,
+                "size": path.stat().st_size,
+            }
+            self._evict(program_id, start_date, stop_date)
+            self._drop_orphans()
+            self._save_index()
+
+    def clear(self) -> None:
+        """Vide entièrement le cache."""
+        with self._locked_index():
+            for key in list(self._index):
+                self._drop(key)
+            self._drop_orphans()
+            self._save_index()
+
+    @contextmanager
+    def _locked_index(self):
+        """
+        Verrouille l'index (threads de l'exécution et autres exécutions sur le même dossier) et le
+        relit depuis le disque ; les modifications doivent être enregistrées avec `_save_index`
+        avant la sortie du bloc.
+        """
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                # Libéré à la fermeture du fichier
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._index = self._load_index()
+            yield
+
+    def _evict(self, program_id: int, start_date: str, stop_date: str) -> None:
+        """Ne conserve que les `keep_versions` dernières versions du programme et de la période."""
+        keys = sorted(
+            (
+                key
+                for key, entry in self._index.items()
+                if entry["program_id"] == program_id
+                and entry["start_date"] == start_date
+                and entry["stop_date"] == stop_date
+            ),
+            key=lambda k: self._index[k]["version_id"],
+            reverse=True,
+        )
+        for key in keys[self.keep_versions :]:
+            self._drop(key)
+
+    def _drop(self, key: str) -> None:
+        self._index.pop(key, None)
+        self._path(key).unlink(missing_ok=True)
+
+    def _drop_orphans(self) -> None:
+        """Supprime les instantanés absents de l'index (entrée perdue, exécution interrompue)."""
+        for path in self.cache_dir.glob("*.parquet"):
+            if path.stem not in self._index:
+                path.unlink(missing_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.parquet"
+
+    def _load_index(self) -> dict:
+        try:
+            return json.loads(self._index_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self) -> None:
+        # Écriture atomique : un index interrompu en cours d'écriture ne doit pas vider le cache
+        tmp_path = self._index_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self._index, indent=1))
+        os.replace(tmp_path, self._index_path)
@@ -0,0 +1,117 @@
+"""
+Données communes aux programmes d'une exécution par lot.
+
+Lorsque plusieurs programmes sont traités dans la même exécution, les entrées qui ne dépendent pas du
+programme (ou qui peuvent être obtenues pour tous les programmes en une fois) sont préparées une seule
+fois puis déposées dans un dossier partagé : chaque notebook de programme les relit au lieu de refaire
+la lecture du fichier de mapping, l'authentification QAT et les requêtes communes.
+"""
+
+import time
+from pathlib import Path
+
+import pandas as pd
+from openhexa.sdk import workspace
+
+from .fetch_pa_from_qat import QatClient, extract_pa
+from .qat_cache import QAT_CACHE_DIR, QatSnapshotCache
+from .queries import QUERY_ETAT_STOCK_PERIPH
+
+
+def shared_input_name(kind: str, programme: str | None = None) -> str:
+    """Nom d'une entrée partagée (`kind` pour les entrées communes, `kind_programme` sinon)."""
+    return kind if programme is None else f"{kind}_{programme}"
+
+
+def prepare_shared_inputs(
+    output_dir: str,
+    programmes: list[str],
+    date_report: str,
+    fp_map_prod: str,
+    fetch_qat: bool = True,
+    qat_offline: bool = False,
+) -> dict[str, float]:
+    """
+    Prépare les entrées communes aux programmes et les enregistre dans `output_dir`.
+
+    Args:
+        output_dir (str): Dossier où sont déposées les entrées partagées.
+        programmes (list[str]): Programmes de l'exécution.
+        date_report (str): Date du rapport au format "YYYY-MM-DD".
+        fp_map_prod (str): Chemin du fichier de mapping des produits QAT / SAGE X3.
+        fetch_qat (bool, optional): Extrait les plans d'approvisionnement depuis QAT (une seule
+            authentification pour tous les programmes). Defaults to True.
+        qat_offline (bool, optional): Lit les plans QAT dans le cache local uniquement (version en
+            vigueur à la fin du mois du rapport), sans appel à l'API QAT. Defaults to False.
+
+    Returns:
+        dict[str, float]: Durée (en secondes) de préparation de chaque groupe d'entrées.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    timings = {}
+
+    # Fichier de mapping : le classeur n'est lu qu'une fois pour toutes les feuilles des programmes
+    start = time.perf_counter()
+    sheets = pd.read_excel(fp_map_prod, sheet_name=programmes)
+    for programme, df_map_prod in sheets.items():
+        df_map_prod.to_pickle(output_dir / f"{shared_input_name('mapping', programme)}.pkl")
+    timings["mapping"] = round(time.perf_counter() - start, 2)
+
+    # Plans d'approvisionnement QAT
+    if fetch_qat:
+        start = time.perf_counter()
+        cache = QatSnapshotCache(Path(workspace.files_path) / QAT_CACHE_DIR)
+        if qat_offline:
+            credentials, client = {}, None
+        else:
+            conn = workspace.get_connection("qat")
+            credentials = {"username": conn.username, "password": conn.password}  # type: ignore
+            client = QatClient(credentials)
+        try:
+            for programme in programmes:
+                df_qat = extract_pa(
+                    programme_id=programme,
+                    credentials=credentials,
+                    date_report=date_report,
+                    client=client,
+                    cache=cache,
+                    offline=qat_offline,
+                )
+                df_qat.to_pickle(
+                    output_dir / f"{shared_input_name('plan_approv_qat', programme)}.pkl"
+                )
+        finally:
+            if client is not None:
+                client.close()
+        timings["plan_approv_qat"] = round(time.perf_counter() - start, 2)
+
+    # Etat de stock des structures périphériques (commun à tous les programmes)
+    from database_operations import stock_sync_manager
+
+    start = time.perf_counter()
+    eomonth = (pd.to_datetime(date_report) + pd.offsets.MonthEnd(0)).strftime("%Y-%m-%d")
+    df_etat_stock_periph = stock_sync_manager.get_table_data(
+        query=QUERY_ETAT_STOCK_PERIPH.format(eomonth=eomonth)
+    )
+    df_etat_stock_periph.to_pickle(output_dir / f"{shared_input_name('etat_stock_periph')}.pkl")
+    timings["etat_stock_periph"] = round(time.perf_counter() - start, 2)
+
+    return timings
+
+
+def load_shared_input(
+    shared_inputs_dir: str | None, kind: str, programme: str | None = None
+) -> pd.DataFrame | None:
+    """
+    Relit une entrée partagée.
+
+    Returns:
+        pd.DataFrame | None: L'entrée, ou None hors exécution par lot (`shared_inputs_dir` vide) ou si
+            elle n'a pas été préparée.
+    """
+    if not shared_inputs_dir:
+        return None
+
+    path = Path(shared_inputs_dir) / f"{shared_input_name(kind, programme)}.pkl"
+    return pd.read_pickle(path) if path.exists() else None
@@ -1,4 +1,4 @@
-from . import stock_sync_manager
+from . import connection_manager, stock_sync_manager
 from .process_statut_prod import process_statut_prod
 
-__all__ = ["stock_sync_manager", "process_statut_prod"]
\ No newline at end of file
+__all__ = ["connection_manager", "process_statut_prod", "stock_sync_manager"]
\ No newline at end of file
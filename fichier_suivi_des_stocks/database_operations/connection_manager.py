@@ -0,0 +1,151 @@
+"""
+Gestion des connexions à la base de données du workspace.
+
+Un unique engine SQLAlchemy avec pool de connexions est créé au premier usage (aucune connexion n'est
+ouverte à l'import). Les transactions et les curseurs psycopg2 sont empruntés au pool le temps d'un bloc
+`with` puis rendus, ce qui évite de payer une reconnexion à chaque lecture ou écriture.
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from sqlalchemy import Connection, Engine, create_engine
+from sqlalchemy.exc import SQLAlchemyError
+
+# Paramètres du pool (modifiables avec `configure`)
+POOL_SETTINGS = {
+    "pool_size": 5,
+    "max_overflow": 5,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+}
+
+_engine: Engine | None = None
+_shared_connection = None
+_shared_cursor = None
+
+
+def configure(**pool_settings) -> None:
+    """
+    Modifie les paramètres du pool (pool_size, max_overflow, pool_pre_ping, pool_recycle).
+
+    L'engine existant est fermé, le suivant sera créé avec les nouveaux paramètres au prochain usage.
+    """
+    unknown = set(pool_settings) - set(POOL_SETTINGS)
+    if unknown:
+        raise ValueError(f"Paramètres de pool inconnus: {unknown}")
+    POOL_SETTINGS.update(pool_settings)
+    dispose()
+
+
+def get_engine() -> Engine:
+    """Retourne l'engine du workspace, créé au premier appel."""
+    global _engine
+
+    if _engine is None:
+        from openhexa.sdk import workspace
+
+        _engine = create_engine(workspace.database_url, **POOL_SETTINGS)
+    return _engine
+
+
+@contextmanager
+def transaction() -> Iterator[Connection]:
+    """Connexion SQLAlchemy empruntée au pool : commit en sortie de bloc, rollback en cas d'erreur."""
+    with get_engine().begin() as connection:
+        yield connection
+
+
+@contextmanager
+def raw_connection():
+    """
+    Connexion psycopg2 empruntée au pool : commit en sortie de bloc, rollback en cas d'erreur.
+
+    La connexion est rendue au pool (et non fermée) à la fin du bloc.
+    """
+    connection = get_engine().raw_connection()
+    try:
+        yield connection
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+@contextmanager
+def cursor():
+    """Curseur psycopg2 sur une connexion empruntée au pool, dans une transaction (voir `raw_connection`)."""
+    with raw_connection() as connection:
+        cur = connection.cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+
+def get_shared_connection():
+    """
+    Connexion psycopg2 empruntée au pool et conservée pour les usages directs des notebooks
+    (`conn.commit()`, `civ_cursor.execute(...)`).
+    """
+    global _shared_connection, _shared_cursor
+
+    if _shared_connection is None or _shared_connection.driver_connection.closed:
+        _shared_connection = get_engine().raw_connection()
+        _shared_cursor = None
+    return _shared_connection.driver_connection
+
+
+def get_shared_cursor():
+    """Curseur de la connexion partagée (voir `get_shared_connection`)."""
+    global _shared_cursor
+
+    connection = get_shared_connection()
+    if _shared_cursor is None or _shared_cursor.closed:
+        _shared_cursor = connection.cursor()
+    return _shared_cursor
+
+
+def release_shared_connection() -> None:
+    """Rend la connexion partagée au pool ; la suivante est empruntée au prochain usage."""
+    global _shared_connection, _shared_cursor
+
+    if _shared_connection is not None:
+        try:
+            _shared_connection.close()
+        except (SQLAlchemyError, OSError) as e:
+            print(f"Erreur de nettoyage de la connexion: {e}")
+    _shared_connection = None
+    _shared_cursor = None
+
+
+def reconnect() -> None:
+    """
+    Rend la connexion partagée (une transaction interrompue est abandonnée) puis vérifie la connexion.
+
+    Si la vérification échoue, toutes les connexions du pool sont fermées et l'engine est recréé
+    avant une seconde tentative, dont l'éventuelle erreur est propagée.
+    """
+    release_shared_connection()
+    try:
+        _ping()
+    except SQLAlchemyError:
+        dispose()
+        _ping()
+
+
+def _ping() -> None:
+    with transaction() as connection:
+        connection.exec_driver_sql("SELECT 1")
+
+
+def dispose() -> None:
+    """Rend la connexion partagée et ferme toutes les connexions du pool (fin d'exécution)."""
+    global _engine
+
+    release_shared_connection()
+    if _engine is not None:
+        _engine.dispose()
+    _engine = None
@@ -45,33 +45,15 @@ def process_statut_prod(df: pd.DataFrame, schema_name: str, stock_sync_manager:
 
     # Opération de suppression
     def delete_operation(df_suppression):
-        delete_query = f"""
-        DELETE FROM {schema_name}.dim_produit_stock_track
-        WHERE code_produit = %s AND programme = %s
-        """
-        params = [
-            [
-                stock_sync_manager.convert_numpy_types(row["code_produit"]),
-                stock_sync_manager.convert_numpy_types(row["programme"]),
-            ]
-            for _, row in df_suppression.iterrows()
-        ]
-        stock_sync_manager.civ_cursor.executemany(delete_query, params)
-        stock_sync_manager.conn.commit()
+        stock_sync_manager.apply_staged_changes(
+            "dim_produit_stock_track",
+            key_columns=["code_produit", "programme"],
+            schema_name=schema_name,
+            deleted_records=df_suppression,
+        )
 
     # Opération de modification
     def update_operation(df_modification):
-        update_query = f"""
-        UPDATE {schema_name}.dim_produit_stock_track 
-        SET ancien_code = %s,
-            categorie = %s,
-            designation = %s,
-            type_produit = %s,
-            unit_niveau_central = %s,
-            unit_niveau_peripherique = %s,
-            facteur_de_conversion = %s
-        WHERE code_produit = %s AND programme = %s
-        """
         keys = [
             "ancien_code",
             "categorie",
@@ -84,13 +66,12 @@ def process_statut_prod(df: pd.DataFrame, schema_name: str, stock_sync_manager:
             "programme",
         ]
 
-        params = [
-            [stock_sync_manager.convert_numpy_types(row[k]) for k in keys]
-            for _, row in df_modification.iterrows()
-        ]
-
-        stock_sync_manager.civ_cursor.executemany(update_query, params)
-        stock_sync_manager.conn.commit()
+        stock_sync_manager.apply_staged_changes(
+            "dim_produit_stock_track",
+            key_columns=["code_produit", "programme"],
+            schema_name=schema_name,
+            updated_records=df_modification[keys],
+        )
 
     # Execution des opérations
     process_status("Ajout", add_operation)
@@ -1,472 +1,724 @@
-"""
-Database Interaction Module
-
-Provides optimized utilities for PostgreSQL database operations including:
-- Connection management
-- Data retrieval/insertion
-- Type conversion handling
-- Data synchronization
-"""
-
-from typing import Any, List, Optional
-
-import numpy as np
-import pandas as pd
-import psycopg2
-
-# from IPython.display import display
-from openhexa.sdk import workspace
-from sqlalchemy import Engine, MetaData, Table, create_engine, inspect
-from sqlalchemy.dialects.postgresql import insert
-
-# Database connection objects
-civ_engine: Optional[Engine] = None
-conn: Optional[psycopg2.extensions.connection] = None
-civ_cursor: Optional[psycopg2.extensions.cursor] = None
-
-
-def initialize_database_connection() -> None:
-    """Initialize or refresh database connections using workspace credentials."""
-    global civ_engine, conn, civ_cursor
-
-    try:
-        # Close existing connections
-        if conn and not conn.closed:
-            conn.close()
-        if civ_engine:
-            civ_engine.dispose()
-    except Exception as e:
-        print(f"Erreur de nettoyage de la connexion: {str(e)}")
-
-    try:
-        civ_engine = create_engine(workspace.database_url)
-        conn = psycopg2.connect(
-            dbname=workspace.database_name,
-            user=workspace.database_username,
-            password=workspace.database_password,
-            host=workspace.database_host,
-            port=workspace.database_port,
-        )
-        conn.autocommit = False
-        civ_cursor = conn.cursor()
-        print("Connexion à la base de données établie avec succès")
-    except Exception as e:
-        print(f"Tentative de connexion à la base de données échouée: {str(e)}")
-        raise
-
-
-def get_table_data(
-    table_name: str = None, schema_name: str = "suivi_stock", query: Optional[str] = None
-) -> pd.DataFrame:
-    """
-    Retrieve data from database table with schema validation.
-
-    Args:
-        table_name: Target table name
-        schema_name: Database schema (default: suivi_stock)
-        query: Custom SQL query (optional)
-
-    Returns:
-        pd.DataFrame: Resultset as DataFrame
-
-    Raises:
-        ValueError: On invalid query execution
-    """
-    try:
-        if not civ_engine:
-            initialize_database_connection()
-
-        final_query = query or f"SELECT * FROM {schema_name}.{table_name}"
-        return pd.read_sql(final_query, civ_engine)
-
-    except Exception as e:
-        print(f"Erreur d'exécution de la réquête d'accès aux données: {str(e)}")
-        raise ValueError("Opération de base de données échouée") from e
-
-
-def insert_dataframe_to_table(
-    df: pd.DataFrame, table_name: str, schema_name: str = "suivi_stock", chunk_size: int = 1000
-) -> str:
-    """
-    Insert DataFrame into database table with schema validation.
-
-    Args:
-        df: Input DataFrame
-        table_name: Target table name
-        schema_name: Database schema (default: suivi_stock)
-        chunk_size: Batch insert size (default: 1000)
-
-    Returns:
-        str: Operation status
-
-    Raises:
-        ValueError: On schema mismatch
-    """
-    try:
-        if not civ_engine:
-            initialize_database_connection()
-
-        # Get schema metadata
-        table_columns = pd.read_sql(
-            f"""
-            SELECT column_name, data_type 
-            FROM information_schema.columns 
-            WHERE table_schema = '{schema_name}' 
-            AND table_name = '{table_name}'
-            """,
-            civ_engine,
-        )
-
-        # Schema validation
-        missing_columns = set(df.columns) - set(table_columns.column_name)
-        if missing_columns:
-            raise ValueError(f"Colonnes invalides: {missing_columns}")
-
-        # Type conversion mapping
-        type_mapping = {
-            "integer": np.int32,
-            "bigint": np.int64,
-            "real": np.float64,
-            "text": str,
-            "character varying": str,
-            "numeric": np.float64,
-            "date": "datetime64[ns]",
-        }
-
-        # Column type enforcement
-        dtype_mapping = {
-            row["column_name"]: type_mapping.get(row["data_type"], str)
-            for _, row in table_columns.iterrows()
-        }
-
-        df = df.astype({col: dtype for col, dtype in dtype_mapping.items() if col in df.columns})
-
-        dtype_str = {
-            col: dtype for col, dtype in dtype_mapping.items() if dtype is str and col in df.columns
-        }
-        for col in dtype_str:
-            df[col] = df[col].replace({np.nan: ""})
-
-        # Batch insert
-        df.to_sql(
-            name=table_name,
-            con=civ_engine,
-            schema=schema_name,
-            if_exists="append",
-            index=False,
-            chunksize=chunk_size,
-            method="multi",
-        )
-
-        return f"Insertion de {len(df)} enrégistrements réussie"
-
-    except Exception as e:
-        conn.rollback()
-        print(f"Insertion d'insertion échouée: {str(e)}")
-        raise
-
-
-def convert_numpy_types(value: Any) -> Any:
-    """Convert numpy datatypes to native Python types."""
-    if isinstance(value, (np.integer)):
-        return int(value)
-    if isinstance(value, (np.floating)):
-        return float(value)
-    if isinstance(value, (np.bool_)):
-        return bool(value)
-    if isinstance(value, (np.datetime64)) or isinstance(
-        value, pd._libs.tslibs.timestamps.Timestamp
-    ):
-        return pd.Timestamp(value).to_pydatetime()
-    return value
-
-
-def synchronize_product_metadata(
-    source_df: pd.DataFrame, programme: str, schema_name: str = "suivi_stock"
-) -> str:
-    """
-    Synchronize product metadata between source DataFrame and database.
-
-    Args:
-        source_df: Source data containing product updates
-        programme: Programme filter
-        schema_name: Database schema (default: suivi_stock)
-
-    Returns:
-        str: Operation status
-    """
-    try:
-        # Validate input structure
-        required_columns = {
-            "Standard product code",
-            "acronym",
-            "facteur_de_conversion_qat_sage",
-        }
-        if not required_columns.issubset(source_df.columns):
-            missing = required_columns - set(source_df.columns)
-            raise ValueError(f"Missing columns: {missing}")
-
-        # Get current database state
-        db_products = get_table_data(
-            schema_name=schema_name,
-            query=f"SELECT * FROM {schema_name}.dim_produit_stock_track WHERE programme = '{programme}'",
-        )
-        source_df = (
-            source_df[list(required_columns)]
-            .rename(columns={"acronym": "designation_acronym"})
-            .drop_duplicates()
-        )
-        source_df.astype(
-            {col: db_products[col].dtype for col in db_products if col in source_df.columns}
-        )
-
-        for col in source_df.select_dtypes("O").columns:
-            source_df[col] = source_df[col].replace({pd.NaT: None})
-
-        # Merge and update logic
-        merged = source_df.merge(
-            db_products,
-            left_on="Standard product code",
-            right_on="code_produit",
-            how="inner",
-            suffixes=("_new", "_current"),
-        ).round(2)
-
-        mask = False  # masque initial
-        for col in [c for c in source_df.columns if c not in ["Standard product code"]]:
-            mask |= ~merged[f"{col}_new"].eq(merged[f"{col}_current"])
-
-        merged = merged.loc[mask]
-        merged = merged.loc[
-            merged["designation_acronym_new"].notna()
-        ]  # Afin de garantir l'intégrité des données
-
-        if merged.empty:
-            return "Aucune mise à jour des données à effectuer sur la table dim_produit"
-
-        # Prepare updates
-        updates = merged[
-            [
-                "id_dim_produit_stock_track_pk",
-                "designation_acronym_new",
-                "facteur_de_conversion_qat_sage_new",
-            ]
-        ].rename(
-            columns={
-                "designation_acronym_new": "designation_acronym",
-                "facteur_de_conversion_qat_sage_new": "facteur_de_conversion_qat_sage",
-            }
-        )
-
-        # Batch update
-        update_query = f"""
-        UPDATE {schema_name}.dim_produit_stock_track 
-        SET 
-            designation_acronym = %s,
-            facteur_de_conversion_qat_sage = %s
-        WHERE id_dim_produit_stock_track_pk = %s
-        """
-
-        params = [
-            (
-                convert_numpy_types(row["designation_acronym"]),
-                convert_numpy_types(row["facteur_de_conversion_qat_sage"]),
-                convert_numpy_types(row["id_dim_produit_stock_track_pk"]),
-            )
-            for _, row in updates.iterrows()
-        ]
-
-        civ_cursor.executemany(update_query, params)
-        conn.commit()
-
-        return f"Mise à jour réussie pour {len(params)} enregistrements"
-
-    except Exception as e:
-        conn.rollback()
-        print(f"Erreur lors de la mise à jour: {str(e)}")
-        raise
-
-
-def synchronize_table_data(
-    source_df: pd.DataFrame,
-    table_name: str,
-    merge_keys: List[str],
-    programme: str,
-    schema_name: str = "suivi_stock",
-) -> Optional[pd.DataFrame]:
-    """
-    Full synchronization workflow for table data.
-
-    Args:
-        source_df: Source data for synchronization
-        table_name: Target table name
-        merge_keys: Columns for merge operations
-        programme: Programme filter
-        schema_name: Database schema (default: suivi_stock)
-
-    Returns:
-        Optional[pd.DataFrame]: Current table state if requested
-    """
-    try:
-        # Schema validation
-        db_columns = get_table_data(
-            schema_name=schema_name,
-            query=f"SELECT * FROM {schema_name}.{table_name} LIMIT 1",
-        )
-
-        if not set(source_df.columns).issubset(db_columns.columns.tolist()):
-            invalid_cols = set(source_df.columns) - set(db_columns.columns.tolist())
-            raise ValueError(f"Colonne invalide: {invalid_cols}")
-
-        # Type consistency
-        for col in source_df.columns:
-            if col in db_columns and source_df[col].dtype != db_columns[col].dtype:
-                source_df[col] = source_df[col].astype(db_columns[col].dtype)
-
-        for col in source_df.select_dtypes("O").columns:
-            source_df[col] = source_df[col].replace({pd.NaT: None})
-
-        # Data synchronization workflow
-        query = (
-            f"SELECT * FROM {schema_name}.{table_name} WHERE programme = '{programme}'"
-            if table_name
-            in ["dim_produit_stock_track", "plan_approv", "share_link", "stock_track_npsp"]
-            else f"""SELECT st.* 
-                     FROM {schema_name}.{table_name} st 
-                     INNER JOIN {schema_name}.dim_produit_stock_track dps 
-                         ON st.id_dim_produit_stock_track_fk = dps.id_dim_produit_stock_track_pk 
-                     WHERE dps.programme = '{programme}'"""
-        )
-
-        current_data = get_table_data(
-            schema_name=schema_name,
-            query=query,
-        )
-        for col in [col_date for col_date in current_data.columns if col_date.startswith("date_")]:
-            source_df[col] = pd.to_datetime(
-                source_df[col].astype(str).str[:10], format="%Y-%m-%d", errors="coerce"
-            )
-            current_data[col] = pd.to_datetime(
-                current_data[col].astype(str).str[:10], format="%Y-%m-%d", errors="coerce"
-            )
-
-        # Identify new records
-        new_records = (
-            source_df.merge(current_data[merge_keys], on=merge_keys, how="left", indicator=True)
-            .query("_merge == 'left_only'")
-            .drop("_merge", axis=1)
-        )
-
-        if not new_records.empty:
-            print(f"Insertion de {len(new_records)} enrégistrements réussie")
-            insert_dataframe_to_table(new_records, table_name, schema_name)
-
-        # Identify updates
-        updates = source_df.merge(current_data, on=merge_keys, suffixes=("_new", "_current"))
-
-        # display(updates)
-        if updates.empty:
-            return "Aucune mise à jour des données à effectuer"
-
-        mask = False  # masque booléen de base
-
-        for col in [c for c in source_df.columns if c not in merge_keys]:
-            mask |= ~updates[f"{col}_new"].round(2).eq(updates[f"{col}_current"].round(2))
-
-        updates = updates.loc[mask]
-
-        # display(updates)
-
-        # Execute batch updates
-        if not updates.empty:
-            # Generate dynamic update statement
-            set_clause = ", ".join(
-                f"{col} = %s" for col in source_df.columns if col not in merge_keys
-            )
-
-            update_query = f"""
-            UPDATE {schema_name}.{table_name}
-            SET {set_clause}
-            WHERE {" AND ".join(f"{key} = %s" for key in merge_keys)}
-            """
-
-            params = [
-                [
-                    convert_numpy_types(row[f"{col}_new"])
-                    for col in source_df.columns
-                    if col not in merge_keys
-                ]
-                + [convert_numpy_types(row[key]) for key in merge_keys]
-                for _, row in updates.iterrows()
-            ]
-
-            civ_cursor.executemany(update_query, params)
-            conn.commit()
-
-        return get_table_data(table_name, schema_name) if current_data.shape[0] else None
-
-    except Exception as e:
-        conn.rollback()
-        print(f"Synchronization error: {str(e)}")
-        raise
-
-
-def get_table_info(table_name: str, schema_name: str, engine) -> tuple:
-    """Récupère les métadonnées de la table"""
-    inspector = inspect(engine)
-    columns = inspector.get_columns(table_name, schema=schema_name)
-    pk = inspector.get_pk_constraint(table_name, schema=schema_name)["constrained_columns"]
-    return columns, pk
-
-
-def upsert_dataframe(
-    df: pd.DataFrame,
-    table_name: str,
-    schema_name: str = "suivi_stock",
-    conflict_columns: list = [],
-    engine=civ_engine,
-):
-    """
-    Effectue un upsert en ignorant les colonnes auto-incrémentées
-
-    Args:
-        df (list[dict]): Données utilisateur
-        table_name (str): Nom de la table
-        schema (str): Schéma de la table
-        engine (sqlalchemy.engine): Connexion
-        conflict_columns (list): Colonnes pour la détection de conflit
-    """
-
-    if df.empty:
-        return "Aucune insertion ou mise à jour effectuée"
-
-    columns, pk = get_table_info(table_name, schema_name, engine)
-
-    auto_cols = [col["name"] for col in columns if col.get("autoincrement", False)]
-    df = df.drop(columns=[c for c in auto_cols if c in df.columns], errors="ignore")
-
-    metadata = MetaData(schema=schema_name)
-    table = Table(table_name, metadata, autoload_with=engine)
-
-    conflict_columns = pk if not conflict_columns else conflict_columns
-
-    stmt = insert(table).values(df.to_dict("records"))
-
-    # Generate the update dictionary
-    # Exclude the primary key and conflict columns from the update
-    update_dict = {c.key: c for c in stmt.excluded if c.key not in [*conflict_columns, *pk]}
-
-    # Generate the WHERE clause for the update statement
-    where_clause = None
-    for col in update_dict.keys():
-        condition = table.c[col].is_distinct_from(stmt.excluded[col])
-        where_clause = condition if where_clause is None else where_clause | condition
-
-    update_stmt = stmt.on_conflict_do_update(
-        index_elements=conflict_columns, set_=update_dict, where=where_clause
-    )
-
-    with engine.begin() as conn:
-        conn.execute(update_stmt)
-
-    return f"Upsert de {len(df)} enrégistrements réussie"
+"""
+Database Interaction Module
+
+Provides optimized utilities for PostgreSQL database operations including:
+- Connection management
+- Data retrieval/insertion
+- Type conversion handling
+- Data synchronization
+"""
+
+import io
+import time
+from functools import cache
+from typing import Any, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# from IPython.display import display
+from sqlalchemy import MetaData, Table, inspect
+from sqlalchemy.dialects.postgresql import insert
+
+from . import connection_manager
+
+
+def initialize_database_connection() -> None:
+    """
+    Initialize the pooled database engine and check connectivity.
+
+    Connections are created lazily by `connection_manager`. Calling this function again releases the
+    shared connection, and rebuilds the engine if the connectivity check fails.
+    """
+    try:
+        connection_manager.reconnect()
+        print("Connexion à la base de données établie avec succès")
+    except Exception as e:
+        print(f"Tentative de connexion à la base de données échouée: {str(e)}")
+        raise
+
+
+def __getattr__(name: str) -> Any:
+    """Legacy connection objects (`civ_engine`, `conn`, `civ_cursor`) used directly by the notebooks."""
+    if name == "civ_engine":
+        return connection_manager.get_engine()
+    if name == "conn":
+        return connection_manager.get_shared_connection()
+    if name == "civ_cursor":
+        return connection_manager.get_shared_cursor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_table_data(
+    table_name: str = None, schema_name: str = "suivi_stock", query: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Retrieve data from database table with schema validation.
+
+    Args:
+        table_name: Target table name
+        schema_name: Database schema (default: suivi_stock)
+        query: Custom SQL query (optional)
+
+    Returns:
+        pd.DataFrame: Resultset as DataFrame
+
+    Raises:
+        ValueError: On invalid query execution
+    """
+    try:
+        final_query = query or f"SELECT * FROM {schema_name}.{table_name}"
+        return pd.read_sql(final_query, connection_manager.get_engine())
+
+    except Exception as e:
+        print(f"Erreur d'exécution de la réquête d'accès aux données: {str(e)}")
+        raise ValueError("Opération de base de données échouée") from e
+
+
+# Correspondance entre les types PostgreSQL et les types pandas appliqués avant insertion
+TYPE_MAPPING = {
+    "integer": np.int32,
+    "bigint": np.int64,
+    "real": np.float64,
+    "text": str,
+    "character varying": str,
+    "numeric": np.float64,
+    "date": "datetime64[ns]",
+}
+
+# Types PostgreSQL arrondis lors des comparaisons côté serveur
+NUMERIC_TYPES = ("integer", "bigint", "smallint", "real", "double precision", "numeric")
+
+# Marqueur des valeurs NULL dans le flux CSV envoyé à COPY (distinct de la chaîne vide)
+COPY_NULL_MARKER = "\\N"
+
+
+# Colonnes des tables lues dans information_schema, par (schéma, table)
+_table_columns_cache: dict[tuple[str, str], tuple] = {}
+
+
+def get_table_columns(table_name: str, schema_name: str = "suivi_stock") -> tuple:
+    """
+    Retrieve (column_name, data_type) pairs of a table, cached for the process lifetime.
+
+    A table without columns (not created yet) is not cached and is read again on the next call.
+    Call `clear_table_columns_cache()` after altering a table structure.
+    """
+    key = (schema_name, table_name)
+    if key in _table_columns_cache:
+        return _table_columns_cache[key]
+
+    table_columns = pd.read_sql(
+        f"""
+        SELECT column_name, data_type 
+        FROM information_schema.columns 
+        WHERE table_schema = '{schema_name}' 
+        AND table_name = '{table_name}'
+        ORDER BY ordinal_position
+        """,
+        connection_manager.get_engine(),
+    )
+    columns = tuple(zip(table_columns["column_name"], table_columns["data_type"]))
+    if columns:
+        _table_columns_cache[key] = columns
+    return columns
+
+
+def clear_table_columns_cache() -> None:
+    """Forget the cached table columns, to call after altering a table structure."""
+    _table_columns_cache.clear()
+
+
+def _copy_dataframe(cursor, df: pd.DataFrame, target: str, chunk_size: int = 50000) -> None:
+    """Stream the DataFrame rows into `target` with COPY FROM STDIN, by chunks of `chunk_size` rows."""
+    columns = ", ".join(f'"{col}"' for col in df.columns)
+    copy_query = (
+        f"COPY {target} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL_MARKER}')"
+    )
+
+    for start in range(0, len(df), chunk_size):
+        buffer = io.StringIO()
+        df.iloc[start : start + chunk_size].to_csv(
+            buffer, index=False, header=False, na_rep=COPY_NULL_MARKER, date_format="%Y-%m-%d"
+        )
+        buffer.seek(0)
+        cursor.copy_expert(copy_query, buffer)
+
+
+def copy_dataframe_to_table(
+    df: pd.DataFrame, table_name: str, schema_name: str = "suivi_stock", chunk_size: int = 50000
+) -> None:
+    """
+    Stream a DataFrame into a table with PostgreSQL COPY FROM STDIN (CSV format).
+
+    Rows are serialized by chunks of `chunk_size` to bound memory; missing values are sent as
+    NULL and empty strings are kept as empty strings. All chunks are loaded in a single transaction.
+
+    Args:
+        df: Input DataFrame whose columns exist in the target table
+        table_name: Target table name
+        schema_name: Database schema (default: suivi_stock)
+        chunk_size: Number of rows serialized per COPY chunk (default: 50000)
+    """
+    with connection_manager.cursor() as cursor:
+        _copy_dataframe(cursor, df, f"{schema_name}.{table_name}", chunk_size)
+
+
+def prepare_dataframe_for_table(
+    df: pd.DataFrame, table_name: str, schema_name: str = "suivi_stock"
+) -> pd.DataFrame:
+    """
+    Validate DataFrame columns against the table schema and cast them to the table types.
+
+    Missing values of text columns are replaced by empty strings.
+
+    Raises:
+        ValueError: On schema mismatch
+    """
+    # Get schema metadata (cached per table)
+    table_columns = dict(get_table_columns(table_name, schema_name))
+
+    # Schema validation
+    missing_columns = set(df.columns) - set(table_columns)
+    if missing_columns:
+        raise ValueError(f"Colonnes invalides: {missing_columns}")
+
+    # Column type enforcement
+    dtype_mapping = {
+        column_name: TYPE_MAPPING.get(data_type, str)
+        for column_name, data_type in table_columns.items()
+    }
+
+    df = df.astype({col: dtype for col, dtype in dtype_mapping.items() if col in df.columns})
+
+    dtype_str = {
+        col: dtype for col, dtype in dtype_mapping.items() if dtype is str and col in df.columns
+    }
+    for col in dtype_str:
+        df[col] = df[col].replace({np.nan: ""})
+
+    return df
+
+
+def insert_dataframe_to_table(
+    df: pd.DataFrame,
+    table_name: str,
+    schema_name: str = "suivi_stock",
+    chunk_size: int = 50000,
+    method: str = "copy",
+) -> str:
+    """
+    Insert DataFrame into database table with schema validation.
+
+    Args:
+        df: Input DataFrame
+        table_name: Target table name
+        schema_name: Database schema (default: suivi_stock)
+        chunk_size: Batch insert size (default: 50000)
+        method: "copy" to stream rows with COPY FROM STDIN (default), "multi" for the
+            multi-row INSERT path of `DataFrame.to_sql`
+
+    Returns:
+        str: Operation status
+
+    Raises:
+        ValueError: On schema mismatch
+    """
+    try:
+        df = prepare_dataframe_for_table(df, table_name, schema_name)
+
+        # Batch insert
+        if method == "copy":
+            copy_dataframe_to_table(df, table_name, schema_name, chunk_size)
+        else:
+            df.to_sql(
+                name=table_name,
+                con=connection_manager.get_engine(),
+                schema=schema_name,
+                if_exists="append",
+                index=False,
+                chunksize=chunk_size,
+                method="multi",
+            )
+
+        return f"Insertion de {len(df)} enrégistrements réussie"
+
+    except Exception as e:
+        print(f"Insertion d'insertion échouée: {str(e)}")
+        raise
+
+
+def convert_numpy_types(value: Any) -> Any:
+    """Convert numpy datatypes to native Python types."""
+    if isinstance(value, (np.integer)):
+        return int(value)
+    if isinstance(value, (np.floating)):
+        return float(value)
+    if isinstance(value, (np.bool_)):
+        return bool(value)
+    if isinstance(value, (np.datetime64)) or isinstance(
+        value, pd._libs.tslibs.timestamps.Timestamp
+    ):
+        return pd.Timestamp(value).to_pydatetime()
+    return value
+
+
+def create_staging_table(
+    cursor,
+    df: pd.DataFrame,
+    table_name: str,
+    schema_name: str = "suivi_stock",
+    with_row_number: bool = False,
+) -> str:
+    """
+    Create a temporary staging table holding the DataFrame rows and return its name.
+
+    The staging table has the DataFrame columns with the types of the target table and is
+    dropped at the end of the transaction. Rows are loaded with COPY FROM STDIN. With
+    `with_row_number`, a `_row` column holds the position of each row in the DataFrame.
+    """
+    # Qualifiée par pg_temp : sans table temporaire existante, un nom non qualifié résolu par le
+    # search_path désignerait une éventuelle table permanente du même nom
+    staging_name = f"pg_temp.staging_{table_name}"
+    columns = ", ".join(f'"{col}"' for col in df.columns)
+    if with_row_number:
+        columns = f"NULL::bigint AS _row, {columns}"
+        df = df.assign(_row=np.arange(len(df))).loc[:, ["_row", *df.columns]]
+    cursor.execute(f"DROP TABLE IF EXISTS {staging_name}")
+    cursor.execute(
+        f"CREATE TEMP TABLE {staging_name} ON COMMIT DROP AS "
+        f"SELECT {columns} FROM {schema_name}.{table_name} WITH NO DATA"
+    )
+
+    # Les entiers passés en float par pandas (présence de NaN) doivent être envoyés sans décimale
+    table_columns = dict(get_table_columns(table_name, schema_name))
+    df = df.astype(
+        {
+            col: "Int64"
+            for col in df.columns
+            if table_columns.get(col) in ("integer", "bigint", "smallint")
+            and pd.api.types.is_float_dtype(df[col])
+        }
+    )
+    _copy_dataframe(cursor, df, staging_name)
+
+    return staging_name
+
+
+def apply_staged_changes(
+    table_name: str,
+    key_columns: list[str],
+    schema_name: str = "suivi_stock",
+    new_records: pd.DataFrame | None = None,
+    updated_records: pd.DataFrame | None = None,
+    deleted_records: pd.DataFrame | None = None,
+) -> dict:
+    """
+    Apply inserts, updates and deletes to a table in a single transaction with set-based statements.
+
+    New records are loaded with COPY; updated and deleted records are copied into a temporary
+    staging table and applied with a single `UPDATE ... FROM` and `DELETE ... USING` statement.
+
+    Args:
+        table_name: Target table name
+        key_columns: Columns identifying a row for updates and deletes
+        schema_name: Database schema (default: suivi_stock)
+        new_records: Rows to insert
+        updated_records: Key columns and new values of the rows to update
+        deleted_records: Rows to delete (only key columns are used)
+
+    Returns:
+        dict: Number of inserted, updated and deleted rows
+    """
+    counts = {"inserted": 0, "updated": 0, "deleted": 0}
+
+    target = f"{schema_name}.{table_name}"
+    join_clause = " AND ".join(f't."{key}" = s."{key}"' for key in key_columns)
+
+    try:
+        with connection_manager.cursor() as cursor:
+            if new_records is not None and not new_records.empty:
+                new_records = prepare_dataframe_for_table(new_records, table_name, schema_name)
+                _copy_dataframe(cursor, new_records, target)
+                counts["inserted"] = len(new_records)
+
+            if updated_records is not None and not updated_records.empty:
+                updated_records = updated_records.drop_duplicates(subset=key_columns, keep="last")
+                staging_name = create_staging_table(
+                    cursor, updated_records, table_name, schema_name
+                )
+                set_clause = ", ".join(
+                    f'"{col}" = s."{col}"' for col in updated_records if col not in key_columns
+                )
+                cursor.execute(
+                    f"UPDATE {target} t SET {set_clause} FROM {staging_name} s WHERE {join_clause}"
+                )
+                counts["updated"] = cursor.rowcount
+
+            if deleted_records is not None and not deleted_records.empty:
+                staging_name = create_staging_table(
+                    cursor,
+                    deleted_records[key_columns].drop_duplicates(),
+                    table_name,
+                    schema_name,
+                )
+                cursor.execute(f"DELETE FROM {target} t USING {staging_name} s WHERE {join_clause}")
+                counts["deleted"] = cursor.rowcount
+
+        return counts
+
+    except Exception as e:
+        print(f"Erreur lors de l'application des modifications: {e}")
+        raise
+
+
+def diff_with_table(
+    source_df: pd.DataFrame,
+    table_name: str,
+    key_columns: list[str],
+    schema_name: str = "suivi_stock",
+    compare_columns: list[str] | None = None,
+    round_decimals: int | None = None,
+    date_columns: list[str] | None = None,
+    include_target_columns: bool = False,
+) -> dict:
+    """
+    Compare a DataFrame with a table inside PostgreSQL and return only the differences.
+
+    The source rows are copied into a temporary table and joined to the target table on the
+    key columns; changed rows are detected with `IS DISTINCT FROM` on the compared columns
+    (NULL and empty text are considered equal). Only new and changed rows are transferred back.
+
+    Args:
+        source_df: Source data
+        table_name: Target table name
+        key_columns: Columns identifying a row
+        schema_name: Database schema (default: suivi_stock)
+        compare_columns: Columns to compare (default: all source columns except the keys)
+        round_decimals: Round numeric columns before comparison
+        date_columns: Columns compared on their date part only
+        include_target_columns: Add the target columns absent from the source to the changed rows
+
+    Returns:
+        dict: "new" and "changed" DataFrames (source rows, followed by the target columns with
+        `include_target_columns`), "unchanged" row count
+    """
+    compare_columns = compare_columns or [c for c in source_df.columns if c not in key_columns]
+    staged = source_df[key_columns + compare_columns]
+    table_columns = dict(get_table_columns(table_name, schema_name))
+    target = f"{schema_name}.{table_name}"
+
+    def column_expression(alias: str, col: str) -> str:
+        expression = f'{alias}."{col}"'
+        if date_columns and col in date_columns:
+            return f"{expression}::date"
+        if round_decimals is not None and table_columns.get(col) in NUMERIC_TYPES:
+            return f"round({expression}::numeric, {round_decimals})"
+        if table_columns.get(col) in ("text", "character varying"):
+            # Les valeurs manquantes des colonnes texte sont insérées en chaîne vide
+            return f"COALESCE({expression}, '')"
+        return expression
+
+    join_clause = " AND ".join(f't."{key}" = s."{key}"' for key in key_columns)
+    distinct_clause = (
+        " OR ".join(
+            f"{column_expression('s', col)} IS DISTINCT FROM {column_expression('t', col)}"
+            for col in compare_columns
+        )
+        or "FALSE"
+    )
+
+    target_columns = (
+        [col for col in table_columns if col not in source_df.columns]
+        if include_target_columns
+        else []
+    )
+    select_list = ["s._row", "t.ctid IS NULL AS _is_new"] + [f't."{col}"' for col in target_columns]
+
+    try:
+        with connection_manager.cursor() as cursor:
+            staging_name = create_staging_table(
+                cursor, staged, table_name, schema_name, with_row_number=True
+            )
+            cursor.execute(
+                f"SELECT {', '.join(select_list)} FROM {staging_name} s "
+                f"LEFT JOIN {target} t ON {join_clause} "
+                f"WHERE t.ctid IS NULL OR {distinct_clause} ORDER BY s._row"
+            )
+            diff = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
+            cursor.execute(
+                f"SELECT count(*) FROM {staging_name} s "
+                f"INNER JOIN {target} t ON {join_clause} WHERE NOT ({distinct_clause})"
+            )
+            unchanged = cursor.fetchone()[0]
+
+    except Exception as e:
+        print(f"Erreur lors de la comparaison avec la table {table_name}: {e}")
+        raise
+
+    # psycopg2 renvoie les colonnes numeric en Decimal
+    for col in diff.columns:
+        if table_columns.get(col) == "numeric":
+            diff[col] = pd.to_numeric(diff[col], errors="coerce")
+
+    rows = source_df.iloc[diff.pop("_row").to_numpy(dtype=int)].reset_index(drop=True)
+    is_new = diff.pop("_is_new").astype(bool).to_numpy()
+    diff = pd.concat([rows, diff], axis=1)
+
+    return {
+        "new": diff.loc[is_new].reset_index(drop=True),
+        "changed": diff.loc[~is_new].reset_index(drop=True),
+        "unchanged": unchanged,
+    }
+
+
+def synchronize_product_metadata(
+    source_df: pd.DataFrame, programme: str, schema_name: str = "suivi_stock"
+) -> str:
+    """
+    Synchronize product metadata between source DataFrame and database.
+
+    Args:
+        source_df: Source data containing product updates
+        programme: Programme filter
+        schema_name: Database schema (default: suivi_stock)
+
+    Returns:
+        str: Operation status
+    """
+    try:
+        # Validate input structure
+        required_columns = {
+            "Standard product code",
+            "acronym",
+            "facteur_de_conversion_qat_sage",
+        }
+        if not required_columns.issubset(source_df.columns):
+            missing = required_columns - set(source_df.columns)
+            raise ValueError(f"Missing columns: {missing}")
+
+        # Get current database state
+        db_products = get_table_data(
+            schema_name=schema_name,
+            query=f"SELECT * FROM {schema_name}.dim_produit_stock_track WHERE programme = '{programme}'",
+        )
+        source_df = (
+            source_df[list(required_columns)]
+            .rename(columns={"acronym": "designation_acronym"})
+            .drop_duplicates()
+        )
+        source_df.astype(
+            {col: db_products[col].dtype for col in db_products if col in source_df.columns}
+        )
+
+        for col in source_df.select_dtypes("O").columns:
+            source_df[col] = source_df[col].replace({pd.NaT: None})
+
+        # Merge and update logic
+        merged = source_df.merge(
+            db_products,
+            left_on="Standard product code",
+            right_on="code_produit",
+            how="inner",
+            suffixes=("_new", "_current"),
+        ).round(2)
+
+        mask = False  # masque initial
+        for col in [c for c in source_df.columns if c not in ["Standard product code"]]:
+            mask |= ~merged[f"{col}_new"].eq(merged[f"{col}_current"])
+
+        merged = merged.loc[mask]
+        merged = merged.loc[
+            merged["designation_acronym_new"].notna()
+        ]  # Afin de garantir l'intégrité des données
+
+        if merged.empty:
+            return "Aucune mise à jour des données à effectuer sur la table dim_produit"
+
+        # Prepare updates
+        updates = merged[
+            [
+                "id_dim_produit_stock_track_pk",
+                "designation_acronym_new",
+                "facteur_de_conversion_qat_sage_new",
+            ]
+        ].rename(
+            columns={
+                "designation_acronym_new": "designation_acronym",
+                "facteur_de_conversion_qat_sage_new": "facteur_de_conversion_qat_sage",
+            }
+        )
+
+        # Set-based update through a staging table
+        counts = apply_staged_changes(
+            "dim_produit_stock_track",
+            key_columns=["id_dim_produit_stock_track_pk"],
+            schema_name=schema_name,
+            updated_records=updates,
+        )
+
+        return f"Mise à jour réussie pour {counts['updated']} enregistrements"
+
+    except Exception as e:
+        print(f"Erreur lors de la mise à jour: {str(e)}")
+        raise
+
+
+def synchronize_table_data(
+    source_df: pd.DataFrame,
+    table_name: str,
+    merge_keys: List[str],
+    schema_name: str = "suivi_stock",
+) -> dict:
+    """
+    Full synchronization workflow for table data.
+
+    Only the rows whose keys appear in `source_df` are compared with the table, so the
+    synchronization no longer needs a programme filter.
+
+    Args:
+        source_df: Source data for synchronization
+        table_name: Target table name
+        merge_keys: Columns for merge operations
+        schema_name: Database schema (default: suivi_stock)
+
+    Returns:
+        dict: Number of inserted, updated and deleted rows (see `apply_staged_changes`) and
+        of unchanged source rows
+    """
+    try:
+        # Schema validation
+        table_columns = dict(get_table_columns(table_name, schema_name))
+
+        if not set(source_df.columns).issubset(table_columns):
+            invalid_cols = set(source_df.columns) - set(table_columns)
+            raise ValueError(f"Colonne invalide: {invalid_cols}")
+
+        date_columns = [col for col in source_df.columns if col.startswith("date_")]
+        for col in date_columns:
+            source_df[col] = pd.to_datetime(
+                source_df[col].astype(str).str[:10], format="%Y-%m-%d", errors="coerce"
+            )
+
+        # Server-side change detection (only new and changed rows are transferred)
+        diff = diff_with_table(
+            source_df,
+            table_name,
+            key_columns=merge_keys,
+            schema_name=schema_name,
+            round_decimals=2,
+            date_columns=date_columns,
+        )
+
+        if diff["new"].empty and diff["changed"].empty:
+            print("Aucune mise à jour des données à effectuer")
+            return {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": diff["unchanged"]}
+
+        # Inserts and set-based updates in a single transaction
+        counts = apply_staged_changes(
+            table_name,
+            key_columns=merge_keys,
+            schema_name=schema_name,
+            new_records=diff["new"],
+            updated_records=diff["changed"],
+        )
+        print(
+            f"Insertion de {counts['inserted']} et mise à jour de {counts['updated']} enrégistrements réussie"
+        )
+
+        return {**counts, "unchanged": diff["unchanged"]}
+
+    except Exception as e:
+        print(f"Synchronization error: {str(e)}")
+        raise
+
+
+@cache
+def get_table_info(table_name: str, schema_name: str, engine) -> tuple:
+    """Récupère les métadonnées de la table (mises en cache pour la durée du processus)"""
+    inspector = inspect(engine)
+    columns = inspector.get_columns(table_name, schema=schema_name)
+    pk = inspector.get_pk_constraint(table_name, schema=schema_name)["constrained_columns"]
+    return columns, pk
+
+
+@cache
+def get_reflected_table(table_name: str, schema_name: str, engine) -> Table:
+    """Récupère la table réfléchie par SQLAlchemy (mise en cache pour la durée du processus)"""
+    return Table(table_name, MetaData(schema=schema_name), autoload_with=engine)
+
+
+def iter_record_batches(df: pd.DataFrame, chunk_size: int):
+    """Génère les lignes du DataFrame par lots de dictionnaires, les valeurs manquantes étant en None"""
+    columns = df.columns.tolist()
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start : start + chunk_size]
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        yield [dict(zip(columns, row)) for row in chunk.itertuples(index=False, name=None)]
+
+
+def upsert_dataframe(
+    df: pd.DataFrame,
+    table_name: str,
+    schema_name: str = "suivi_stock",
+    conflict_columns: list = [],
+    engine=None,
+    chunk_size: int = 5000,
+) -> list:
+    """
+    Effectue un upsert en ignorant les colonnes auto-incrémentées
+
+    Les lignes sont envoyées par lots de `chunk_size` avec une requête paramétrée unique
+    (INSERT ... ON CONFLICT DO UPDATE), dans une seule transaction.
+
+    Args:
+        df (pd.DataFrame): Données utilisateur
+        table_name (str): Nom de la table
+        schema (str): Schéma de la table
+        engine (sqlalchemy.engine): Connexion (par défaut l'engine de `connection_manager`)
+        conflict_columns (list): Colonnes pour la détection de conflit
+        chunk_size (int): Nombre de lignes par lot
+
+    Returns:
+        list: Nombre de lignes et durée (en secondes) de chaque lot
+    """
+
+    if df.empty:
+        print("Aucune insertion ou mise à jour effectuée")
+        return []
+
+    engine = engine or connection_manager.get_engine()
+    columns, pk = get_table_info(table_name, schema_name, engine)
+
+    auto_cols = [col["name"] for col in columns if col.get("autoincrement", False)]
+    df = df.drop(columns=[c for c in auto_cols if c in df.columns], errors="ignore")
+
+    table = get_reflected_table(table_name, schema_name, engine)
+
+    conflict_columns = pk if not conflict_columns else conflict_columns
+
+    stmt = insert(table)
+
+    # Generate the update dictionary
+    # Exclude the primary key and conflict columns from the update
+    update_dict = {c.key: c for c in stmt.excluded if c.key not in [*conflict_columns, *pk]}
+
+    # Generate the WHERE clause for the update statement
+    where_clause = None
+    for col in update_dict.keys():
+        condition = table.c[col].is_distinct_from(stmt.excluded[col])
+        where_clause = condition if where_clause is None else where_clause | condition
+
+    update_stmt = stmt.on_conflict_do_update(
+        index_elements=conflict_columns, set_=update_dict, where=where_clause
+    )
+
+    timings = []
+    with engine.begin() as connection:
+        for records in iter_record_batches(df, chunk_size):
+            start = time.perf_counter()
+            connection.execute(update_stmt, records)
+            timings.append({"rows": len(records), "seconds": round(time.perf_counter() - start, 3)})
+
+    print(f"Upsert de {len(df)} enrégistrements réussie en {len(timings)} lot(s)")
+    return timings
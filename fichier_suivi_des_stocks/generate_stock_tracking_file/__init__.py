@@ -1,3 +1,5 @@
+from .streaming_writer import StreamingWorkbookWriter
+from .style_registry import StyleRegistry
 from .update_sheet_annexe_1 import update_sheet_annexe_1
 from .update_sheet_annexe_2 import update_sheet_annexe_2
 from .update_sheet_plan_approv import update_sheet_plan_approv
@@ -19,4 +21,6 @@ __all__ = [
     "update_sheet_prevision",
     "update_sheet_plan_approv",
     "get_current_variable",
+    "StreamingWorkbookWriter",
+    "StyleRegistry",
 ]
@@ -0,0 +1,453 @@
+"""
+Interface efc avec caches pour les formules qui ne sont pas évaluées nativement.
+
+efc reste utilisé pour les formules hors des modèles du fichier de suivi (formules modifiées à la
+main dans l'Annexe 2, rapport feedback) et pour les feuilles mises à jour pendant la génération.
+Avec `OpenpyxlInterface`, chaque SUMIFS, COUNTIFS ou VLOOKUP reparcourt ses plages (souvent des
+colonnes entières) cellule par cellule. `CachedOpenpyxlInterface` :
+
+- charge une seule fois chaque plage d'une colonne lue par ces fonctions dans un tableau NumPy
+  et l'indexe par valeur (code produit, période, ...) : les critères d'égalité et les recherches
+  exactes ne parcourent plus la plage ;
+- mémorise le résultat de chaque formule par (feuille, formule, ligne) ;
+- lorsqu'une cellule est écrite avec `set_cell_value`, n'invalide que les caches des feuilles qui
+  peuvent en dépendre (la feuille écrite et celles dont les formules y font référence, directement
+  ou par une autre feuille) ;
+- compte dans `stats` les résultats servis depuis le cache, les formules calculées et le temps
+  passé à les calculer.
+
+Les cas non indexables (recherche approchée, plages de tailles différentes, plage contenant une
+erreur, ...) sont laissés à efc, qui renvoie alors exactement le même résultat qu'auparavant.
+
+Le module s'appuie sur des attributs internes d'efc (`RPN._array`, caches de l'interface) : la
+version d'excel-formulas-calculator est fixée dans pyproject.toml (0.5.1, celle pour laquelle ces
+attributs ont été vérifiés).
+"""
+
+import re
+import time
+
+import numpy as np
+from efc import Parser  # type: ignore
+from efc.base.errors import BaseEFCException  # type: ignore
+from efc.interfaces.iopenpyxl import OpenpyxlInterface  # type: ignore
+from efc.rpn_builder.parser.functions import operand_to_final_operand  # type: ignore
+from efc.rpn_builder.parser.operands import (  # type: ignore
+    BadReference,
+    CellAddress,
+    CellRangeOperand,
+    EmptyOperand,
+    NotFoundErrorOperand,
+    OperandLikeObject,
+    RPNOperand,
+    SetOperand,
+    SimpleOperand,
+    SingleCellOperand,
+    ValueErrorOperand,
+)
+from efc.rpn_builder.parser.operations import FunctionOperation  # type: ignore
+from efc.rpn_builder.rpn import RPN  # type: ignore
+from openpyxl import Workbook
+from openpyxl.cell import Cell
+from openpyxl.utils.cell import coordinate_to_tuple
+
+from .formula_evaluator import (
+    _aggregate,
+    _criteria_key,
+    _criteria_test,
+    _lookup_key,
+    _matches,
+)
+
+# Fonctions calculées sur les index des plages
+INDEXED_FUNCTIONS = ("SUMIFS", "COUNTIFS", "VLOOKUP")
+
+# Résultat d'un appel que les index ne savent pas traiter (calcul laissé à efc)
+_NOT_INDEXED = object()
+
+# Erreurs d'évaluation d'une formule par efc : ses erreurs Excel et celles de ses fonctions
+_EVALUATION_ERRORS = (BaseEFCException, ArithmeticError, LookupError, TypeError, ValueError)
+
+# Feuille référencée par une formule ('Feuille'!A1 ou Feuille!A1) et noms qu'elle utilise
+_SHEET_REFERENCE_RE = re.compile(r"'((?:[^']|'')+)'!|([\w.]+)!")
+_NAME_RE = re.compile(r"[A-Za-z_\\][\w.]*")
+
+
+class _IndexedOperation(FunctionOperation):
+    """Appel de SUMIFS / COUNTIFS / VLOOKUP calculé sur les index de l'interface si possible."""
+
+    def __init__(self, operation: FunctionOperation, source: "CachedOpenpyxlInterface"):
+        super().__init__(operation.f_name)
+        self.operands_count = operation.operands_count
+        self.source = source
+
+    def eval(self, *args):
+        result = self.source._indexed_call(self.f_name, args)
+        if result is _NOT_INDEXED:
+            self.source.stats["scanned"] += 1
+            return super().eval(*args)
+
+        self.source.stats["indexed"] += 1
+        return result if isinstance(result, OperandLikeObject) else SimpleOperand(result)
+
+
+class _IndexedParser(Parser):
+    """Parser d'efc dont les appels à INDEXED_FUNCTIONS passent par les index de l'interface."""
+
+    def to_rpn(self, line, ws_name, source, is_operand=False):
+        result = super().to_rpn(line, ws_name, source, is_operand)
+        rpn = result.rpn if isinstance(result, RPNOperand) else result
+        if isinstance(rpn, RPN) and isinstance(source, CachedOpenpyxlInterface):
+            for i, token in enumerate(rpn):
+                if type(token) is FunctionOperation and token.f_name in INDEXED_FUNCTIONS:
+                    rpn._array[i] = _IndexedOperation(token, source)
+        return result
+
+
+class _ColumnRange:
+    """Valeurs calculées d'une plage d'une colonne et index construits dessus."""
+
+    def __init__(self, values: np.ndarray, has_formula: bool):
+        self.values = values
+        self.has_formula = has_formula
+        self.indexes = {}
+
+    def positions(self, key: str) -> np.ndarray:
+        """Positions des valeurs égales à `key` au sens d'un critère *IFS."""
+        if "eq" not in self.indexes:
+            groups = {}
+            for i, item in enumerate(self.values):
+                groups.setdefault(_criteria_key(item), []).append(i)
+            self.indexes["eq"] = {k: np.array(v, dtype=np.intp) for k, v in groups.items()}
+        return self.indexes["eq"].get(key, np.empty(0, dtype=np.intp))
+
+    def keys(self) -> np.ndarray:
+        """Clé de critère *IFS de chaque valeur."""
+        if "keys" not in self.indexes:
+            keys = np.empty(len(self.values), dtype=object)
+            keys[:] = [_criteria_key(item) for item in self.values]
+            self.indexes["keys"] = keys
+        return self.indexes["keys"]
+
+    def mask(self, test: tuple) -> np.ndarray:
+        """Valeurs vérifiant un critère de comparaison (<, >, <>, ...)."""
+        if test not in self.indexes:
+            self.indexes[test] = np.fromiter(
+                (_matches(item, test) for item in self.values), dtype=bool, count=len(self.values)
+            )
+        return self.indexes[test]
+
+    def lookup(self, key) -> int | None:
+        """Première position de la valeur recherchée (recherche exacte), sinon None."""
+        if "lookup" not in self.indexes:
+            lookup = {}
+            for i, item in enumerate(self.values):
+                lookup.setdefault(_lookup_key(item), i)
+            self.indexes["lookup"] = lookup
+        return self.indexes["lookup"].get(key)
+
+
+class CachedOpenpyxlInterface(OpenpyxlInterface):
+    """
+    `OpenpyxlInterface` d'efc avec plages indexées et résultats mémorisés.
+
+    S'utilise comme l'interface d'efc (`calc_cell`, `clear_cache`). Les écritures dans le classeur
+    pendant les calculs doivent passer par `set_cell_value` ; après une modification faite
+    autrement, appeler `clear_cache`.
+    """
+
+    def __init__(self, wb: Workbook):
+        super().__init__(wb=wb, use_cache=True, parser=_IndexedParser)
+        self.stats = {"hits": 0, "misses": 0, "seconds": 0.0, "indexed": 0, "scanned": 0}
+        self._results = {}  # feuille -> {(formule, ligne): (valeur, erreur)}
+        self._ranges = {}
+        self._sheet_dimensions = {}
+        self._references = {}  # feuille -> feuilles lues par ses formules (None : toutes)
+        self._stale_sheets = set()  # feuilles dont les caches d'efc restent à invalider
+
+    def clear_cache(self) -> None:
+        """Oublie les résultats, les plages chargées et leurs index (les compteurs sont gardés)."""
+        super().clear_cache()
+        self._results.clear()
+        self._ranges.clear()
+        self._sheet_dimensions.clear()
+        self._references.clear()
+        self._stale_sheets.clear()
+
+    def report_stats(self, label: str) -> None:
+        """Affiche les compteurs de `stats`, en fin de traitement."""
+        stats = self.stats
+        print(
+            f"Formules efc ({label}) : {stats['misses']} calculée(s) en {stats['seconds']:.1f} s, "
+            f"{stats['hits']} servie(s) depuis le cache, {stats['indexed']} appel(s) indexé(s) "
+            f"et {stats['scanned']} parcouru(s) par efc"
+        )
+
+    def calc_cell(self, cell_index: str, ws_name: str):
+        """
+        Calcule la formule d'une cellule (ex: "B5"), ou renvoie sa valeur si elle n'en contient pas.
+
+        Le résultat (ou l'erreur levée) est mémorisé par (feuille, formule, ligne).
+        """
+        row, column = coordinate_to_tuple(cell_index)
+        cell = self.wb[ws_name]._get_cell(row, column)
+        if cell.data_type != "f":
+            return super().calc_cell(cell_index, ws_name)
+
+        if self._stale_sheets:
+            self._drop_efc_caches()
+
+        results = self._results.setdefault(ws_name, {})
+        key = (str(cell.value), row)
+        if key in results:
+            self.stats["hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            start = time.perf_counter()
+            try:
+                results[key] = (super().calc_cell(cell_index, ws_name), None)
+            except _EVALUATION_ERRORS as e:
+                results[key] = (None, e)
+            self.stats["seconds"] += time.perf_counter() - start
+
+        value, error = results[key]
+        if error is not None:
+            raise error
+        return value
+
+    def set_cell_value(self, ws_name: str, row: int, column: int, value) -> Cell:
+        """
+        Écrit une valeur (ou une formule) dans une cellule et invalide les caches qui peuvent en
+        dépendre. Seules les feuilles dépendantes (la feuille écrite et celles qui y font
+        référence) sont concernées : leurs résultats mémorisés, leurs plages contenant la cellule
+        ou des formules et les caches d'efc (ceux-ci au calcul suivant, une seule fois pour une
+        série d'écritures).
+
+        Returns:
+            Cell: La cellule écrite
+        """
+        cell = self.wb[ws_name].cell(row=row, column=column, value=value)
+
+        if ws_name in self._references and cell.data_type == "f":
+            self._add_references(ws_name, str(value))
+        dependents = self._dependent_sheets(ws_name)
+
+        for sheet in dependents:
+            self._results.pop(sheet, None)
+        self._stale_sheets.update(dependents)
+        self._sheet_dimensions.pop(ws_name, None)
+        for key in list(self._ranges):
+            range_ws, range_column, row1, row2, last_row = key
+            column_range = self._ranges[key]
+            in_range = (
+                range_ws == ws_name
+                and (range_column == column or row > last_row)
+                and (row1 is None or row1 <= row <= row2)
+            )
+            if range_ws in dependents and (
+                column_range is None or column_range.has_formula or in_range
+            ):
+                del self._ranges[key]
+        return cell
+
+    # ---- Dépendances entre feuilles ----
+
+    def _dependent_sheets(self, ws_name: str) -> set:
+        """Feuilles dont les formules peuvent lire `ws_name`, directement ou par une autre feuille."""
+        dependents, queue = {ws_name}, [ws_name]
+        while queue:
+            target = queue.pop().lower()
+            for sheet in self.wb.sheetnames:
+                references = self._sheet_references(sheet)
+                if sheet not in dependents and (references is None or target in references):
+                    dependents.add(sheet)
+                    queue.append(sheet)
+        return dependents
+
+    def _sheet_references(self, ws_name: str) -> set | None:
+        """Feuilles (en minuscules) lues par les formules de `ws_name`, analysées une seule fois."""
+        if ws_name not in self._references:
+            self._references[ws_name] = set()
+            for row in self.wb[ws_name].iter_rows():
+                for cell in row:
+                    if cell.data_type == "f":
+                        self._add_references(ws_name, str(cell.value))
+        return self._references[ws_name]
+
+    def _add_references(self, ws_name: str, formula: str) -> None:
+        if self._references[ws_name] is None:
+            return
+        names = set(self.wb.defined_names) | set(self.wb[ws_name].defined_names)
+        if "INDIRECT(" in formula.upper() or names.intersection(_NAME_RE.findall(formula)):
+            # Références calculées ou plages nommées : la formule peut lire toutes les feuilles
+            self._references[ws_name] = None
+            return
+        for quoted, plain in _SHEET_REFERENCE_RE.findall(formula):
+            self._references[ws_name].add((quoted.replace("''", "'") or plain).lower())
+
+    def _drop_efc_caches(self) -> None:
+        """Retire des caches d'efc les cellules et plages des feuilles invalidées."""
+        stale = self._stale_sheets
+        for cache in self._caches._caches.values():
+            cache._items = {key: item for key, item in cache._items.items() if key[0] not in stale}
+        self._stale_sheets = set()
+
+    # ---- Plages indexées ----
+
+    def _column_range(self, ws_name: str, column: int, row1, row2) -> _ColumnRange | None:
+        """
+        Valeurs calculées (par efc) de la plage `column`[`row1`:`row2`], chargées une seule fois ;
+        None si une cellule de la plage ne peut pas être calculée ou contient une erreur.
+        """
+        ws = self.wb[ws_name]
+        min_row, max_row, min_column, max_column = self._dimensions(ws_name)
+        first_row = min_row if row1 is None else row1
+        last_row = max_row if row2 is None else row2
+        key = (ws_name, column, row1, row2, last_row)
+        if key in self._ranges:
+            return self._ranges[key]
+
+        values, has_formula = [], False
+        try:
+            for row in range(first_row, last_row + 1):
+                if not (min_row <= row <= max_row and min_column <= column <= max_column):
+                    values.append(None)
+                    continue
+                has_formula = has_formula or ws._get_cell(row, column).data_type == "f"
+                value, _ = self._cell_to_value(CellAddress(ws_name, row, column, False, False))
+                if isinstance(value, Exception):
+                    raise value
+                values.append(value)
+        except _EVALUATION_ERRORS:
+            column_range = None
+        else:
+            array = np.empty(len(values), dtype=object)
+            array[:] = values
+            column_range = _ColumnRange(array, has_formula)
+
+        self._ranges[key] = column_range
+        return column_range
+
+    def _dimensions(self, ws_name: str) -> tuple:
+        """
+        (min_row, max_row, min_column, max_column) de la feuille, conservés : openpyxl les
+        recalcule à chaque accès en parcourant toutes les cellules, et efc les lit pour chaque
+        plage de chaque formule.
+        """
+        if ws_name not in self._sheet_dimensions:
+            ws = self.wb[ws_name]
+            self._sheet_dimensions[ws_name] = (ws.min_row, ws.max_row, ws.min_column, ws.max_column)
+        return self._sheet_dimensions[ws_name]
+
+    def _min_row(self, ws_name):
+        return self._dimensions(ws_name)[0]
+
+    def _max_row(self, ws_name):
+        return self._dimensions(ws_name)[1]
+
+    def _min_column(self, ws_name):
+        return self._dimensions(ws_name)[2]
+
+    def _max_column(self, ws_name):
+        return self._dimensions(ws_name)[3]
+
+    @staticmethod
+    def _is_column_range(op) -> bool:
+        return (
+            isinstance(op, CellRangeOperand)
+            and op.column1 is not None
+            and op.column1 == op.column2
+            and (op.row1 is None) == (op.row2 is None)
+        )
+
+    def _indexed_call(self, name: str, args: tuple):
+        try:
+            args = [operand_to_final_operand(arg) for arg in args]
+            if name == "VLOOKUP":
+                return self._vlookup(*args)
+            return self._ifs(name, args)
+        except NotFoundErrorOperand:
+            raise
+        except _EVALUATION_ERRORS:
+            return _NOT_INDEXED
+
+    def _ifs(self, name: str, args: list):
+        target, pairs = (args[0], args[1:]) if name == "SUMIFS" else (None, args)
+        if not pairs or len(pairs) % 2:
+            return _NOT_INDEXED
+
+        ranges = pairs[::2] if target is None else [target, *pairs[::2]]
+        if not all(self._is_column_range(op) for op in ranges):
+            return _NOT_INDEXED
+        if len({(op.ws_name, op.row1, op.row2) for op in ranges}) != 1:
+            return _NOT_INDEXED
+
+        tests = []
+        for op, criteria in zip(pairs[::2], pairs[1::2]):
+            if isinstance(criteria, (CellRangeOperand, SetOperand)):
+                return _NOT_INDEXED
+            value = criteria.value
+            if isinstance(value, Exception):
+                return _NOT_INDEXED
+            column_range = self._column_range(op.ws_name, op.column1, op.row1, op.row2)
+            if column_range is None:
+                return _NOT_INDEXED
+            tests.append((column_range, _criteria_test(value)))
+
+        # Les égalités réduisent d'abord les lignes candidates grâce à l'index par valeur
+        positions = None
+        for column_range, test in sorted(tests, key=lambda item: item[1][0] != "eq"):
+            if test[0] == "eq":
+                if positions is None:
+                    positions = column_range.positions(test[1])
+                else:
+                    positions = positions[column_range.keys()[positions] == test[1]]
+            else:
+                mask = column_range.mask(test)
+                positions = (
+                    np.flatnonzero(mask) if positions is None else positions[mask[positions]]
+                )
+            if not len(positions):
+                break
+
+        if target is None:
+            return len(positions)
+
+        target_range = self._column_range(target.ws_name, target.column1, target.row1, target.row2)
+        if target_range is None:
+            return _NOT_INDEXED
+        return _aggregate("sum", target_range.values, positions)
+
+    def _vlookup(self, value, table, column, flag=None):
+        # Seule la recherche exacte (4e argument à FAUX / 0) est indexée
+        if flag is None or isinstance(flag, EmptyOperand) or flag.digit:
+            return _NOT_INDEXED
+        if not isinstance(table, CellRangeOperand) or table.column1 is None:
+            return _NOT_INDEXED
+        if isinstance(value, (CellRangeOperand, SetOperand)):
+            return _NOT_INDEXED
+
+        lookup_value = value.value
+        if isinstance(lookup_value, Exception):
+            return _NOT_INDEXED
+        first_column = self._column_range(table.ws_name, table.column1, table.row1, table.row2)
+        if first_column is None:
+            return _NOT_INDEXED
+
+        column_index = int(column.digit)
+        if column_index < 1:
+            return ValueErrorOperand()
+        if column_index > (table.column2 or table.column1) - table.column1 + 1:
+            return BadReference()
+
+        position = first_column.lookup(_lookup_key(lookup_value))
+        if position is None:
+            raise NotFoundErrorOperand()
+        # Une plage de colonnes entières (A:B) commence à la première ligne de la feuille
+        first_row = self._min_row(table.ws_name) if table.row1 is None else table.row1
+        return SingleCellOperand(
+            row=first_row + position,
+            column=table.column1 + column_index - 1,
+            ws_name=table.ws_name,
+            source=self,
+        )
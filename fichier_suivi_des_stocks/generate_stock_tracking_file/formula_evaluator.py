@@ -0,0 +1,922 @@
+"""
+Évaluation native des formules des fichiers de suivi de stock.
+
+Les formules des feuilles sont pour l'essentiel les modèles générés par le projet
+(DICO_FORMULES_ANNEXE_2, DICO_FORMULES_PREVISION, formules de l'Annexe 1, du Plan d'appro, du
+Stock detaille et des Receptions) : dans une colonne, elles ne diffèrent que par le numéro de
+ligne. `FormulaEvaluator` regroupe les cellules d'une colonne par formule modèle (références
+relatives ramenées à un décalage de ligne), analyse chaque modèle une seule fois puis l'évalue
+pour toutes les lignes du groupe en une passe. Les feuilles référencées sont lues une seule
+fois, et SUMIFS, COUNTIFS, MINIFS, MAXIFS, VLOOKUP et MATCH s'appuient sur des index construits
+une fois par plage au lieu de reparcourir la colonne entière pour chaque cellule.
+
+Les formules non reconnues (fonction hors du sous-ensemble pris en charge, syntaxe inattendue,
+référence circulaire) sont évaluées cellule par cellule par efc (`CachedOpenpyxlInterface`).
+Les valeurs renvoyées suivent les conventions d'efc (dates converties en numéro de série texte,
+entiers conservés, comparaisons sensibles à la casse) afin que les données extraites restent
+identiques.
+"""
+
+import math
+import operator
+import re
+from datetime import date, datetime
+from functools import cache
+
+from efc import settings
+from efc.base.errors import BaseEFCException  # type: ignore
+from efc.utils import IS_FLOAT_REGEXP, datetime_to_openxml, digit, parse_date  # type: ignore
+from openpyxl import Workbook
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.cell import coordinate_to_tuple
+
+from .utils import has_formula
+
+
+class FormulaError(Exception):
+    """Valeur d'erreur Excel (#VALUE!, #DIV/0!, #N/A, #REF!) produite par une formule."""
+
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.code = code
+
+
+class _Unsupported(Exception):
+    """Formule hors du sous-ensemble pris en charge : elle est évaluée par efc."""
+
+
+# ---- Analyse des formules ----
+
+_TOKEN_RE = re.compile(
+    r"""\s*(?:
+    (?P<string>"(?:[^"]|"")*")
+    |(?P<ref>(?:(?P<sheet>'(?:[^']|'')+'|[^\W\d][\w.]*)!)?
+        (?:(?P<a1>\$?[A-Z]{1,3}\$?\d+)(?::(?P<a2>\$?[A-Z]{1,3}\$?\d+))?
+        |(?P<k1>\$?[A-Z]{1,3}):(?P<k2>\$?[A-Z]{1,3})))(?![\w(!])
+    |(?P<number>\d+(?:\.\d+)?)
+    |(?P<func>[A-Za-z_][\w.]*)\(
+    |(?P<name>[A-Za-z_][\w.]*)
+    |(?P<op><>|<=|>=|[-+*/^&=<>(),%])
+    )""",
+    re.VERBOSE,
+)
+_CELL_RE = re.compile(r"(\$?)([A-Z]{1,3})(\$?)(\d+)")
+
+# Fonctions évaluées nativement et nombre d'arguments admis
+_FUNCTIONS = {
+    "IF": (2, 3),
+    "IFERROR": (2, 2),
+    "AND": (1, None),
+    "OR": (1, None),
+    "SUM": (1, None),
+    "MAX": (1, None),
+    "MIN": (1, None),
+    "ROUNDUP": (2, 2),
+    "TODAY": (0, 0),
+    "YEAR": (1, 1),
+    "MONTH": (1, 1),
+    "SUMIFS": (3, None),
+    "COUNTIFS": (2, None),
+    "MINIFS": (3, None),
+    "MAXIFS": (3, None),
+    "VLOOKUP": (4, 4),
+    "MATCH": (3, 3),
+    "INDEX": (2, 3),
+}
+# Préfixes ajoutés par Excel aux fonctions récentes (ex: "_xlfn.MINIFS")
+_FUNCTION_PREFIXES = ("_xlfn.", "_xlws.")
+
+_COMPARISONS = {
+    "=": operator.eq,
+    "<>": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+_ARITHMETIC = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "^": operator.pow,
+}
+
+
+def _row_spec(dollar: str, row: str, current_row: int) -> tuple:
+    """Ligne absolue ("a", ligne) ou relative ("r", décalage par rapport à la ligne courante)."""
+    return ("a", int(row)) if dollar else ("r", int(row) - current_row)
+
+
+def _tokenize(formula: str, current_row: int) -> tuple:
+    """
+    Découpe une formule en jetons. Les lignes relatives des références sont remplacées par leur
+    décalage : deux cellules d'une colonne remplies avec le même modèle ont les mêmes jetons.
+    """
+    tokens = []
+    text = formula[1:]
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            if text[pos:].strip():
+                raise _Unsupported(formula)
+            break
+        pos = match.end()
+
+        if match.group("string") is not None:
+            tokens.append(("str", match.group("string")[1:-1].replace('""', '"')))
+        elif match.group("ref") is not None:
+            sheet = match.group("sheet")
+            if sheet is not None and sheet.startswith("'"):
+                sheet = sheet[1:-1].replace("''", "'")
+            if match.group("a1") is not None:
+                _, c1, r1_abs, r1 = _CELL_RE.match(match.group("a1")).groups()
+                spec1 = _row_spec(r1_abs, r1, current_row)
+                c2, spec2 = c1, spec1
+                if match.group("a2") is not None:
+                    _, c2, r2_abs, r2 = _CELL_RE.match(match.group("a2")).groups()
+                    spec2 = _row_spec(r2_abs, r2, current_row)
+            else:
+                c1, c2 = match.group("k1").lstrip("$"), match.group("k2").lstrip("$")
+                spec1 = spec2 = None
+            cells = match.group("a2") is not None or spec1 is None
+            tokens.append(
+                (
+                    "range" if cells else "ref",
+                    sheet,
+                    column_index_from_string(c1),
+                    spec1,
+                    column_index_from_string(c2),
+                    spec2,
+                )
+            )
+        elif match.group("number") is not None:
+            number = match.group("number")
+            tokens.append(("num", float(number) if "." in number else int(number)))
+        elif match.group("func") is not None:
+            name = match.group("func").upper()
+            for prefix in _FUNCTION_PREFIXES:
+                name = name.removeprefix(prefix.upper())
+            tokens.append(("func", name))
+        elif match.group("name") is not None:
+            name = match.group("name").upper()
+            if name not in ("TRUE", "FALSE"):
+                # Plage nommée
+                raise _Unsupported(formula)
+            tokens.append(("bool", name == "TRUE"))
+        else:
+            tokens.append(("op", match.group("op")))
+    return tuple(tokens)
+
+
+class _Parser:
+    """Analyseur descendant récursif (priorités : comparaison < & < +- < */ < ^ < signe < %)."""
+
+    def __init__(self, tokens: tuple):
+        self.tokens = tokens
+        self.pos = 0
+
+    def parse(self):
+        node = self._comparison()
+        if self.pos != len(self.tokens):
+            raise _Unsupported(self.tokens)
+        return node
+
+    def _peek_op(self, *ops):
+        if self.pos < len(self.tokens):
+            kind, value = self.tokens[self.pos][:2]
+            if kind == "op" and value in ops:
+                self.pos += 1
+                return value
+        return None
+
+    def _binary(self, ops, operand):
+        node = operand()
+        while (op := self._peek_op(*ops)) is not None:
+            node = ("bin", op, node, operand())
+        return node
+
+    def _comparison(self):
+        return self._binary(tuple(_COMPARISONS), self._concat)
+
+    def _concat(self):
+        return self._binary(("&",), self._additive)
+
+    def _additive(self):
+        return self._binary(("+", "-"), self._term)
+
+    def _term(self):
+        return self._binary(("*", "/"), self._power)
+
+    def _power(self):
+        return self._binary(("^",), self._unary)
+
+    def _unary(self):
+        op = self._peek_op("-", "+")
+        if op == "-":
+            return ("neg", self._unary())
+        if op == "+":
+            return self._unary()
+        node = self._primary()
+        while self._peek_op("%") is not None:
+            node = ("bin", "/", node, ("num", 100))
+        return node
+
+    def _primary(self):
+        if self.pos >= len(self.tokens):
+            raise _Unsupported(self.tokens)
+        token = self.tokens[self.pos]
+        self.pos += 1
+        kind = token[0]
+        if kind in ("num", "str", "bool", "ref", "range"):
+            return token
+        if kind == "op" and token[1] == "(":
+            node = self._comparison()
+            if self._peek_op(")") is None:
+                raise _Unsupported(self.tokens)
+            return node
+        if kind == "func":
+            return self._call(token[1])
+        raise _Unsupported(self.tokens)
+
+    def _call(self, name):
+        if name not in _FUNCTIONS:
+            raise _Unsupported(name)
+        args = []
+        if self._peek_op(")") is None:
+            while True:
+                args.append(self._comparison())
+                if self._peek_op(")") is not None:
+                    break
+                if self._peek_op(",") is None:
+                    raise _Unsupported(self.tokens)
+        min_args, max_args = _FUNCTIONS[name]
+        if len(args) < min_args or (max_args is not None and len(args) > max_args):
+            raise _Unsupported(name)
+        if name in ("SUMIFS", "MINIFS", "MAXIFS") and len(args) % 2 == 0:
+            raise _Unsupported(name)
+        if name == "COUNTIFS" and len(args) % 2:
+            raise _Unsupported(name)
+        # Seules les recherches exactes sont prises en charge
+        if name == "VLOOKUP" and args[3] not in (("bool", False), ("num", 0)):
+            raise _Unsupported(name)
+        if name == "MATCH" and args[2] != ("num", 0):
+            raise _Unsupported(name)
+        return ("call", name, args)
+
+
+@cache
+def _parse_template(tokens: tuple):
+    """Arbre de la formule modèle, ou None si elle n'est pas prise en charge."""
+    try:
+        return _Parser(tokens).parse()
+    except _Unsupported:
+        return None
+
+
+# ---- Valeurs (conventions d'efc) ----
+
+
+def _is_error(value) -> bool:
+    return isinstance(value, Exception)
+
+
+def _serialize(value):
+    """Valeur d'une cellule vue par efc : une date devient son numéro de série (texte)."""
+    if isinstance(value, datetime):
+        return datetime_to_openxml(value)
+    if isinstance(value, date):
+        return datetime_to_openxml(datetime(value.year, value.month, value.day))
+    return value
+
+
+def _text(value) -> str:
+    """Conversion en texte (concaténation, critères)."""
+    if isinstance(value, bool):
+        return str(value).upper()
+    if isinstance(value, float):
+        return (
+            str(int(value)) if value % 1 == 0 else str(value).replace(".", settings.FLOAT_DELIMITER)
+        )
+    return "" if value is None else str(value)
+
+
+def _number(value):
+    """Nombre représenté par une valeur (nombre ou texte numérique), sinon None."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str) and IS_FLOAT_REGEXP.match(value):
+        return float(value)
+    return None
+
+
+def _compare_key(value, other):
+    """
+    Clé de comparaison : nombres < textes < booléens ; une cellule vide vaut "" face à un texte,
+    0 sinon.
+    """
+    if value is None:
+        return (1, "") if isinstance(other, str) else (0, 0)
+    if isinstance(value, bool):
+        return (2, value)
+    if isinstance(value, str):
+        return (1, value)
+    return (0, value)
+
+
+def _lookup_key(value):
+    """Clé d'une valeur dans un index de recherche exacte (VLOOKUP, MATCH)."""
+    return _compare_key(value, "")
+
+
+def _criteria_key(value) -> str:
+    """Clé d'égalité d'un critère *IFS : 1234, 1234.0 et "1234" sont équivalents, vide vaut ""."""
+    return _text(value)
+
+
+_CRITERIA_RE = re.compile(r"^(<=|>=|<>|>|<|=)(.+)$", re.DOTALL)
+
+
+def _criteria_test(criteria) -> tuple:
+    """Critère *IFS : ("eq", clé) pour une égalité, ("cmp", opérateur, opérande) sinon."""
+    if isinstance(criteria, str):
+        match = _CRITERIA_RE.match(criteria)
+        if match:
+            op, operand = match.groups()
+            if op == "=":
+                return ("eq", operand)
+            return ("cmp", op, operand)
+    return ("eq", _criteria_key(criteria))
+
+
+def _matches(item, test: tuple) -> bool:
+    if _is_error(item):
+        return False
+    if test[0] == "eq":
+        return _criteria_key(item) == test[1]
+
+    _, op, operand = test
+    operand_number = _number(operand)
+    if op == "<>":
+        item_number = _number(item)
+        if operand_number is not None and item_number is not None:
+            return item_number != operand_number
+        return _criteria_key(item) != operand
+    if operand_number is not None:
+        item_number = _number(item)
+        return item_number is not None and _COMPARISONS[op](item_number, operand_number)
+    return isinstance(item, str) and _COMPARISONS[op](item, operand)
+
+
+def _digits(items):
+    """Nombres d'une liste de valeurs (cellules vides et textes ignorés), ou l'erreur rencontrée."""
+    digits = []
+    for item in items:
+        if _is_error(item):
+            return item
+        if item is None or item == "":
+            continue
+        try:
+            digits.append(digit(item))
+        except (TypeError, ValueError):
+            continue
+    return digits
+
+
+def _aggregate(how: str, items, indexes):
+    if how == "count":
+        return len(indexes)
+    digits = _digits(items[i] for i in indexes)
+    if _is_error(digits):
+        return digits
+    if how == "sum":
+        return sum(d or 0 for d in digits)
+    if how == "min":
+        return min(digits) if digits else 0
+    return max(digits) if digits else 0
+
+
+def _roundup(value, num_digits):
+    factor = 10 ** int(num_digits)
+    result = math.copysign(math.ceil(round(abs(value) * factor, 9)) / factor, value)
+    return int(result) if num_digits <= 0 else result
+
+
+def _to_date(value) -> datetime:
+    return parse_date(digit(value))
+
+
+def _at(values: list, row: int):
+    if row < 1:
+        return FormulaError("#REF!")
+    return values[row] if row < len(values) else None
+
+
+# ---- Évaluateur ----
+
+
+class FormulaEvaluator:
+    """
+    Remplace `efc.interfaces.iopenpyxl.OpenpyxlInterface` pour le calcul des formules d'un
+    classeur openpyxl.
+
+    Même interface (`calc_cell`, `clear_cache`) : au premier calcul d'une cellule, toute sa
+    colonne est évaluée puis conservée en cache. Comme avec efc, `clear_cache` doit être appelé
+    après une modification du classeur pour que les calculs suivants en tiennent compte.
+    """
+
+    def __init__(self, wb: Workbook):
+        self.wb = wb
+        self._efc = None
+        self.clear_cache()
+
+    def clear_cache(self) -> None:
+        """Oublie les feuilles lues, les valeurs calculées et les index des plages."""
+        self._sheets = {}
+        self._values = {}
+        self._pending = set()
+        self._ranges = {}
+        self._indexes = {}
+        if self._efc is not None:
+            self._efc.clear_cache()
+
+    def report_stats(self, label: str) -> None:
+        """Affiche les compteurs des formules confiées à efc, en fin de traitement."""
+        if self._efc is None:
+            print(f"Formules efc ({label}) : aucune, toutes les formules ont été évaluées nativement")
+        else:
+            self._efc.report_stats(label)
+
+    def calc_cell(self, cell_index: str, ws_name: str):
+        """
+        Calcule la formule d'une cellule (ex: "B5"), ou renvoie sa valeur si elle n'en contient pas.
+
+        Raises:
+            Exception: L'erreur Excel produite par la formule (`FormulaError`, ou l'erreur
+                d'efc pour les formules qui lui sont confiées)
+        """
+        row, column = coordinate_to_tuple(cell_index)
+        cell = self.wb[ws_name].cell(row=row, column=column)
+        if not has_formula(cell):
+            return cell.value
+
+        value = _at(self._column(ws_name, column), row)
+        if _is_error(value):
+            raise value
+        return value
+
+    # ---- Lecture des feuilles ----
+
+    def _sheet(self, ws_name: str) -> list:
+        """Colonnes de la feuille (index 1 = ligne 1), lues une seule fois."""
+        if ws_name not in self._sheets:
+            if ws_name not in self.wb.sheetnames:
+                raise FormulaError("#REF!")
+            rows = self.wb[ws_name].iter_rows(values_only=True)
+            self._sheets[ws_name] = [[None, *map(_serialize, values)] for values in zip(*rows)]
+        return self._sheets[ws_name]
+
+    def _max_row(self, ws_name: str) -> int:
+        columns = self._sheet(ws_name)
+        return len(columns[0]) - 1 if columns else 0
+
+    def _column(self, ws_name: str, column: int) -> list:
+        """Valeurs calculées d'une colonne entière."""
+        key = (ws_name, column)
+        if key in self._values:
+            return self._values[key]
+        if key in self._pending:
+            raise _Unsupported("Référence circulaire")
+
+        columns = self._sheet(ws_name)
+        if column > len(columns):
+            values = [None] * (self._max_row(ws_name) + 1)
+        else:
+            values = columns[column - 1]
+
+        groups = {}
+        for row, value in enumerate(values):
+            if isinstance(value, str) and value.startswith("="):
+                try:
+                    template = _tokenize(value, row)
+                except _Unsupported:
+                    template = None
+                groups.setdefault(template, []).append(row)
+
+        if groups:
+            values = list(values)
+            self._pending.add(key)
+            try:
+                for template, rows in groups.items():
+                    for row, value in zip(
+                        rows, self._evaluate_group(ws_name, column, template, rows)
+                    ):
+                        values[row] = value
+            finally:
+                self._pending.discard(key)
+
+        self._values[key] = values
+        return values
+
+    def _cell(self, ws_name: str, column: int, row: int):
+        """
+        Valeur d'une cellule fixe ; une cellule sans formule de la colonne en cours de calcul
+        (ex. l'en-tête $AK$1 dans la colonne AK) est lue telle quelle.
+        """
+        if (ws_name, column) in self._pending:
+            columns = self._sheet(ws_name)
+            value = _at(columns[column - 1], row) if column <= len(columns) else None
+            if not (isinstance(value, str) and value.startswith("=")):
+                return value
+        return _at(self._column(ws_name, column), row)
+
+    def _evaluate_group(self, ws_name: str, column: int, template, rows: list) -> list:
+        node = _parse_template(template) if template is not None else None
+        if node is not None:
+            try:
+                return self._eval(node, ws_name, rows)
+            except _Unsupported:
+                pass
+        return [self._efc_value(ws_name, row, column) for row in rows]
+
+    def _efc_value(self, ws_name: str, row: int, column: int):
+        if self._efc is None:
+            from .cached_interface import CachedOpenpyxlInterface
+
+            self._efc = CachedOpenpyxlInterface(self.wb)
+        try:
+            return self._efc.calc_cell(f"{get_column_letter(column)}{row}", ws_name)
+        except BaseEFCException as e:
+            # Convention d'efc : une erreur de formule est une valeur de la cellule
+            return e
+
+    # ---- Plages ----
+
+    def _range_key(self, node, ws_name: str, row: int | None = None) -> tuple:
+        """
+        (feuille, 1re colonne, dernière colonne, 1re ligne, dernière ligne) d'une plage ; les
+        lignes valent None pour des colonnes entières.
+        """
+        _, sheet, c1, spec1, c2, spec2 = node
+        rows = []
+        for spec in (spec1, spec2):
+            if spec is None:
+                rows.append(None)
+            elif spec[0] == "a":
+                rows.append(spec[1])
+            elif row is None:
+                raise _Unsupported("Plage relative")
+            else:
+                rows.append(row + spec[1])
+        return (sheet or ws_name, min(c1, c2), max(c1, c2), *rows)
+
+    @staticmethod
+    def _is_relative(node) -> bool:
+        return any(spec is not None and spec[0] == "r" for spec in (node[3], node[5]))
+
+    def _range_items(self, key: tuple) -> list:
+        """Valeurs d'une plage, ligne par ligne."""
+        if key in self._ranges:
+            return self._ranges[key]
+
+        ws_name, c1, c2, r1, r2 = key
+        if r1 is None:
+            r1, r2 = 1, self._max_row(ws_name)
+        elif r1 > r2:
+            r1, r2 = r2, r1
+        if r1 < 1:
+            raise FormulaError("#REF!")
+
+        columns = [self._column(ws_name, c) for c in range(c1, c2 + 1)]
+        if len(columns) == 1:
+            items = columns[0][r1 : r2 + 1]
+            items += [None] * (r2 - r1 + 1 - len(items))
+        else:
+            items = [_at(values, r) for r in range(r1, r2 + 1) for values in columns]
+
+        self._ranges[key] = items
+        return items
+
+    def _index(self, kind: str, key: tuple) -> dict | list:
+        """
+        Index d'une plage, construit une seule fois : clé -> lignes ("eq"), clé de chaque ligne
+        ("keys") ou clé -> première ligne ("lookup").
+        """
+        index_key = (kind, key)
+        if index_key not in self._indexes:
+            items = self._range_items(key)
+            if kind == "eq":
+                index = {}
+                for i, item in enumerate(items):
+                    if not _is_error(item):
+                        index.setdefault(_criteria_key(item), []).append(i)
+            elif kind == "keys":
+                index = [None if _is_error(item) else _criteria_key(item) for item in items]
+            else:
+                index = {}
+                for i, item in enumerate(items):
+                    if not _is_error(item):
+                        index.setdefault(_lookup_key(item), i)
+            self._indexes[index_key] = index
+        return self._indexes[index_key]
+
+    def _mask(self, key: tuple, test: tuple) -> list:
+        mask_key = ("mask", key, test)
+        if mask_key not in self._indexes:
+            self._indexes[mask_key] = [_matches(item, test) for item in self._range_items(key)]
+        return self._indexes[mask_key]
+
+    # ---- Évaluation vectorisée ----
+
+    def _eval(self, node, ws_name: str, rows: list) -> list:
+        """Valeur de l'expression pour chacune des lignes `rows`."""
+        try:
+            return self._eval_node(node, ws_name, rows)
+        except FormulaError as e:
+            return [e] * len(rows)
+
+    def _eval_node(self, node, ws_name: str, rows: list) -> list:
+        kind = node[0]
+        n = len(rows)
+        if kind in ("num", "str", "bool"):
+            return [node[1]] * n
+        if kind == "ref":
+            _, sheet, column, spec = node[:4]
+            if spec[0] == "a":
+                return [self._cell(sheet or ws_name, column, spec[1])] * n
+            values = self._column(sheet or ws_name, column)
+            return [_at(values, row + spec[1]) for row in rows]
+        if kind == "range":
+            # Plage utilisée comme valeur (intersection implicite)
+            raise _Unsupported("Plage")
+        if kind == "neg":
+            return [
+                self._arithmetic(operator.sub, 0, v) for v in self._eval(node[1], ws_name, rows)
+            ]
+        if kind == "bin":
+            _, op, left, right = node
+            lefts, rights = self._eval(left, ws_name, rows), self._eval(right, ws_name, rows)
+            if op in _ARITHMETIC:
+                func = _ARITHMETIC[op]
+                return [self._arithmetic(func, a, b) for a, b in zip(lefts, rights)]
+            if op == "&":
+                return [self._concat(a, b) for a, b in zip(lefts, rights)]
+            func = _COMPARISONS[op]
+            return [self._compare(func, a, b) for a, b in zip(lefts, rights)]
+        return self._call(node[1], node[2], ws_name, rows)
+
+    @staticmethod
+    def _arithmetic(func, a, b):
+        if _is_error(a):
+            return a
+        if _is_error(b):
+            return b
+        try:
+            return func(digit(a), digit(b))
+        except ZeroDivisionError:
+            return FormulaError("#DIV/0!")
+        except (TypeError, ValueError, OverflowError):
+            return FormulaError("#VALUE!")
+
+    @staticmethod
+    def _concat(a, b):
+        if _is_error(a):
+            return a
+        if _is_error(b):
+            return b
+        return _text(a) + _text(b)
+
+    @staticmethod
+    def _compare(func, a, b):
+        if _is_error(a):
+            return a
+        if _is_error(b):
+            return b
+        try:
+            return func(_compare_key(a, b), _compare_key(b, a))
+        except TypeError:
+            return FormulaError("#VALUE!")
+
+    def _items(self, node, ws_name: str, rows: list) -> list:
+        """Pour chaque ligne, la liste des valeurs d'un argument (plage ou expression)."""
+        if node[0] != "range":
+            return [[v] for v in self._eval(node, ws_name, rows)]
+        if not self._is_relative(node):
+            return [self._range_items(self._range_key(node, ws_name))] * len(rows)
+        return [self._range_items(self._range_key(node, ws_name, row)) for row in rows]
+
+    def _call(self, name: str, args: list, ws_name: str, rows: list) -> list:
+        n = len(rows)
+
+        if name == "IF":
+            conditions = self._eval(args[0], ws_name, rows)
+            if_true = self._eval(args[1], ws_name, rows)
+            if_false = self._eval(args[2], ws_name, rows) if len(args) == 3 else [False] * n
+            return [
+                c if _is_error(c) else (t if c else f)
+                for c, t, f in zip(conditions, if_true, if_false)
+            ]
+
+        if name == "IFERROR":
+            values = self._eval(args[0], ws_name, rows)
+            fallbacks = self._eval(args[1], ws_name, rows)
+            return [f if _is_error(v) else v for v, f in zip(values, fallbacks)]
+
+        if name in ("AND", "OR"):
+            per_arg = [self._items(arg, ws_name, rows) for arg in args]
+            results = []
+            for i in range(n):
+                values = [v for items in per_arg for v in items[i]]
+                error = next((v for v in values if _is_error(v)), None)
+                if error is not None:
+                    results.append(error)
+                    continue
+                logical = [v for v in values if v is not None and not isinstance(v, str)]
+                results.append(all(logical) if name == "AND" else any(logical))
+            return results
+
+        if name in ("SUM", "MAX", "MIN"):
+            per_arg = [self._items(arg, ws_name, rows) for arg in args]
+            results = []
+            for i in range(n):
+                digits = _digits(v for items in per_arg for v in items[i])
+                if _is_error(digits):
+                    results.append(digits)
+                elif name == "SUM":
+                    results.append(sum(d or 0 for d in digits))
+                else:
+                    func = max if name == "MAX" else min
+                    results.append(func([d or 0 for d in digits] or [0]))
+            return results
+
+        if name == "ROUNDUP":
+            values = self._eval(args[0], ws_name, rows)
+            num_digits = self._eval(args[1], ws_name, rows)
+            return [self._scalar(_roundup, v, d) for v, d in zip(values, num_digits)]
+
+        if name == "TODAY":
+            return [(date.today() - date(1899, 12, 30)).days] * n
+
+        if name in ("YEAR", "MONTH"):
+            attribute = name.lower()
+            return [
+                v if _is_error(v) else self._scalar(lambda x: getattr(_to_date(x), attribute), v)
+                for v in self._eval(args[0], ws_name, rows)
+            ]
+
+        if name in ("SUMIFS", "COUNTIFS", "MINIFS", "MAXIFS"):
+            how = {"SUMIFS": "sum", "COUNTIFS": "count", "MINIFS": "min", "MAXIFS": "max"}[name]
+            target, pairs = (None, args) if how == "count" else (args[0], args[1:])
+            return self._ifs(how, target, pairs, ws_name, rows)
+
+        if name == "VLOOKUP":
+            return self._vlookup(args, ws_name, rows)
+
+        if name == "MATCH":
+            key = self._shared_range(args[1], ws_name)
+            index = self._index("lookup", key)
+            results = []
+            for v in self._eval(args[0], ws_name, rows):
+                position = None if _is_error(v) or v is None else index.get(_lookup_key(v))
+                results.append(
+                    v
+                    if _is_error(v)
+                    else FormulaError("#N/A")
+                    if position is None
+                    else position + 1
+                )
+            return results
+
+        # INDEX
+        ws_range, c1, c2, r1, r2 = self._shared_range(args[0], ws_name)
+        row_numbers = self._eval(args[1], ws_name, rows)
+        column_numbers = self._eval(args[2], ws_name, rows) if len(args) == 3 else [1] * n
+        results = []
+        for row_number, column_number in zip(row_numbers, column_numbers):
+            if _is_error(row_number) or _is_error(column_number):
+                results.append(row_number if _is_error(row_number) else column_number)
+                continue
+            try:
+                row_number, column_number = int(digit(row_number)), int(digit(column_number))
+            except (TypeError, ValueError):
+                results.append(FormulaError("#VALUE!"))
+                continue
+            height = None if r1 is None else r2 - r1 + 1
+            if row_number < 1 or column_number < 1:
+                results.append(FormulaError("#VALUE!"))
+            elif column_number > c2 - c1 + 1 or (height is not None and row_number > height):
+                results.append(FormulaError("#REF!"))
+            else:
+                values = self._column(ws_range, c1 + column_number - 1)
+                results.append(_at(values, (r1 or 1) + row_number - 1))
+        return results
+
+    @staticmethod
+    def _scalar(func, *values):
+        error = next((v for v in values if _is_error(v)), None)
+        if error is not None:
+            return error
+        try:
+            return func(*(digit(v) for v in values))
+        except (TypeError, ValueError, OverflowError):
+            return FormulaError("#VALUE!")
+
+    def _shared_range(self, node, ws_name: str) -> tuple:
+        """Plage identique pour toutes les lignes (colonnes entières ou lignes absolues)."""
+        if node[0] not in ("range", "ref") or self._is_relative(node):
+            raise _Unsupported("Plage")
+        return self._range_key(node, ws_name)
+
+    def _vlookup(self, args: list, ws_name: str, rows: list) -> list:
+        ws_range, c1, c2, r1, r2 = self._shared_range(args[1], ws_name)
+        index = self._index("lookup", (ws_range, c1, c1, r1, r2))
+        results = []
+        for v, column_number in zip(
+            self._eval(args[0], ws_name, rows), self._eval(args[2], ws_name, rows)
+        ):
+            if _is_error(v) or _is_error(column_number):
+                results.append(v if _is_error(v) else column_number)
+                continue
+            try:
+                column_number = int(digit(column_number))
+            except (TypeError, ValueError):
+                results.append(FormulaError("#VALUE!"))
+                continue
+            position = None if v is None else index.get(_lookup_key(v))
+            if column_number < 1:
+                results.append(FormulaError("#VALUE!"))
+            elif column_number > c2 - c1 + 1:
+                results.append(FormulaError("#REF!"))
+            elif position is None:
+                results.append(FormulaError("#N/A"))
+            else:
+                values = self._column(ws_range, c1 + column_number - 1)
+                results.append(_at(values, (r1 or 1) + position))
+        return results
+
+    def _ifs(self, how: str, target, pairs: list, ws_name: str, rows: list) -> list:
+        """SUMIFS, COUNTIFS, MINIFS et MAXIFS pour toutes les lignes."""
+        range_nodes = [pairs[i] for i in range(0, len(pairs), 2)] + ([target] if target else [])
+        if any(node[0] not in ("range", "ref") for node in range_nodes):
+            raise _Unsupported(how)
+        criteria = [self._eval(pairs[i], ws_name, rows) for i in range(1, len(pairs), 2)]
+
+        if any(self._is_relative(node) for node in range_nodes):
+            # Plages propres à chaque ligne (ex: COUNTIFS(V5:BE5,"X")) : elles sont courtes
+            results = []
+            for i, row in enumerate(rows):
+                keys = [self._range_key(node, ws_name, row) for node in range_nodes]
+                results.append(self._ifs_row(how, keys, [c[i] for c in criteria], indexed=False))
+            return results
+
+        keys = [self._range_key(node, ws_name) for node in range_nodes]
+        results = []
+        memo = {}
+        for i in range(len(rows)):
+            values = tuple(c[i] for c in criteria)
+            # Le type fait partie de la clé : True et 1 ne désignent pas le même critère
+            memo_key = tuple((type(v), v) for v in values)
+            if memo_key not in memo:
+                memo[memo_key] = self._ifs_row(how, keys, values, indexed=True)
+            results.append(memo[memo_key])
+        return results
+
+    def _ifs_row(self, how: str, keys: list, criteria: tuple, indexed: bool):
+        error = next((c for c in criteria if _is_error(c)), None)
+        if error is not None:
+            return error
+        try:
+            items = [self._range_items(key) for key in keys]
+        except FormulaError as e:
+            return e
+        if len({len(values) for values in items}) > 1:
+            return FormulaError("#VALUE!")
+
+        candidates = None
+        tests = []
+        for key, values, value in zip(keys, items, criteria):
+            test = _criteria_test(value)
+            if indexed and test[0] == "eq" and candidates is None:
+                # Le premier critère d'égalité sélectionne directement les lignes candidates
+                candidates = self._index("eq", key).get(test[1], [])
+            else:
+                tests.append((key, values, test))
+        if candidates is None:
+            candidates = range(len(items[0]))
+
+        for key, values, test in tests:
+            if not candidates:
+                break
+            if not indexed:
+                candidates = [i for i in candidates if _matches(values[i], test)]
+            elif test[0] == "eq":
+                criteria_keys = self._index("keys", key)
+                candidates = [i for i in candidates if criteria_keys[i] == test[1]]
+            else:
+                mask = self._mask(key, test)
+                candidates = [i for i in candidates if mask[i]]
+
+        return _aggregate(how, items[-1] if how != "count" else None, candidates)
@@ -0,0 +1,185 @@
+"""
+Génération en flux des feuilles de données du Fichier Suivi de Stock.
+
+Remplir le template cellule par cellule (`ws.cell(...)` puis une Font, une Border, une Alignment
+... par cellule) garde en mémoire un objet `Cell` et son style pour chaque cellule jusqu'à la
+sauvegarde, et chaque affectation de style recherche l'objet dans les collections du classeur.
+Pour les feuilles qui ne sont plus relues pendant la génération (Plan d'appro, Prévision,
+Distribution, ...), `StreamingWorkbookWriter` :
+
+- enregistre une seule fois dans le classeur un style nommé par combinaison de mise en forme
+  (`StyleRegistry`) ; une cellule ne porte plus que le nom de son style ;
+- conserve les lignes de données sous forme d'itérables, consommés uniquement à la sauvegarde ;
+- écrit chaque feuille au fil de l'eau avec le writer de feuille d'openpyxl (le même que celui
+  des feuilles write-only) : une ligne est convertie en cellules, écrite dans le fichier puis
+  libérée.
+
+Le reste du classeur (feuilles non modifiées, en-têtes, largeurs de colonnes, cellules
+fusionnées, mises en forme conditionnelles, validations, noms définis, ...) est repris tel quel
+du template : les mises en forme conditionnelles s'ajoutent toujours sur la feuille du template.
+"""
+
+import datetime
+from collections.abc import Iterable
+from typing import Any
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from openpyxl import Workbook
+from openpyxl.cell import Cell, MergedCell
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.writer.excel import ExcelWriter
+
+from .style_registry import StyleRegistry
+
+# Contenu d'une ligne en flux : {indice de colonne: (valeur, nom du style nommé ou None)}
+StreamedRow = dict[int, tuple[Any, str | None]]
+
+
+class StreamingWorkbookWriter:
+    """
+    Sauvegarde du template avec des feuilles dont les lignes de données sont écrites en flux.
+
+    S'utilise à la place de `wb_temp.save(...)` : les fonctions de mise à jour qui reçoivent le
+    writer y déposent leurs lignes avec `stream_rows` au lieu de les écrire dans la feuille
+    (`write_rows` sans writer), et `save` écrit le classeur complet.
+    """
+
+    def __init__(self, wb_temp: Workbook):
+        """
+        Args:
+            wb_temp (Workbook): Workbook template, chargé normalement (pas en lecture seule).
+        """
+        self.wb = wb_temp
+        self.styles = StyleRegistry(wb_temp)
+        self._streams = {}  # feuille -> (première ligne, itérable des lignes)
+
+    def stream_rows(self, ws: Worksheet, rows: Iterable[StreamedRow], min_row: int) -> None:
+        """
+        Dépose les lignes de données d'une feuille, écrites à la sauvegarde à partir de `min_row`.
+
+        Chaque ligne associe à un indice de colonne un couple (valeur, nom de style). Comme avec
+        `ws.cell(...)` suivi d'affectations `cell.font = ...`, une cellule déjà présente dans le
+        template garde sa valeur si la valeur fournie est None et son style, dont seuls les
+        attributs renseignés du style nommé sont remplacés (style None : inchangé). Les cellules
+        du template situées dans ces lignes et non fournies sont conservées, les cellules
+        fusionnées du template restent prioritaires.
+
+        Args:
+            ws (Worksheet): Feuille du template.
+            rows (Iterable[StreamedRow]): Lignes consécutives, consommées une seule fois.
+            min_row (int): Indice de la première ligne.
+        """
+        if ws in self._streams:
+            raise ValueError(f"Des lignes sont déjà prévues pour la feuille '{ws.title}'")
+        self._streams[ws] = (min_row, rows)
+
+    def save(self, filename) -> None:
+        """Enregistre le classeur, feuilles en flux comprises."""
+        archive = ZipFile(filename, "w", ZIP_DEFLATED, allowZip64=True)
+        self.wb.properties.modified = datetime.datetime.now(tz=datetime.UTC).replace(
+            tzinfo=None
+        )
+        _StreamingExcelWriter(self, archive).save()
+        self._streams.clear()
+
+    def _cell(self, ws: Worksheet, row: int, column: int, value, style: str | None, base):
+        """Cellule à écrire, mise en forme par-dessus la cellule du template si elle existe."""
+        if base is None:
+            return Cell(
+                ws, row=row, column=column, value=value, style_array=self.styles.style_array(style)
+            )
+        # Comme `StyleRegistry.write` : valeur affectée à la cellule du template (une date peut y
+        # fixer le format numérique), puis mise en forme
+        cell = Cell(ws, row=row, column=column, style_array=base._style)
+        cell._value, cell.data_type = base._value, base.data_type
+        if value is not None:
+            cell.value = value
+        return self.styles.apply(cell, style) if style is not None else cell
+
+
+def write_rows(
+    styles: StyleRegistry, ws: Worksheet, rows: Iterable[StreamedRow], min_row: int
+) -> None:
+    """
+    Écrit directement dans la feuille les lignes prévues pour `StreamingWorkbookWriter.stream_rows`
+    (génération sans writer, ou feuille relue avant la sauvegarde), avec le même résultat une fois
+    le classeur sauvegardé.
+
+    Args:
+        styles (StyleRegistry): Styles nommés du classeur de la feuille.
+        ws (Worksheet): Feuille du template.
+        rows (Iterable[StreamedRow]): Lignes consécutives.
+        min_row (int): Indice de la première ligne.
+    """
+    for row_idx, streamed in enumerate(rows, start=min_row):
+        for column, (value, style) in streamed.items():
+            if isinstance(ws._cells.get((row_idx, column)), MergedCell):
+                continue
+            if style is None:
+                ws.cell(row=row_idx, column=column, value=value)
+            else:
+                styles.write(ws, row_idx, column, value, style)
+
+
+class _StreamingSheetWriter(WorksheetWriter):
+    """Writer d'une feuille du template complétée par des lignes en flux."""
+
+    def __init__(self, ws: Worksheet, writer: StreamingWorkbookWriter, min_row: int, rows):
+        super().__init__(ws)
+        self.writer = writer
+        self.min_row = min_row
+        self.streamed_rows = rows
+
+    def write_dimensions(self):
+        # Etendue inconnue avant l'écriture des lignes (comme pour les feuilles write-only)
+        pass
+
+    def rows(self):
+        template_rows = super().rows()
+        position = 0
+
+        for row_idx, streamed in enumerate(self.streamed_rows, start=self.min_row):
+            while position < len(template_rows) and template_rows[position][0] < row_idx:
+                yield template_rows[position]
+                position += 1
+
+            base = {}
+            if position < len(template_rows) and template_rows[position][0] == row_idx:
+                base = {cell.column: cell for cell in template_rows[position][1]}
+                position += 1
+
+            cells = dict(base)
+            for column, (value, style) in streamed.items():
+                if isinstance(base.get(column), MergedCell):
+                    continue
+                cells[column] = self.writer._cell(
+                    self.ws, row_idx, column, value, style, base.get(column)
+                )
+            yield row_idx, [cells[column] for column in sorted(cells)]
+
+        yield from template_rows[position:]
+
+
+class _StreamingExcelWriter(ExcelWriter):
+    """ExcelWriter d'openpyxl utilisant `_StreamingSheetWriter` pour les feuilles en flux."""
+
+    def __init__(self, writer: StreamingWorkbookWriter, archive: ZipFile):
+        super().__init__(writer.wb, archive)
+        self.writer = writer
+
+    def write_worksheet(self, ws):
+        if ws not in self.writer._streams:
+            return super().write_worksheet(ws)
+
+        ws._drawing = SpreadsheetDrawing()
+        ws._drawing.charts = ws._charts
+        ws._drawing.images = ws._images
+        sheet_writer = _StreamingSheetWriter(ws, self.writer, *self.writer._streams[ws])
+        sheet_writer.write()
+
+        ws._rels = sheet_writer._rels
+        self._archive.write(sheet_writer.out, ws.path[1:])
+        self.manifest.append(ws)
+        sheet_writer.cleanup()
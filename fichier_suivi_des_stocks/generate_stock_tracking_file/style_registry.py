@@ -0,0 +1,133 @@
+"""
+Styles nommés enregistrés une seule fois par classeur et appliqués en bloc.
+
+Affecter `cell.font`, `cell.border`, `cell.fill`, ... cellule par cellule recherche à chaque fois
+l'objet dans les collections de styles du classeur (calcul du hash de l'objet) et les chemins
+de copie créent en plus un `.copy()` par attribut. `StyleRegistry` enregistre chaque
+combinaison de mise en forme une seule fois comme style nommé ; appliquer un style à une cellule
+revient alors à copier un tableau de quelques indices.
+
+Comme les affectations qu'il remplace, un style ne modifie que les attributs renseignés à son
+enregistrement : une cellule déjà mise en forme (template) garde les autres.
+
+Copie à l'identique de `generate_feedback_report/style_registry.py` : les deux projets
+sont déployés dans des dossiers distincts du workspace et ne peuvent pas s'importer mutuellement.
+"""
+
+from copy import copy
+
+from openpyxl import Workbook
+from openpyxl.cell import Cell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.worksheet.worksheet import Worksheet
+
+
+class StyleRegistry:
+    """Styles nommés d'un classeur, enregistrés au premier usage."""
+
+    def __init__(self, wb: Workbook):
+        self.wb = wb
+        self._styles = {}  # nom du style -> StyleArray du style nommé
+        self._overrides = {}  # nom du style -> attributs renseignés à l'enregistrement
+        self._copied_styles = {}  # style d'une cellule d'un autre classeur -> nom du style
+
+    def register(
+        self,
+        name: str,
+        font: Font | None = None,
+        fill: PatternFill | None = None,
+        border: Border | None = None,
+        alignment: Alignment | None = None,
+        number_format: str | None = None,
+    ) -> str:
+        """
+        Enregistre un style nommé dans le classeur (une seule fois) et retourne son nom.
+
+        Les attributs non renseignés sont ceux par défaut du classeur (police du style Normal,
+        ...), comme pour une cellule nouvellement créée. Un style de même nom déjà présent dans le
+        classeur est réutilisé tel quel.
+        """
+        if name not in self._styles:
+            attributes = {
+                "fontId": ("font", font, self.wb._fonts[0]),
+                "fillId": ("fill", fill, self.wb._fills[0]),
+                "borderId": ("border", border, self.wb._borders[0]),
+                "alignmentId": ("alignment", alignment, Alignment()),
+                "numFmtId": ("number_format", number_format, "General"),
+            }
+            if name not in self.wb.named_styles:
+                style = NamedStyle(name=name)
+                for attr, value, default in attributes.values():
+                    setattr(style, attr, value if value is not None else default)
+                self.wb.add_named_style(style)
+            self._styles[name] = self.wb._named_styles[name].as_tuple()
+            self._overrides[name] = [
+                key for key, (_, value, _) in attributes.items() if value is not None
+            ]
+        return name
+
+    def register_copy(
+        self, cell: Cell, number_format: str | None = None, alignment: Alignment | None = None
+    ) -> str:
+        """
+        Style nommé reprenant la mise en forme d'une cellule d'un autre classeur (police,
+        bordure, remplissage, format numérique et alignement), enregistré au premier appel.
+
+        Args:
+            cell (Cell): Cellule source.
+            number_format (str, optional): Format numérique à utiliser à la place de celui de
+                la cellule.
+            alignment (Alignment, optional): Alignement à utiliser à la place de celui de la
+                cellule.
+        """
+        key = (id(cell.parent.parent), tuple(cell._style), number_format, alignment)
+        if key not in self._copied_styles:
+            index = len(self._copied_styles) + 1
+            while f"Copie {index}" in self.wb.named_styles:
+                index += 1
+            self._copied_styles[key] = self.register(
+                f"Copie {index}",
+                font=copy(cell.font),
+                fill=copy(cell.fill),
+                border=copy(cell.border),
+                alignment=alignment if alignment is not None else copy(cell.alignment),
+                number_format=number_format or cell.number_format,
+            )
+        return self._copied_styles[key]
+
+    def style_array(self, name: str | None, base: StyleArray | None = None):
+        """
+        StyleArray d'une cellule mise en forme avec le style `name` par-dessus le style `base`
+        (None : cellule sans style).
+        """
+        if base is not None:
+            style_array = copy(base)
+            if name is not None:
+                for key in self._overrides[name]:
+                    setattr(style_array, key, getattr(self._styles[name], key))
+            return style_array
+        return self._styles[name] if name is not None else None
+
+    def apply(self, cell: Cell, name: str) -> Cell:
+        """Met en forme une cellule du classeur avec un style enregistré."""
+        cell._style = copy(self.style_array(name, cell._style if cell.has_style else None))
+        return cell
+
+    def write(self, ws: Worksheet, row: int, column: int, value, name: str) -> Cell:
+        """Équivalent de `ws.cell(row, column, value)` suivi de la mise en forme `name`."""
+        cell = ws._cells.get((row, column))
+        if cell is None:
+            # Nouvelle cellule : créée directement avec son style
+            cell = Cell(ws, row=row, column=column, value=value, style_array=self._styles[name])
+            ws._add_cell(cell)
+            return cell
+        if value is not None:
+            cell.value = value
+        return self.apply(cell, name)
+
+    def format_range(self, ws: Worksheet, cell_range: str, name: str) -> None:
+        """Met en forme toutes les cellules d'une plage (par exemple une colonne de données)."""
+        for row in ws[cell_range]:
+            for cell in row:
+                self.apply(cell, name)
@@ -1,11 +1,11 @@
 import numpy as np
 import pandas as pd
-from efc.interfaces.iopenpyxl import OpenpyxlInterface
 from openpyxl import Workbook
 from openpyxl.comments import Comment
 from openpyxl.formatting.rule import Rule
 from openpyxl.utils import get_column_letter
 
+from .cached_interface import CachedOpenpyxlInterface
 from .constants import (
     ALIGNMENT,
     BODY_FONT,
@@ -122,7 +122,7 @@ def update_sheet_annexe_2(
         )
     ]
 
-    interface = OpenpyxlInterface(wb=wb_temp, use_cache=True)
+    interface = CachedOpenpyxlInterface(wb_temp)
     interface.clear_cache()
 
     def format_cell_annexe_2(cell, col_idx):
@@ -148,7 +148,9 @@ def update_sheet_annexe_2(
                 cell.border = THIN_BORDER
 
             if col_idx not in (23, 38, 40):
-                cell = ws_annexe_2.cell(row=start, column=col_idx, value=formula.format(start))
+                cell = interface.set_cell_value(
+                    ws_annexe_2.title, start, col_idx, formula.format(start)
+                )
                 format_cell_annexe_2(cell, col_idx)
 
             # Date de Péremption la plus proche (BRUTE)
@@ -162,7 +164,7 @@ def update_sheet_annexe_2(
                     ),
                     "Date limite de consommation",
                 ].min()
-                cell = ws_annexe_2.cell(row=start, column=col_idx, value=value)
+                cell = interface.set_cell_value(ws_annexe_2.title, start, col_idx, value)
                 # cell.style = DATE_STYLE
                 format_cell_annexe_2(cell, col_idx)
 
@@ -190,7 +192,7 @@ def update_sheet_annexe_2(
                     else np.nan
                 )
 
-                cell = ws_annexe_2.cell(row=start, column=col_idx, value=value)
+                cell = interface.set_cell_value(ws_annexe_2.title, start, col_idx, value)
                 # cell.style = DATE_STYLE
                 format_cell_annexe_2(cell, col_idx)
                 cell.number_format = "DD MMM YYYY"
@@ -208,7 +210,7 @@ def update_sheet_annexe_2(
                     ),
                     "Date de réception effective",
                 ].max()
-                cell = ws_annexe_2.cell(row=start, column=col_idx, value=value)
+                cell = interface.set_cell_value(ws_annexe_2.title, start, col_idx, value)
                 # cell.style = DATE_STYLE
                 format_cell_annexe_2(cell, col_idx)
                 cell.number_format = "DD MMM YYYY"
@@ -247,4 +249,5 @@ def update_sheet_annexe_2(
                 f"{col_letter_etat_stock}5:{col_letter_etat_stock}{start}", rule
             )
 
+    interface.report_stats(ws_annexe_2.title)
     return wb_temp
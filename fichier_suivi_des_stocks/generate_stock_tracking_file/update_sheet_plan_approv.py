@@ -5,14 +5,22 @@ from openpyxl.utils import column_index_from_string
 from openpyxl.utils.dataframe import dataframe_to_rows
 
 from .constants import CENTER_ALIGNMENT, DATE_STYLE, LEFT_ALIGNMENT
+from .streaming_writer import StreamingWorkbookWriter, write_rows
+from .style_registry import StyleRegistry
 
 
-def update_sheet_plan_approv(wb_temp: Workbook, df_plan_approv: pd.DataFrame) -> Workbook:
+def update_sheet_plan_approv(
+    wb_temp: Workbook,
+    df_plan_approv: pd.DataFrame,
+    writer: StreamingWorkbookWriter | None = None,
+) -> Workbook:
     """Met à jour la feuille `Plan d'approvisionnement` en utilisant les données extraites de QAT.
 
     Args:
         wb_temp (Workbook): Workbook template.
         df_plan_approv (pd.DataFrame): DataFrame contenant les données prétraitées.
+        writer (StreamingWorkbookWriter, optional): Si fourni, les lignes sont écrites en flux à
+            la sauvegarde par le writer au lieu d'être ajoutées à la feuille. Defaults to None.
 
     Returns:
         Workbook: Le Workbook mis à jour.
@@ -61,42 +69,61 @@ def update_sheet_plan_approv(wb_temp: Workbook, df_plan_approv: pd.DataFrame) ->
         "T": '=A{row}&"_"&K{row}',  # Concaténation du code et de la date
     }
 
-    # Remplissage des cellules avec les données
-    for row_idx, row in enumerate(
-        dataframe_to_rows(df_plan_approv, index=False, header=False), start=2
-    ):
-        for col_name, (col_letter, col_idx, df_idx) in dico_cols.items():
-            cell = ws_plan_approv.cell(row=row_idx, column=col_idx, value=row[df_idx])
-            cell.font = font_bold if col_letter in {"A", "I", "J"} else font
-            cell.border = border
-            cell.alignment = (
-                CENTER_ALIGNMENT
-                if col_letter not in {"C", "E", "F", "G", "O", "P"}
-                else LEFT_ALIGNMENT
+    # Un style nommé par colonne, enregistré une seule fois dans le classeur
+    styles = writer.styles if writer is not None else StyleRegistry(wb_temp)
+    col_styles = {}
+    for col_name, (col_letter, col_idx, _) in dico_cols.items():
+        if col_name == "DATE":
+            col_styles[col_idx] = styles.register(
+                f"Plan d'appro {col_letter}",
+                font=font,
+                fill=fill_white,
+                border=border,
+                alignment=DATE_STYLE.alignment,
+                number_format=DATE_STYLE.number_format,
             )
-            cell.fill = fill if col_letter == "I" else fill_white
+        else:
+            col_styles[col_idx] = styles.register(
+                f"Plan d'appro {col_letter}",
+                font=font_bold if col_letter in {"A", "I", "J"} else font,
+                fill=fill if col_letter == "I" else fill_white,
+                border=border,
+                alignment=(
+                    CENTER_ALIGNMENT
+                    if col_letter not in {"C", "E", "F", "G", "O", "P"}
+                    else LEFT_ALIGNMENT
+                ),
+                number_format="0" if col_name in number_format_cols else None,
+            )
+
+    formula_styles = {
+        col_letter: styles.register(
+            f"Plan d'appro formule {col_letter}",
+            font=font_bold if col_letter in {"A", "I", "J"} else font,
+            fill=fill_white,
+            border=border,
+            alignment=LEFT_ALIGNMENT if col_letter not in {"J", "Q", "S"} else CENTER_ALIGNMENT,
+            number_format="0" if col_letter == "J" else None,
+        )
+        for col_letter in dico_formules
+    }
 
-            if col_name == "DATE":
-                cell.style = DATE_STYLE
-                cell.font = font
-                cell.border = border
-                cell.fill = fill_white
-            if col_name in number_format_cols:
-                cell.number_format = "0"
+    def rows(df):
+        for row_idx, row in enumerate(dataframe_to_rows(df, index=False, header=False), start=2):
+            cells = {
+                col_idx: (row[df_idx], col_styles[col_idx])
+                for _, col_idx, df_idx in dico_cols.values()
+            }
+            for col_letter, formula in dico_formules.items():
+                cells[column_index_from_string(col_letter)] = (
+                    formula.format(row=row_idx),
+                    formula_styles[col_letter],
+                )
+            yield cells
 
-        # Ajout des formules
-        for col_letter, formula in dico_formules.items():
-            cell = ws_plan_approv.cell(
-                row=row_idx,
-                column=column_index_from_string(col_letter),
-                value=formula.format(row=row_idx),
-            )
-            cell.font = font_bold if col_letter in {"A", "I", "J"} else font
-            cell.alignment = (
-                LEFT_ALIGNMENT if col_letter not in {"J", "Q", "S"} else CENTER_ALIGNMENT
-            )
-            cell.border = border
-            cell.fill = fill_white
-            if col_letter == "J":
-                cell.number_format = "0"
+    if writer is not None:
+        # Les lignes ne sont lues qu'à la sauvegarde : copie des données à cet instant
+        writer.stream_rows(ws_plan_approv, rows(df_plan_approv.copy()), min_row=2)
+    else:
+        write_rows(styles, ws_plan_approv, rows(df_plan_approv), min_row=2)
     return wb_temp
@@ -5,13 +5,14 @@ from openpyxl.utils import column_index_from_string
 from openpyxl.utils.dataframe import dataframe_to_rows
 
 from .constants import (
-    ALIGNMENT,
     BODY_FONT,
     CENTER_ALIGNMENT,
     DICO_FORMULES_PREVISION,
     DICO_RULES_PREVISION,
     HEADER_FONT,
 )
+from .streaming_writer import StreamingWorkbookWriter, write_rows
+from .style_registry import StyleRegistry
 from .utils import get_current_variable
 
 
@@ -19,12 +20,15 @@ def update_sheet_prevision(
     wb_temp: Workbook,
     date_report: str,
     df_produit: pd.DataFrame,
+    writer: StreamingWorkbookWriter | None = None,
 ):
     """Mise à jour de la feuille 'Prévision' dans le workbook donné en utilisant les données fournies.
     Args:
         wb_temp (Workbook): objet workbook template
         date_report (str): date de rapportage
         df_produit (pd.DataFrame): dataframe comportant la liste des produits
+        writer (StreamingWorkbookWriter, optional): si fourni, les lignes des produits sont
+            écrites en flux à la sauvegarde par le writer au lieu d'être ajoutées à la feuille
     """
 
     date_format = get_current_variable(date_report)[0]
@@ -36,56 +40,74 @@ def update_sheet_prevision(
     BODY_FONT.size = 11
     HEADER_FONT.size = 11
 
-    def format_cell_prevision(cell, center=True, bold=True):
-        cell.font = HEADER_FONT if bold else BODY_FONT
-        cell.alignment = CENTER_ALIGNMENT if center else ALIGNMENT
-        cell.fill = fill
-
-    for start, row in enumerate(dataframe_to_rows(df_produit, index=False, header=False), start=8):
-        col_values = {
-            "E": (row[0], "0"),  # Code produit
-            "F": (row[1], None),  # Type ou catégorie
-            "G": (row[2], None),  # Désignation
-        }
-
-        for col, (value, num_format) in col_values.items():
-            cell = ws_prevision.cell(row=start, column=column_index_from_string(col), value=value)
-            format_cell_prevision(cell, bold=False)
-
-            if num_format:
-                cell.number_format = num_format
-
-        for col, formula in DICO_FORMULES_PREVISION.items():
-            cell = ws_prevision.cell(
-                row=start, column=column_index_from_string(col.upper()), value=formula.format(start)
-            )
-            if col in {"x", "y", "z", "aq", "ar", "bg", "bh", "bw", "bx"}:
-                format_cell_prevision(cell, bold=False)
-            else:
-                format_cell_prevision(cell, center=True)
-
-            # Définition des formats numériques selon les plages de colonnes
-            col_idx = cell.col_idx
-            if col in {"x", "aq", "bg", "bw"}:
-                cell.number_format = "0"
-            elif 7 <= col_idx < 23 or 27 <= col_idx < 44:
-                cell.number_format = "#,##0"
-            elif 61 <= col_idx <= 73:
-                cell.number_format = "0.0"
-            elif 77 <= col_idx <= 89:
-                cell.number_format = '"$"#,##0.00'
-
-            # Gestion des alignements spécifiques
-            if col in {"h", "i", "aa", "ab"}:
-                cell.alignment = Alignment(horizontal="right", vertical="center")
-
-        # Gestion des bordures et mises en forme des autres cellules
-        for col in {"D", "W", "AP", "BF", "BV"}:
-            cell = ws_prevision.cell(row=start, column=column_index_from_string(col))
-            format_cell_prevision(cell)
-            cell.border = medium_border
-        cell = ws_prevision.cell(row=start, column=column_index_from_string("CL"))
-        cell.border = medium_border
+    def number_format_prevision(col, col_idx):
+        """Format numérique d'une colonne de formules (None : format de la cellule conservé)"""
+        if col in {"x", "aq", "bg", "bw"}:
+            return "0"
+        elif 7 <= col_idx < 23 or 27 <= col_idx < 44:
+            return "#,##0"
+        elif 61 <= col_idx <= 73:
+            return "0.0"
+        elif 77 <= col_idx <= 89:
+            return '"$"#,##0.00'
+        return None
+
+    # Colonnes de formules en police normale, alignées à droite et colonnes bordées
+    body_cols = {"x", "y", "z", "aq", "ar", "bg", "bh", "bw", "bx"}
+    right_cols = {"h", "i", "aa", "ab"}
+    right_alignment = Alignment(horizontal="right", vertical="center")
+    border_cols = ["D", "W", "AP", "BF", "BV"]
+
+    # Un style nommé par colonne, enregistré une seule fois dans le classeur
+    styles = writer.styles if writer is not None else StyleRegistry(wb_temp)
+
+    def register_style_prevision(col, bold=True, alignment=CENTER_ALIGNMENT, **kwargs):
+        return styles.register(
+            f"Prévision {col.upper()}",
+            font=HEADER_FONT if bold else BODY_FONT,
+            alignment=alignment,
+            fill=fill,
+            **kwargs,
+        )
+
+    col_styles = {
+        "E": register_style_prevision("E", bold=False, number_format="0"),
+        "F": register_style_prevision("F", bold=False),
+        "G": register_style_prevision("G", bold=False),
+    }
+    for col in DICO_FORMULES_PREVISION:
+        col_styles[col] = register_style_prevision(
+            col,
+            bold=col not in body_cols,
+            alignment=right_alignment if col in right_cols else CENTER_ALIGNMENT,
+            number_format=number_format_prevision(col, column_index_from_string(col.upper())),
+        )
+    for col in border_cols:
+        col_styles[col] = register_style_prevision(col, border=medium_border)
+    col_styles["CL"] = styles.register("Prévision CL", border=medium_border)
+
+    def rows(df):
+        for start, row in enumerate(dataframe_to_rows(df, index=False, header=False), start=8):
+            cells = {
+                column_index_from_string(col): (value, col_styles[col])
+                for col, value in zip(("E", "F", "G"), row)
+            }
+            for col, formula in DICO_FORMULES_PREVISION.items():
+                cells[column_index_from_string(col.upper())] = (
+                    formula.format(start),
+                    col_styles[col],
+                )
+            for col in border_cols + ["CL"]:
+                cells[column_index_from_string(col)] = (None, col_styles[col])
+            yield cells
+
+    if writer is not None:
+        # Les lignes ne sont lues qu'à la sauvegarde : copie des données à cet instant
+        writer.stream_rows(ws_prevision, rows(df_produit.copy()), min_row=8)
+    else:
+        write_rows(styles, ws_prevision, rows(df_produit), min_row=8)
+    start = 7 + len(df_produit)
+
     # Application des règles de mise en forme conditionnelle
     for col in DICO_FORMULES_PREVISION.keys():
         col_idx = column_index_from_string(col.upper())
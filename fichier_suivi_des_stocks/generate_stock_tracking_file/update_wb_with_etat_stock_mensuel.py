@@ -1,13 +1,71 @@
+from copy import copy
+
 from compute_indicators.utils import check_if_sheet_name_in_file
-from efc.interfaces.iopenpyxl import OpenpyxlInterface
 from openpyxl.formatting.rule import Rule
 from openpyxl.styles import Alignment, Font, PatternFill
 from openpyxl.styles.differential import DifferentialStyle
 
+from .formula_evaluator import FormulaEvaluator
+from .streaming_writer import write_rows
+from .style_registry import StyleRegistry
 from .utils import find_best_match, get_current_variable, has_formula
 
+# Feuilles relues par `update_sheet_annexe_2` : toujours écrites dans le template
+SHEETS_READ_BACK = ("Stock detaille", "Receptions")
+
+
+def data_rows_on_sheet(styles, ws_base, interface, dico_cols, sheet_name, max_row):
+    """
+    Lignes de données d'une feuille de l'état de stock mensuel, au format de
+    `StreamingWorkbookWriter.stream_rows` : valeurs (formules calculées) et styles des cellules
+    source copiés en styles nommés.
+
+    Args:
+        styles (StyleRegistry): styles nommés du template
+        ws_base (worksheet): worksheet etat stock mensuel
+        interface (FormulaEvaluator): évaluateur des formules du workbook etat stock mensuel
+        dico_cols (dict): colonne source -> colonne du template
+        sheet_name (str): le nom de la feuille
+        max_row (int): ligne d'en-tête
+    """
+    max_column = 9 if sheet_name == "Stock detaille" else None
+
+    for row in ws_base.iter_rows(min_row=max_row + 1, max_col=max_column):
+        cells = {}
+        column = None
+        for cell in row:
+            if hasattr(cell, "col_idx") and dico_cols.get(cell.col_idx) is not None:
+                column = dico_cols[cell.col_idx]
+                value = (
+                    interface.calc_cell(cell.coordinate, ws_base.title)
+                    if has_formula(cell)
+                    else cell.value
+                )
+                cells[column] = (value, None)
 
-def update_data_on_sheet(wb_base, ws_base, ws_temp, sheet_name, programme, date_report, max_row):
+            # Le style d'une cellule source s'applique à la dernière cellule écrite de la ligne
+            if cell.has_style and column is not None:
+                number_format = (
+                    "DD/MM/YYYY"
+                    if (sheet_name == "Distribution" and column in (4, 2))
+                    or (sheet_name == "Receptions" and column == 9)
+                    else None
+                )
+                cells[column] = (cells[column][0], styles.register_copy(cell, number_format))
+        yield cells
+
+
+def update_data_on_sheet(
+    wb_base,
+    ws_base,
+    ws_temp,
+    sheet_name,
+    programme,
+    date_report,
+    max_row,
+    writer=None,
+    styles=None,
+):
     """
     Sert à actualiser les donnée des feuilles en utilisant la source de d'origine
 
@@ -18,6 +76,9 @@ def update_data_on_sheet(wb_base, ws_base, ws_temp, sheet_name, programme, date_
         programme (str): le nom du programme
         date_report (str): date de conception du rapport
         max_row (int): à partir de quelle ligne dois-t-on commencer les itérations
+        writer (StreamingWorkbookWriter, optional): si fourni, les lignes des feuilles qui ne sont
+            pas relues pendant la génération sont écrites en flux à la sauvegarde
+        styles (StyleRegistry, optional): styles nommés du template, partagés entre les feuilles
     """
 
     dico_cols = {}
@@ -49,69 +110,58 @@ def update_data_on_sheet(wb_base, ws_base, ws_temp, sheet_name, programme, date_
             if match_index is not None:
                 dico_cols[match_index] = cell.col_idx
 
-    interface = OpenpyxlInterface(wb=wb_base, use_cache=True)
+    interface = FormulaEvaluator(wb_base)
     interface.clear_cache()
 
-    font = Font(name="Calibri", size=11)
-    alignment_one = Alignment(horizontal="center", vertical="center")
-    alignment_two = Alignment(horizontal=None, vertical="center")
-    fill = PatternFill(start_color="FFA8D08D", fill_type="solid")
+    if styles is None:
+        styles = writer.styles if writer is not None else StyleRegistry(ws_temp.parent)
+    rows = data_rows_on_sheet(styles, ws_base, interface, dico_cols, sheet_name, max_row)
 
-    max_column = 9 if sheet_name == "Stock detaille" else None
+    if writer is not None and sheet_name not in SHEETS_READ_BACK:
+        # Lignes écrites en flux à la sauvegarde
+        writer.stream_rows(ws_temp, rows, min_row=max_row + 1)
+    else:
+        write_rows(styles, ws_temp, rows, min_row=max_row + 1)
+    start = ws_base.max_row
 
-    # start = max_row+1
-    # print(sheet_name)
-    for start, row in enumerate(
-        ws_base.iter_rows(min_row=max_row + 1, max_col=max_column), start=max_row + 1
-    ):
-        for cell in row:
-            if hasattr(cell, "col_idx") and dico_cols.get(cell.col_idx) is None:
-                pass
-            elif hasattr(cell, "col_idx") and has_formula(cell):
-                result = interface.calc_cell(cell.coordinate, ws_base.title)
-                new_cell = ws_temp.cell(row=cell.row, column=dico_cols[cell.col_idx], value=result)
-            elif hasattr(cell, "col_idx"):
-                new_cell = ws_temp.cell(
-                    row=cell.row, column=dico_cols[cell.col_idx], value=cell.value
-                )
-            else:
-                pass
-
-            if cell.has_style:
-                new_cell.font = cell.font.copy()
-                new_cell.border = cell.border.copy()
-                new_cell.fill = cell.fill.copy()
-                new_cell.number_format = (
-                    "DD/MM/YYYY"
-                    if (sheet_name == "Distribution" and new_cell.col_idx in (4, 2))
-                    or (sheet_name == "Receptions" and new_cell.col_idx == 9)
-                    else cell.number_format
-                )
-                new_cell.alignment = cell.alignment.copy()
-
-            # if (sheet_name == "Distribution" and new_cell.col_idx in (4, 2)) or (
-            #     sheet_name == "Receptions" and new_cell.col_idx == 9
-            # ):
-            #     new_cell.number_format = "DD/MM/YYYY"
-
-        # start+=1
-        if sheet_name == "Stock detaille":
-            ws_temp[f"J{start}"] = '=IFERROR(D{0}-TODAY(),"")'.format(start)
-            ws_temp[f"K{start}"] = (
-                '=IF(J{0}<180,"RED", IF(AND(J{0}>=180,J{0}<=365),"ORANGE","GREEN"))'.format(start)
+    # Colonnes calculées des feuilles relues (toujours écrites dans le template)
+    font = Font(name="Calibri", size=11)
+    fill = PatternFill(start_color="FFA8D08D", fill_type="solid")
+    if sheet_name == "Stock detaille":
+        style_j = styles.register(
+            "Stock detaille J",
+            font=font,
+            fill=fill,
+            alignment=Alignment(horizontal="center", vertical="center"),
+        )
+        style_k = styles.register(
+            "Stock detaille K",
+            font=font,
+            fill=fill,
+            alignment=Alignment(horizontal=None, vertical="center"),
+        )
+        for row in range(max_row + 1, start + 1):
+            styles.write(ws_temp, row, 10, '=IFERROR(D{0}-TODAY(),"")'.format(row), style_j)
+            styles.write(
+                ws_temp,
+                row,
+                11,
+                f'=IF(J{row}<180,"RED", IF(AND(J{row}>=180,J{row}<=365),"ORANGE","GREEN"))',
+                style_k,
             )
-            ws_temp[f"J{start}"].font = ws_temp[f"K{start}"].font = font
-            ws_temp[f"J{start}"].fill = ws_temp[f"K{start}"].fill = fill
-            ws_temp[f"J{start}"].alignment = alignment_one
-            ws_temp[f"K{start}"].alignment = alignment_two
 
-        if sheet_name == "Receptions":
-            ws_temp[f"J{start}"] = (
+    if sheet_name == "Receptions":
+        style_j = styles.register("Receptions J", font=font)
+        for row in range(max_row + 1, start + 1):
+            styles.write(
+                ws_temp,
+                row,
+                10,
                 '=IFERROR(IF(AND(YEAR(I{index})={year}, MONTH(I{index})={month}), "ok", "skip"), "skip")'.format(
-                    index=start, year=date_report.year, month=date_report.month
-                )
+                    index=row, year=date_report.year, month=date_report.month
+                ),
+                style_j,
             )
-            ws_temp[f"J{start}"].font = font
 
     # Gestion des céllules fusionnées
     for merged_cell in ws_base.merged_cells.ranges:
@@ -123,11 +173,11 @@ def update_data_on_sheet(wb_base, ws_base, ws_temp, sheet_name, programme, date_
                     cell = ws_base.cell(row=row, column=col)
                     new_cell = ws_temp.cell(row=row, column=col)
 
-                    new_cell.font = cell.font.copy()
-                    new_cell.border = cell.border.copy()
-                    new_cell.fill = cell.fill.copy()
+                    new_cell.font = copy(cell.font)
+                    new_cell.border = copy(cell.border)
+                    new_cell.fill = copy(cell.fill)
                     new_cell.number_format = cell.number_format
-                    new_cell.alignment = cell.alignment.copy()
+                    new_cell.alignment = copy(cell.alignment)
 
             ws_temp.merge_cells(str(merged_cell))
 
@@ -185,7 +235,7 @@ def update_data_on_sheet(wb_base, ws_base, ws_temp, sheet_name, programme, date_
             ws_temp.conditional_formatting.add(f"N6:N{start}", rule)
 
 
-def update_sheets_etat_mensuel(wb_base, wb_temp, programme, date_report):
+def update_sheets_etat_mensuel(wb_base, wb_temp, programme, date_report, writer=None):
     """
     Fonction générale utilisée pour effectuer la mise à jour des données depuis le fichier etat de stock mensuel
 
@@ -194,6 +244,8 @@ def update_sheets_etat_mensuel(wb_base, wb_temp, programme, date_report):
         wb_temp (workbook): workbook template
         programme (str): le nom du programme
         date_report (str): date de conception du rapport
+        writer (StreamingWorkbookWriter, optional): writer du template pour écrire en flux les
+            feuilles qui ne sont pas relues pendant la génération (Distribution, PPI, ...)
     """
     global date_format, month_year_str, prev_month_year_str
 
@@ -208,6 +260,7 @@ def update_sheets_etat_mensuel(wb_base, wb_temp, programme, date_report):
         "PPI": 3,
         "Prelèvement": 3,
     }
+    styles = writer.styles if writer is not None else StyleRegistry(wb_temp)
     sheet_names_ws_base = wb_base.sheetnames
     sheet_names_ws_temp = wb_temp.sheetnames
 
@@ -218,7 +271,9 @@ def update_sheets_etat_mensuel(wb_base, wb_temp, programme, date_report):
         _sheet_name = check_if_sheet_name_in_file(sheet_name, sheet_names_ws_temp)
         ws_temp = wb_temp[_sheet_name]
 
-        update_data_on_sheet(wb_base, ws_base, ws_temp, sheet_name, programme, date_format, max_row)
+        update_data_on_sheet(
+            wb_base, ws_base, ws_temp, sheet_name, programme, date_format, max_row, writer, styles
+        )
 
         ws_temp.sheet_state = "hidden"
 
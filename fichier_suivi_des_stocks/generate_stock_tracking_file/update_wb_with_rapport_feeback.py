@@ -1,12 +1,13 @@
 import pandas as pd
-from efc.interfaces.iopenpyxl import OpenpyxlInterface
 from openpyxl.formatting.rule import CellIsRule, Rule
 from openpyxl.styles import Alignment, Font, PatternFill
 from openpyxl.styles.differential import DifferentialStyle
 from openpyxl.utils import column_index_from_string, get_column_letter
 from openpyxl.utils.dataframe import dataframe_to_rows
 
+from .cached_interface import CachedOpenpyxlInterface
 from .constants import THIN_BORDER
+from .style_registry import StyleRegistry
 from .utils import find_best_match, has_formula
 
 
@@ -36,8 +37,9 @@ def update_sheet_etat_stock(wb_temp, wb_fbr, programme):
             if match_index is not None:
                 dico_cols[match_index] = cell.col_idx
 
-    interface = OpenpyxlInterface(wb=wb_fbr, use_cache=True)
+    interface = CachedOpenpyxlInterface(wb_fbr)
     interface.clear_cache()
+    styles = StyleRegistry(wb_temp)
     index_row = 2
     for row in ws_fbr.iter_rows(min_row=2):
         if row[col_idx_programme].value != programme:
@@ -54,11 +56,7 @@ def update_sheet_etat_stock(wb_temp, wb_fbr, programme):
                 )
 
             if cell.has_style:
-                new_cell.font = cell.font.copy()
-                new_cell.border = cell.border.copy()
-                new_cell.fill = cell.fill.copy()
-                new_cell.number_format = cell.number_format
-                new_cell.alignment = cell.alignment.copy()
+                styles.apply(new_cell, styles.register_copy(cell))
 
         ws_temp.row_dimensions[index_row].height = 27
         index_row += 1
@@ -146,23 +144,30 @@ def update_sheet_etat_stock(wb_temp, df_etat_stock: pd.DataFrame):
         "QUANTITE A TRANSFERER OUT",
     }
 
+    # Un style nommé par colonne, enregistré une seule fois puis appliqué à chaque ligne
+    styles = StyleRegistry(wb_temp)
+    col_styles = {
+        col: styles.register(
+            f"Etat de stock Periph - {col}",
+            font=font_one if col in special_font_cols else font_two,
+            fill=fill if col in fill_cols else None,
+            border=THIN_BORDER,
+            alignment=(
+                alignment_center
+                if col in special_alignment_cols or element[1] in special_alignment_indices
+                else alignment_one
+            ),
+            number_format=number_format_cols.get(col),
+        )
+        for col, element in dico_cols.items()
+    }
+
     for start, row in enumerate(
         dataframe_to_rows(df_etat_stock, index=False, header=False), start=2
     ):
         ws_temp.row_dimensions[start].height = 25.2
         for col, element in dico_cols.items():
-            cell = ws_temp.cell(row=start, column=element[1], value=row[element[2]])
-            cell.border = THIN_BORDER
-            cell.font = font_one if col in special_font_cols else font_two
-            cell.alignment = (
-                alignment_center
-                if col in special_alignment_cols or element[1] in special_alignment_indices
-                else alignment_one
-            )
-            if col in number_format_cols:
-                cell.number_format = number_format_cols[col]
-            if col in fill_cols:
-                cell.fill = fill
+            styles.write(ws_temp, start, element[1], row[element[2]], col_styles[col])
 
     # Add rule in column Categorie du produit
     rule_categorie_produit = CellIsRule(
@@ -251,8 +256,9 @@ def update_sheet_stock_region(wb_temp, wb_fbr, programme):
 
     col_idx_programme = values.index("Programme")
 
-    interface = OpenpyxlInterface(wb=wb_fbr, use_cache=True)
+    interface = CachedOpenpyxlInterface(wb_fbr)
     interface.clear_cache()
+    styles = StyleRegistry(wb_temp)
     index_row = 1
     alignment_code = Alignment(horizontal="center", vertical="center")
 
@@ -281,11 +287,10 @@ def update_sheet_stock_region(wb_temp, wb_fbr, programme):
                 new_cell = ws_temp.cell(row=index_row, column=cell.col_idx, value=cell.value)
 
             if cell.has_style:
-                new_cell.font = cell.font.copy()
-                new_cell.border = cell.border.copy()
-                new_cell.fill = cell.fill.copy()
-                new_cell.number_format = cell.number_format
-                new_cell.alignment = cell.alignment.copy() if cell.col_idx != 1 else alignment_code
+                style = styles.register_copy(
+                    cell, alignment=alignment_code if cell.col_idx == 1 else None
+                )
+                styles.apply(new_cell, style)
 
         ws_temp.row_dimensions[index_row].height = 18
         index_row += 1
@@ -1,5 +1,6 @@
 from .extract_data_from_sheet import get_cmm_dataframes, get_data_etat_stock, get_dmm_dataframes
 from .get_data_from_sheet import get_data_from_sheet
+from .workbook_snapshot import WorkbookSnapshot
 
 # Exported symbols
 __all__ = [
@@ -7,4 +8,5 @@ __all__ = [
     "get_dmm_dataframes",
     "get_cmm_dataframes",
     "get_data_etat_stock",
+    "WorkbookSnapshot",
 ]
@@ -3,17 +3,27 @@ import math
 import numpy as np
 import pandas as pd
 from compute_indicators.utils import check_if_sheet_name_in_file
-from efc.interfaces.iopenpyxl import OpenpyxlInterface  # type: ignore
+from generate_stock_tracking_file.formula_evaluator import FormulaEvaluator
 from generate_stock_tracking_file.utils import has_formula
 from openpyxl import Workbook
 from openpyxl.cell import MergedCell
 from openpyxl.utils import column_index_from_string
 
 from .constants import COLUMNS_NAME_ETAT_STOCK, DICO_COLUMNS
+from .workbook_snapshot import WorkbookSnapshot
+
+
+def formula_evaluator(src_wb: Workbook, snapshot: WorkbookSnapshot | None) -> FormulaEvaluator:
+    """Evaluator shared through the refresh snapshot, or a new one for `src_wb`."""
+    return snapshot.evaluator if snapshot is not None else FormulaEvaluator(src_wb)
 
 
 def get_dmm_dataframes(
-    df_etat_stock: pd.DataFrame, src_wb: Workbook, sheetnames: list[str], date_report: str
+    df_etat_stock: pd.DataFrame,
+    src_wb: Workbook,
+    sheetnames: list[str],
+    date_report: str,
+    snapshot: WorkbookSnapshot | None = None,
 ) -> tuple[pd.DataFrame]:
     """Extract DMM dataframes from the annex sheet.
 
@@ -22,6 +32,8 @@ def get_dmm_dataframes(
         src_wb (Workbook): Source workbook containing the annex sheet.
         sheetnames (list[str]): List of sheet names in the workbook.
         date_report (str): Date of the report in 'YYYY-MM-DD' format.
+        snapshot (WorkbookSnapshot, optional): Snapshot of the refresh, whose formula evaluator
+            is reused. A new evaluator is created if not provided.
 
     Returns:
         tuple[pd.DataFrame]: Tuple containing two DataFrames:
@@ -29,8 +41,7 @@ def get_dmm_dataframes(
             - df_stock_track_dmm_histo: DataFrame with historical DMM data.
     """
     sheet_annexe_1 = check_if_sheet_name_in_file("Annexe 1 - Consolidation", sheetnames)
-    interface = OpenpyxlInterface(wb=src_wb, use_cache=True)
-    interface.clear_cache()
+    interface = formula_evaluator(src_wb, snapshot)
 
     data_list = []
     for start, row in enumerate(
@@ -77,7 +88,6 @@ def get_dmm_dataframes(
         .astype("<M8[ns]")
     )
 
-    interface.clear_cache()
     data_list = []
     for row in src_wb[sheet_annexe_1].iter_rows(
         min_row=3,
@@ -168,6 +178,7 @@ def get_cmm_dataframes(
     src_wb: Workbook,
     sheetnames: list[str],
     date_report: str,
+    snapshot: WorkbookSnapshot | None = None,
 ) -> tuple[pd.DataFrame]:
     """Extract CMM dataframes from the annex sheet.
     Args:
@@ -176,14 +187,15 @@ def get_cmm_dataframes(
         src_wb (Workbook): Source workbook containing the annex sheet.
         sheetnames (list[str]): List of sheet names in the workbook.
         date_report (str): Date of the report in 'YYYY-MM-DD' format.
+        snapshot (WorkbookSnapshot, optional): Snapshot of the refresh, whose formula evaluator
+            is reused. A new evaluator is created if not provided.
     Returns:
         tuple[pd.DataFrame]: Tuple containing two DataFrames:
             - df_stock_track_cmm: DataFrame with CMM stock tracking data.
             - df_stock_track_cmm_histo: DataFrame with historical CMM data.
     """
     sheet_annexe_1 = check_if_sheet_name_in_file("Annexe 1 - Consolidation", sheetnames)
-    interface = OpenpyxlInterface(wb=src_wb, use_cache=True)
-    interface.clear_cache()
+    interface = formula_evaluator(src_wb, snapshot)
 
     header_row = list(
         src_wb[sheet_annexe_1].iter_rows(
@@ -268,7 +280,6 @@ def get_cmm_dataframes(
         .astype("<M8[ns]")
     )
 
-    interface.clear_cache()
     data_list = []
     for row in src_wb[sheet_annexe_1].iter_rows(
         min_row=3,
@@ -356,6 +367,7 @@ def get_data_annexe_2(
     df_etat_stock: pd.DataFrame,
     df_stock_prog_nat: pd.DataFrame,
     df_plan_approv: pd.DataFrame,
+    snapshot: WorkbookSnapshot | None = None,
 ) -> pd.DataFrame:
     """Extract data from the annex 2 sheet.
 
@@ -365,6 +377,9 @@ def get_data_annexe_2(
         df_etat_stock (pd.DataFrame): Data frame containing status stock from sheet annexe 1 - consolidation
         df_stock_prog_nat (pd.DataFrame): DataFrame containing stock program data.
         df_plan_approv (pd.DataFrame): DataFrame containing plan approval data.
+        snapshot (WorkbookSnapshot, optional): Snapshot of the refresh, whose formula evaluator
+            is reused (and invalidated once the formulas are replaced). A new evaluator is created
+            if not provided.
 
     Returns:
         pd.DataFrame: DataFrame containing the data from the annex 2 sheet.
@@ -397,8 +412,6 @@ def get_data_annexe_2(
         check_if_sheet_name_in_file("Annexe 1 - Consolidation", sheetnames),
         check_if_sheet_name_in_file("Annexe 2 - Suivi des Stocks", sheetnames),
     )
-    interface = OpenpyxlInterface(wb=src_wb, use_cache=True)
-    interface.clear_cache()
 
     dico_cols = {
         "M": "CONSO",
@@ -456,8 +469,10 @@ def get_data_annexe_2(
                 "Quantité harmonisée (SAGE)",
             ].sum()
 
-    interface = OpenpyxlInterface(wb=src_wb, use_cache=True)
-    interface.clear_cache()
+    # Formules de l'Annexe 2 remplacées ci-dessus
+    if snapshot is not None:
+        snapshot.invalidate_formulas()
+    interface = formula_evaluator(src_wb, snapshot)
     data_list = []
     columns_letter = []
     for row in src_wb[sheet_annexe_2].iter_rows(
@@ -482,6 +497,7 @@ def get_data_annexe_2(
                 # print(e)
                 continue
         data_list.append(data)
+    interface.report_stats(sheet_annexe_2)
 
     return pd.concat(
         [
@@ -499,6 +515,7 @@ def get_data_etat_stock(
     df_stock_prog_nat: pd.DataFrame,
     df_plan_approv: pd.DataFrame,
     date_report: str,
+    snapshot: WorkbookSnapshot | None = None,
 ) -> pd.DataFrame:
     """Extracts and merges stock status data from multiple sources for a given report date.
 
@@ -509,6 +526,8 @@ def get_data_etat_stock(
         df_stock_prog_nat (pd.DataFrame): DataFrame containing national stock program data.
         df_plan_approv (pd.DataFrame): DataFrame containing approval plan data.
         date_report (str): The report date in 'YYYY-MM-DD' format.
+        snapshot (WorkbookSnapshot, optional): Snapshot of the refresh, passed to
+            `get_data_annexe_2`.
 
     Returns:
         pd.DataFrame: The merged and processed stock status DataFrame with updated columns and report date.
@@ -522,6 +541,7 @@ def get_data_etat_stock(
         df_etat_stock=df_etat_stock,
         df_stock_prog_nat=df_stock_prog_nat,
         df_plan_approv=df_plan_approv.copy(),
+        snapshot=snapshot,
     )
     assert (
         df_etat_stock.merge(df_data, on="code_produit", how="inner").shape[0]
@@ -6,10 +6,11 @@ import numpy as np
 import pandas as pd
 from compute_indicators.file_utils import process_etat_stock_npsp
 from compute_indicators.utils import check_if_sheet_name_in_file
-from efc.interfaces.iopenpyxl import OpenpyxlInterface  # type: ignore
 from generate_stock_tracking_file.utils import has_formula
 from openpyxl import Workbook
 
+from .workbook_snapshot import WorkbookSnapshot
+
 
 def get_data_from_sheet(
     fp_suivi_stock: Path,
@@ -18,6 +19,7 @@ def get_data_from_sheet(
     date_report: str,
     programme: str,
     src_wb: Workbook,
+    snapshot: WorkbookSnapshot | None = None,
 ) -> pd.DataFrame:
     """Get data from a specific sheet in the stock tracking file.
 
@@ -28,6 +30,8 @@ def get_data_from_sheet(
         date_report (str | None): Date of the report, if applicable.
         programme (str | None): Programme name, if applicable.
         src_wb: Source workbook, if needed for calculations.
+        snapshot (WorkbookSnapshot, optional): Snapshot of the file shared by the calls of a
+            refresh, so that the file is parsed once. A single-use one is created if not provided.
 
     Returns:
         pd.DataFrame: DataFrame containing the data from the specified sheet.
@@ -35,13 +39,16 @@ def get_data_from_sheet(
     Raises:
         ValueError: If the sheet name is not recognized.
     """
+    if snapshot is None:
+        snapshot = WorkbookSnapshot(fp_suivi_stock, src_wb)
+
     if sheet_name == "Etat de stock":
         sheet_stock_npsp = check_if_sheet_name_in_file("Etat de stock", sheetnames)
         assert sheet_stock_npsp is not None, print(
             f"La feuille `Etat de stock` n'est pas dans la liste {sheetnames} du classeur excel"
         )
 
-        df_etat_stock_npsp = pd.read_excel(fp_suivi_stock, sheet_name=sheet_stock_npsp, skiprows=4)
+        df_etat_stock_npsp = snapshot.read_sheet(sheet_stock_npsp, skiprows=4)
         df_etat_stock_npsp = df_etat_stock_npsp.loc[df_etat_stock_npsp["Nouveau code"].notna()]
         df_etat_stock_npsp = process_etat_stock_npsp(df_etat_stock_npsp, date_report, programme)
 
@@ -53,9 +60,7 @@ def get_data_from_sheet(
             f"La feuille `Stock detaille` n'est pas dans la liste {sheetnames} du classeur excel"
         )
 
-        df_stock_detaille = pd.read_excel(fp_suivi_stock, sheet_name=sheet_stock_detaille).dropna(
-            how="all"
-        )
+        df_stock_detaille = snapshot.read_sheet(sheet_stock_detaille).dropna(how="all")
 
         max_date_year = pd.Timestamp.max.year
 
@@ -88,9 +93,7 @@ def get_data_from_sheet(
             f"La feuille `Distribution X3` n'est pas dans la liste {sheetnames} du classeur excel"
         )
 
-        df_distribution = pd.read_excel(fp_suivi_stock, sheet_name=sheet_distribution_x3).dropna(
-            how="all"
-        )
+        df_distribution = snapshot.read_sheet(sheet_distribution_x3).dropna(how="all")
 
         return df_distribution
 
@@ -100,7 +103,7 @@ def get_data_from_sheet(
             f"La feuille `Receptions` n'est pas dans la liste {sheetnames} du classeur excel"
         )
 
-        df_receptions = pd.read_excel(fp_suivi_stock, sheet_name=sheet_reception).dropna(how="all")
+        df_receptions = snapshot.read_sheet(sheet_reception).dropna(how="all")
         df_receptions["Date_entree_machine"] = pd.to_datetime(
             df_receptions["Date d'entrée en machine"], format="%d/%m/%Y", errors="coerce"
         )
@@ -133,6 +136,7 @@ def get_data_from_sheet(
 
                     if cell.row is not None and cell.column is not None:
                         src_wb[sheet_reception].cell(row=cell.row, column=cell.column, value=value)
+        snapshot.invalidate_formulas()
 
         return df_receptions
 
@@ -142,7 +146,7 @@ def get_data_from_sheet(
             f"La feuille `PPI` n'est pas dans la liste {sheetnames} du classeur excel"
         )
 
-        df_ppi = pd.read_excel(fp_suivi_stock, sheet_name=sheet_ppi, skiprows=2)
+        df_ppi = snapshot.read_sheet(sheet_ppi, skiprows=2)
 
         return df_ppi.dropna(how="all")
 
@@ -152,7 +156,7 @@ def get_data_from_sheet(
             f"La feuille `Prelèvement CQ` n'est pas dans la liste {sheetnames} du classeur excel"
         )
 
-        df_prelevement = pd.read_excel(fp_suivi_stock, sheet_name=sheet_prelev, skiprows=2)
+        df_prelevement = snapshot.read_sheet(sheet_prelev, skiprows=2)
 
         return df_prelevement.dropna(how="all")
 
@@ -166,8 +170,7 @@ def get_data_from_sheet(
             f"La feuille `Plan d'appro` n'est pas dans la liste {sheetnames} du classeur excel"
         )
 
-        interface = OpenpyxlInterface(wb=src_wb, use_cache=True)
-        interface.clear_cache()
+        interface = snapshot.evaluator
         data_list = []
         for row in src_wb[sheet_approv].iter_rows(min_row=0, max_col=19):
             data = []
@@ -197,9 +200,7 @@ def get_data_from_sheet(
             f"La feuille `Statut Produits` n'est pas dans la liste {sheetnames} du classeur excel"
         )
 
-        df_statut_prod = pd.read_excel(
-            fp_suivi_stock, sheet_name=sheet_statut_prod, skiprows=1
-        ).dropna(how="all")
+        df_statut_prod = snapshot.read_sheet(sheet_statut_prod, skiprows=1).dropna(how="all")
         df_statut_prod["programme"] = programme
 
         return df_statut_prod
@@ -211,9 +212,9 @@ def get_data_from_sheet(
             f"La feuille `Annexe 1 - Consolidation` n'est pas dans la liste {sheetnames} du classeur excel"
         )
 
-        df_etat_stock = pd.read_excel(
-            fp_suivi_stock, sheet_name=sheet_annexe_1, skiprows=2, usecols="A:T", engine="openpyxl"
-        ).dropna(how="all")
+        df_etat_stock = snapshot.read_sheet(sheet_annexe_1, skiprows=2, usecols="A:T").dropna(
+            how="all"
+        )
 
         COLUMN_MAPPING = {
             "Stock Théorique fin": "stock_theorique_mois_precedent",
@@ -232,8 +233,7 @@ def get_data_from_sheet(
             inplace=True,
         )
 
-        interface = OpenpyxlInterface(wb=src_wb, use_cache=True)
-        interface.clear_cache()
+        interface = snapshot.evaluator
         data_list = []
         for row in src_wb[sheet_annexe_1].iter_rows(min_row=5, max_col=20):
             data = []
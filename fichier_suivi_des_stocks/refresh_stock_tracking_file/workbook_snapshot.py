@@ -0,0 +1,101 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from generate_stock_tracking_file.formula_evaluator import FormulaEvaluator
+from openpyxl import Workbook, load_workbook
+from pandas.io.excel._openpyxl import OpenpyxlReader
+
+
+class WorkbookSnapshot:
+    """
+    Single parse of a stock tracking file shared by every step of a refresh.
+
+    `pd.read_excel(fp, sheet_name=...)` re-opens the xlsx archive and re-parses the workbook,
+    the shared strings and the styles on each call. The snapshot parses the file once with
+    openpyxl (`src_wb`, formulas kept) and materializes a sheet as a DataFrame, with the same
+    options and parsing rules as `pd.read_excel`, only the first time it is requested.
+
+    Formula cells hold the value computed by the snapshot's single `FormulaEvaluator` instead of
+    the value cached in the file, which openpyxl does not keep alongside the formula (and which is
+    absent from the files written by generate_stock_tracking_file until Excel saves them again).
+    The sheets whose formulas are computed (Plan d'appro, Annexe 1, Annexe 2) share the same
+    evaluator, hence the sheets already read and the columns already evaluated.
+    """
+
+    def __init__(self, fp_suivi_stock: Path, src_wb: Workbook | None = None):
+        """
+        Args:
+            fp_suivi_stock (Path): Path to the stock tracking file.
+            src_wb (Workbook, optional): The file already loaded with openpyxl (formulas kept),
+                loaded here if not provided.
+        """
+        self.fp_suivi_stock = Path(fp_suivi_stock)
+        self.src_wb = src_wb if src_wb is not None else load_workbook(self.fp_suivi_stock)
+        self._reader = None
+        self._frames = {}
+        self._evaluator = None
+
+    @property
+    def sheetnames(self) -> list[str]:
+        return self.src_wb.sheetnames
+
+    @property
+    def evaluator(self) -> FormulaEvaluator:
+        """Formula evaluator of `src_wb`, shared by all the sheets."""
+        if self._evaluator is None:
+            self._evaluator = FormulaEvaluator(self.src_wb)
+        return self._evaluator
+
+    def read_sheet(
+        self, sheet_name: str, skiprows: int | None = None, usecols=None
+    ) -> pd.DataFrame:
+        """
+        Cell values of a sheet, with the same options and result as `pd.read_excel`.
+
+        The sheet is materialized on first request only; each call returns a copy that the
+        caller can modify freely.
+        """
+        if self._reader is None:
+            self._reader = _EvaluatedOpenpyxlReader(self.src_wb, self.evaluator)
+
+        key = (sheet_name, skiprows, usecols)
+        if key not in self._frames:
+            self._frames[key] = self._reader.parse(sheet_name, skiprows=skiprows, usecols=usecols)
+        return self._frames[key].copy()
+
+    def invalidate_formulas(self) -> None:
+        """To call after writing into `src_wb`: formulas are evaluated again on next request."""
+        if self._evaluator is not None:
+            self._evaluator.clear_cache()
+
+    def close(self) -> None:
+        """Releases the materialized sheets and the evaluated formulas."""
+        self._reader = None
+        self._evaluator = None
+        self._frames.clear()
+
+
+class _EvaluatedOpenpyxlReader(OpenpyxlReader):
+    """
+    pandas' openpyxl reader working on the loaded workbook, formula cells being converted to the
+    value computed by the evaluator.
+    """
+
+    def __init__(self, wb: Workbook, evaluator: FormulaEvaluator):
+        super().__init__(wb)
+        self.evaluator = evaluator
+
+    def _convert_cell(self, cell):
+        if cell.data_type != "f":
+            return super()._convert_cell(cell)
+        try:
+            value = self.evaluator.calc_cell(cell.coordinate, cell.parent.title)
+        except Exception:
+            # Excel error of the formula, read as NaN like the error cells
+            return np.nan
+        if value is None:
+            return ""
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
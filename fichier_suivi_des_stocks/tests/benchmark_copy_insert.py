@@ -0,0 +1,128 @@
+"""
+Compare l'insertion d'un DataFrame par COPY FROM STDIN et par `DataFrame.to_sql(method="multi")`.
+
+Le script crée une table de test (texte, date, entier, réel), y insère les mêmes lignes par chaque
+méthode de `insert_dataframe_to_table`, affiche le débit obtenu et vérifie que les deux méthodes
+stockent autant de NULL et de chaînes vides par colonne. La table est supprimée à la fin.
+
+Nécessite un serveur PostgreSQL (par défaut l'URL de la variable d'environnement DATABASE_URL).
+
+Usage (depuis le dossier fichier_suivi_des_stocks) :
+    python tests/benchmark_copy_insert.py --rows 200000 --database-url postgresql://...
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from database_operations import connection_manager, stock_sync_manager
+
+TABLE_NAME = "benchmark_copy_insert"
+# Méthode de `insert_dataframe_to_table` : (libellé, lignes par lot)
+METHODS = {"multi": ("to_sql (multi)", 1_000), "copy": ("COPY", 50_000)}
+COLUMNS = [
+    "code_produit",
+    "designation",
+    "date_rapport",
+    "stock_initial",
+    "quantite_distribuee",
+    "cmm",
+]
+TEXT_COLUMNS = ["code_produit", "designation"]
+
+
+def make_rows(n_rows: int, seed: int = 2024) -> pd.DataFrame:
+    """
+    Lignes de stock synthétiques, avec des valeurs manquantes (colonnes texte, date et réelle : les
+    colonnes entières sont converties en int32 avant insertion) et des chaînes vides.
+    """
+    rng = np.random.default_rng(seed)
+
+    def with_missing(values, share):
+        values = pd.Series(values)
+        values[rng.random(n_rows) < share] = None
+        return values
+
+    return pd.DataFrame(
+        {
+            "code_produit": [f"{code:07d}" for code in rng.integers(0, 5_000, n_rows)],
+            "designation": with_missing(
+                rng.choice(["Produit, 100 mg", 'Produit "B"', "", "Produit\nligne"], n_rows), 0.1
+            ),
+            "date_rapport": with_missing(
+                pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365, n_rows), "D"),
+                0.05,
+            ),
+            "stock_initial": rng.integers(0, 10_000, n_rows),
+            "quantite_distribuee": rng.integers(0, 5_000, n_rows),
+            "cmm": with_missing(rng.random(n_rows) * 1_000, 0.1),
+        }
+    )
+
+
+def null_and_empty_counts(schema_name: str) -> dict:
+    """Nombre de NULL par colonne et de chaînes vides par colonne texte de la table de test."""
+    counts = ", ".join(
+        [f'count(*) - count("{col}") AS "{col} NULL"' for col in COLUMNS]
+        + [f'count(*) FILTER (WHERE "{col}" = \'\') AS "{col} vide"' for col in TEXT_COLUMNS]
+    )
+    with connection_manager.cursor() as cursor:
+        cursor.execute(f"SELECT {counts} FROM {schema_name}.{TABLE_NAME}")
+        return dict(zip([desc[0] for desc in cursor.description], cursor.fetchone()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--schema", default="suivi_stock")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"))
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url ou DATABASE_URL est requis")
+
+    # Engine du serveur de test à la place de celui du workspace OpenHEXA
+    connection_manager._engine = create_engine(
+        args.database_url, **connection_manager.POOL_SETTINGS
+    )
+    target = f"{args.schema}.{TABLE_NAME}"
+    df = make_rows(args.rows)
+
+    with connection_manager.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {args.schema}")
+        cursor.execute(
+            f"CREATE TABLE {target} (code_produit text, designation text, date_rapport date, "
+            "stock_initial integer, quantite_distribuee integer, cmm real)"
+        )
+    try:
+        counts = {}
+        for method, (label, chunk_size) in METHODS.items():
+            with connection_manager.cursor() as cursor:
+                cursor.execute(f"TRUNCATE {target}")
+
+            start = time.perf_counter()
+            stock_sync_manager.insert_dataframe_to_table(
+                df, TABLE_NAME, args.schema, chunk_size=chunk_size, method=method
+            )
+            seconds = time.perf_counter() - start
+            print(f"{label:<15}: {seconds:.2f}s, {args.rows / seconds:,.0f} lignes/s")
+            counts[method] = null_and_empty_counts(args.schema)
+
+        print(f"NULL et chaînes vides identiques : {counts['copy'] == counts['multi']}")
+        for column, value in counts["copy"].items():
+            print(f"  {column:<25}: {value} (to_sql : {counts['multi'][column]})")
+    finally:
+        with connection_manager.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {target}")
+        connection_manager.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Serveur HTTP local imitant les endpoints de l'API QAT utilisés par `extract_pa`.
+
+`/authenticate` délivre un nouveau jeton à chaque appel ; seul le dernier jeton délivré est accepté
+(401 sinon), `expire_token` permettant de simuler l'expiration du jeton en cours. Les versions et les
+envois de chaque programme sont générés à partir de son ID.
+"""
+
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+AUTH_PATH = "/authenticate"
+VERSION_PATH = "/api/dropdown/version/filter/sp/programId/{program_id}"
+SHIPMENT_DETAILS_PATH = "/api/report/shipmentDetails"
+VERSION_ID = 7
+SHIPMENTS_PER_PROGRAM = 3
+
+
+def shipment_ids(program_id: int) -> list[int]:
+    return [program_id * 100 + i for i in range(SHIPMENTS_PER_PROGRAM)]
+
+
+class StubQat:
+    def __init__(self):
+        self.auth_requests = 0
+        self.token = None
+        # Incidents simulés par chemin : nombre de réponses concernées
+        self.errors = Counter()  # réponse 503
+        self.rate_limited = Counter()  # réponse 429 avec un en-tête Retry-After
+        self.retry_after = 5
+        self.delay = 0.0  # délai de réponse des envois
+        self.requests = Counter()  # nombre de requêtes reçues par chemin
+        self.unauthorized = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._handle(None)
+
+            def do_POST(self):
+                self._handle(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+
+            def _handle(self, body):
+                if self.path == AUTH_PATH:
+                    return self._send(200, {"token": stub.new_token()})
+                status, payload, headers = stub.run(
+                    self.path, self.headers.get("Authorization"), body
+                )
+                self._send(status, payload, headers)
+
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def new_token(self) -> str:
+        with self._lock:
+            self.auth_requests += 1
+            self.token = f"token-{self.auth_requests}"
+            return self.token
+
+    def expire_token(self):
+        with self._lock:
+            self.token = None
+
+    def _take(self, counter: Counter, key) -> bool:
+        with self._lock:
+            if counter[key] > 0:
+                counter[key] -= 1
+                return True
+            return False
+
+    def run(self, path: str, authorization: str | None, body: dict | None):
+        with self._lock:
+            self.requests[path] += 1
+            if authorization != f"Bearer {self.token}":
+                self.unauthorized += 1
+                return 401, {}, {}
+        if self._take(self.errors, path):
+            return 503, {}, {}
+        if self._take(self.rate_limited, path):
+            return 429, {}, {"Retry-After": str(self.retry_after)}
+
+        if re.fullmatch(VERSION_PATH.format(program_id=r"\d+"), path):
+            versions = [
+                {"versionId": version_id, "createdDate": f"2025-0{version_id}-01 08:00:00"}
+                for version_id in range(1, VERSION_ID + 1)
+            ]
+            return 200, versions, {}
+
+        program_id = int(body["programIds"][0])
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        details = [
+            {
+                "shipmentId": shipment_id,
+                "shipmentQty": 1000,
+                "expectedDeliveryDate": "2025-06-30",
+                "notes": "Livraison partielle, reliquat en juillet",
+                "planningUnit": {"id": program_id, "label": {"label_fr": f"Produit {program_id}"}},
+            }
+            for shipment_id in shipment_ids(program_id)
+        ]
+        return 200, {"shipmentDetailsList": details}, {}
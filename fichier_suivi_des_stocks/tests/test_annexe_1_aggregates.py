@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+from compute_indicators.compute_indicators_annexe_1 import get_etat_stock_current_month
+
+DATE_REPORT = "2025-03-01"
+
+
+def make_exports(distribution_qty_col: str):
+    """Exports du mois : le produit P3 n'apparaît dans aucun, P2 seulement dans certains."""
+    df_etat_stock = pd.DataFrame(
+        {
+            "code_produit": ["P1", "P2", "P3"],
+            "stock_theorique_mois_precedent": [100, None, 50],
+        }
+    )
+    df_distribution = pd.DataFrame(
+        {"Article": ["P1", "P2", "P1", "X9"], distribution_qty_col: [10, 4, 5, 1000]}
+    )
+    df_receptions = pd.DataFrame(
+        {
+            "Nouveau code": ["P1", "P1", "P1", "P2"],
+            # Seules les réceptions de mars 2025 comptent (pas mars 2024, ni février 2025)
+            "Date_entree_machine": pd.to_datetime(
+                ["2025-03-03", "2025-03-31", "2024-03-15", "2025-02-28"]
+            ),
+            "Quantité réceptionnée": [20, 30, 400, 500],
+        }
+    )
+    df_ppi = pd.DataFrame({"Code produit": ["P2"], "Quantité": [2]})
+    df_prelevement = pd.DataFrame({"CODE": ["P1", "P1"], "Quantité": [1, 2]})
+    df_stock_detaille = pd.DataFrame(
+        {"Code article": ["P1", "P1", "P2"], "Qté \nPhysique": [90, 45, 7]}
+    )
+    return (
+        df_etat_stock,
+        df_stock_detaille,
+        df_distribution,
+        df_ppi,
+        df_prelevement,
+        df_receptions,
+    )
+
+
+@pytest.mark.parametrize("distribution_qty_col", ["Quantité livrée", "Qté livrée"])
+def test_product_aggregates(distribution_qty_col):
+    df = get_etat_stock_current_month(*make_exports(distribution_qty_col), DATE_REPORT)
+
+    assert df["Distribution effectuée"].tolist() == [15, 4, 0]
+    assert df["Quantité reçue entrée en stock"].tolist() == [50, 0, 0]
+    assert df["Quantité de PPI"].tolist() == [0, 2, 0]
+    assert df["Quantité prélévée en Contrôle Qualité (CQ)"].tolist() == [3, 0, 0]
+    assert df["Stock Théorique Final SAGE"].tolist() == [135, 7, 0]
+    # Stock du mois précédent absent : les mouvements du mois seuls
+    assert df["Stock Théorique Final Attendu"].tolist() == [132, -6, 50]
+    assert df["ECARTS"].tolist() == [3, 13, -50]
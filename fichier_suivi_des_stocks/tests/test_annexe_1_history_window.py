@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+from compute_indicators.compute_indicators_annexe_1 import is_month_start, sum_history_window
+
+DATE_REPORT = pd.Timestamp("2025-03-01")
+
+
+def reference_window_sum(df_current, df_histo, value_col, drop_first_month):
+    """Ancienne sélection par produit : pd.date_range(...)[1:] ou [:-1] puis isin sur l'historique."""
+
+    def total(row):
+        # pd.date_range levait une erreur sans date de début, l'ancien code renvoyait alors NaN
+        if pd.isna(row.date_report_prev_min):
+            return np.nan
+        months = pd.date_range(start=row.date_report_prev_min, end=row.date_report, freq="MS")
+        months = months[1:] if drop_first_month else months[:-1]
+        return df_histo.loc[
+            (df_histo.id_dim_produit_stock_track_pk == row.id_dim_produit_stock_track_pk)
+            & (df_histo.date_report_prev.isin(months)),
+            value_col,
+        ].sum()
+
+    return df_current.apply(total, axis=1).to_numpy(dtype=float)
+
+
+def make_history(seed: int, n_products: int = 60):
+    rng = np.random.default_rng(seed)
+    month_starts = pd.date_range("2024-06-01", DATE_REPORT, freq="MS")
+    # Dates en début de mois, en milieu de mois et en début de mois avec une heure
+    dates = list(month_starts) + [
+        pd.Timestamp("2024-07-15"),
+        pd.Timestamp("2024-09-20"),
+        pd.Timestamp("2024-11-01 12:00"),
+    ]
+    n_lines = 8 * n_products
+    df_histo = pd.DataFrame(
+        {
+            # Les derniers produits n'ont pas d'historique
+            "id_dim_produit_stock_track_pk": rng.integers(0, n_products - 5, n_lines),
+            "date_report_prev": rng.choice(np.array(dates, dtype="datetime64[ns]"), n_lines),
+            "value": rng.choice([0, 1, 7, 30, 250, np.nan], n_lines),
+        }
+    )
+    df_histo["date_report_prev_min"] = df_histo.groupby("id_dim_produit_stock_track_pk")[
+        "date_report_prev"
+    ].transform("min")
+
+    df_current = pd.DataFrame({"id_dim_produit_stock_track_pk": np.arange(n_products)})
+    df_current["date_report"] = DATE_REPORT
+    df_current = df_current.merge(
+        df_histo[["id_dim_produit_stock_track_pk", "date_report_prev_min"]].drop_duplicates(),
+        on="id_dim_produit_stock_track_pk",
+        how="left",
+    )
+    return df_current, df_histo
+
+
+@pytest.mark.parametrize("drop_first_month", [True, False], ids=["first_dropped", "last_dropped"])
+@pytest.mark.parametrize("seed", range(5))
+def test_sum_history_window_matches_the_date_range_selection(seed, drop_first_month):
+    df_current, df_histo = make_history(seed)
+
+    expected = reference_window_sum(df_current, df_histo, "value", drop_first_month)
+    result = sum_history_window(df_current, df_histo, "value", drop_first_month=drop_first_month)
+
+    np.testing.assert_array_equal(result, expected)
+    # Produits sans historique, fenêtres commençant en milieu de mois
+    assert np.isnan(result[-5:]).all()
+    assert (~is_month_start(df_current["date_report_prev_min"].dropna())).any()
+
+
+def test_sum_history_window_without_history():
+    df_current = pd.DataFrame(
+        {
+            "id_dim_produit_stock_track_pk": [1, 2],
+            "date_report": DATE_REPORT,
+            "date_report_prev_min": pd.NaT,
+        }
+    )
+    df_histo = pd.DataFrame(
+        {
+            "id_dim_produit_stock_track_pk": pd.Series(dtype=int),
+            "date_report_prev": pd.Series(dtype="datetime64[ns]"),
+            "value": pd.Series(dtype=float),
+        }
+    )
+
+    result = sum_history_window(df_current, df_histo, "value")
+
+    np.testing.assert_array_equal(
+        result, reference_window_sum(df_current, df_histo, "value", drop_first_month=True)
+    )
@@ -0,0 +1,98 @@
+import pytest
+
+# L'interface remplace des attributs internes d'efc
+pytest.importorskip("efc")
+
+from efc.interfaces.iopenpyxl import OpenpyxlInterface
+from efc.rpn_builder.parser.operands import BadReference
+from generate_stock_tracking_file.cached_interface import CachedOpenpyxlInterface
+from openpyxl import Workbook
+
+
+def make_workbook():
+    wb = Workbook()
+    data = wb.active
+    data.title = "Donnees"
+    for row in range(1, 21):
+        data.append([row % 5 + 1, row * 10])
+
+    calcul = wb.create_sheet("Annexe 1")
+    for row in range(1, 6):
+        calcul[f"A{row}"] = row
+        calcul[f"B{row}"] = f"=SUMIFS(Donnees!B:B,Donnees!A:A,A{row})"
+        calcul[f"C{row}"] = f"=VLOOKUP(A{row},Donnees!A:B,2,FALSE)"
+
+    # Feuille qui ne lit que l'Annexe 1
+    suivi = wb.create_sheet("Suivi")
+    for row in range(1, 6):
+        suivi[f"A{row}"] = f"='Annexe 1'!B{row}*2"
+
+    # Feuille indépendante des autres
+    autre = wb.create_sheet("Autre")
+    for row in range(1, 6):
+        autre[f"A{row}"] = row
+        autre[f"B{row}"] = f"=A{row}*3"
+    return wb
+
+
+def all_values(interface, wb):
+    return {
+        (ws.title, cell.coordinate): interface.calc_cell(cell.coordinate, ws.title)
+        for ws in wb.worksheets
+        for row in ws.iter_rows()
+        for cell in row
+        if cell.data_type == "f"
+    }
+
+
+def test_writes_give_the_same_results_as_a_fresh_efc_interface():
+    wb = make_workbook()
+    interface = CachedOpenpyxlInterface(wb)
+    all_values(interface, wb)
+
+    for ws_name, row, column, value in [
+        ("Donnees", 3, 2, 1000),
+        ("Donnees", 21, 1, 2),  # ligne ajoutée à la plage
+        ("Annexe 1", 2, 1, 4),
+        ("Autre", 1, 1, 7),
+        ("Suivi", 6, 1, "='Annexe 1'!C1+Autre!B1"),
+    ]:
+        interface.set_cell_value(ws_name, row, column, value)
+        assert all_values(interface, wb) == all_values(OpenpyxlInterface(wb, use_cache=True), wb)
+
+
+def test_writes_keep_the_results_of_independent_sheets():
+    wb = make_workbook()
+    interface = CachedOpenpyxlInterface(wb)
+    all_values(interface, wb)
+
+    interface.set_cell_value("Donnees", 3, 2, 1000)
+    hits = interface.stats["hits"]
+    for row in range(1, 6):
+        interface.calc_cell(f"B{row}", "Autre")
+        interface.calc_cell(f"A{row}", "Suivi")
+
+    # Les résultats de la feuille "Autre" sont conservés, ceux de "Suivi" (qui lit l'Annexe 1,
+    # qui lit les données) sont recalculés
+    assert interface.stats["hits"] - hits == 5
+
+
+def test_vlookup_on_whole_columns_starts_at_the_first_row_of_the_sheet():
+    wb = Workbook()
+    data = wb.active
+    data.title = "Data"
+    # Données à partir de la ligne 3 : la plage A:B commence à la première ligne remplie
+    data["A3"], data["B3"] = "k1", 10
+    data["A4"], data["B4"] = "k2", 20
+    calcul = wb.create_sheet("Calcul")
+    calcul["A1"] = '=VLOOKUP("k2",Data!A:B,2,FALSE)'
+    calcul["A2"] = '=VLOOKUP("k2",Data!A3:B4,2,FALSE)'
+    calcul["A3"] = '=VLOOKUP("k2",Data!A:B,3,FALSE)'
+
+    interface = CachedOpenpyxlInterface(wb)
+    assert interface.calc_cell("A1", "Calcul") == 20
+    assert interface.calc_cell("A2", "Calcul") == 20
+    # Colonne demandée au-delà de la table : #REF!
+    with pytest.raises(BadReference):
+        interface.calc_cell("A3", "Calcul")
+    assert interface.stats["indexed"] == 3
@@ -0,0 +1,216 @@
+import pytest
+
+# L'évaluateur reprend les conventions d'efc et lui confie les formules non prises en charge
+pytest.importorskip("efc")
+
+from efc.interfaces.iopenpyxl import OpenpyxlInterface
+from generate_stock_tracking_file.constants import DICO_FORMULES_ANNEXE_2
+from generate_stock_tracking_file.formula_evaluator import (
+    FormulaError,
+    FormulaEvaluator,
+)
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+ANNEXE_2 = "Annexe 2 - Suivi des Stocks"
+FIRST_ROW, LAST_ROW = 5, 12
+
+# Colonnes de l'Annexe 2 dont efc sait calculer les formules (ROUNDUP, MINIFS, MAXIFS, TODAY et
+# les références à 'Plan d''appro' ne le sont pas)
+EFC_COLUMNS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 16, 18, 29, 30, 31, 34, 35]
+
+
+def make_annexe_2_workbook():
+    """Classeur minimal dont l'Annexe 2 est remplie avec les formules modèles du projet."""
+    wb = Workbook()
+    annexe_1 = wb.active
+    annexe_1.title = "Annexe 1 - Consolidation"
+    for row in range(FIRST_ROW, LAST_ROW + 1):
+        annexe_1.cell(row, 1, 1000 + row)
+        for column in range(2, 62):
+            annexe_1.cell(row, column, (row * column) % 7)
+        # Code produit en texte dans la consolidation, en nombre dans les autres feuilles
+        if row == 8:
+            annexe_1.cell(row, 1, str(1000 + row))
+
+    stock_region = wb.create_sheet("StockParRegion")
+    for row in range(FIRST_ROW, LAST_ROW, 2):
+        stock_region.append([1000 + row] + [row + i for i in range(9)])
+
+    periph = wb.create_sheet("Etat de stock Periph")
+    for row in range(1, 30):
+        periph.append([1000 + FIRST_ROW + row % 6] + [None] * 23 + [("RUPTURE", "OK")[row % 2]])
+
+    stock_detaille = wb.create_sheet("Stock detaille")
+    for row in range(1, 30):
+        stock_detaille.cell(row, 1, 1000 + FIRST_ROW + row % 5)
+        stock_detaille.cell(row, 4, 45000 + row)
+        stock_detaille.cell(row, 7, row * 10)
+        stock_detaille.cell(row, 11, ("RED", "ORANGE", "GREEN")[row % 3])
+
+    wb.create_sheet("Plan d'appro")
+
+    receptions = wb.create_sheet("Receptions")
+    for row in range(1, 12):
+        receptions.cell(row, 3, 1000 + FIRST_ROW + row % 4)
+        receptions.cell(row, 8, row * 3)
+        receptions.cell(row, 10, ("ok", "en attente", None)[row % 3])
+
+    annexe_2 = wb.create_sheet(ANNEXE_2)
+    for row in range(FIRST_ROW, LAST_ROW + 1):
+        for column, formula in DICO_FORMULES_ANNEXE_2.items():
+            annexe_2.cell(row, column, formula.format(row))
+    return wb
+
+
+def make_criteria_workbook():
+    wb = Workbook()
+    donnees = wb.active
+    donnees.title = "Donnees"
+    for values in [
+        ("1234", 10, 45001, "ok"),
+        (1234, 20, 45002, "ko"),
+        (1234.0, 40, 45003, None),
+        ("abc", 80, 45004, "ok"),
+        (99, 160, 45005, "ko"),
+    ]:
+        donnees.append(values)
+
+    calcul = wb.create_sheet("Calcul")
+    calcul["A1"] = 1234
+    calcul["A2"] = "1234"
+    calcul["A3"] = 45003
+    calcul["A4"] = 5555
+    return wb, calcul
+
+
+def evaluate(wb, ws_name, formulas: dict):
+    ws = wb[ws_name]
+    for coordinate, formula in formulas.items():
+        ws[coordinate] = formula
+    evaluator = FormulaEvaluator(wb)
+    return evaluator, {
+        coordinate: evaluator.calc_cell(coordinate, ws_name) for coordinate in formulas
+    }
+
+
+def test_annexe_2_templates_give_the_same_values_as_efc():
+    wb = make_annexe_2_workbook()
+    evaluator = FormulaEvaluator(wb)
+    efc = OpenpyxlInterface(wb, use_cache=True)
+
+    for column in EFC_COLUMNS:
+        for row in range(FIRST_ROW, LAST_ROW + 1):
+            coordinate = f"{get_column_letter(column)}{row}"
+            expected = efc.calc_cell(coordinate, ANNEXE_2)
+            value = evaluator.calc_cell(coordinate, ANNEXE_2)
+            assert value == expected and type(value) is type(expected), coordinate
+
+    # Toutes ces formules sont évaluées nativement
+    assert evaluator._efc is None
+
+
+def test_ifs_criteria_coerce_numbers_and_numeric_text():
+    wb, _ = make_criteria_workbook()
+
+    _, values = evaluate(
+        wb,
+        "Calcul",
+        {
+            "B1": "=SUMIFS(Donnees!B:B,Donnees!A:A,A1)",
+            "B2": "=SUMIFS(Donnees!B:B,Donnees!A:A,A2)",
+            "B3": '=COUNTIFS(Donnees!A:A,"1234")',
+        },
+    )
+
+    # 1234, 1234.0 et "1234" désignent le même critère
+    assert values == {"B1": 70, "B2": 70, "B3": 3}
+
+
+def test_ifs_comparison_criteria():
+    wb, _ = make_criteria_workbook()
+
+    _, values = evaluate(
+        wb,
+        "Calcul",
+        {
+            "B1": '=SUMIFS(Donnees!B:B,Donnees!D:D,"<>ok")',
+            "B2": '=SUMIFS(Donnees!B:B,Donnees!C:C,">="&A3)',
+            "B3": '=SUMIFS(Donnees!B:B,Donnees!C:C,">="&A3,Donnees!C:C,"<"&(A3+2))',
+            "B4": '=COUNTIFS(Donnees!A:A,A2,Donnees!D:D,"<>ok")',
+        },
+    )
+
+    # "<>ok" retient les cellules vides ; ">="&A3 compare des nombres
+    assert values == {"B1": 220, "B2": 280, "B3": 120, "B4": 2}
+
+
+def test_lookups_without_match_raise_na():
+    wb, _ = make_criteria_workbook()
+
+    evaluator, values = evaluate(
+        wb,
+        "Calcul",
+        {
+            "C1": '=IFERROR(VLOOKUP(A4,Donnees!A:B,2,FALSE),"absent")',
+            "C2": "=MATCH(A1,Donnees!A:A,0)",
+            "C3": "=VLOOKUP(A2,Donnees!A:B,2,FALSE)",
+        },
+    )
+    # La recherche exacte distingue le nombre 1234 du texte "1234"
+    assert values == {"C1": "absent", "C2": 2, "C3": 10}
+
+    wb["Calcul"]["C4"] = "=VLOOKUP(A4,Donnees!A:B,2,FALSE)"
+    wb["Calcul"]["C5"] = "=MATCH(A4,Donnees!A:A,0)"
+    evaluator.clear_cache()
+    for coordinate in ("C4", "C5"):
+        with pytest.raises(FormulaError) as error:
+            evaluator.calc_cell(coordinate, "Calcul")
+        assert error.value.code == "#N/A"
+
+
+def test_errors_propagate_until_iferror():
+    wb, calcul = make_criteria_workbook()
+    calcul["D1"] = "=A1/0"
+    calcul["E1"] = "=D1*2"
+    calcul["E2"] = "=E1+1"
+
+    evaluator, values = evaluate(
+        wb,
+        "Calcul",
+        {
+            "F1": '=IFERROR(D1+1,"erreur")',
+            "F2": '=IFERROR(IF(D1>0,1,2),"erreur")',
+            "F3": "=IFERROR(SUMIFS(D1:D3,A1:A3,1234),-1)",
+            "F4": '=IFERROR(E2&"",0)',
+        },
+    )
+    assert values == {"F1": "erreur", "F2": "erreur", "F3": -1, "F4": 0}
+
+    with pytest.raises(FormulaError) as error:
+        evaluator.calc_cell("D1", "Calcul")
+    assert error.value.code == "#DIV/0!"
+
+
+def test_running_references_in_the_same_column_fall_back_to_efc():
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Cumul"
+    ws["A1"] = 5
+    for row in range(2, 6):
+        ws[f"A{row}"] = f"=A{row - 1}+10"
+        ws[f"B{row}"] = f"=A{row}*2"
+
+    evaluator = FormulaEvaluator(wb)
+    efc = OpenpyxlInterface(wb, use_cache=True)
+
+    for row in range(2, 6):
+        for column in "AB":
+            assert evaluator.calc_cell(f"{column}{row}", "Cumul") == efc.calc_cell(
+                f"{column}{row}", "Cumul"
+            )
+    assert evaluator.calc_cell("B5", "Cumul") == 90
+    # La colonne A (référence à la ligne précédente de la même colonne) est calculée par efc,
+    # la colonne B nativement
+    assert evaluator._efc is not None
+    assert evaluator._efc.stats["misses"] == 4
@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+import pytest
+from compute_indicators.compute_indicators_prevision import (
+    compute_projected_stock,
+    compute_stock_months,
+    project_stocks,
+    to_stock_values,
+    update_stocks,
+)
+
+DATE_REPORT = pd.Timestamp("2025-01-01")
+
+
+def reference_update_stocks(df_prevision_other_month, df_plan_approv):
+    """Ancienne version ligne à ligne de `update_stocks`, construite sur `compute_projected_stock`."""
+    for i in range(len(df_prevision_other_month)):
+        row = df_prevision_other_month.iloc[i]
+        if row["PERIOD"] != row["date_report"]:
+            period = row["PERIOD"]
+            df_plan_filtered = df_plan_approv.loc[
+                (df_plan_approv["Standard product code"] == row["code_produit"])
+                & (df_plan_approv["Date updated"] == period)
+            ]
+            df_prev_filtered = df_prevision_other_month.loc[
+                (df_prevision_other_month.PERIOD == period - pd.DateOffset(months=1))
+                & (
+                    df_prevision_other_month.id_dim_produit_stock_track_pk
+                    == row["id_dim_produit_stock_track_pk"]
+                )
+            ]
+            if not df_prev_filtered.empty:
+                stock_prev_central = df_prev_filtered["stock_prev_central"].iloc[0]
+                stock_prev_national = df_prev_filtered["stock_prev_national"].iloc[0]
+            else:
+                stock_prev_central = stock_prev_national = "ND"
+
+            quantite = (
+                df_plan_filtered["Quantité harmonisée (SAGE)"].sum()
+                if not df_plan_filtered.empty
+                else 0
+            )
+            row["stock_prev_central"] = compute_projected_stock(
+                stock_prev_central, quantite, row["dmm_central_annexe_2"]
+            )
+            row["stock_prev_national"] = compute_projected_stock(
+                stock_prev_national, quantite, row["cmm_national_annexe_2"]
+            )
+            df_prevision_other_month.iloc[i] = row
+    return df_prevision_other_month.round(0)
+
+
+def reference_stock_months(sdu, consommation):
+    return [
+        0 if s == 0 or pd.isna(s) else round(s / c) if c != 0 and not pd.isna(c) else "ND"
+        for s, c in zip(sdu, consommation)
+    ]
+
+
+def make_prevision(seed: int, n_products: int = 40):
+    """Produits x 13 mois avec des consommations nulles ou absentes et des quotients à x.5."""
+    rng = np.random.default_rng(seed)
+    # 0, NaN et des consommations paires qui produisent des égalités d'arrondi
+    choices = np.array([0, np.nan, 2, 4, 1, 3, 7.5])
+    df = pd.DataFrame(
+        {
+            "id_dim_produit_stock_track_pk": np.arange(n_products),
+            "code_produit": [f"P{i % (n_products - 3)}" for i in range(n_products)],
+            "sdu_central_annexe_2": rng.choice([0, np.nan, 5, 9, 21, 101], n_products),
+            "dmm_central_annexe_2": rng.choice(choices, n_products),
+            "sdu_national_annexe_2": rng.choice([0, np.nan, 3, 11, 30], n_products),
+            "cmm_national_annexe_2": rng.choice(choices, n_products),
+        }
+    )
+    df["stock_prev_central"] = compute_stock_months(
+        df["sdu_central_annexe_2"], df["dmm_central_annexe_2"]
+    )
+    df["stock_prev_national"] = compute_stock_months(
+        df["sdu_national_annexe_2"], df["cmm_national_annexe_2"]
+    )
+    periods = pd.DataFrame({"PERIOD": pd.date_range(DATE_REPORT, periods=13, freq="MS")})
+    df = df.merge(periods, how="cross")
+    df["date_report"] = DATE_REPORT
+
+    n_lines = 4 * n_products
+    plan = pd.DataFrame(
+        {
+            "Standard product code": rng.choice([f"P{i}" for i in range(n_products)], n_lines),
+            "Date updated": rng.choice(periods["PERIOD"].to_numpy(), n_lines),
+            "Quantité harmonisée (SAGE)": rng.choice([0, 1, 3, 5, 15, 100, np.nan], n_lines),
+        }
+    )
+    # Quantité non numérique, seule pour son (produit, mois) : projection "ND"
+    invalid = {"Standard product code": "P0", "Date updated": periods["PERIOD"].iloc[3]}
+    plan = plan.loc[
+        (plan["Standard product code"] != invalid["Standard product code"])
+        | (plan["Date updated"] != invalid["Date updated"])
+    ]
+    plan = pd.concat(
+        [plan, pd.DataFrame([{**invalid, "Quantité harmonisée (SAGE)": "à confirmer"}])],
+        ignore_index=True,
+    )
+    return df, plan
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_update_stocks_matches_the_scalar_recurrence(seed):
+    df, plan = make_prevision(seed)
+
+    expected = reference_update_stocks(df.copy(), plan)
+    result = update_stocks(df.copy(), plan)
+
+    for col in ("stock_prev_central", "stock_prev_national"):
+        assert result[col].tolist() == expected[col].tolist()
+        assert [type(v) for v in result[col]] == [type(v) for v in expected[col]]
+    # Les cas "ND" et les valeurs numériques sont bien représentés dans les données
+    invalid = (result["code_produit"] == "P0") & (result["PERIOD"] == result["PERIOD"].unique()[3])
+    for col in ("stock_prev_central", "stock_prev_national"):
+        assert (result.loc[invalid, col] == "ND").all()
+    assert (result["stock_prev_central"] == "ND").any()
+    assert result["stock_prev_central"].map(lambda v: isinstance(v, int)).any()
+
+
+def test_compute_stock_months_matches_the_row_wise_rule():
+    sdu = pd.Series([0, np.nan, 5, 9, 7, 3, 10])
+    consommation = pd.Series([2, 2, 2, 2, 0, np.nan, 4])
+
+    assert compute_stock_months(sdu, consommation).tolist() == reference_stock_months(
+        sdu, consommation
+    )
+
+
+@pytest.mark.parametrize(
+    "previous, quantite, consommation",
+    [
+        ("ND", 10, 2),
+        (np.nan, 10, 2),
+        (0, 0, 0),
+        (0, 5, np.nan),
+        (2.5, 1, 2),  # 1.5 + 0.5 -> 2
+        (3, 1, 2),  # 2 + 0.5 -> égalité arrondie au pair
+        (4, 3, 2),  # 3 + 1.5 -> 4
+        (0, np.inf, 1),
+        (0, 1e300, 1e-300),
+        (0, 1e20, 1),  # au-delà de 2**63
+        (-5, 1, 4),
+    ],
+)
+def test_project_stocks_matches_compute_projected_stock(previous, quantite, consommation):
+    expected = compute_projected_stock(previous, quantite, consommation)
+
+    previous_value = np.nan if previous == "ND" else previous
+    projected = project_stocks(
+        np.array([previous_value], dtype=float),
+        np.array([quantite], dtype=float),
+        np.array([consommation], dtype=float),
+    )
+    value = to_stock_values(projected)[0]
+
+    assert value == expected and type(value) is type(expected)
@@ -0,0 +1,86 @@
+import json
+import multiprocessing
+
+import polars as pl
+from compute_indicators.qat_cache import QatSnapshotCache
+
+START, STOP = "2025-01-01", "2026-12-31"
+
+
+def snapshot(version_id: int) -> pl.DataFrame:
+    return pl.DataFrame({"shipment_id": [version_id, version_id + 1], "quantity": [10, 20]})
+
+
+def put_versions(cache_dir, program_id: int, versions) -> None:
+    cache = QatSnapshotCache(cache_dir, keep_versions=100)
+    for version_id in versions:
+        cache.put(snapshot(version_id), program_id, version_id, "2025-01-15", START, STOP)
+
+
+def test_runs_sharing_the_folder_keep_each_other_entries(tmp_path):
+    # Deux exécutions ouvrent le cache avant que l'une ou l'autre n'y écrive
+    first, second = QatSnapshotCache(tmp_path), QatSnapshotCache(tmp_path)
+
+    first.put(snapshot(1), 21, 1, "2025-01-10", START, STOP)
+    second.put(snapshot(7), 22, 7, "2025-01-12", START, STOP)
+
+    index = json.loads((tmp_path / QatSnapshotCache.INDEX_FILE).read_text())
+    assert sorted(index) == sorted(
+        [
+            QatSnapshotCache.make_key(21, 1, START, STOP),
+            QatSnapshotCache.make_key(22, 7, START, STOP),
+        ]
+    )
+    # L'entrée de l'autre exécution est servie, et non supprimée comme absente
+    assert first.get(22, 7, START, STOP).equals(snapshot(7))
+    assert second.get(21, 1, START, STOP).equals(snapshot(1))
+    assert first.get_as_of(22, START, STOP, "2025-01-31").equals(snapshot(7))
+    assert len(list(tmp_path.glob("*.parquet"))) == 2
+
+
+def test_eviction_sees_the_versions_of_other_runs(tmp_path):
+    first, second = QatSnapshotCache(tmp_path, keep_versions=2), QatSnapshotCache(tmp_path)
+
+    first.put(snapshot(1), 21, 1, "2025-01-01", START, STOP)
+    second.put(snapshot(2), 21, 2, "2025-02-01", START, STOP)
+    first.put(snapshot(3), 21, 3, "2025-03-01", START, STOP)
+
+    assert first.get(21, 1, START, STOP) is None
+    assert sorted(path.stem for path in tmp_path.glob("*.parquet")) == [
+        QatSnapshotCache.make_key(21, 2, START, STOP),
+        QatSnapshotCache.make_key(21, 3, START, STOP),
+    ]
+
+
+def test_orphaned_snapshots_are_removed(tmp_path):
+    orphan = tmp_path / f"{QatSnapshotCache.make_key(21, 4, START, STOP)}.parquet"
+    snapshot(4).write_parquet(orphan)
+
+    cache = QatSnapshotCache(tmp_path)
+    cache.put(snapshot(5), 21, 5, "2025-01-15", START, STOP)
+
+    assert not orphan.exists()
+    assert cache.get(21, 5, START, STOP).equals(snapshot(5))
+
+    cache.clear()
+    assert list(tmp_path.glob("*.parquet")) == []
+
+
+def test_concurrent_processes_do_not_lose_entries(tmp_path):
+    # spawn : polars ne supporte pas fork une fois son pool de threads démarré
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=put_versions, args=(tmp_path, program_id, range(1, 16)))
+        for program_id in range(21, 25)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    cache = QatSnapshotCache(tmp_path)
+    for program_id in range(21, 25):
+        for version_id in range(1, 16):
+            assert cache.get(program_id, version_id, START, STOP) is not None
+    assert len(list(tmp_path.glob("*.parquet"))) == 4 * 15
@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import pytest
+import requests
+from compute_indicators import fetch_pa_from_qat
+from compute_indicators.fetch_pa_from_qat import QatClient, extract_pa
+from qat_stub import (
+    AUTH_PATH,
+    SHIPMENT_DETAILS_PATH,
+    VERSION_ID,
+    VERSION_PATH,
+    StubQat,
+    shipment_ids,
+)
+
+CREDENTIALS = {"username": "user", "password": "secret"}
+PROGRAM_IDS = [21, 22, 23, 24]
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubQat()
+    monkeypatch.setattr(fetch_pa_from_qat, "AUTH_URL", server.url + AUTH_PATH)
+    monkeypatch.setattr(fetch_pa_from_qat, "VERSION_URL", server.url + VERSION_PATH)
+    monkeypatch.setattr(
+        fetch_pa_from_qat, "SHIPMENT_DETAILS_URL", server.url + SHIPMENT_DETAILS_PATH
+    )
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Délais d'attente entre les reprises (enregistrés au lieu d'être observés)."""
+    recorded = []
+    monkeypatch.setattr(fetch_pa_from_qat, "time", SimpleNamespace(sleep=recorded.append))
+    return recorded
+
+
+@pytest.fixture
+def client(stub):
+    client = QatClient(CREDENTIALS, backoff_seconds=2.0)
+    yield client
+    client.close()
+
+
+def extract(client, program_ids=PROGRAM_IDS):
+    return extract_pa(program_ids, CREDENTIALS, "2025-03-01", client=client)
+
+
+def assert_all_shipments(df, program_ids=PROGRAM_IDS):
+    expected = [
+        shipment_id for program_id in program_ids for shipment_id in shipment_ids(program_id)
+    ]
+    assert df["ID de l`envoi QAT"].tolist() == expected
+    assert set(df["version_pa"]) == {VERSION_ID}
+    assert set(df["Notes"]) == {"Livraison partielle, reliquat en juillet"}
+
+
+def test_programmes_are_extracted_in_parallel(client, stub):
+    stub.delay = 0.2
+
+    df = extract(client)
+
+    assert_all_shipments(df)
+    assert stub.max_in_flight > 1
+    assert stub.auth_requests == 1
+
+
+def test_expired_token_is_refreshed_once_for_concurrent_requests(client, stub):
+    extract(client, program_ids=PROGRAM_IDS[:1])
+    stub.expire_token()
+
+    df = extract(client)
+
+    assert_all_shipments(df)
+    assert stub.unauthorized >= 1
+    assert stub.auth_requests == 2
+
+
+def test_transient_errors_are_retried_with_exponential_backoff(client, stub, delays):
+    stub.errors[SHIPMENT_DETAILS_PATH] = 2
+
+    df = extract(client, program_ids=PROGRAM_IDS[:1])
+
+    assert_all_shipments(df, PROGRAM_IDS[:1])
+    assert stub.requests[SHIPMENT_DETAILS_PATH] == 3
+    assert delays == [2.0, 4.0]
+
+
+def test_retry_after_header_extends_the_backoff(client, stub, delays):
+    stub.rate_limited[SHIPMENT_DETAILS_PATH] = 1
+
+    df = extract(client, program_ids=PROGRAM_IDS[:1])
+
+    assert_all_shipments(df, PROGRAM_IDS[:1])
+    assert delays == [stub.retry_after]
+
+
+def test_errors_beyond_max_retries_raise(client, stub, delays):
+    stub.errors[SHIPMENT_DETAILS_PATH] = 10
+
+    with pytest.raises(requests.HTTPError, match="503"):
+        extract(client, program_ids=PROGRAM_IDS[:1])
+
+    assert stub.requests[SHIPMENT_DETAILS_PATH] == client.max_retries + 1
+    assert delays == [2.0, 4.0, 8.0]
@@ -0,0 +1,57 @@
+from compute_indicators.file_utils import _read_pa_csv
+
+COLUMNS = [
+    "ID de produit QAT / Identifiant de produit (prévision)",
+    "Produit (planification) / Produit (prévision)",
+    "ID de l`envoi QAT",
+    "Commande d`urgence",
+    "Commande PGI",
+    "Approvisionnement local",
+    "N° de commande de l`agent d`approvisionnement",
+    "Agent d`approvisionnement",
+    "Source de financement",
+    "Budget",
+    "État",
+    "Quantité",
+    "date de réception",
+    "Coût unitaire de produit (USD)",
+    "Coût du fret (USD)",
+    "Coût total (USD)",
+    "Notes",
+]
+
+
+def csv_line(values):
+    return ",".join(f'"{value}"' for value in values)
+
+
+def shipment(shipment_id, notes):
+    return csv_line(
+        [101, "Produit", shipment_id, "Non", "Non", "Non", 12, "PSM", "GF", "B1", "Planifié"]
+        + [1000, "15-Mar-2025", 1.5, 0.2, 1700, notes]
+    )
+
+
+def test_notes_keep_their_commas(tmp_path):
+    export = tmp_path / "plan.csv"
+    lines = [
+        csv_line(["Détails de l'envoi"]),
+        csv_line(["Version : 12 (Mar 05 2025)"]),
+        "",
+        csv_line(COLUMNS),
+        shipment(5001, "Livraison partielle, reliquat en juillet, à confirmer"),
+        "",
+        # En-tête répété et ligne incomplète
+        csv_line(COLUMNS),
+        shipment(5002, ""),
+        csv_line(["Total", 2000]),
+    ]
+    export.write_text("\r\n".join(lines) + "\r\n")
+
+    df = _read_pa_csv(export)
+
+    assert df.columns == COLUMNS + ["version_pa", "date_extraction_pa"]
+    assert df["ID de l`envoi QAT"].to_list() == [5001, 5002]
+    assert df["Notes"].to_list() == ["Livraison partielle, reliquat en juillet, à confirmer", ""]
+    assert df["Quantité"].to_list() == [1000.0, 1000.0]
+    assert df["version_pa"].to_list() == [12, 12]
@@ -0,0 +1,121 @@
+from collections import Counter
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# Le package importe l'évaluateur de formules (efc) et la recherche des en-têtes (fuzzywuzzy)
+pytest.importorskip("efc")
+pytest.importorskip("fuzzywuzzy")
+
+from generate_stock_tracking_file import (
+    StreamingWorkbookWriter,
+    update_sheet_plan_approv,
+    update_sheet_prevision,
+    update_sheets_etat_mensuel,
+)
+from openpyxl import load_workbook
+
+TEMPLATE_DIR = (
+    Path(__file__).resolve().parents[1]
+    / "generate_stock_tracking_file"
+    / "Template Fichier Suivi de Stock"
+)
+TEMPLATE = TEMPLATE_DIR / "Fichier Suivi de Stock Template.xlsx"
+ETAT_STOCK = TEMPLATE_DIR / "Etat du stock et de distribution PNLP fin Janvier 2025.xlsx"
+DATE_REPORT = "01/02/2025"
+
+
+def make_plan_approv():
+    return pd.DataFrame(
+        {
+            "Standard product code": [1001, 1002, 1003],
+            "Produits": ["Produit A", "Produit B", "Produit C"],
+            "Status": ["Reçu", "Planifié", None],
+            "Quantite": [1200.0, 50.5, 0.0],
+            "Facteur de conversion de QAT vers SAGE": [1, 10, 0.5],
+            "DATE": pd.to_datetime(["2025-01-15", "2025-03-01", "2025-06-30"]),
+            "Couts totaux": [1500.25, None, 12.0],
+            "Acronym": ["GF", "USAID", "ETAT"],
+        }
+    )
+
+
+def make_products():
+    return pd.DataFrame(
+        {
+            "code_produit": [1001, 1002, 1003],
+            "categorie": ["ACT", "TDR", "ACT"],
+            "designation": ["Produit A", "Produit B", "Produit C"],
+        }
+    )
+
+
+def fill_template(wb_template, writer=None):
+    wb_etat_stock = load_workbook(ETAT_STOCK)
+    update_sheets_etat_mensuel(wb_etat_stock, wb_template, "pnlp", DATE_REPORT, writer=writer)
+    update_sheet_plan_approv(wb_template, make_plan_approv(), writer=writer)
+    update_sheet_prevision(wb_template, DATE_REPORT, make_products(), writer=writer)
+
+
+def named_style(wb, name):
+    # Les styles "Copie N" sont numérotés dans l'ordre d'enregistrement, qui n'est pas le même
+    # quand les lignes ne sont lues qu'à la sauvegarde : comparaison sur leur définition
+    style = wb._named_styles[name]
+    return (style.font, style.fill, style.border, style.alignment, style.number_format)
+
+
+def cells(ws):
+    wb = ws.parent
+    # Objets de style du classeur (les StyleProxy des cellules ne se comparent pas entre eux)
+    return {
+        cell.coordinate: (
+            cell.value,
+            named_style(wb, cell.style),
+            wb._fonts[cell._style.fontId],
+            wb._fills[cell._style.fillId],
+            wb._borders[cell._style.borderId],
+            wb._alignments[cell._style.alignmentId],
+            cell.number_format,
+            wb._protections[cell._style.protectionId],
+        )
+        for row in ws.iter_rows()
+        for cell in row
+    }
+
+
+def test_streamed_and_in_memory_generation_give_the_same_workbook(tmp_path):
+    # `StreamingWorkbookWriter` s'appuie sur les writers internes d'openpyxl : le fichier écrit en
+    # flux doit rester identique à celui écrit par openpyxl à partir des feuilles remplies
+    wb_streamed = load_workbook(TEMPLATE)
+    writer = StreamingWorkbookWriter(wb_streamed)
+    fill_template(wb_streamed, writer)
+    writer.save(tmp_path / "streamed.xlsx")
+
+    wb_in_memory = load_workbook(TEMPLATE)
+    fill_template(wb_in_memory)
+    wb_in_memory.save(tmp_path / "in_memory.xlsx")
+
+    streamed = load_workbook(tmp_path / "streamed.xlsx")
+    in_memory = load_workbook(tmp_path / "in_memory.xlsx")
+
+    assert streamed.sheetnames == in_memory.sheetnames
+    assert Counter(named_style(streamed, name) for name in streamed.named_styles) == Counter(
+        named_style(in_memory, name) for name in in_memory.named_styles
+    )
+    for ws_streamed, ws_in_memory in zip(streamed, in_memory):
+        assert cells(ws_streamed) == cells(ws_in_memory), ws_streamed.title
+        assert set(map(str, ws_streamed.merged_cells.ranges)) == set(
+            map(str, ws_in_memory.merged_cells.ranges)
+        ), ws_streamed.title
+        assert [str(cf.sqref) for cf in ws_streamed.conditional_formatting] == [
+            str(cf.sqref) for cf in ws_in_memory.conditional_formatting
+        ], ws_streamed.title
+
+    # Les lignes de données ont bien été écrites
+    plan_approv = streamed["Plan d'appro"]
+    assert [plan_approv.cell(row, 1).value for row in (2, 3, 4)] == [1001, 1002, 1003]
+    assert plan_approv["J2"].value == "=I2*H2"
+    assert plan_approv["K2"].number_format == "DD/MM/YYYY"
+    assert streamed["Prévision"]["E10"].value == 1003
+    assert streamed["Distribution X3"].max_row > 2
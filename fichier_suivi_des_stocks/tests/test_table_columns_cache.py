@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+from database_operations import stock_sync_manager
+
+
+@pytest.fixture
+def information_schema(monkeypatch):
+    """information_schema simulé : colonnes par table et nombre de lectures."""
+    tables, reads = {}, []
+
+    def read_sql(query, engine):
+        table_name = next(name for name in ("stock", "nouvelle") if f"'{name}'" in query)
+        reads.append(table_name)
+        return pd.DataFrame(tables.get(table_name, []), columns=["column_name", "data_type"])
+
+    monkeypatch.setattr(stock_sync_manager.pd, "read_sql", read_sql)
+    monkeypatch.setattr(stock_sync_manager.connection_manager, "get_engine", lambda: None)
+    stock_sync_manager.clear_table_columns_cache()
+    yield tables, reads
+    stock_sync_manager.clear_table_columns_cache()
+
+
+def test_table_columns_are_read_once(information_schema):
+    tables, reads = information_schema
+    tables["stock"] = [("code", "text"), ("quantite", "integer")]
+
+    for _ in range(3):
+        assert stock_sync_manager.get_table_columns("stock") == (
+            ("code", "text"),
+            ("quantite", "integer"),
+        )
+    assert reads == ["stock"]
+
+    stock_sync_manager.clear_table_columns_cache()
+    stock_sync_manager.get_table_columns("stock")
+    assert reads == ["stock", "stock"]
+
+
+def test_missing_table_is_read_again_once_created(information_schema):
+    tables, reads = information_schema
+
+    assert stock_sync_manager.get_table_columns("nouvelle") == ()
+    tables["nouvelle"] = [("code", "text")]
+
+    assert stock_sync_manager.get_table_columns("nouvelle") == (("code", "text"),)
+    assert stock_sync_manager.get_table_columns("nouvelle") == (("code", "text"),)
+    assert reads == ["nouvelle", "nouvelle"]
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+# L'évaluateur de formules du snapshot s'appuie sur efc
+pytest.importorskip("efc")
+
+from openpyxl import Workbook
+from refresh_stock_tracking_file import WorkbookSnapshot
+from refresh_stock_tracking_file.extract_data_from_sheet import formula_evaluator
+
+
+def make_workbook():
+    wb = Workbook()
+    stock = wb.active
+    stock.title = "Stock detaille"
+    stock.append(["Titre du rapport"])
+    stock.append(["Code", "Lot", "Quantite", "Date limite", "Double", "Erreur", None, "Note"])
+    for i in range(1, 6):
+        row = i + 2
+        stock.append(
+            [i, f"L{i}", i * 1.5, datetime(2026, i, 1), f"=C{row}*2", f"=C{row}/0", None, None]
+        )
+    stock["H4"] = "à vérifier"
+
+    ppi = wb.create_sheet("PPI")
+    ppi.append(["Code", "Valeur"])
+    ppi.append([1, None])
+    ppi.append([2, 3])
+    return wb
+
+
+def test_sheets_without_formulas_are_read_like_pandas(tmp_path):
+    wb = make_workbook()
+    wb.save(tmp_path / "suivi.xlsx")
+    snapshot = WorkbookSnapshot(tmp_path / "suivi.xlsx", wb)
+
+    pd.testing.assert_frame_equal(
+        snapshot.read_sheet("PPI"), pd.read_excel(tmp_path / "suivi.xlsx", sheet_name="PPI")
+    )
+    options = {"sheet_name": "Stock detaille", "skiprows": 1, "usecols": "A:D"}
+    pd.testing.assert_frame_equal(
+        snapshot.read_sheet(**options), pd.read_excel(tmp_path / "suivi.xlsx", **options)
+    )
+
+
+def test_formula_cells_hold_the_evaluated_values(tmp_path):
+    wb = make_workbook()
+    wb.save(tmp_path / "suivi.xlsx")
+    snapshot = WorkbookSnapshot(tmp_path / "suivi.xlsx", wb)
+
+    df = snapshot.read_sheet("Stock detaille", skiprows=1)
+
+    # Fichier écrit par openpyxl : pandas n'y trouve aucune valeur calculée
+    assert pd.read_excel(tmp_path / "suivi.xlsx", skiprows=1)["Double"].isna().all()
+    assert df["Double"].tolist() == [3, 6, 9, 12, 15]
+    assert df["Erreur"].isna().all()
+    assert df["Note"].isna().tolist() == [True, False, True, True, True]
+    # Les lectures suivantes sont des copies du même DataFrame
+    df.loc[0, "Code"] = 100
+    assert snapshot.read_sheet("Stock detaille", skiprows=1)["Code"].iloc[0] == 1
+
+    assert formula_evaluator(wb, snapshot) is snapshot.evaluator
+    snapshot.close()
+    assert snapshot.read_sheet("Stock detaille", skiprows=1)["Double"].iloc[0] == 3
@@ -4,7 +4,7 @@ from pathlib import Path
 import pandas as pd
 import papermill as pm
 import requests
-from openhexa.sdk import current_run, pipeline, workspace
+from openhexa.sdk import current_run, parameter, pipeline, workspace
 
 
 # ============================================================================
@@ -100,7 +100,15 @@ def get_prod_traceurs_file(month_report, report_year):
 # Pipeline principal
 # ============================================================================
 @pipeline("feedback-report-pipelines")
-def feedback_report_pipelines():
+@parameter(
+    "force_refresh",
+    name="Forcer la ré-extraction des données eSIGL",
+    type=bool,
+    default=False,
+    required=False,
+    help="Ignore le cache local des extractions Metabase et ré-extrait les données du mois",
+)
+def feedback_report_pipelines(force_refresh=False):
     """
     Pipeline autonome de génération du rapport Feedback.
 
@@ -109,6 +117,9 @@ def feedback_report_pipelines():
         - retrouve automatiquement les fichiers nécessaires ;
         - exécute le notebook principal ;
         - rafraîchit le rapport Power BI.
+
+    Les extractions eSIGL sont mises en cache par mois : une ré-exécution du même mois réutilise
+    les données déjà extraites, sauf si `force_refresh` est activé.
     """
 
     # Détermination automatique du mois et de l'année
@@ -134,6 +145,7 @@ def feedback_report_pipelines():
         month_report,
         fp_site_attendus,
         fp_prod_traceurs,
+        force_refresh,
     )
 
 
@@ -145,6 +157,7 @@ def run_notebook(
     month_report,
     fp_site_attendus,
     fp_prod_traceurs,
+    force_refresh=False,
 ):
     """
     Exécute le notebook principal avec Papermill.
@@ -165,6 +178,7 @@ def run_notebook(
             "month_report": month_report,
             "fp_site_attendus": fp_site_attendus,
             "fp_prod_traceurs": fp_prod_traceurs,
+            "force_refresh": force_refresh,
         },
     )
 
@@ -1,11 +1,23 @@
 """Template for newly generated pipelines."""
 
+import os
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 
 import papermill as pm
 import requests
 from openhexa.sdk import File, current_run, parameter, pipeline, workspace
+from papermill.exceptions import PapermillException
+
+PROGRAMMES = ["PNLP", "PNLS", "PNLT", "PNN", "PNSME"]
+ALL_PROGRAMMES = "Tous"
+
+# Dossier du code (notebooks et bibliothèques) dans les fichiers du workspace
+CODE_PATH = "Fichier Suivi de Stock/code/pipelines"
 
 
 @pipeline("stock-file-tracking-integration")
@@ -39,26 +51,30 @@ from openhexa.sdk import File, current_run, parameter, pipeline, workspace
     help="Année de conception du Fichier Suivi des Stocks",
 )
 @parameter(
-    "programme",
-    name="Programme",
+    "programmes",
+    name="Programmes",
     type=str,
+    multiple=True,
     required=True,
-    help="Programme pour lequel on concoit le rapport",
-    choices=["PNLP", "PNLS", "PNLT", "PNN", "PNSME"],
+    help="Programmes pour lesquels on concoit le rapport (`Tous` pour l'ensemble des programmes). "
+    "Les programmes sont traités en parallèle.",
+    choices=[*PROGRAMMES, ALL_PROGRAMMES],
 )
 @parameter(
     "fp_etat_mensuel",
     name="Fichier etat du stock et de distribution",
     type=File,  # type: ignore
-    required=True,
-    help="Ce fichier doit être chargé dans le dossier `Fichier Suivi de Stock/data/<programme>/Etat de Stock Mensuel`",
+    required=False,
+    help="Ce fichier doit être chargé dans le dossier `Fichier Suivi de Stock/data/<programme>/Etat de Stock Mensuel`. "
+    "S'il n'est pas fourni (ou pour les autres programmes), le fichier du mois est recherché dans ce dossier.",
 )
 @parameter(
     "fp_plan_approv",
     name="Fichier du plan d'appro",
     type=str,
     required=False,
-    help="Fichier ou dossier doit être chargé dans le dossier `Fichier Suivi de Stock/data/<programme>/Plan d'Approvisionnement`",
+    help="Fichier ou dossier doit être chargé dans le dossier `Fichier Suivi de Stock/data/<programme>/Plan d'Approvisionnement`. "
+    "Uniquement pour un seul programme : sinon, les plans sont extraits de QAT.",
 )
 @parameter(
     "fp_map_prod",
@@ -86,72 +102,275 @@ from openhexa.sdk import File, current_run, parameter, pipeline, workspace
     help="Si coché, le choix de consommations des mois sont sélectionnées automatiquement. "
     "Si décoché, les valeurs du mois précédent sont utilisées.",
 )
+@parameter(
+    "qat_offline",
+    name="Plan QAT depuis le cache (hors ligne)",
+    type=bool,
+    required=False,
+    default=False,
+    help="Si coché, les plans d'approvisionnement QAT sont lus dans le cache local (version en vigueur "
+    "à la fin du mois du rapport) sans appel à l'API QAT, pour reproduire un mois passé.",
+)
 def stock_file_tracking_integration(
     month_report,
     year_report,
-    programme,
+    programmes,
     fp_etat_mensuel,
     fp_plan_approv,
     fp_map_prod,
     auto_computed_dmm,
     auto_computed_cmm,
+    qat_offline,
 ):
     """Write your pipeline orchestration here.
 
     Pipeline functions should only call tasks and should never perform IO operations or expensive computations.
     """
-    run_notebook(
+    programmes = get_programmes(programmes)
+    check_plan_approv(programmes, fp_plan_approv)
+    fp_etat_mensuel = get_etat_mensuel_files(
+        programmes, month_report, year_report, fp_etat_mensuel.path if fp_etat_mensuel else None
+    )
+
+    shared_inputs_dir = prepare_shared_inputs(
+        month_report,
+        year_report,
+        programmes,
+        fp_map_prod.path,
+        qat_offline,
+    )
+    run_notebooks(
         month_report,
         year_report,
-        programme,
-        fp_etat_mensuel.path,
+        fp_etat_mensuel,
         fp_plan_approv or "",
         fp_map_prod.path,
         auto_computed_dmm,
         auto_computed_cmm,
+        shared_inputs_dir,
+        qat_offline,
     )
 
 
+def get_programmes(programmes: list) -> list:
+    """Liste des programmes à traiter (`Tous` désignant l'ensemble des programmes)"""
+    if ALL_PROGRAMMES in programmes:
+        return PROGRAMMES.copy()
+    return [programme for programme in PROGRAMMES if programme in programmes]
+
+
+def check_plan_approv(programmes: list, fp_plan_approv: str | None):
+    """
+    Le fichier du plan d'appro fourni en paramètre est propre à un programme : il n'est accepté que
+    pour un programme unique (les plans des autres programmes étant tirés de QAT)
+    """
+    if fp_plan_approv and len(programmes) > 1:
+        raise ValueError(
+            "Le fichier du plan d'appro ne peut être fourni que pour un seul programme "
+            f"({len(programmes)} sélectionnés : {', '.join(programmes)}). Laissez ce paramètre vide "
+            "pour utiliser les plans d'approvisionnement QAT de chaque programme."
+        )
+
+
 @stock_file_tracking_integration.task
-def run_notebook(
+def get_etat_mensuel_files(programmes, month_report, year_report, fp_etat_mensuel=None) -> dict:
+    """
+    Associe à chaque programme son fichier etat du stock et de distribution
+
+    Le fichier fourni en paramètre est utilisé pour un programme unique, ou pour le programme dont il
+    occupe le dossier. Pour les autres programmes, le fichier du mois (nom contenant le mois et l'année
+    du rapport) est recherché dans `Fichier Suivi de Stock/data/<programme>/Etat de Stock Mensuel`.
+    """
+    if fp_etat_mensuel and len(programmes) == 1:
+        return {programmes[0]: fp_etat_mensuel}
+
+    files = {}
+    for programme in programmes:
+        if fp_etat_mensuel and programme in Path(fp_etat_mensuel).parts:
+            files[programme] = fp_etat_mensuel
+            continue
+
+        folder = (
+            Path(workspace.files_path)
+            / f"Fichier Suivi de Stock/data/{programme}/Etat de Stock Mensuel"
+        )
+        candidates = [
+            fp
+            for fp in (folder.glob("*.xls*") if folder.exists() else [])
+            if normalize_name(month_report) in normalize_name(fp.name)
+            and str(year_report) in fp.name
+        ]
+        if not candidates:
+            raise FileNotFoundError(
+                f"Aucun fichier etat du stock et de distribution de {month_report} {year_report} "
+                f"n'a été trouvé dans le dossier `{folder}`"
+            )
+
+        files[programme] = max(candidates, key=lambda fp: fp.stat().st_mtime).as_posix()
+        current_run.log_info(
+            f"Fichier etat du stock et de distribution {programme} : {Path(files[programme]).name}"
+        )
+    return files
+
+
+def normalize_name(name: str) -> str:
+    """Nom en minuscules et en forme Unicode composée (les noms de fichiers peuvent être décomposés)"""
+    return unicodedata.normalize("NFC", name).lower()
+
+
+@stock_file_tracking_integration.task
+def prepare_shared_inputs(month_report, year_report, programmes, fp_map_prod, qat_offline=False):
+    """
+    Prépare une seule fois les entrées communes aux programmes d'une exécution par lot (fichier de
+    mapping, plans d'approvisionnement QAT, état de stock des structures périphériques)
+    """
+    if len(programmes) == 1:
+        return ""
+
+    sys.path.insert(0, (Path(workspace.files_path) / CODE_PATH).as_posix())
+    from compute_indicators import shared_inputs, utils
+
+    date_report = utils.format_date(month_report, year_report)
+    shared_inputs_dir = (
+        Path(workspace.files_path)
+        / f"{CODE_PATH}/output_notebook_execution/maj fichier suivi stock/entrees partagees/{date_report}"
+    )
+
+    current_run.log_info(f"Préparation des entrées communes aux programmes {', '.join(programmes)}")
+    timings = shared_inputs.prepare_shared_inputs(
+        shared_inputs_dir.as_posix(),
+        programmes,
+        date_report,
+        (Path(workspace.files_path) / Path(fp_map_prod)).as_posix(),
+        qat_offline=qat_offline,
+    )
+    current_run.log_info(
+        "Entrées communes préparées : "
+        + ", ".join(f"{name} en {seconds} s" for name, seconds in timings.items())
+    )
+    return shared_inputs_dir.as_posix()
+
+
+@stock_file_tracking_integration.task
+def run_notebooks(
     month_report,
     year_report,
-    programme,
     fp_etat_mensuel,
     fp_plan_approv,
     fp_map_prod,
     auto_computed_dmm,
     auto_computed_cmm,
+    shared_inputs_dir,
+    qat_offline=False,
 ):
-    """Put some data processing code here."""
+    """
+    Exécute le notebook de chaque programme, les programmes étant répartis sur un pool de processus
+    (autant de processus que de coeurs disponibles)
+    """
     current_run.log_info("Run jupyter notebook Main Program Fichier Suivi des Stocks Integration")
-    timestamp = datetime.now().strftime("%Y-%m-%d")
-    input_path = (
-        Path(workspace.files_path)
-        / "Fichier Suivi de Stock/code/pipelines/mise a jour fichier suivi stock.ipynb"
+
+    max_workers = min(len(fp_etat_mensuel), os.cpu_count() or 1)
+    current_run.log_info(
+        f"{len(fp_etat_mensuel)} programme(s) à traiter, {max_workers} en parallèle"
     )
+
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                run_notebook,
+                month_report,
+                year_report,
+                programme,
+                fp,
+                fp_plan_approv,
+                fp_map_prod,
+                auto_computed_dmm,
+                auto_computed_cmm,
+                shared_inputs_dir,
+                qat_offline,
+            )
+            for programme, fp in fp_etat_mensuel.items()
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result["error"] is None:
+                current_run.log_info(
+                    f"✅ {result['programme']} : exécution réussie en {result['seconds']} s"
+                )
+            else:
+                current_run.log_error(
+                    f"❌ {result['programme']} : échec après {result['seconds']} s "
+                    f"(notebook : {result['output_path']}) - {result['error']}"
+                )
+
+    failed = [result["programme"] for result in results if result["error"] is not None]
+    if len(failed) < len(results):
+        refresh_pbi_report()
+
+    if failed:
+        raise RuntimeError(f"Echec de l'exécution pour le(s) programme(s) : {', '.join(failed)}")
+
+    current_run.log_info("Exécution terminée avec succès !")
+
+
+def run_notebook(
+    month_report,
+    year_report,
+    programme,
+    fp_etat_mensuel,
+    fp_plan_approv,
+    fp_map_prod,
+    auto_computed_dmm,
+    auto_computed_cmm,
+    shared_inputs_dir="",
+    qat_offline=False,
+) -> dict:
+    """
+    Exécute le notebook d'un programme (dans un processus du pool)
+
+    Returns:
+        dict: Programme, durée d'exécution (en secondes), notebook produit et erreur éventuelle
+    """
+    start = time.perf_counter()
+    timestamp = datetime.now().strftime("%Y-%m-%d")
+    input_path = Path(workspace.files_path) / f"{CODE_PATH}/mise a jour fichier suivi stock.ipynb"
     output_path = (
         Path(workspace.files_path)
-        / f"Fichier Suivi de Stock/code/pipelines/output_notebook_execution/maj fichier suivi stock/{programme}"
+        / f"{CODE_PATH}/output_notebook_execution/maj fichier suivi stock/{programme}"
     )
     output_path.mkdir(parents=True, exist_ok=True)
     output_path = output_path / f"output_{timestamp}.ipynb"
-    pm.execute_notebook(
-        input_path=input_path.as_posix(),
-        output_path=output_path.as_posix(),
-        parameters={
-            "month_report": month_report,
-            "year_report": year_report,
-            "programme": programme,
-            "fp_etat_mensuel": fp_etat_mensuel,
-            "fp_plan_approv": fp_plan_approv,
-            "fp_map_prod": fp_map_prod,
-            "auto_computed_dmm": auto_computed_dmm,
-            "auto_computed_cmm": auto_computed_cmm,
-        },
-    )
-    refresh_pbi_report()
-    current_run.log_info("Exécution terminée avec succès !")
+
+    error = None
+    try:
+        pm.execute_notebook(
+            input_path=input_path.as_posix(),
+            output_path=output_path.as_posix(),
+            parameters={
+                "month_report": month_report,
+                "year_report": year_report,
+                "programme": programme,
+                "fp_etat_mensuel": fp_etat_mensuel,
+                "fp_plan_approv": fp_plan_approv,
+                "fp_map_prod": fp_map_prod,
+                "auto_computed_dmm": auto_computed_dmm,
+                "auto_computed_cmm": auto_computed_cmm,
+                "shared_inputs_dir": shared_inputs_dir,
+                "qat_offline": qat_offline,
+            },
+        )
+    except (PapermillException, OSError, RuntimeError, ValueError) as e:
+        # Dernière ligne du message (le détail est dans le notebook produit)
+        error = (str(e).strip().splitlines() or [repr(e)])[-1]
+
+    return {
+        "programme": programme,
+        "seconds": round(time.perf_counter() - start, 1),
+        "output_path": output_path.as_posix(),
+        "error": error,
+    }
 
 
 def refresh_pbi_report(
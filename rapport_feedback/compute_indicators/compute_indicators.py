@@ -90,25 +90,28 @@ def convert_reporting_period_to_cutoff_date(period_name: str, facility: str):
     return datetime.strptime(str(mois) + "/" + str(7) + "/" + str(annee), "%m/%d/%Y")
 
 
-def count_valid_submissions_by_criteria(extract_transmission, element_col, code, program, column_type_table, value_type_table):
-    """Compte les soumissions valides selon des critères."""
-    if element_col == "NA":
-        return "NA"
-    if "PNLT" in program:
-        if extract_transmission.loc[extract_transmission.program == program].shape[0] == 0:
-            return "NA"
-        else:
-            return extract_transmission.loc[
-                (extract_transmission.code == code)
-                & (extract_transmission.program == program)
-                & (extract_transmission[column_type_table] == value_type_table)
-            ].shape[0]
+def index_valid_submissions(extract_transmission, column_type_table, value_type_table) -> pd.Series:
+    """
+    Pré-calcule le nombre de soumissions valides par couple (code, programme).
+
+    Le résultat est indexé sur (code, program) et permet de retrouver en une seule recherche le nombre
+    de rapports transmis (ou transmis à temps) par un site pour un programme.
+    """
+    valid = extract_transmission.loc[
+        extract_transmission[column_type_table] == value_type_table, ["code", "program"]
+    ]
+    return valid.groupby(["code", "program"]).size()
 
-    return extract_transmission.loc[
-        (extract_transmission.code == code)
-        & (extract_transmission.program == program)
-        & (extract_transmission[column_type_table] == value_type_table)
-    ].shape[0]
+
+def lookup_valid_submissions(submissions_index: pd.Series, codes: pd.Series, program: str) -> np.ndarray:
+    """Retourne le nombre de soumissions valides de chaque code pour un programme (0 si absent)."""
+    keys = pd.MultiIndex.from_arrays([codes, np.repeat(program, len(codes))], names=["code", "program"])
+    return submissions_index.reindex(keys, fill_value=0).to_numpy()
+
+
+def _program_values(df: pd.DataFrame, cols: list) -> pd.DataFrame:
+    """Convertit les colonnes programmes en valeurs numériques, les sites non attendus ("NA") devenant NaN."""
+    return df[cols].mask(df[cols].eq("NA")).astype("float64")
 
 
 def calculate_completeness_promptness_metrics(
@@ -145,20 +148,24 @@ def calculate_completeness_promptness_metrics(
         "TBLAB": "PNLT/SENSIBLE MEDICAMENTS ET INTRANTS",
     }
 
+    submissions_index = index_valid_submissions(extract_transmission, column_type_table, value_type_table)
+    programs_extracted = set(extract_transmission["program"].unique())
+
     for column, program in dico_cols.items():
-        try:
-            df[column] = df[[column, "Code"]].apply(
-                lambda x: count_valid_submissions_by_criteria(
-                    extract_transmission, x[0], x["Code"], program, column_type_table, value_type_table
-                ),
-                axis=1,
-            )
-        except KeyError:
+        if column not in df.columns:
             columns_to_process.pop(column)
             if column in ("TBS", "TBMR", "TBLAB"):
                 dico_cols_pnlt.pop(column)
             continue
 
+        not_expected = df[column].eq("NA").to_numpy()
+        if "PNLT" in program and program not in programs_extracted:
+            not_expected = np.ones(len(df), dtype=bool)
+
+        counts = lookup_valid_submissions(submissions_index, df["Code"], program).astype(object)
+        counts[not_expected] = "NA"
+        df[column] = pd.Series(counts, index=df.index).infer_objects()
+
     df = df[["Code", "Site", "Region"] + list(columns_to_process)]
 
     # --> Calcul des colonnes aditionnelles
@@ -175,107 +182,38 @@ def calculate_completeness_promptness_metrics(
     # if "PNSME-GRAT" in df.columns:
     #     columns_to_process.pop("PNSME")
 
+    cols_programmes = [col for col in dico_cols if col in df.columns]
+    valeurs = _program_values(df, cols_programmes)
+    attendus = valeurs.notna()
+    # Nombre de sites attendus par région et par programme
+    attendus_region = attendus.groupby(df["Region"]).transform("sum")
+
     for column, new_column in columns_to_process.items():
-        try:
-            df_group = df[df[column] != "NA"].groupby(["Region"])["Code"].count().reset_index()
-
-            df[new_column] = df.apply(
-                lambda x: 0
-                if x[column] == "NA" or x[column] == 0
-                else (x[column] / df_group.loc[df_group.Region == x["Region"], "Code"].iloc[0])
-                if not df_group.loc[df_group.Region == x["Region"], "Code"].empty
-                else 0,
-                axis=1,
-            )
-            del df_group
-        except KeyError:
+        if column not in df.columns:
             continue
-
-    # if "PNSME" not in list(columns_to_process):
-    #     df_melt = pd.melt(
-    #         df.drop(columns="Code"),
-    #         id_vars="Region",
-    #         value_vars=["PNSME", "PNSME-GRAT"],
-    #         value_name="Code",
-    #     )
-    #     df_group = (
-    #         df_melt.loc[df_melt.Code.ne("NA"), ["Region", "Code"]]
-    #         .groupby("Region")["Code"]
-    #         .count()
-    #         .reset_index()
-    #     )
-    #     df["Taux par Région PNSME"] = df.apply(
-    #         lambda x: sum([e for e in (x["PNSME"], x["PNSME-GRAT"]) if e != "NA"])
-    #         / df_group.loc[df_group.Region == x["Region"], "Code"].iloc[0]
-    #         if not df_group.loc[df_group.Region == x["Region"], "Code"].empty
-    #         else 0,
-    #         axis=1,
-    #     )
-    #     del df_melt, df_group
+        df[new_column] = (valeurs[column] / attendus_region[column]).where(
+            valeurs[column].fillna(0).ne(0), 0
+        )
 
     # Le taux par Région PNLT à changer dans la nouvelle version de Mars 2024
     if "PNLT" not in df.columns:
         cols_pnlt = list(dico_cols_pnlt)
-        df_melt = pd.melt(
-            df.drop(columns="Code"), id_vars="Region", value_vars=cols_pnlt, value_name="Code"
-        )
-        df_group = (
-            df_melt.loc[df_melt.Code.ne("NA"), ["Region", "Code"]]
-            .groupby("Region")["Code"]
-            .count()
-            .reset_index()
-        )
-        df["Taux par Région PNLT"] = df.apply(
-            lambda x: sum([x[e] for e in cols_pnlt if x[e] != "NA"])
-            / df_group.loc[df_group.Region == x["Region"], "Code"].iloc[0]
-            if not df_group.loc[df_group.Region == x["Region"], "Code"].empty
-            else 0,
-            axis=1,
-        )
-        del df_melt, df_group
+        attendus_pnlt = attendus_region[cols_pnlt].sum(axis=1)
+        df["Taux par Région PNLT"] = (
+            valeurs[cols_pnlt].sum(axis=1) / attendus_pnlt.where(attendus_pnlt.ne(0))
+        ).fillna(0)
+
     # --> Taux par Région PNLS
-    df_melt = pd.melt(
-        df,
-        id_vars=["Region"],
-        value_vars=["ARV", "TRC", "LAB", "CHARGE VIRALE"],
-        value_name="value",
+    cols_pnls = ["ARV", "TRC", "LAB", "CHARGE VIRALE"]
+    attendus_pnls_region = attendus_region[cols_pnls].sum(axis=1)
+    df["Taux par Région PNLS"] = valeurs[cols_pnls].eq(1).sum(axis=1) / attendus_pnls_region.where(
+        attendus_pnls_region.ne(0)
     )
 
-    df_melt = df_melt.groupby("Region")["value"].value_counts().reset_index()
+    df["PNLS recu"] = valeurs[cols_pnls].sum(axis=1).astype("int64")
 
-    df["Taux par Région PNLS"] = df[["Region", "ARV", "TRC", "LAB", "CHARGE VIRALE"]].apply(
-        lambda x: len(
-            [
-                element
-                for element in [x["ARV"], x["TRC"], x["LAB"], x["CHARGE VIRALE"]]
-                if element == 1
-            ]
-        )
-        / df_melt[(df_melt.Region == x["Region"]) & (df_melt.value != "NA")]["count"].sum(),
-        axis=1,
-    )
-
-    df["PNLS recu"] = df[["ARV", "TRC", "LAB", "CHARGE VIRALE"]].apply(
-        lambda x: sum(
-            [
-                element
-                for element in [x["ARV"], x["TRC"], x["LAB"], x["CHARGE VIRALE"]]
-                if element != "NA"
-            ]
-        ),
-        axis=1,
-    )
+    df["PNLS attendu"] = attendus[cols_pnls].sum(axis=1)
 
-    df["PNLS attendu"] = df[["ARV", "TRC", "LAB", "CHARGE VIRALE"]].apply(
-        lambda x: len(
-            [
-                element
-                for element in [x["ARV"], x["TRC"], x["LAB"], x["CHARGE VIRALE"]]
-                if element != "NA"
-            ]
-        ),
-        axis=1,
-    )
     cols = [
         col
         for col in [
@@ -294,14 +232,42 @@ def calculate_completeness_promptness_metrics(
         ]
         if col in df.columns
     ]
-    df["Attendu"] = df[cols].apply(
-        lambda row: len([element for element in row if element != "NA"]), axis=1
+    df["Attendu"] = attendus[cols].sum(axis=1)
+
+    df["Recu"] = valeurs[cols].eq(1).sum(axis=1)
+    return df
+
+
+def compute_submission_promptness(extract_transmission: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ajoute à chaque rapport sa date limite de soumission ("Date limite") et sa promptitude ("Promptitude") :
+    1 si le rapport est transmis et autorisé au plus tard à la date limite, 0 sinon.
+    """
+    # La date limite ne dépend que de la période et du type de structure (district sanitaire ou non) :
+    # elle est calculée une seule fois par combinaison puis reportée sur chaque ligne
+    cutoff_keys = pd.DataFrame(
+        {
+            "period": extract_transmission["period"].to_numpy(),
+            "facility": np.where(
+                extract_transmission["facility"].str.upper().str.contains("DISTRICT SANITAIRE", regex=False),
+                "DISTRICT SANITAIRE",
+                "",
+            ),
+        }
     )
+    cutoff_dates = cutoff_keys.drop_duplicates()
+    cutoff_dates["Date limite"] = [
+        convert_reporting_period_to_cutoff_date(period, facility)
+        for period, facility in zip(cutoff_dates["period"], cutoff_dates["facility"])
+    ]
+    date_limite = cutoff_keys.merge(
+        cutoff_dates, on=["period", "facility"], how="left"
+    )["Date limite"].to_numpy()
 
-    df["Recu"] = df[cols].apply(
-        lambda row: len([element for element in row if element == 1]), axis=1
+    promptitude = (date_limite >= extract_transmission["date_autorisation"]) & (
+        extract_transmission["Transmis"] == "OUI"
     )
-    return df
+    return extract_transmission.assign(**{"Date limite": date_limite, "Promptitude": promptitude.astype(int)})
 
 
 def compute_indicators_completeness_and_promptness(
@@ -379,13 +345,7 @@ def compute_indicators_completeness_and_promptness(
         lambda x: "OUI" if x != "" and x != "NON" else x
     )
 
-    extract_transmission["Date limite"] = extract_transmission[["facility", "period"]].apply(
-        lambda x: convert_reporting_period_to_cutoff_date(x[1], x[0]), axis=1
-    )
-
-    extract_transmission["Promptitude"] = extract_transmission[
-        ["Transmis", "Date limite", "date_autorisation"]
-    ].apply(lambda x: 1 if x[1] >= x[2] and x[0] == "OUI" else 0, axis=1)
+    extract_transmission = compute_submission_promptness(extract_transmission)
 
     detail_completness = calculate_completeness_promptness_metrics(extract_transmission, expected_site)
     detail_completness["Indicateur type"] = "Completude"
@@ -597,6 +557,173 @@ def compute_indicators_completeness_and_promptness(
 
     return df_ets, df_region
 
+def _to_float_array(series: pd.Series) -> np.ndarray:
+    """Convertit une colonne numérique (éventuellement nullable) en tableau float64 avec NaN."""
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def compute_stock_status_columns(df_etat_stock: pd.DataFrame, nombre_de_jours: int) -> pd.DataFrame:
+    """
+    Calcule de façon vectorisée les colonnes de gestion de stock par ligne de l'extraction eSIGL.
+
+    Les règles (CMM gestionnaire, MSD, ETAT DU STOCK et quantités à commander ou à transférer)
+    sont exprimées sous forme de masques évalués dans l'ordre avec `np.select`, la première
+    condition vérifiée l'emportant, à l'image des anciennes cascades `if/elif` appliquées ligne par ligne.
+
+    Args:
+        df_etat_stock (pd.DataFrame): Extraction de l'état de stock contenant au minimum les colonnes
+            `periode`, `abrv_programme`, `quantite_commandee`, `cmm`, `sdu` et `nbrejrsrupture`.
+        nombre_de_jours (int): Nombre de jours du mois de rapportage.
+
+    Returns:
+        pd.DataFrame: Le DataFrame enrichi des colonnes `CMM gestionnaire`, `MSD`, `ETAT DU STOCK`,
+        `BESOIN CMMMANDE URGENTE`, `BESOIN TRANSFERT IN` et `QUANTITE A TRANSFERER OUT`.
+    """
+    is_pnlt = df_etat_stock["abrv_programme"].eq("PNLT").to_numpy(dtype=bool, na_value=False)
+    periode_manquante = df_etat_stock["periode"].isna().to_numpy()
+    qte_commandee = _to_float_array(df_etat_stock["quantite_commandee"])
+    cmm = _to_float_array(df_etat_stock["cmm"])
+    sdu = _to_float_array(df_etat_stock["sdu"])
+    jours_rupture = _to_float_array(df_etat_stock["nbrejrsrupture"])
+
+    # --> CMM gestionnaire
+    cmm_gest = np.select(
+        [periode_manquante, np.isnan(qte_commandee), is_pnlt & (qte_commandee > 0), qte_commandee > 0],
+        [np.nan, cmm, (qte_commandee + sdu) / 6, (qte_commandee + sdu) / 4],
+        default=cmm,
+    )
+
+    # --> MSD
+    with np.errstate(divide="ignore", invalid="ignore"):
+        msd = np.where((cmm_gest == 0) | np.isnan(cmm_gest), np.nan, sdu / cmm_gest)
+
+    # --> Statut du stock : seuils PNLT (PCU 1.5, MIN 3, MAX 6) et autres programmes (PCU 1, MIN 2, MAX 4)
+    rupture_sdu_nul = (sdu == 0) & (cmm_gest > 0)
+    statut_pnlt = np.select(
+        [
+            (msd > 0) & (msd <= 1.5),
+            (msd > 1.5) & (msd < 3),
+            (msd >= 3) & (msd <= 6),
+            msd > 6,
+            rupture_sdu_nul,
+        ],
+        ["EN BAS DU PCU", "ENTRE PCU et MIN", "BIEN STOCKE", "SURSTOCK", "RUPTURE"],
+        default="NA",
+    )
+    statut_autres = np.select(
+        [
+            msd > 4,
+            (msd >= 2) & (msd <= 4),
+            (msd > 1) & (msd < 2),
+            (msd > 0) & (msd <= 1),
+            rupture_sdu_nul,
+        ],
+        ["SURSTOCK", "BIEN STOCKE", "ENTRE PCU et MIN", "EN BAS DU PCU", "RUPTURE"],
+        default="NA",
+    )
+    statut = np.select(
+        [
+            np.isnan(cmm_gest) & np.isnan(sdu),
+            (jours_rupture >= nombre_de_jours) | (sdu == 0),  # new_update dans le calcul de l'etat de stock
+            (sdu > 0) & (cmm_gest == 0),
+            is_pnlt,
+        ],
+        ["NA", "RUPTURE", "STOCK DORMANT", statut_pnlt],
+        default=statut_autres,
+    )
+
+    # --> Quantités à commander ou à transférer
+    besoin = (statut == "EN BAS DU PCU") | (sdu == 0)
+    besoin_urgent = np.select(
+        [is_pnlt & besoin, besoin], [6 * cmm_gest - sdu, 4 * cmm_gest - sdu], default=np.nan
+    )
+    # Pour le PNLT, toutes les lignes reçoivent un besoin de transfert IN (le statut, toujours renseigné,
+    # était évalué comme condition vraie dans l'ancienne règle)
+    besoin_transfert_in = np.select(
+        [is_pnlt, besoin], [3 * cmm_gest - sdu, cmm_gest - sdu], default=np.nan
+    )
+    excedent = np.isin(statut, ["STOCK DORMANT", "SURSTOCK"])
+    quantite_transfert_out = np.select(
+        [excedent & is_pnlt, excedent], [sdu - 6 * cmm_gest, sdu - 4 * cmm_gest], default=np.nan
+    )
+
+    return df_etat_stock.assign(
+        **{
+            "CMM gestionnaire": cmm_gest,
+            "MSD": msd,
+            "ETAT DU STOCK": statut,
+            "BESOIN CMMMANDE URGENTE": besoin_urgent,
+            "BESOIN TRANSFERT IN": besoin_transfert_in,
+            "QUANTITE A TRANSFERER OUT": quantite_transfert_out,
+        }
+    )
+
+
+def aggregate_by_keys(
+    df: pd.DataFrame,
+    keys: list[str],
+    sum_columns: list[str] | None = None,
+    first_columns: list[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Agrège un DataFrame par clé en une seule passe.
+
+    Chaque combinaison de `keys` apparaît une seule fois, dans l'ordre de sa première occurrence et
+    avec l'index de cette occurrence. Les colonnes de `first_columns` reprennent la valeur de la première
+    ligne de la clé, celles de `sum_columns` la somme des lignes de la clé (valeurs manquantes ignorées) ; comme
+    pour une sélection `df[col] == valeur`, une clé contenant une valeur manquante n'a aucune ligne et sa somme
+    est nulle.
+
+    Args:
+        df (pd.DataFrame): Données à agréger.
+        keys (list[str]): Colonnes formant la clé d'agrégation (ex. code produit et programme).
+        sum_columns (list[str], optional): Colonnes à sommer par clé.
+        first_columns (list[str], optional): Colonnes dont on garde la première valeur par clé.
+
+    Returns:
+        pd.DataFrame: Une ligne par clé avec les colonnes `keys + first_columns + sum_columns`.
+    """
+    sum_columns = list(sum_columns or [])
+    first_columns = list(first_columns or [])
+
+    df_first = df.drop_duplicates(subset=keys)[keys + first_columns]
+    if not sum_columns:
+        return df_first
+
+    # Clés incomplètes (valeur manquante dans `keys`) : aucune ligne ne leur correspond, somme nulle
+    df_sum = df.groupby(keys, sort=False)[sum_columns].sum().reset_index()
+    df_agg = df_first.merge(df_sum, on=keys, how="left")
+    df_agg[sum_columns] = df_agg[sum_columns].fillna(0)
+    df_agg.index = df_first.index
+    return df_agg
+
+
+def classify_msd_statut(msd: np.ndarray, msd_na: np.ndarray, sdu: np.ndarray) -> np.ndarray:
+    """
+    Détermine le statut de stock agrégé (national ou régional) à partir des MSD calculés.
+
+    Args:
+        msd (np.ndarray): Mois de stock disponible.
+        msd_na (np.ndarray): Masque des MSD non calculables (renseignés "NA").
+        sdu (np.ndarray): Somme des SDU de la clé, utilisée pour repérer les stocks dormants.
+
+    Returns:
+        np.ndarray: Statut par ligne (RUPTURE, SOUS-STOCK, BIEN STOCKE, SURSTOCK, STOCK DORMANT, NA ou ND).
+    """
+    return np.select(
+        [
+            msd_na & (sdu > 0),
+            msd_na,
+            msd < 0.05,
+            (msd > 0) & (msd < 2),
+            (msd >= 2) & (msd <= 4),
+            msd > 4,
+        ],
+        ["STOCK DORMANT", "NA", "RUPTURE", "SOUS-STOCK", "BIEN STOCKE", "SURSTOCK"],
+        default="ND",
+    )
+
+
 def analyze_product_stock_status_indicators(df_prod_traceurs, df_etat_stock, date_report):
     """Analyse les indicateurs clés de gestion des stocks produits."""
     
@@ -627,30 +754,8 @@ def analyze_product_stock_status_indicators(df_prod_traceurs, df_etat_stock, dat
         else x
     )
 
-    def get_cmm_gestionnaire(row):
-        if pd.isna(row.periode):
-            return np.nan
-        else:
-            if pd.isna(row.quantite_commandee):
-                return row.cmm
-            elif row.abrv_programme == "PNLT" and row.quantite_commandee > 0:
-                return (row.quantite_commandee + row.sdu) / 6
-            elif row.quantite_commandee > 0:
-                return (row.quantite_commandee + row.sdu) / 4
-            else:
-                return row.cmm
-
-    df_etat_stock["CMM gestionnaire"] = df_etat_stock.apply(get_cmm_gestionnaire, axis=1)
-
-    df_etat_stock["MSD"] = df_etat_stock[["sdu", "CMM gestionnaire"]].apply(
-        lambda x: np.nan if x[1] == 0 or pd.isna(x[1]) else x[0] / x[1], axis=1
-    )
-    # [("VITAMINE A 200 000 UI caps UN  -", 3150050),
-    #  ("VITAMINE A 100 000 UI caps UN  -", 3150049),
-    #  ("ALBENDAZOLE 400 mg comp. UN  -", 3050002)]
     # Les id correspondent aux id de certains districts dans eSIGL (district_id) pour faire des vérifications
     # ou étendre la liste voir le script suivant dans metabase """select * from vw_districts vw join geographic_zones gz on vw.district_id = gz.id where gz.levelid=3 """
-    
     dds_routine_pnn = [
         24, 25, 34, 101, 102, 28, 49, 152, 71, 98, 30,
         87, 93, 92, 55, 94, 97, 100, 133, 138, 74, 47,
@@ -661,102 +766,20 @@ def analyze_product_stock_status_indicators(df_prod_traceurs, df_etat_stock, dat
         69, 126, 115, 116, 84, 90, 26, 27, 62, 110
     ]
 
-    df_etat_stock["check_prod_pnn"] = df_etat_stock.apply(
-        lambda row: 0
-        if row.abrv_programme == "PNN"
-        and row.code_produit
-        in (3050002, 3150049, 3050002)
-        and row.id_district_esigl not in dds_routine_pnn
-        else 1,
-        axis=1,
-    )
-
-    df_etat_stock = df_etat_stock.loc[df_etat_stock.check_prod_pnn == 1].drop(
-        columns="check_prod_pnn"
+    # [("VITAMINE A 200 000 UI caps UN  -", 3150050),
+    #  ("VITAMINE A 100 000 UI caps UN  -", 3150049),
+    #  ("ALBENDAZOLE 400 mg comp. UN  -", 3050002)]
+    check_prod_pnn = (
+        df_etat_stock["abrv_programme"].eq("PNN")
+        & df_etat_stock["code_produit"].isin([3050002, 3150049]).fillna(False)
+        & ~df_etat_stock["id_district_esigl"].isin(dds_routine_pnn)
     )
+    df_etat_stock = df_etat_stock.loc[~check_prod_pnn]
 
     date_report = pd.to_datetime(date_report)
     nombre_de_jours = calendar.monthrange(date_report.year, date_report.month)[1]
 
-    def determine_statut_stock(row):
-        if pd.isna(row["CMM gestionnaire"]) and pd.isna(row["sdu"]):
-            return "NA"
-        elif (
-            row["nbrejrsrupture"] >= nombre_de_jours or row["sdu"] == 0
-        ):  # new_update dans le calcul de l'etat de stock
-            return "RUPTURE"
-        elif row["sdu"] > 0 and row["CMM gestionnaire"] == 0:
-            return "STOCK DORMANT"  # Good Here
-        elif row.abrv_programme == "PNLT":  # row['programme'].lstrip()[:4] ==
-            if row["MSD"] > 0 and row["MSD"] <= 1.5:
-                return "EN BAS DU PCU"
-            elif row["MSD"] > 1.5 and row["MSD"] < 3:
-                return "ENTRE PCU et MIN"
-            elif row["MSD"] >= 3 and row["MSD"] <= 6:
-                return "BIEN STOCKE"
-            elif row["MSD"] > 6:
-                return "SURSTOCK"
-            elif row["sdu"] == 0 and row["CMM gestionnaire"] > 0:
-                return "RUPTURE"
-        elif row["MSD"] > 4:
-            return "SURSTOCK"
-        elif row["MSD"] >= 2 and row["MSD"] <= 4:
-            return "BIEN STOCKE"
-        elif row["MSD"] > 1 and row["MSD"] < 2:
-            return "ENTRE PCU et MIN"
-        elif row["MSD"] > 0 and row["MSD"] <= 1:
-            return "EN BAS DU PCU"
-        elif row["sdu"] == 0 and row["CMM gestionnaire"] > 0:
-            return "RUPTURE"  # Good here
-        else:
-            return "NA"
-
-    df_etat_stock["ETAT DU STOCK"] = df_etat_stock.apply(determine_statut_stock, axis=1)
-
-    df_etat_stock["ETAT DU STOCK"] = df_etat_stock["ETAT DU STOCK"].fillna("NA")
-
-    def calcul_quantite(row):
-        if row.abrv_programme == "PNLT" and (
-            row["ETAT DU STOCK"] == "EN BAS DU PCU" or row["sdu"] == 0
-        ):  # (row['ETAT DU STOCK'] in ('EN BAS DU PCU', 'RUPTURE')):
-            return 6 * row["CMM gestionnaire"] - row["sdu"]
-        elif (
-            row["ETAT DU STOCK"] == "EN BAS DU PCU" or row["sdu"] == 0
-        ):  # in ('EN BAS DU PCU', 'RUPTURE'):
-            return 4 * row["CMM gestionnaire"] - row["sdu"]
-        else:
-            return np.nan
-
-    df_etat_stock["BESOIN CMMMANDE URGENTE"] = df_etat_stock.apply(calcul_quantite, axis=1)
-
-    def calcul_quantite(row):
-        if row.abrv_programme == "PNLT" and (
-            row["ETAT DU STOCK"] or row["sdu"] == 0
-        ):  # in ('EN BAS DU PCU', 'RUPTURE')):
-            return 3 * row["CMM gestionnaire"] - row["sdu"]
-        elif (
-            row["ETAT DU STOCK"] == "EN BAS DU PCU" or row["sdu"] == 0
-        ):  # in ('EN BAS DU PCU', 'RUPTURE'):
-            return row["CMM gestionnaire"] - row["sdu"]
-        else:
-            return np.nan
-
-    df_etat_stock["BESOIN TRANSFERT IN"] = df_etat_stock.apply(calcul_quantite, axis=1)
-
-    def calcul_quantite(row):
-        if row["ETAT DU STOCK"] == "ND":
-            return np.nan
-        elif row["ETAT DU STOCK"] in ("STOCK DORMANT", "SURSTOCK"):
-            if row.abrv_programme == "PNLT":
-                return row["sdu"] - 6 * row["CMM gestionnaire"]
-            else:
-                return row["sdu"] - 4 * row["CMM gestionnaire"]
-        else:
-            return np.nan
-
-    df_etat_stock["QUANTITE A TRANSFERER OUT"] = df_etat_stock.apply(calcul_quantite, axis=1)
-
-    del calcul_quantite
+    df_etat_stock = compute_stock_status_columns(df_etat_stock, nombre_de_jours)
 
     df_etat_stock.rename(
         columns={
@@ -822,14 +845,6 @@ def analyze_product_stock_status_indicators(df_prod_traceurs, df_etat_stock, dat
         ]
     ]
 
-    stock_lvl_decent = (
-        df_etat_stock[["CODE", "PROGRAMME"]]
-        .drop_duplicates()
-        .rename(columns={"CODE": "Code", "PROGRAMME": "Programme"})
-    )
-
-    stock_lvl_decent = stock_lvl_decent.drop_duplicates()
-
     column_to_caculate = {
         "Designation": "PRODUIT",
         "Categorie": "CATEGORIE_DU_PRODUIT",
@@ -840,121 +855,55 @@ def analyze_product_stock_status_indicators(df_prod_traceurs, df_etat_stock, dat
         "Categorie_produit": "CATEGORIE PRODUIT",
     }
 
-    for column, col_in_extract_stock in column_to_caculate.items():
-        if column in ("lvl_decent_conso", "lvl_decent_sdu", "lvl_decent_cmm"):
-            stock_lvl_decent[column] = stock_lvl_decent.apply(
-                lambda row: df_etat_stock.loc[
-                    (df_etat_stock.CODE == row.Code)
-                    & (df_etat_stock["PROGRAMME"] == row.Programme),
-                    col_in_extract_stock,
-                ].sum()
-                if not df_etat_stock.loc[
-                    (df_etat_stock.CODE == row.Code)
-                    & (df_etat_stock["PROGRAMME"] == row.Programme),
-                    col_in_extract_stock,
-                ].empty
-                else "",
-                axis=1,
-            )
-        else:
-            stock_lvl_decent[column] = stock_lvl_decent.apply(
-                lambda row: df_etat_stock.loc[
-                    (df_etat_stock.CODE == row.Code)
-                    & (df_etat_stock["PROGRAMME"] == row.Programme),
-                    col_in_extract_stock,
-                ].iloc[0]
-                if not df_etat_stock.loc[
-                    (df_etat_stock.CODE == row.Code)
-                    & (df_etat_stock["PROGRAMME"] == row.Programme),
-                    col_in_extract_stock,
-                ].empty
-                else "",
-                axis=1,
-            )
+    stock_lvl_decent = aggregate_by_keys(
+        df_etat_stock,
+        keys=["CODE", "PROGRAMME"],
+        sum_columns=["QUANTITE UTILISEE", "SDU", "CMM gestionnaire"],
+        first_columns=["PRODUIT", "CATEGORIE_DU_PRODUIT", "UNITE DE RAPPORTAGE", "CATEGORIE PRODUIT"],
+    ).rename(
+        columns={
+            "CODE": "Code",
+            "PROGRAMME": "Programme",
+            **{col_in_extract_stock: column for column, col_in_extract_stock in column_to_caculate.items()},
+        }
+    )[["Code", "Programme"] + list(column_to_caculate)]
 
-    def calculate_msd(row):
-        if sum([row.lvl_decent_conso, row.lvl_decent_sdu, row.lvl_decent_cmm]) == 0:
-            return "NA"
-        else:
-            if row.lvl_decent_sdu == 0 and row.lvl_decent_cmm == 0:
-                return "NA"
-            else:
-                if row.lvl_decent_sdu > 0 and row.lvl_decent_cmm == 0:
-                    return row.lvl_decent_sdu
-                else:
-                    return row.lvl_decent_sdu / row.lvl_decent_cmm
-
-    stock_lvl_decent["lvl_decent_msd"] = stock_lvl_decent.apply(calculate_msd, axis=1)
-
-    def get_satut(row):
-        if row.lvl_decent_msd == "NA":
-            if (
-                df_etat_stock.loc[
-                    (df_etat_stock.CODE == row.Code) & (df_etat_stock.PROGRAMME == row.Programme),
-                    "SDU",
-                ].sum()
-                > 0
-            ):
-                return "STOCK DORMANT"
-            else:
-                return "NA"
-        elif row.lvl_decent_msd < 0.05:
-            return "RUPTURE"
-        elif row.lvl_decent_msd > 0 and row.lvl_decent_msd < 2:
-            return "SOUS-STOCK"
-        elif row.lvl_decent_msd >= 2 and row.lvl_decent_msd <= 4:
-            return "BIEN STOCKE"
-        elif row.lvl_decent_msd > 4:
-            return "SURSTOCK"
-        else:
-            return "ND"
+    conso = stock_lvl_decent["lvl_decent_conso"].to_numpy(dtype="float64")
+    sdu = stock_lvl_decent["lvl_decent_sdu"].to_numpy(dtype="float64")
+    cmm = stock_lvl_decent["lvl_decent_cmm"].to_numpy(dtype="float64")
 
-    stock_lvl_decent["lvl_decent_statut"] = stock_lvl_decent.apply(get_satut, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        msd = np.select([(sdu > 0) & (cmm == 0)], [sdu], default=sdu / cmm)
+    msd_na = ((conso + sdu + cmm) == 0) | ((sdu == 0) & (cmm == 0))
+
+    stock_lvl_decent["lvl_decent_msd"] = pd.Series(msd, index=stock_lvl_decent.index, dtype=object).mask(
+        msd_na, "NA"
+    )
+    stock_lvl_decent["lvl_decent_statut"] = classify_msd_statut(msd, msd_na, sdu)
 
     df_count_prog = stock_lvl_decent["Programme"].value_counts().reset_index()
     df_count_prog["dispo_globale_cible"] = 0.85 / df_count_prog["count"]
     df_count_prog["dispo_traceur_cible"] = 0.95 / df_count_prog["count"]
 
-    stock_lvl_decent["dispo_globale"] = stock_lvl_decent["Programme"].apply(
-        lambda prog: df_etat_stock.loc[
-            (df_etat_stock.PROGRAMME == prog) & (df_etat_stock["ETAT DU STOCK"] != "RUPTURE")
-        ].shape[0]
-        / df_count_prog.loc[df_count_prog["Programme"] == prog, "count"].values[0]
+    # Nombre de lignes (toutes et hors rupture) par programme, globalement et pour les produits traceurs
+    est_traceur = df_etat_stock["CATEGORIE PRODUIT"].str.upper() == "PRODUIT TRACEUR"
+    hors_rupture = df_etat_stock["ETAT DU STOCK"] != "RUPTURE"
+    nb_lignes_prog = df_etat_stock["PROGRAMME"].value_counts()
+    nb_lignes_prog_hors_rupture = df_etat_stock.loc[hors_rupture, "PROGRAMME"].value_counts()
+    nb_traceurs_prog = df_etat_stock.loc[est_traceur, "PROGRAMME"].value_counts()
+    nb_traceurs_prog_hors_rupture = df_etat_stock.loc[est_traceur & hors_rupture, "PROGRAMME"].value_counts()
+    nb_produits_prog = df_count_prog.set_index("Programme")["count"]
+
+    programme = stock_lvl_decent["Programme"]
+    stock_lvl_decent["dispo_globale"] = (
+        programme.map(nb_lignes_prog_hors_rupture).fillna(0)
+        / programme.map(nb_produits_prog)
+        / programme.map(nb_lignes_prog)
     )
-    df_ = (
-        df_etat_stock["PROGRAMME"]
-        .value_counts()
-        .reset_index()
-        .rename(columns={"PROGRAMME": "Programme"})
-    )
-    stock_lvl_decent["dispo_globale"] = stock_lvl_decent.apply(
-        lambda row: row.dispo_globale
-        / df_.loc[df_["Programme"] == row.Programme, "count"].values[0],
-        axis=1,
-    )
-
-    stock_lvl_decent["dispo_traceur"] = stock_lvl_decent["Programme"].apply(
-        lambda prog: df_etat_stock.loc[
-            (df_etat_stock.PROGRAMME == prog)
-            & (df_etat_stock["CATEGORIE PRODUIT"].str.upper() == "PRODUIT TRACEUR")
-            & (df_etat_stock["ETAT DU STOCK"] != "RUPTURE")
-        ].shape[0]
-        / df_count_prog.loc[df_count_prog["Programme"] == prog, "count"].values[0]
-    )  # Bien mais pour l'heure pas optimale
-    
-    df_ = (
-        df_etat_stock.loc[
-            (df_etat_stock["CATEGORIE PRODUIT"].str.upper() == "PRODUIT TRACEUR"), "PROGRAMME"
-        ]
-        .value_counts()
-        .reset_index()
-        .rename(columns={"PROGRAMME": "Programme"})
-    )
-    
-    stock_lvl_decent["dispo_traceur"] = stock_lvl_decent.apply(
-        lambda row: row.dispo_traceur
-        / df_.loc[df_["Programme"] == row.Programme, "count"].values[0],
-        axis=1,
+    stock_lvl_decent["dispo_traceur"] = (
+        programme.map(nb_traceurs_prog_hors_rupture).fillna(0)
+        / programme.map(nb_produits_prog)
+        / programme.map(nb_traceurs_prog)
     )
 
     stock_lvl_decent = stock_lvl_decent.merge(
@@ -973,67 +922,28 @@ def analyze_product_stock_status_indicators(df_prod_traceurs, df_etat_stock, dat
         [col for col in stock_lvl_decent.columns if col not in cols] + cols
     ]
 
-    del df_count_prog, df_, cols
+    del df_count_prog, cols, programme
 
-    stock_region = (
-        df_etat_stock[["CODE", "PROGRAMME", "REGION"]]
-        .drop_duplicates()
-        .rename(columns={"CODE": "Code", "REGION": "Region", "PROGRAMME": "Programme"})
+    stock_region = aggregate_by_keys(
+        df_etat_stock,
+        keys=["CODE", "PROGRAMME", "REGION"],
+        sum_columns=["CMM gestionnaire", "SDU"],
     )
 
-    df_ = (
-        df_etat_stock.groupby(["CODE", "PROGRAMME", "REGION"])[["CMM gestionnaire", "SDU"]]
-        .sum()
-        .reset_index()
-    )
+    cmm_region = stock_region["CMM gestionnaire"].to_numpy(dtype="float64")
+    sdu_region = stock_region["SDU"].to_numpy(dtype="float64")
 
-    def get_msd_region(row):
-        try:
-            filtered_data = df_[
-                (df_.CODE == row.Code)
-                & (df_.REGION == row.Region)
-                & (df_["PROGRAMME"] == row.Programme)
-            ]
-            cmm_sum = filtered_data["CMM gestionnaire"].sum()
-            if cmm_sum == 0:
-                return "NA"
-            else:
-                sdu_sum = filtered_data["SDU"].sum()
-                return sdu_sum / cmm_sum
-        except Exception as e:
-            print(e)
-            return ""
-
-    stock_region["MSD"] = stock_region.apply(get_msd_region, axis=1)
-
-    def get_statut_stock_region(row):
-        try:
-            if row.MSD == "NA":
-                if (
-                    df_[
-                        (df_.CODE == row.Code)
-                        & (df_.REGION == row.Region)
-                        & (df_["PROGRAMME"] == row.Programme)
-                    ]["SDU"].sum()
-                    > 0
-                ):
-                    return "STOCK DORMANT"
-                else:
-                    return "NA"
-            elif row.MSD < 0.05:
-                return "RUPTURE"
-            elif row.MSD > 0 and row.MSD < 2:
-                return "SOUS-STOCK"
-            elif row.MSD >= 2 and row.MSD <= 4:
-                return "BIEN STOCKE"
-            elif row.MSD > 4:
-                return "SURSTOCK"
-            else:
-                return "ND"
-        except:
-            return "ND"
-
-    stock_region["STATUT"] = stock_region.apply(get_statut_stock_region, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        msd_region = sdu_region / cmm_region
+    msd_region_na = cmm_region == 0
+
+    stock_region = stock_region[["CODE", "PROGRAMME", "REGION"]].rename(
+        columns={"CODE": "Code", "REGION": "Region", "PROGRAMME": "Programme"}
+    )
+    stock_region["MSD"] = pd.Series(msd_region, index=stock_region.index, dtype=object).mask(
+        msd_region_na, "NA"
+    )
+    stock_region["STATUT"] = classify_msd_statut(msd_region, msd_region_na, sdu_region)
 
     return df_etat_stock, stock_lvl_decent, stock_region
 
@@ -2,33 +2,29 @@ import pandas as pd
 from IPython.display import display
 from typing import List
 
+from . import connection_manager
+
 def reload_connection():
-    from sqlalchemy import create_engine
-    from openhexa.sdk import workspace
-    import psycopg2
-    global civ_engine, conn, civ_cursor
+    """
+    Réinitialise la connexion partagée (`conn`, `civ_cursor`) et vérifie la connexion à la base.
 
+    Si la vérification échoue, l'engine et son pool sont recréés (voir `connection_manager.reconnect`).
+    Les connexions sont créées au premier usage : rien n'est ouvert à l'import du module.
+    """
     try:
-        if conn:
-            conn.close()
-    except Exception as e:
-        pass
-    try:
-        civ_engine = create_engine(workspace.database_url)
-        conn = psycopg2.connect(
-            dbname=workspace.database_name,
-            user=workspace.database_username,
-            password=workspace.database_password,
-            host=workspace.database_host,
-            port=workspace.database_port
-            )
-        civ_cursor = conn.cursor()
+        connection_manager.reconnect()
     except Exception as e:
         print(f"Error while connecting to database: {e}")
 
-    # return civ_engine, conn, civ_cursor
-
-reload_connection()
+def __getattr__(name):
+    """Objets de connexion historiques (`civ_engine`, `conn`, `civ_cursor`) utilisés par les notebooks"""
+    if name == "civ_engine":
+        return connection_manager.get_engine()
+    if name == "conn":
+        return connection_manager.get_shared_connection()
+    if name == "civ_cursor":
+        return connection_manager.get_shared_cursor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def convert_numpy_to_native(value):
     import numpy as np
@@ -40,109 +36,208 @@ def convert_numpy_to_native(value):
     else:
         return value
 
+# Marqueur des valeurs NULL dans le flux CSV envoyé à COPY
+COPY_NULL_MARKER = "\\N"
+
+
+def get_table_columns(table_name: str, schema_name: str = "dap_tools") -> dict:
+    """
+    Renvoie les colonnes d'une table et leur type PostgreSQL
+    """
+    with connection_manager.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = %s AND table_name = %s ORDER BY ordinal_position
+            """,
+            (schema_name, table_name),
+        )
+        return dict(cursor.fetchall())
+
+
+def stage_dataframe(cursor, df: pd.DataFrame, table_name: str, schema_name: str = "dap_tools") -> str:
+    """
+    Copie les lignes du DataFrame dans une table temporaire typée comme la table cible.
+
+    La table temporaire contient une colonne `_row` (position de la ligne dans le DataFrame) suivie des
+    colonnes du DataFrame ; elle est supprimée à la fin de la transaction.
+    """
+    import io
+
+    import numpy as np
+
+    # Qualifiée par pg_temp : sans table temporaire existante, un nom non qualifié résolu par le
+    # search_path désignerait une éventuelle table permanente du même nom
+    staging_name = f"pg_temp.staging_{table_name}"
+    columns = ", ".join(f'"{col}"' for col in df.columns)
+    cursor.execute(f"DROP TABLE IF EXISTS {staging_name}")
+    cursor.execute(
+        f"CREATE TEMP TABLE {staging_name} ON COMMIT DROP AS "
+        f"SELECT NULL::bigint AS _row, {columns} FROM {schema_name}.{table_name} WITH NO DATA"
+    )
+
+    # Les entiers passés en float par pandas (présence de NaN) doivent être envoyés sans décimale
+    table_columns = get_table_columns(table_name, schema_name)
+    df = df.astype(
+        {
+            col: "Int64"
+            for col in df.columns
+            if table_columns.get(col) in ("integer", "bigint", "smallint")
+            and pd.api.types.is_float_dtype(df[col])
+        }
+    )
+
+    buffer = io.StringIO()
+    df.assign(_row=np.arange(len(df)))[["_row", *df.columns]].to_csv(
+        buffer, index=False, header=False, na_rep=COPY_NULL_MARKER, date_format="%Y-%m-%d"
+    )
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {staging_name} (_row, {columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL_MARKER}')",
+        buffer,
+    )
+    return staging_name
+
+
+def diff_with_table(
+    df_source: pd.DataFrame,
+    table_name: str,
+    key_columns: list[str],
+    schema_name: str = "dap_tools",
+    compare_columns: list[str] | None = None,
+    include_target_columns: bool = False,
+) -> dict:
+    """
+    Compare un DataFrame avec une table directement dans PostgreSQL et ne renvoie que les différences.
+
+    Les données sources sont copiées dans une table temporaire puis jointes à la table cible sur les
+    colonnes clés ; les modifications sont détectées avec `IS DISTINCT FROM` sur les colonnes comparées.
+    Seules les lignes nouvelles ou modifiées sont rapatriées.
+
+    Args:
+        df_source: Données sources
+        table_name: Nom de la table cible
+        key_columns: Colonnes identifiant une ligne
+        schema_name: Nom du schéma
+        compare_columns: Colonnes à comparer (par défaut toutes les colonnes sources hors clés)
+        include_target_columns: Ajoute les colonnes de la table absentes de la source
+
+    Returns:
+        dict: "new" (clé absente de la table) et "changed" (au moins une valeur différente) avec les
+        lignes sources, "unchanged" nombre de lignes identiques
+    """
+    compare_columns = compare_columns or [c for c in df_source.columns if c not in key_columns]
+    target = f"{schema_name}.{table_name}"
+    target_columns = (
+        [col for col in get_table_columns(table_name, schema_name) if col not in df_source.columns]
+        if include_target_columns
+        else []
+    )
+
+    join_clause = " AND ".join(f't."{key}" = s."{key}"' for key in key_columns)
+    distinct_clause = (
+        " OR ".join(f's."{col}" IS DISTINCT FROM t."{col}"' for col in compare_columns) or "FALSE"
+    )
+    select_list = ["s._row", "t.ctid IS NULL AS _is_new"] + [f't."{col}"' for col in target_columns]
+
+    with connection_manager.cursor() as cursor:
+        staging_name = stage_dataframe(
+            cursor, df_source[key_columns + compare_columns], table_name, schema_name
+        )
+        cursor.execute(
+            f"SELECT {', '.join(select_list)} FROM {staging_name} s "
+            f"LEFT JOIN {target} t ON {join_clause} "
+            f"WHERE t.ctid IS NULL OR {distinct_clause} ORDER BY s._row"
+        )
+        diff = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
+        cursor.execute(
+            f"SELECT count(*) FROM {staging_name} s "
+            f"INNER JOIN {target} t ON {join_clause} WHERE NOT ({distinct_clause})"
+        )
+        unchanged = cursor.fetchone()[0]
+
+    rows = df_source.iloc[diff.pop("_row").to_numpy(dtype=int)].reset_index(drop=True)
+    is_new = diff.pop("_is_new").astype(bool).to_numpy()
+    diff = pd.concat([rows, diff], axis=1)
+
+    return {
+        "new": diff.loc[is_new].reset_index(drop=True),
+        "changed": diff.loc[~is_new].reset_index(drop=True),
+        "unchanged": unchanged,
+    }
+
+
 def get_data_from_database(table_name, schema_name="dap_tools") -> pd.DataFrame:
     """
     Renvoie les données d'une table spécifique présent dans la base de données
     """
-    if civ_engine is None and civ_cursor is None and conn is None:
-        reload_connection()
+    return pd.read_sql(f"select * from {schema_name}.{table_name}", connection_manager.get_engine())
 
-    return pd.read_sql(f"select * from {schema_name}.{table_name}", civ_engine)
+# Clé de substitution tirée d'une séquence et colonnes ignorées lors de la recherche des nouveaux membres
+FULL_TABLE_SETTINGS = {
+    "dim_produit": {"key_column": "id_produit_pk", "sequence": "dim_produit_seq"},
+    "dim_structure": {"ignore": ["type_structure"]},
+}
 
-def get_full_table(df_preprocess: pd.DataFrame, table_name, schema_name="dap_tools") -> pd.DataFrame:
-    if civ_engine is None and civ_cursor is None and conn is None:
-        reload_connection()
-        
-    df_from_db = pd.read_sql(f"select * from {schema_name}.{table_name}", civ_engine)
-    
-    if table_name == "dim_produit":
-        merged = df_preprocess.merge(df_from_db.drop(columns="id_produit_pk"), indicator=True, how="left")
-    elif table_name == "dim_structure":
-        merged = df_preprocess.merge(df_from_db.drop(columns="type_structure"), indicator=True, how="left")
-    else:
-        merged = df_preprocess.merge(df_from_db, indicator=True, how="left")
+def get_full_table(df_preprocess: pd.DataFrame, table_name, schema_name="dap_tools", resolver=None) -> pd.DataFrame:
+    """
+    Insère dans la dimension les lignes absentes de la table puis renvoie la dimension complète.
 
-    result = merged[merged["_merge"] == "left_only"].drop(columns=["_merge"])
-    
-    if not result.empty:
-        if table_name == "dim_produit":
-            civ_cursor.execute(f"SELECT last_value FROM {schema_name}.dim_produit_seq")
-            dim_produit_seq = civ_cursor.fetchone()[0]
-            result["id_produit_pk"] = [i for i in range(dim_produit_seq, dim_produit_seq + result.shape[0])]
-            result.to_sql(table_name, civ_engine, if_exists="append", schema=schema_name, index=False)
-            civ_cursor.execute(f"""ALTER SEQUENCE {schema_name}.dim_produit_seq RESTART WITH {result['id_produit_pk'].max()+1};""")
-            conn.commit()
-        else:
-            result.to_sql(table_name, civ_engine, if_exists="append", schema=schema_name, index=False)
-            civ_engine.dispose()
-        return pd.read_sql(f"select * from {schema_name}.{table_name}", civ_engine)
-    else:
-        return pd.read_sql(f"select * from {schema_name}.{table_name}", civ_engine)
+    Args:
+        resolver: Service de résolution des dimensions de l'exécution (`DimensionResolver`) ; la dimension
+            n'est alors lue qu'une fois par exécution
+    """
+    from .dimension_resolver import DimensionResolver
+
+    resolver = resolver or DimensionResolver(schema_name)
+    settings = FULL_TABLE_SETTINGS.get(table_name, {})
+    key_column = settings.get("key_column")
+    table_columns = resolver.columns(table_name)
+
+    natural_key = [
+        col for col in df_preprocess.columns
+        if col in table_columns and col != key_column and col not in settings.get("ignore", [])
+    ]
+    resolver.resolve(df_preprocess, table_name, natural_key, key_column, settings.get("sequence"))
+
+    return resolver.get(table_name)
 
-def check_update_data_from_db(df_new: pd.DataFrame, table_name:str, schema_name:str, programme:str, merge_columns:List, bool_df_need=True) -> pd.DataFrame:
+def check_update_data_from_db(df_new: pd.DataFrame, table_name:str, schema_name:str, programme:str, merge_columns:List) -> dict:
     """
     Cette fonction est principalement utilisée pour faire la mise à jour de certaines tables par rapport à des colonnes principales (merge_columns)
+
+    La détection des nouveaux enregistrements et des modifications est réalisée dans PostgreSQL (voir `diff_with_table`) :
+    seules les lignes ajoutées ou modifiées sont transférées. Renvoie le nombre de lignes nouvelles ("new"), modifiées
+    ("changed") et inchangées ("unchanged").
     """
-    df_from_db = pd.read_sql(f"select * from {schema_name}.{table_name}", civ_engine)
+    table_columns = get_table_columns(table_name, schema_name)
 
-    assert len(df_from_db.columns) >= len(df_new.columns), print(f"Il faut que le dataframe ait la même structure et au format de colonne suivant {list(df_from_db.columns)}")
-    
-    cols_not_in_db = [col for col in df_new.columns if col not in df_from_db.columns]
-    assert len(cols_not_in_db)==0, print(f"Les colonnes suivantes: {cols_not_in_db} ne respecte pas le format de données attendus parmi la liste des colonnes de la table: {list(df_from_db.columns)}")
-    
-    for col in df_from_db.columns:
-        if col in df_new.columns:
-            df_new[col] = df_new[col].astype(df_from_db[col].dtype)
-        
-    merged = df_new.merge(
-        df_from_db,
-        on=merge_columns, suffixes=('_new', '_past'), indicator=True, how="left")
-
-    result = merged[merged["_merge"] == "left_only"].drop(columns=["_merge"])
-    result = result[merge_columns + [col for col in result.columns if '_new' in col]].rename(columns=lambda x: x.replace('_new', ''))
-    result = result.drop_duplicates()
-    
-    # Ajout de nouveaux enrégistrements
-    if not result.empty:
-        print(f"Ajout de ces nouvelles informations dans la table: {table_name}")        
-        display(result)
-        result.drop_duplicates().to_sql(table_name, con = civ_engine, 
-                                        schema=schema_name, index=False, 
-                                        if_exists='append')
-        civ_engine.dispose()
-        conn.commit()
-
-    # Mise à jour des informations en fonction des nouveaux inputs
-    df_from_db = pd.read_sql(f"select * from {schema_name}.{table_name}", civ_engine)
-    merged = df_from_db.merge(
-        df_new,
-        on=merge_columns, suffixes=('_past', '_new'), how='outer')
-    
+    assert len(table_columns) >= len(df_new.columns), f"Il faut que le dataframe ait la même structure et au format de colonne suivant {list(table_columns)}"
+
+    cols_not_in_db = [col for col in df_new.columns if col not in table_columns]
+    assert len(cols_not_in_db)==0, f"Les colonnes suivantes: {cols_not_in_db} ne respecte pas le format de données attendus parmi la liste des colonnes de la table: {list(table_columns)}"
+
+    df_new = df_new.drop_duplicates()
     indicator_columns = [col for col in df_new.columns if col not in merge_columns]
-    
-    condition = ''
-    for col in [col.replace('_past', '') for col in merged.columns if '_past' in col]:
-        condition+=f"(merged.{col}_new != merged.{col}_past) & "
-    condition = condition.rstrip('& ')
-    
-    merged = merged.loc[eval(condition)]
-
-    for col in indicator_columns:
-        merged[col] = merged[col + '_new'].combine_first(merged[col + '_past'])
-
-    result = merged[df_from_db.columns].reset_index(drop=True).drop_duplicates()
-    if not result.empty:
-        print(f"Mise à jour des informations rélatives suite aux mise à jour apportées sur la table: {table_name}")
-        display(result)
-        for i in range(len(result)):
-            row = result.iloc[i]
-            update_stmt = (f"UPDATE {schema_name}.{table_name} SET " + \
-                            ", ".join([f"{col}=%s" for col in result.columns if col!=col_id_pk]) + \
-                            f" WHERE {col_id_pk}=%s;")
-            params = [convert_numpy_to_native(row[col]) for col in result.columns if col!=col_id_pk] + [convert_numpy_to_native(row[col_id_pk])]
-            civ_cursor.execute(update_stmt, params)
-                
-        conn.commit()
-        # civ_engine.dispose()
-
-    return pd.read_sql(f"""SELECT * FROM {schema_name}.{table_name} where programme='{programme}'""", civ_engine) if bool_df_need else None
\ No newline at end of file
+    diff = diff_with_table(df_new, table_name, merge_columns, schema_name, compare_columns=indicator_columns)
+
+    target = f"{schema_name}.{table_name}"
+    columns = ", ".join(f'"{col}"' for col in df_new.columns)
+    with connection_manager.cursor() as cursor:
+        # Ajout de nouveaux enrégistrements
+        if not diff["new"].empty:
+            print(f"Ajout de ces nouvelles informations dans la table: {table_name}")
+            display(diff["new"])
+            staging_name = stage_dataframe(cursor, diff["new"], table_name, schema_name)
+            cursor.execute(f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {staging_name}")
+
+        # Mise à jour des informations en fonction des nouveaux inputs (les valeurs manquantes ne remplacent pas l'existant)
+        if not diff["changed"].empty:
+            print(f"Mise à jour des informations rélatives suite aux mise à jour apportées sur la table: {table_name}")
+            display(diff["changed"])
+            staging_name = stage_dataframe(cursor, diff["changed"], table_name, schema_name)
+            set_clause = ", ".join(f'"{col}" = COALESCE(s."{col}", t."{col}")' for col in indicator_columns)
+            join_clause = " AND ".join(f't."{col}" = s."{col}"' for col in merge_columns)
+            cursor.execute(f"UPDATE {target} t SET {set_clause} FROM {staging_name} s WHERE {join_clause}")
+
+    return {"new": len(diff["new"]), "changed": len(diff["changed"]), "unchanged": diff["unchanged"]}
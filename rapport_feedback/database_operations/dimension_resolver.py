@@ -0,0 +1,159 @@
+import pandas as pd
+
+from . import connection_manager
+from .db_ops import stage_dataframe
+
+
+class DimensionResolver:
+    """
+    Résolution des membres des tables de dimension pour une exécution.
+
+    Chaque dimension est lue une seule fois puis conservée en mémoire : les recherches suivantes de la même
+    exécution ne sollicitent plus la base. Les membres absents sont insérés en une requête
+    (INSERT ... ON CONFLICT DO NOTHING RETURNING), leur clé de substitution étant tirée directement de la
+    séquence de la dimension, et ajoutés au cache.
+
+    Avant tout tirage, la séquence est avancée au-delà de la plus grande clé de la table : des clés
+    attribuées en dehors de la séquence ne provoquent donc pas de conflit sur la clé de substitution.
+    """
+
+    def __init__(self, schema_name: str = "dap_tools"):
+        self.schema_name = schema_name
+        self._members = {}
+
+    def get(self, table_name: str) -> pd.DataFrame:
+        """Retourne une copie des membres de la dimension (lue en base au premier appel uniquement)."""
+        return self._get_members(table_name).copy()
+
+    def columns(self, table_name: str) -> list[str]:
+        """Retourne les colonnes de la dimension."""
+        return self._get_members(table_name).columns.tolist()
+
+    def invalidate(self, table_name: str | None = None) -> None:
+        """Oublie une dimension (ou toutes) après une écriture faite en dehors du service."""
+        if table_name is None:
+            self._members.clear()
+        else:
+            self._members.pop(table_name, None)
+
+    def resolve(
+        self,
+        df: pd.DataFrame,
+        table_name: str,
+        natural_key: list[str],
+        key_column: str | None = None,
+        sequence: str | None = None,
+    ) -> pd.DataFrame:
+        """
+        Insère les membres absents de la dimension et retourne la table de correspondance.
+
+        Args:
+            df: Données contenant les membres à résoudre (les colonnes absentes de la table sont ignorées)
+            table_name: Nom de la table de dimension
+            natural_key: Colonnes identifiant un membre
+            key_column: Clé de substitution de la dimension
+            sequence: Séquence dont est tirée la clé des nouveaux membres (sinon valeur par défaut de la table)
+
+        Returns:
+            pd.DataFrame: Membres de la dimension correspondant aux clés naturelles de `df`
+        """
+        members = self._get_members(table_name)
+
+        candidates = df[[col for col in df.columns if col in members.columns and col != key_column]]
+        candidates = candidates.drop_duplicates(subset=natural_key)
+        missing = (
+            candidates.merge(members[natural_key], on=natural_key, how="left", indicator=True)
+            .query("_merge == 'left_only'")
+            .drop(columns="_merge")
+        )
+
+        if not missing.empty:
+            inserted = self._insert_members(missing, table_name, natural_key, key_column, sequence)
+            members = pd.concat([members, inserted], ignore_index=True)
+            self._members[table_name] = members
+
+        return members.merge(candidates[natural_key], on=natural_key)
+
+    def next_keys(self, table_name: str, key_column: str, sequence: str, count: int) -> list[int]:
+        """
+        Tire `count` clés de substitution de la séquence de la dimension, pour les membres écrits en
+        dehors de `resolve` (par exemple avec `upsert_table`).
+        """
+        if count == 0:
+            return []
+        with connection_manager.cursor() as cursor:
+            self._sync_sequence(cursor, table_name, key_column, sequence)
+            cursor.execute(
+                f"SELECT nextval('{self.schema_name}.{sequence}') FROM generate_series(1, %s)",
+                (int(count),),
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _sync_sequence(self, cursor, table_name: str, key_column: str, sequence: str) -> None:
+        """Avance la séquence jusqu'à la plus grande clé de la table si elle est en retard."""
+        sequence_name = f"{self.schema_name}.{sequence}"
+        cursor.execute(
+            f"SELECT setval('{sequence_name}', max_key) "
+            f'FROM (SELECT max("{key_column}") AS max_key FROM {self.schema_name}.{table_name}) t, '
+            f"{sequence_name} s "
+            "WHERE max_key IS NOT NULL AND (max_key > s.last_value OR NOT s.is_called)"
+        )
+
+    def _get_members(self, table_name: str) -> pd.DataFrame:
+        if table_name not in self._members:
+            self._members[table_name] = pd.read_sql(
+                f"SELECT * FROM {self.schema_name}.{table_name}", connection_manager.get_engine()
+            )
+        return self._members[table_name]
+
+    def _insert_members(
+        self,
+        missing: pd.DataFrame,
+        table_name: str,
+        natural_key: list[str],
+        key_column: str | None,
+        sequence: str | None,
+    ) -> pd.DataFrame:
+        target = f"{self.schema_name}.{table_name}"
+        columns = [f'"{col}"' for col in missing.columns]
+        values = [f"s.{col}" for col in columns]
+        if sequence:
+            columns.append(f'"{key_column}"')
+            values.append(f"nextval('{self.schema_name}.{sequence}')")
+
+        with connection_manager.cursor() as cursor:
+            if sequence:
+                self._sync_sequence(cursor, table_name, key_column, sequence)
+            staging_name = stage_dataframe(cursor, missing, table_name, self.schema_name)
+            cursor.execute(
+                f"INSERT INTO {target} ({', '.join(columns)}) "
+                f"SELECT {', '.join(values)} FROM {staging_name} s ORDER BY s._row "
+                f"ON CONFLICT DO NOTHING RETURNING *"
+            )
+            inserted = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
+            print(f"Ajout de {len(inserted)} membre(s) dans la dimension: {table_name}")
+
+            if len(inserted) < len(missing):
+                # Lignes écartées par ON CONFLICT DO NOTHING (membres insérés entre-temps par une autre
+                # exécution) : elles sont signalées puis relues en base
+                skipped = (
+                    missing[natural_key]
+                    .merge(inserted[natural_key], on=natural_key, how="left", indicator=True)
+                    .query("_merge == 'left_only'")
+                    .drop(columns="_merge")
+                )
+                print(
+                    f"{len(skipped)} membre(s) ignoré(s) sur conflit dans la dimension {table_name}, "
+                    f"relus en base :\n{skipped.to_string(index=False)}"
+                )
+                join_clause = " AND ".join(f't."{col}" = s."{col}"' for col in natural_key)
+                cursor.execute(f"SELECT t.* FROM {target} t INNER JOIN {staging_name} s ON {join_clause}")
+                inserted = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
+
+                if len(inserted) < len(missing):
+                    print(
+                        f"Attention : {len(missing) - len(inserted)} membre(s) de la dimension {table_name} "
+                        "n'ont été ni insérés ni retrouvés en base (conflit sur une autre contrainte)"
+                    )
+
+        return inserted
@@ -1,6 +1,7 @@
 from typing import List, Optional, Callable
 import pandas as pd
-from .db_ops import get_data_from_database
+from .db_ops import diff_with_table, get_data_from_database, get_table_columns
+from .dimension_resolver import DimensionResolver
 
 
 def update_dimension_table(
@@ -10,6 +11,7 @@ def update_dimension_table(
     change_columns: List[str],
     code_generation: Optional[Callable] = None,
     schema_name: str = "dap_tools",
+    resolver: DimensionResolver | None = None,
 ):
     """
     Met à jour une table de dimension de manière générique
@@ -21,52 +23,51 @@ def update_dimension_table(
         change_columns: Colonnes à vérifier pour détecter les changements
         code_generation: Fonction de génération de codes (optionnel)
         schema_name: Nom du schéma
+        resolver: Service de résolution des dimensions de l'exécution (les dimensions lues pour la
+            génération des codes et l'alignement ne le sont qu'une fois par exécution)
     """
+    resolver = resolver or DimensionResolver(schema_name)
+
     # 1. Fusion des sources et déduplication
     combined_df = pd.concat(source_dfs, ignore_index=True).drop_duplicates()
 
-    # 2. Récupération des données existantes
-    existing_data = get_data_from_database(dimension_name, schema_name=schema_name)
-
-    # 3. Détection des modifications
-    # existing_data = existing_data.astype({col: combined_df[col].dtype for col in merge_on})
-    existing_data = existing_data.astype(
-        {col: safe_dtype(combined_df[col].dtype) for col in merge_on}
+    # 2. Détection des nouvelles lignes et des modifications directement dans la base
+    diff = diff_with_table(
+        combined_df,
+        dimension_name,
+        key_columns=merge_on,
+        schema_name=schema_name,
+        compare_columns=change_columns,
+        include_target_columns=True,
     )
-    merged = combined_df.merge(existing_data, on=merge_on, how="left", suffixes=("", "_existing"))
-
-    # 4. Filtrage des lignes modifiées
-    change_conditions = ""
-
-    for col in change_columns:
-        change_conditions += f"(merged['{col}'] != merged['{col}_existing']) |"
-
-    change_conditions = change_conditions.strip("|")
-
-    updated_data = merged.loc[eval(change_conditions)]
+    updated_data = pd.concat([diff["new"], diff["changed"]], ignore_index=True)
+    existing_columns = list(get_table_columns(dimension_name, schema_name))
 
     if not updated_data.empty:
-        # 5. Génération des codes si nécessaire
+        # 3. Génération des codes si nécessaire
         if code_generation:
+            existing_data = resolver.get(dimension_name)
             updated_data = code_generation(updated_data, existing_data)
 
-        # 6. Alignement du format de sortie
+        # 4. Alignement du format de sortie
         if dimension_name == "dim_structure":
             # Il faudra rajouter les informations de code_district
-            df_district_db = get_data_from_database("dim_district", schema_name=schema_name)
+            df_district_db = resolver.get("dim_district")
 
             updated_data = updated_data.drop(columns="Code_district").merge(
                 df_district_db, on=["id_district_esigl"]
-            )[existing_data.columns.tolist()]
+            )[existing_columns]
 
-        updated_data = updated_data[existing_data.columns.tolist()]
+        updated_data = updated_data[existing_columns]
 
     return updated_data
 
 
 def region_code_generation(df, existing, metabase):
     """Génère les informations restante de la table"""
-    df_code = metabase.get_data_from_sql_query("""
+    # Lecture directe, sans le cache des extractions : une région ajoutée après la mise en cache
+    # n'aurait pas de code
+    df_code = metabase.fetch_paginated("""
         SELECT code as code_region, id AS id_region_esigl
         FROM geographic_zones WHERE levelid = 2
     """)
@@ -80,11 +81,13 @@ def region_code_generation(df, existing, metabase):
     return df.drop(columns=["code_region"])
 
 
-def district_code_generation(df, existing, tb_region, schema_name):
+def district_code_generation(df, existing, tb_region, schema_name, resolver=None):
     """Génère les informations sur les code de district"""
     # Recherche des codes régionaux
     df = df.drop(columns="Code_region")
-    df_region = get_data_from_database(tb_region, schema_name)[["id_region_esigl", "Code_region"]]
+    df_region = (
+        resolver.get(tb_region) if resolver else get_data_from_database(tb_region, schema_name)
+    )[["id_region_esigl", "Code_region"]]
     df = df.merge(df_region, on="id_region_esigl", how="left")
     max_code = existing["Code_district"].str.extract(r"DIST-(\d+)").astype(float).max()
     missing = df["Code_district"].isna()
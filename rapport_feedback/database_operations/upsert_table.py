@@ -1,41 +1,75 @@
+import time
+from functools import cache
+
+import pandas as pd
 from sqlalchemy import MetaData, Table, inspect
 from sqlalchemy.dialects.postgresql import insert
-import pandas as pd
 
+
+@cache
 def get_table_info(table_name: str, schema_name:str, engine) -> tuple:
-    """Récupère les métadonnées de la table"""
+    """Récupère les métadonnées de la table (mises en cache pour la durée du processus)"""
     inspector = inspect(engine)
     columns = inspector.get_columns(table_name, schema=schema_name)
     pk = inspector.get_pk_constraint(table_name, schema=schema_name)['constrained_columns']
     return columns, pk
 
-def upsert_table(df: pd.DataFrame, table_name: str, schema_name:str, engine, conflict_columns: list=[]):
-    """UPSERT pour tables avec PK auto-générée"""
+@cache
+def get_reflected_table(table_name: str, schema_name: str, engine) -> Table:
+    """Récupère la table réfléchie par SQLAlchemy (mise en cache pour la durée du processus)"""
+    return Table(table_name, MetaData(schema=schema_name), autoload_with=engine)
+
+def iter_record_batches(df: pd.DataFrame, chunk_size: int):
+    """Génère les lignes du DataFrame par lots de dictionnaires, les valeurs manquantes étant en None"""
+    columns = df.columns.tolist()
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        yield [dict(zip(columns, row)) for row in chunk.itertuples(index=False, name=None)]
+
+def upsert_table(df: pd.DataFrame, table_name: str, schema_name:str, engine, conflict_columns: list | None = None, chunk_size: int=5000) -> list:
+    """
+    UPSERT pour tables avec PK auto-générée
+
+    Les lignes sont envoyées par lots de `chunk_size` avec une requête paramétrée unique
+    (INSERT ... ON CONFLICT DO UPDATE), dans une seule transaction.
+
+    Returns:
+        list: Nombre de lignes et durée (en secondes) de chaque lot
+    """
 
     if df.empty:
-        return "Aucune insertion ou mise à jour effectuée"
+        print("Aucune insertion ou mise à jour effectuée")
+        return []
 
     columns, pk = get_table_info(table_name, schema_name, engine)
-    
+
     auto_cols = [col['name'] for col in columns if col.get('autoincrement', False)]
     df = df.drop(columns=[c for c in auto_cols if c in df.columns], errors='ignore')
-    
-    metadata = MetaData(schema=schema_name)
-    table = Table(table_name, metadata, autoload_with=engine)
-    
-    stmt = insert(table).values(df.to_dict('records'))
-    
+
+    table = get_reflected_table(table_name, schema_name, engine)
+
+    stmt = insert(table)
+
+    conflict_columns = conflict_columns or []
     update_dict = {
-        c.key: c for c in stmt.excluded 
+        c.key: c for c in stmt.excluded
         if c.key not in [*conflict_columns, *pk]
     }
-    
+
     conflict_columns = pk if len(conflict_columns)==0 else conflict_columns
-    
+
     update_stmt = stmt.on_conflict_do_update(
         index_elements=conflict_columns,
         set_=update_dict
     )
-    
+
+    timings = []
     with engine.begin() as conn:
-        conn.execute(update_stmt)
\ No newline at end of file
+        for records in iter_record_batches(df, chunk_size):
+            start = time.perf_counter()
+            conn.execute(update_stmt, records)
+            timings.append({"rows": len(records), "seconds": round(time.perf_counter() - start, 3)})
+
+    print(f"Upsert de {len(df)} enrégistrements réussie en {len(timings)} lot(s)")
+    return timings
@@ -10,6 +10,8 @@ from openpyxl.styles.differential import DifferentialStyle
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.workbook.defined_name import DefinedName
 
+from .style_registry import StyleRegistry
+
 # Formule générale qui sera formatée pour les différentes règles
 f_rule_etat_stock = 'NOT(ISERROR(SEARCH("{etat_stock}", {col_letter_etat_stock}{index_start})))'
 
@@ -117,6 +119,12 @@ def export_detail_comp_promp_to_sheet(
 
     side = Side(style="thin", color="000000")
     border = Border(left=side, right=side, bottom=side)
+
+    styles = StyleRegistry(wb_feedback_report)
+    style_detail = styles.register("Detail ETS", font=font, border=border, alignment=alignment_one)
+    style_detail_site = styles.register(
+        "Detail ETS - Site", font=font, border=border, alignment=alignment_two
+    )
     start = 2
     # for start, row_comp, row_promp in enumerate(dataframe_to_rows(df_comp, index=False, header=False), dataframe_to_rows(df_promp, index=False, header=False), start=2):
     for row_comp, row_promp in zip(
@@ -124,14 +132,10 @@ def export_detail_comp_promp_to_sheet(
         dataframe_to_rows(df_promp, index=False, header=False),
     ):
         for col, element in dico_cols.items():
-            cell_comp = ws_comp.cell(row=start, column=element[1], value=row_comp[element[2]])
-            cell_promp = ws_promp.cell(row=start, column=element[1], value=row_promp[element[2]])
             # Gestion de la mise en forme des cellules
-            cell_comp.font = cell_promp.font = font
-            cell_comp.alignment = cell_promp.alignment = (
-                alignment_one if col not in ("Site", "Region") else alignment_two
-            )
-            cell_comp.border = cell_promp.border = border
+            style = style_detail if col not in ("Site", "Region") else style_detail_site
+            styles.write(ws_comp, start, element[1], row_comp[element[2]], style)
+            styles.write(ws_promp, start, element[1], row_promp[element[2]], style)
 
         start += 1
 
@@ -286,6 +290,15 @@ def export_detail_comp_promp_to_sheet(
     alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
     fill = PatternFill(start_color="FFEDEDED", fill_type="solid")
 
+    style_border_region = styles.register("Taux par Region - bordure", border=border)
+    style_taux_region = styles.register(
+        "Taux par Region",
+        font=font,
+        fill=fill,
+        alignment=alignment,
+        number_format=numbers.FORMAT_PERCENTAGE,
+    )
+
     # Affectation des valeurs aux cellules
     start = 2
     for index_col_merge, index_cols in zip(
@@ -297,13 +310,8 @@ def export_detail_comp_promp_to_sheet(
             )  # Petit problème ici à revoir pourquoi il ne merge pas
             ws_promp.merge_cells(index_col_merge.format(element[0]))
 
-            for row in ws_comp[index_col_merge.format(element[0])]:
-                for cell in row:
-                    cell.border = border
-
-            for row in ws_promp[index_col_merge.format(element[0])]:
-                for cell in row:
-                    cell.border = border
+            styles.format_range(ws_comp, index_col_merge.format(element[0]), style_border_region)
+            styles.format_range(ws_promp, index_col_merge.format(element[0]), style_border_region)
 
             ws_comp.merge_cells(
                 index_col_merge.format(element[0])
@@ -312,13 +320,9 @@ def export_detail_comp_promp_to_sheet(
 
             # Affectation des valeurs
             value_comp = df_region_comp.iloc[start - 2, dico_cols[col][2]]
-            cell_comp = ws_comp.cell(row=index_cols, column=element[1], value=value_comp)
+            styles.write(ws_comp, index_cols, element[1], value_comp, style_taux_region)
             value_promp = df_region_promp.iloc[start - 2, dico_cols[col][2]]
-            cell_promp = ws_promp.cell(row=index_cols, column=element[1], value=value_promp)
-            cell_comp.font = cell_promp.font = font
-            cell_comp.fill = cell_promp.fill = fill
-            cell_comp.alignment = cell_promp.alignment = alignment
-            cell_comp.number_format = cell_promp.number_format = numbers.FORMAT_PERCENTAGE
+            styles.write(ws_promp, index_cols, element[1], value_promp, style_taux_region)
 
         start += 1
 
@@ -386,6 +390,36 @@ def export_detail_comp_promp_to_sheet(
     fill_comp = PatternFill(start_color="FFDDEBF7", fill_type="solid")
     fill_promp = PatternFill(start_color="FFE2EFDA", fill_type="solid")
 
+    # Styles par feuille, type de colonne et parité de ligne (lignes paires colorées)
+    region_styles = {}
+    for ws_region, fill_even in ((ws_region_comp, fill_comp), (ws_region_promp, fill_promp)):
+        for parity, fill_row in ((0, fill_even), (1, fill)):
+            region_styles[ws_region, "Region", parity] = styles.register(
+                f"{ws_region.title} - Region {parity}",
+                font=font_region,
+                fill=fill_row,
+                alignment=alignment_region,
+            )
+            region_styles[ws_region, "Taux", parity] = styles.register(
+                f"{ws_region.title} - Taux {parity}",
+                font=font,
+                fill=fill_row,
+                border=border_two,
+                alignment=alignment,
+                number_format=numbers.FORMAT_PERCENTAGE,
+            )
+            region_styles[ws_region, "Total", parity] = styles.register(
+                f"{ws_region.title} - Total {parity}",
+                font=font,
+                fill=fill_row,
+                border=border,
+                alignment=alignment,
+                number_format="#,##0",
+            )
+            region_styles[ws_region, None, parity] = styles.register(
+                f"{ws_region.title} - {parity}", font=font, fill=fill_row, alignment=alignment
+            )
+
     start = 5
     for row_comp, row_promp in zip(
         dataframe_to_rows(df_region_comp, index=False, header=False),
@@ -394,23 +428,19 @@ def export_detail_comp_promp_to_sheet(
         for col, element in dico_cols.items():
             # Affectation des valeurs
             val_comp, val_promp = row_comp[element[1]], row_promp[element[1]]
-            cell_comp = ws_region_comp.cell(row=start, column=element[0], value=val_comp)
-            cell_promp = ws_region_promp.cell(row=start, column=element[0], value=val_promp)
-            # print(col, val_comp, val_promp, start, element[0])
             # Gestion de la mise en forme des cellules
-            cell_comp.font = cell_promp.font = font if col != "Region" else font_region
-            cell_comp.alignment = cell_promp.alignment = (
-                alignment if col != "Region" else alignment_region
-            )
-            cell_comp.fill = fill_comp if start % 2 == 0 else fill
-            cell_promp.fill = fill_promp if start % 2 == 0 else fill
-            if "Taux de Completude" in col:
-                cell_comp.number_format = cell_promp.number_format = numbers.FORMAT_PERCENTAGE
-                cell_comp.border = cell_promp.border = border_two
-
-            if "Total rapports attendus" in col:
-                cell_comp.number_format = cell_promp.number_format = "#,##0"
-                cell_comp.border = cell_promp.border = border
+            if col == "Region":
+                kind = "Region"
+            elif "Taux de Completude" in col:
+                kind = "Taux"
+            elif "Total rapports attendus" in col:
+                kind = "Total"
+            else:
+                kind = None
+            style_comp = region_styles[ws_region_comp, kind, start % 2]
+            style_promp = region_styles[ws_region_promp, kind, start % 2]
+            styles.write(ws_region_comp, start, element[0], val_comp, style_comp)
+            styles.write(ws_region_promp, start, element[0], val_promp, style_promp)
 
         start += 1
 
@@ -586,29 +616,33 @@ def export_stock_data_to_sheet(
         "QUANTITE A TRANSFERER OUT",
     }
 
+    # Un style nommé par colonne, enregistré une seule fois puis appliqué à chaque ligne
+    styles = StyleRegistry(wb_feedback_report)
+    col_styles = {
+        col: styles.register(
+            f"ETAT DU STOCK - {col}",
+            font=font_one if col in special_font_cols else font_two,
+            fill=fill if col in fill_cols else None,
+            border=border,
+            alignment=(
+                alignment_two
+                if col in special_alignment_cols or element[1] in special_alignment_indices
+                else alignment_one
+            ),
+            number_format=number_format_cols.get(col),
+        )
+        for col, element in dico_cols.items()
+    }
+    style_last_cols = styles.register("ETAT DU STOCK", font=font_one, border=border)
+
     for start, row in enumerate(
         dataframe_to_rows(extract_stock, index=False, header=False), start=2
     ):
         ws.row_dimensions[start].height = 25.2
         for col, element in dico_cols.items():
-            cell = ws.cell(row=start, column=element[1], value=row[element[2]])
-            cell.border = border
-            cell.font = font_one if col in special_font_cols else font_two
-            cell.alignment = (
-                alignment_two
-                if col in special_alignment_cols or element[1] in special_alignment_indices
-                else alignment_one
-            )
-            if col in number_format_cols:
-                cell.number_format = number_format_cols[col]
-            if col in fill_cols:
-                cell.fill = fill
-        cell = ws.cell(row=start, column=element[1] + 1)
-        cell.border = border
-        cell.font = font_one
-        cell = ws.cell(row=start, column=element[1] + 2)
-        cell.border = border
-        cell.font = font_one
+            styles.write(ws, start, element[1], row[element[2]], col_styles[col])
+        styles.write(ws, start, element[1] + 1, None, style_last_cols)
+        styles.write(ws, start, element[1] + 2, None, style_last_cols)
 
     # Add rule in column Categorie du produit
     rule_categorie_produit = CellIsRule(
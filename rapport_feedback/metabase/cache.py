@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCache:
+    """
+    Cache local des extractions Metabase au format Parquet.
+
+    Chaque résultat est stocké dans un fichier Parquet dont le nom est le hash de la requête SQL rendue
+    et de la date du rapport. Un index JSON conserve pour chaque entrée sa date de création, son dernier
+    accès et sa taille, ce qui permet d'appliquer une durée de vie (TTL) et une éviction LRU bornée en taille.
+
+    Le dossier peut être partagé par plusieurs exécutions simultanées : chaque opération relit l'index sous un
+    verrou de fichier avant de le modifier, pour ne pas écraser les entrées enregistrées entre-temps par une autre
+    exécution.
+    """
+
+    INDEX_FILE = "index.json"
+    LOCK_FILE = "index.lock"
+
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        ttl: float | None = 30 * 24 * 3600,
+        max_size_bytes: int = 2 * 1024**3,
+    ):
+        """
+        Args:
+            cache_dir: Répertoire du cache (créé si nécessaire), par exemple sous le workspace
+            ttl: Durée de vie d'une entrée en secondes (None pour ne jamais expirer)
+            max_size_bytes: Taille maximale du cache, au-delà les entrées les moins récemment lues sont supprimées
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_size_bytes = max_size_bytes
+        self._index_path = self.cache_dir / self.INDEX_FILE
+        self._lock_path = self.cache_dir / self.LOCK_FILE
+        self._index = self._load_index()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        sql_query: str, date_report: str | None = None, database_id: int | None = None
+    ) -> str:
+        """Calcule la clé d'une extraction à partir de la requête rendue et de la date du rapport."""
+        payload = json.dumps(
+            {"sql": sql_query.strip(), "date_report": date_report, "database_id": database_id},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        """Retourne le DataFrame en cache pour la clé, ou None s'il est absent ou expiré."""
+        with self._locked_index():
+            entry = self._index.get(key)
+            path = self._path(key)
+            expired = (
+                entry is not None
+                and self.ttl is not None
+                and time.time() - entry["created_at"] > self.ttl
+            )
+            if entry is None or expired or not path.exists():
+                self._drop(key)
+                self._save_index()
+                return None
+
+            entry["last_access"] = time.time()
+            self._save_index()
+            # Lu sous le verrou : une autre exécution ne peut pas l'évincer pendant la lecture
+            return pd.read_parquet(path)
+
+    def put(self, key: str, df: pd.DataFrame, date_report: str | None = None) -> None:
+        """Enregistre le DataFrame pour la clé puis applique l'éviction si la taille maximale est dépassée."""
+        with self._locked_index():
+            path = self._path(key)
+            df.to_parquet(path, index=False)
+            now = time.time()
+            self._index[key] = {
+                "created_at": now,
+                "last_access": now,
+                "size": path.stat().st_size,
+                "date_report": date_report,
+            }
+            self._evict()
+            self._drop_orphans()
+            self._save_index()
+
+    def get_or_fetch(
+        self,
+        sql_query: str,
+        fetch: Callable[[], pd.DataFrame],
+        date_report: str | None = None,
+        database_id: int | None = None,
+        force_refresh: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Retourne le résultat en cache de la requête, ou l'extrait avec `fetch` puis le met en cache.
+
+        Args:
+            sql_query: Requête SQL rendue
+            fetch: Fonction sans argument réalisant l'extraction
+            date_report: Date du rapport associée à l'extraction
+            database_id: ID de la base Metabase
+            force_refresh: Ignore l'entrée existante et ré-extrait les données
+        """
+        key = self.make_key(sql_query, date_report, database_id)
+        if not force_refresh:
+            df = self.get(key)
+            if df is not None:
+                return df
+
+        df = fetch()
+        try:
+            self.put(key, df, date_report)
+        except (ImportError, OSError, TypeError, ValueError, NotImplementedError) as e:
+            # Le cache ne doit jamais bloquer l'extraction (pyarrow absent, type de colonne non supporté,
+            # disque plein...) ; les erreurs pyarrow dérivent de ces exceptions standard
+            self.invalidate(key)
+            logger.warning(f"Impossible de mettre en cache l'extraction: {e}")
+        return df
+
+    def invalidate(self, key: str | None = None, date_report: str | None = None) -> int:
+        """
+        Supprime une entrée par clé, ou toutes les entrées d'une date de rapport.
+
+        Returns:
+            Nombre d'entrées supprimées
+        """
+        with self._locked_index():
+            keys = [
+                k
+                for k, entry in self._index.items()
+                if k == key or (date_report is not None and entry.get("date_report") == date_report)
+            ]
+            for k in keys:
+                self._drop(k)
+            if key is not None:
+                # Fichier éventuellement écrit sans entrée d'index (échec de `put`)
+                self._drop(key)
+            self._save_index()
+        return len(keys)
+
+    def clear(self) -> None:
+        """Vide entièrement le cache."""
+        with self._locked_index():
+            for key in list(self._index):
+                self._drop(key)
+            self._drop_orphans()
+            self._save_index()
+
+    @contextmanager
+    def _locked_index(self):
+        """
+        Verrouille l'index (threads de l'exécution et autres exécutions sur le même dossier) et le relit
+        depuis le disque ; les modifications doivent être enregistrées avec `_save_index` avant la sortie
+        du bloc.
+        """
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                # Libéré à la fermeture du fichier
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._index = self._load_index()
+            yield
+
+    def _evict(self) -> None:
+        """Supprime les entrées les moins récemment lues jusqu'à repasser sous la taille maximale."""
+        total_size = sum(entry["size"] for entry in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_access"]):
+            if total_size <= self.max_size_bytes:
+                break
+            total_size -= self._index[key]["size"]
+            self._drop(key)
+
+    def _drop(self, key: str) -> None:
+        self._index.pop(key, None)
+        self._path(key).unlink(missing_ok=True)
+
+    def _drop_orphans(self) -> None:
+        """Supprime les fichiers Parquet absents de l'index (entrée perdue, exécution interrompue)."""
+        for path in self.cache_dir.glob("*.parquet"):
+            if path.stem not in self._index:
+                path.unlink(missing_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.parquet"
+
+    def _load_index(self) -> dict:
+        try:
+            return json.loads(self._index_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self) -> None:
+        # Écriture dans un fichier temporaire puis remplacement atomique : un autre processus ne lit
+        # jamais un index à moitié écrit
+        tmp_path = self._index_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self._index, indent=1))
+        os.replace(tmp_path, self._index_path)
@@ -0,0 +1,162 @@
+import json
+import os
+
+import pandas as pd
+
+from . import queries
+from .cache import QueryCache
+from .metabase import Metabase
+
+# Requête incrémentale et colonne identifiant la réquisition dans chaque requête
+INCREMENTAL_DATASETS = {
+    "transmission": (queries.QUERY_TRANSMISSION_INCREMENTAL, "r.id"),
+    "etat_stock": (queries.QUERY_ETAT_STOCK_INCREMENTAL, "requisitions.id"),
+}
+
+
+class IncrementalExtractor:
+    """
+    Extraction incrémentale des jeux de données eSIGL d'une période de rapport.
+
+    Pour chaque jeu de données et chaque période, le résultat complet est conservé dans le cache local
+    avec un watermark (date du dernier changement de statut et plus grand identifiant de réquisition vus).
+    Les exécutions suivantes n'extraient que les réquisitions créées ou ayant changé de statut depuis ce
+    watermark : leurs lignes remplacent celles du jeu de données en cache.
+
+    Les extractions complètes passent par l'export CSV de Metabase (avec repli sur la pagination), les
+    extractions partielles et la liste des réquisitions modifiées par la pagination JSON.
+    """
+
+    WATERMARKS_FILE = "watermarks.json"
+
+    def __init__(self, metabase: Metabase, cache: QueryCache, max_changed_requisitions: int = 5000):
+        """
+        Args:
+            metabase: Client Metabase utilisé pour les extractions
+            cache: Cache local où sont conservés les jeux de données par période
+            max_changed_requisitions: Au-delà de ce nombre de réquisitions modifiées, la période est
+                ré-extraite entièrement plutôt que filtrée sur une liste d'identifiants
+        """
+        self.metabase = metabase
+        self.cache = cache
+        self.max_changed_requisitions = max_changed_requisitions
+        self._watermarks_path = cache.cache_dir / self.WATERMARKS_FILE
+        self._pending_watermarks = {}
+
+    def extract(
+        self,
+        dataset: str,
+        date_report: str,
+        period_filter: str,
+        force_refresh: bool = False,
+        commit: bool = True,
+    ) -> tuple[pd.DataFrame, set | None]:
+        """
+        Retourne le jeu de données à jour de la période et les établissements dont les données ont changé.
+
+        Args:
+            dataset: Nom du jeu de données ("transmission" ou "etat_stock")
+            date_report: Date du rapport
+            period_filter: Liste des périodes eSIGL au format SQL (résultat de `date_utils.get_date_report`)
+            force_refresh: Ignore le jeu de données en cache et ré-extrait toute la période
+            commit: Enregistre immédiatement le nouveau watermark. Avec False, il n'est enregistré
+                qu'à l'appel de `commit()` : si le traitement des établissements modifiés échoue
+                entre-temps, l'exécution suivante extrait de nouveau les mêmes réquisitions
+
+        Returns:
+            Le DataFrame de la période (avec la colonne `requisition_id`) et l'ensemble des codes des
+            établissements dont au moins une réquisition a été ajoutée ou modifiée lors de cet appel.
+            L'ensemble vaut None lorsque toute la période a été extraite : tous les établissements
+            sont alors à retraiter.
+        """
+        query_template, id_column = INCREMENTAL_DATASETS[dataset]
+        key = QueryCache.make_key(f"{dataset}:{period_filter}", date_report)
+        watermarks = self._load_watermarks()
+
+        cached = None if force_refresh else self.cache.get(key)
+        watermark = watermarks.get(key) if cached is not None else None
+
+        changes = self.metabase.fetch_paginated(
+            queries.QUERY_CHANGED_REQUISITIONS.format(
+                date_report=period_filter,
+                watermark=watermark["last_change"] if watermark else "-infinity",
+                max_requisition_id=watermark["max_requisition_id"] if watermark else 0,
+            )
+        )
+        if watermark is not None and changes.empty:
+            return cached, set()
+
+        # Sans aucune ligne, Metabase renvoie un DataFrame sans colonnes
+        changed_ids = (
+            [] if changes.empty else changes["requisition_id"].astype(int).unique().tolist()
+        )
+        if (
+            watermark is None
+            or "requisition_id" not in cached.columns
+            or len(changed_ids) > self.max_changed_requisitions
+        ):
+            data = self.metabase.fetch_csv_export(
+                self._render(query_template, period_filter, "TRUE")
+            )
+            changed_facilities = None
+        else:
+            data_changed = self.metabase.fetch_paginated(
+                self._render(
+                    query_template,
+                    period_filter,
+                    f"{id_column} IN ({', '.join(map(str, changed_ids))})",
+                )
+            )
+            data = pd.concat(
+                [cached.loc[~cached["requisition_id"].isin(changed_ids)], data_changed],
+                ignore_index=True,
+            )
+            changed_facilities = set(changes["code"].dropna().astype(int))
+
+        self.cache.put(key, data, date_report)
+        self._pending_watermarks[key] = self._next_watermark(changes, watermark)
+        if commit:
+            self.commit()
+
+        return data, changed_facilities
+
+    def commit(self) -> None:
+        """Enregistre les watermarks des extractions dont les données ont été traitées en aval."""
+        if not self._pending_watermarks:
+            return
+        watermarks = self._load_watermarks()
+        watermarks.update(self._pending_watermarks)
+        self._save_watermarks(watermarks)
+        self._pending_watermarks.clear()
+
+    @staticmethod
+    def _render(query_template: str, period_filter: str, requisition_filter: str) -> str:
+        return query_template.format(
+            date_report=period_filter, requisition_filter=requisition_filter
+        )
+
+    @staticmethod
+    def _next_watermark(changes: pd.DataFrame, watermark: dict | None) -> dict:
+        """Avance le watermark au dernier changement de statut et au plus grand identifiant observés."""
+        watermark = watermark or {"last_change": "-infinity", "max_requisition_id": 0}
+        if changes.empty:
+            return watermark
+        # Les dates sont au format 'YYYY-MM-DD HH24:MI:SS.US' : l'ordre lexical est l'ordre chronologique
+        # et "-infinity" est inférieur à toute date
+        return {
+            "last_change": max(changes["last_change"].max(), watermark["last_change"]),
+            "max_requisition_id": max(
+                int(changes["requisition_id"].max()), watermark["max_requisition_id"]
+            ),
+        }
+
+    def _load_watermarks(self) -> dict:
+        try:
+            return json.loads(self._watermarks_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_watermarks(self, watermarks: dict) -> None:
+        tmp_path = self._watermarks_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(watermarks, indent=1))
+        os.replace(tmp_path, self._watermarks_path)
@@ -1,29 +1,89 @@
-from typing import Optional
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from urllib.parse import urlparse
 
+import numpy as np
 import pandas as pd
 import requests
 from openhexa.sdk import CustomConnection
 
+from .cache import QueryCache
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal de lignes renvoyées par les exports Metabase (limite par défaut d'un export CSV)
+EXPORT_ROW_LIMIT = 1_048_575
+
+# Nombre maximal de lignes renvoyées par /api/dataset (limite par défaut de Metabase)
+DATASET_ROW_LIMIT = 2000
+
+# Correspondance entre les types de base Metabase et les noms de types pyarrow
+METABASE_ARROW_TYPES = {
+    "type/Integer": "int64",
+    "type/BigInteger": "int64",
+    "type/Float": "float64",
+    "type/Decimal": "float64",
+    "type/Boolean": "bool_",
+}
+
 
 class MetabaseError(Exception):
     pass
 
 
 class Metabase:
-    def __init__(self, connection: CustomConnection):
+    def __init__(self, connection: CustomConnection, cache: QueryCache | None = None):
         self.api = Api(connection)
+        self.cache = cache
 
     def get_data_from_sql_query(
-        self, sql_query: str, database_id: int = 3, chunk_size: int = 2000
+        self,
+        sql_query: str,
+        database_id: int = 3,
+        chunk_size: int = 2000,
+        max_workers: int = 1,
+        keyset_column: str | None = None,
+        order_by: str | None = None,
+        max_retries: int = 3,
+        backoff_factor: float = 1.0,
+        timeout: float = 120,
+        date_report: str | None = None,
+        force_refresh: bool = False,
     ) -> pd.DataFrame:
         """
         Exécute une requête SQL sur Metabase avec pagination automatique.
 
+        Lorsqu'un cache est associé à l'instance, le résultat est lu depuis le cache local s'il existe
+        pour la même requête et la même date de rapport, et y est enregistré sinon.
+
+        Trois modes de pagination sont disponibles :
+        - `keyset_column` renseigné : pagination par clé (`WHERE colonne > dernière valeur`), la colonne
+          devant être unique et stable dans le résultat de la requête ;
+        - `max_workers > 1` : le nombre de lignes est d'abord compté, puis les pages LIMIT/OFFSET,
+          triées sur la colonne unique `order_by`, sont récupérées en parallèle sur la session
+          authentifiée et réassemblées dans l'ordre. Sans tri sur une clé unique, deux pages lues
+          simultanément peuvent se recouvrir ou laisser des lignes de côté ;
+        - `max_workers == 1` (par défaut) : les pages LIMIT/OFFSET sont récupérées l'une après
+          l'autre.
+
         Args:
             sql_query: Requête SQL avec {limit} et {offset} comme paramètres de pagination
             database_id: ID de la base Metabase
-            chunk_size: Nombre de lignes par requête (2000 par défaut)
+            chunk_size: Nombre de lignes par requête (2000 par défaut, limite de /api/dataset)
+            max_workers: Nombre maximal de pages récupérées simultanément (1 par défaut)
+            keyset_column: Colonne du résultat utilisée pour la pagination par clé
+            order_by: Colonne unique du résultat sur laquelle trier les pages récupérées en
+                parallèle, obligatoire lorsque `max_workers > 1`
+            max_retries: Nombre de nouvelles tentatives par page en cas d'erreur réseau ou serveur
+            backoff_factor: Délai de base (en secondes) entre deux tentatives, doublé à chaque essai
+            timeout: Délai maximal (en secondes) d'attente d'une réponse, au-delà la requête est
+                retentée comme une erreur réseau
+            date_report: Date du rapport, utilisée avec la requête comme clé du cache
+            force_refresh: Ignore le cache et ré-extrait les données
 
         Returns:
             DataFrame combinant tous les résultats
@@ -31,25 +91,242 @@ class Metabase:
         Raises:
             ValueError en cas d'erreur
         """
+        fetch = partial(
+            self.fetch_paginated,
+            sql_query,
+            database_id,
+            chunk_size,
+            max_workers,
+            keyset_column,
+            order_by,
+            max_retries,
+            backoff_factor,
+            timeout,
+        )
+        if self.cache is None:
+            return fetch()
+        return self.cache.get_or_fetch(sql_query, fetch, date_report, database_id, force_refresh)
+
+    def fetch_paginated(
+        self,
+        sql_query: str,
+        database_id: int = 3,
+        chunk_size: int = 2000,
+        max_workers: int = 1,
+        keyset_column: str | None = None,
+        order_by: str | None = None,
+        max_retries: int = 3,
+        backoff_factor: float = 1.0,
+        timeout: float = 120,
+    ) -> pd.DataFrame:
+        """
+        Extrait toutes les pages de la requête selon le mode de pagination demandé, sans passer par
+        le cache. Les paramètres sont ceux de `get_data_from_sql_query`.
+        """
+        if chunk_size > DATASET_ROW_LIMIT:
+            # Metabase tronque silencieusement les pages au-delà de cette limite
+            raise ValueError(
+                f"chunk_size ({chunk_size}) dépasse la limite de {DATASET_ROW_LIMIT} lignes "
+                "par requête de Metabase"
+            )
+        if max_workers > 1 and not keyset_column and not order_by:
+            # Des pages LIMIT/OFFSET non triées lues en parallèle peuvent se recouvrir
+            raise ValueError(
+                "La pagination parallèle (max_workers > 1) nécessite une colonne unique `order_by`"
+            )
         try:
             sql_query = self._prepare_sql_query(sql_query)
-            data_frames = []
-            offset = 0
-            names = None
-
-            while True:
-                df, names = self._fetch_chunk(sql_query, database_id, chunk_size, offset, names)
-                if df.empty:
-                    break
-                data_frames.append(df)
-                offset += len(df)
-                if len(df) < chunk_size:
-                    break
+            retry = {
+                "max_retries": max_retries,
+                "backoff_factor": backoff_factor,
+                "timeout": timeout,
+            }
+
+            if keyset_column:
+                data_frames = self._fetch_keyset_pages(
+                    sql_query, database_id, chunk_size, keyset_column, **retry
+                )
+            elif max_workers > 1:
+                data_frames = self._fetch_pages_concurrently(
+                    sql_query, database_id, chunk_size, max_workers, order_by, **retry
+                )
+            else:
+                data_frames = self._fetch_pages_sequentially(
+                    sql_query, database_id, chunk_size, **retry
+                )
 
             return pd.concat(data_frames, ignore_index=True) if data_frames else pd.DataFrame()
         except Exception as e:
             raise ValueError(f"Erreur lors de la récupération des données: {e}") from e
 
+    def get_data_from_csv_export(
+        self,
+        sql_query: str,
+        database_id: int = 3,
+        destination: str | None = None,
+        block_size: int = 1 << 22,
+        timeout: float = 120,
+        date_report: str | None = None,
+        force_refresh: bool = False,
+        **pagination_kwargs,
+    ) -> pd.DataFrame:
+        """
+        Exécute une requête SQL via l'export CSV de Metabase (/api/dataset/csv) en une seule requête.
+
+        Le flux CSV est décodé par blocs avec pyarrow, directement en colonnes typées à partir des
+        types `results_metadata` de la requête, sans passer par des listes Python intermédiaires.
+        Les dates restent des chaînes de caractères, comme dans le chemin JSON paginé.
+
+        Le chemin paginé `get_data_from_sql_query` est utilisé à la place lorsque pyarrow n'est pas
+        installé, que l'export n'est pas disponible (droits, version de Metabase, réponse invalide)
+        ou que le résultat atteint la limite de lignes de l'export.
+
+        Args:
+            sql_query: Requête SQL (les paramètres {limit} et {offset} éventuels sont ignorés)
+            database_id: ID de la base Metabase
+            destination: Chemin d'un fichier où enregistrer le CSV avant décodage. Par défaut le
+                flux est décodé en mémoire au fil de la réception.
+            block_size: Taille en octets des blocs décodés par pyarrow
+            timeout: Délai maximal (en secondes) d'attente d'une réponse ou d'un bloc du flux CSV
+            date_report: Date du rapport, utilisée avec la requête comme clé du cache
+            force_refresh: Ignore le cache et ré-extrait les données
+            **pagination_kwargs: Paramètres de pagination utilisés en cas de repli
+
+        Returns:
+            DataFrame contenant tous les résultats
+        """
+        fetch = partial(
+            self.fetch_csv_export,
+            sql_query,
+            database_id,
+            destination,
+            block_size,
+            timeout,
+            **pagination_kwargs,
+        )
+        if self.cache is None:
+            return fetch()
+        return self.cache.get_or_fetch(sql_query, fetch, date_report, database_id, force_refresh)
+
+    def fetch_csv_export(
+        self,
+        sql_query: str,
+        database_id: int = 3,
+        destination: str | None = None,
+        block_size: int = 1 << 22,
+        timeout: float = 120,
+        **pagination_kwargs,
+    ) -> pd.DataFrame:
+        """
+        Extrait les données via l'export CSV, avec repli sur la pagination JSON, sans passer par le
+        cache. Les paramètres sont ceux de `get_data_from_csv_export`.
+        """
+        fallback = partial(
+            self.fetch_paginated, sql_query, database_id, timeout=timeout, **pagination_kwargs
+        )
+        try:
+            import pyarrow as pa
+        except ImportError:
+            logger.warning("pyarrow n'est pas installé, repli sur la pagination JSON")
+            return fallback()
+
+        try:
+            base_query = self._strip_pagination(self._prepare_sql_query(sql_query))
+            columns = self._fetch_columns_metadata(base_query, database_id, timeout)
+            table = self._read_csv_export(
+                base_query, database_id, columns, destination, block_size, timeout
+            )
+        except (requests.exceptions.RequestException, pa.ArrowInvalid, ValueError) as e:
+            logger.warning(f"Export CSV Metabase indisponible, repli sur la pagination JSON: {e}")
+            return fallback()
+
+        if table.num_rows >= EXPORT_ROW_LIMIT:
+            logger.warning(
+                "Limite de lignes de l'export CSV atteinte, repli sur la pagination JSON"
+            )
+            return fallback()
+
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
+    def _fetch_columns_metadata(
+        self, base_query: str, database_id: int, timeout: float
+    ) -> list[dict]:
+        """Récupère les métadonnées (nom affiché et type de base) des colonnes de la requête."""
+        response = self.api.session.post(
+            f"{self.api.url}/dataset",
+            headers={"Content-Type": "application/json", "X-Metabase-Session": self.api.token},
+            json={
+                "database": database_id,
+                "type": "native",
+                "native": {"query": f"SELECT * FROM (\n{base_query}\n) AS metabase_meta\nLIMIT 0"},
+            },
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        try:
+            return response.json()["data"]["results_metadata"]["columns"]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Structure de réponse invalide: {e}") from e
+
+    def _read_csv_export(
+        self,
+        base_query: str,
+        database_id: int,
+        columns: list[dict],
+        destination: str | None,
+        block_size: int,
+        timeout: float,
+    ):
+        """Télécharge l'export CSV en flux et le décode par blocs en table pyarrow typée."""
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+
+        names = [col["display_name"] for col in columns]
+        column_types = {
+            col["display_name"]: getattr(
+                pa, METABASE_ARROW_TYPES.get(col.get("base_type"), "string")
+            )()
+            for col in columns
+        }
+
+        with self.api.session.post(
+            f"{self.api.url}/dataset/csv",
+            headers={"X-Metabase-Session": self.api.token},
+            data={
+                "query": json.dumps(
+                    {"database": database_id, "type": "native", "native": {"query": base_query}}
+                ),
+                "format_rows": "false",
+            },
+            stream=True,
+            timeout=timeout,
+        ) as response:
+            response.raise_for_status()
+
+            if destination is not None:
+                with open(destination, "wb") as file:
+                    file.writelines(response.iter_content(chunk_size=block_size))
+                source = destination
+            else:
+                response.raw.decode_content = True
+                source = response.raw
+
+            reader = pa_csv.open_csv(
+                source,
+                read_options=pa_csv.ReadOptions(
+                    column_names=names, skip_rows=1, block_size=block_size
+                ),
+                # Comme dans la réponse JSON, un texte NULL (champ vide) est None et non "" ;
+                # les autres marqueurs de pyarrow ("NA", "null", ...) restent du texte
+                convert_options=pa_csv.ConvertOptions(
+                    column_types=column_types,
+                    null_values=[""],
+                    strings_can_be_null=True,
+                    quoted_strings_can_be_null=True,
+                ),
+            )
+            return reader.read_all()
+
     def _prepare_sql_query(self, sql_query: str) -> str:
         """Valide et formate la requête SQL avec les paramètres de pagination."""
         sql_query = sql_query.rstrip(";")
@@ -66,38 +343,232 @@ class Metabase:
 
         return sql_query
 
+    @staticmethod
+    def _strip_pagination(sql_query: str) -> str:
+        """Retire les clauses LIMIT {limit} et OFFSET {offset} pour obtenir la requête de base."""
+        base_query = re.sub(r"\bLIMIT\s+\{limit\}", "", sql_query, flags=re.IGNORECASE)
+        base_query = re.sub(r"\bOFFSET\s+\{offset\}", "", base_query, flags=re.IGNORECASE)
+
+        if "{limit}" in base_query or "{offset}" in base_query:
+            raise ValueError(
+                "Les paramètres {limit} et {offset} doivent apparaître sous la forme LIMIT {limit} et OFFSET {offset}"
+            )
+
+        return base_query.rstrip()
+
+    @staticmethod
+    def _format_sql_literal(value) -> str:
+        """Formate une valeur Python en littéral SQL pour la pagination par clé."""
+        if isinstance(value, np.generic):
+            # Les clés lues dans un DataFrame sont des scalaires numpy (np.int64, np.float64...)
+            value = value.item()
+        if isinstance(value, bool):
+            return "TRUE" if value else "FALSE"
+        if isinstance(value, (int, float)):
+            return repr(value)
+        return "'" + str(value).replace("'", "''") + "'"
+
+    def _fetch_pages_sequentially(
+        self, sql_query: str, database_id: int, chunk_size: int, **retry
+    ) -> list[pd.DataFrame]:
+        """Récupère les pages LIMIT/OFFSET l'une après l'autre jusqu'à la dernière page incomplète."""
+        data_frames = []
+        offset = 0
+        names = None
+
+        while True:
+            df, names = self._fetch_chunk(
+                sql_query, database_id, chunk_size, offset, names, **retry
+            )
+            if df.empty:
+                break
+            data_frames.append(df)
+            offset += len(df)
+            if len(df) < chunk_size:
+                break
+
+        return data_frames
+
+    def _fetch_pages_concurrently(
+        self,
+        sql_query: str,
+        database_id: int,
+        chunk_size: int,
+        max_workers: int,
+        order_by: str,
+        **retry,
+    ) -> list[pd.DataFrame]:
+        """
+        Compte les lignes puis récupère toutes les pages en parallèle, dans l'ordre des offsets.
+
+        Les pages sont triées sur `order_by` : sans ordre déterministe, PostgreSQL peut renvoyer
+        les lignes dans un ordre différent d'une requête à l'autre (parcours séquentiels
+        synchronisés), et les pages se recouvrir sans que le nombre de lignes ne change.
+        """
+        base_query = self._strip_pagination(sql_query)
+        total_rows = self._count_rows(base_query, database_id, **retry)
+        sql_query = (
+            f"SELECT * FROM (\n{base_query}\n) AS metabase_page\n"
+            f'ORDER BY "{order_by}"\nLIMIT {{limit}}\nOFFSET {{offset}}'
+        )
+        offsets = range(0, total_rows, chunk_size)
+        if not offsets:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(offsets))) as executor:
+            futures = [
+                executor.submit(
+                    self._fetch_complete_chunk,
+                    sql_query,
+                    database_id,
+                    chunk_size,
+                    offset,
+                    min(chunk_size, total_rows - offset),
+                    **retry,
+                )
+                for offset in offsets
+            ]
+            return [future.result() for future in futures]
+
+    def _fetch_complete_chunk(
+        self,
+        sql_query: str,
+        database_id: int,
+        chunk_size: int,
+        offset: int,
+        expected_rows: int,
+        max_retries: int = 3,
+        backoff_factor: float = 1.0,
+        timeout: float = 120,
+    ) -> pd.DataFrame:
+        """
+        Récupère une page dont le nombre de lignes est connu d'après le comptage préalable.
+
+        Une page incomplète (limite de lignes de Metabase, données modifiées entre le comptage et
+        l'extraction) est récupérée à nouveau ; elle lève une erreur si elle l'est toujours après
+        `max_retries` tentatives, au lieu de perdre des lignes sans le signaler.
+        """
+        for attempt in range(max_retries + 1):
+            df, _ = self._fetch_chunk(
+                sql_query,
+                database_id,
+                chunk_size,
+                offset,
+                None,
+                max_retries,
+                backoff_factor,
+                timeout,
+            )
+            if len(df) == expected_rows:
+                return df
+            if attempt < max_retries:
+                time.sleep(backoff_factor * 2**attempt)
+
+        raise ValueError(
+            f"Page incomplète à l'offset {offset}: {len(df)} lignes reçues sur {expected_rows} "
+            "attendues"
+        )
+
+    def _fetch_keyset_pages(
+        self, sql_query: str, database_id: int, chunk_size: int, keyset_column: str, **retry
+    ) -> list[pd.DataFrame]:
+        """Récupère les pages triées sur `keyset_column` en reprenant après la dernière clé lue."""
+        base_query = self._strip_pagination(sql_query)
+        data_frames = []
+        names = None
+        condition = "TRUE"
+
+        while True:
+            page_query = (
+                f"SELECT * FROM (\n{base_query}\n) AS metabase_page\n"
+                f'WHERE {condition}\nORDER BY "{keyset_column}"\nLIMIT {chunk_size}'
+            )
+            df, names = self._run_native_query(page_query, database_id, names, **retry)
+            if df.empty:
+                break
+            data_frames.append(df)
+            if len(df) < chunk_size:
+                break
+            last_key = df[keyset_column].iloc[-1]
+            condition = f'"{keyset_column}" > {self._format_sql_literal(last_key)}'
+
+        return data_frames
+
+    def _count_rows(self, base_query: str, database_id: int, **retry) -> int:
+        """Compte le nombre de lignes renvoyées par la requête de base."""
+        count_query = f"SELECT count(*) AS total FROM (\n{base_query}\n) AS metabase_count"
+        df, _ = self._run_native_query(count_query, database_id, None, **retry)
+        return int(df.iloc[0, 0]) if not df.empty else 0
+
     def _fetch_chunk(
-        self, sql_query: str, database_id: int, chunk_size: int, offset: int, names: Optional[list]
+        self,
+        sql_query: str,
+        database_id: int,
+        chunk_size: int,
+        offset: int,
+        names: list | None,
+        max_retries: int = 3,
+        backoff_factor: float = 1.0,
+        timeout: float = 120,
     ) -> tuple[pd.DataFrame, list]:
         """Récupère un segment de données et gère les métadonnées."""
-        try:
-            response = self.api.session.post(
-                f"{self.api.url}/dataset",
-                headers={"Content-Type": "application/json", "X-Metabase-Session": self.api.token},
-                json={
-                    "database": database_id,
-                    "type": "native",
-                    "native": {"query": sql_query.format(limit=chunk_size, offset=offset)},
-                },
-                # timeout=15
-            )
-            response.raise_for_status()
-            data = response.json()["data"]
+        return self._run_native_query(
+            sql_query.format(limit=chunk_size, offset=offset),
+            database_id,
+            names,
+            max_retries=max_retries,
+            backoff_factor=backoff_factor,
+            timeout=timeout,
+        )
 
-            # Extraction des noms de colonnes
-            if names is None:
-                names = [col["display_name"] for col in data["results_metadata"]["columns"]]
+    def _run_native_query(
+        self,
+        native_query: str,
+        database_id: int,
+        names: list | None,
+        max_retries: int = 3,
+        backoff_factor: float = 1.0,
+        timeout: float = 120,
+    ) -> tuple[pd.DataFrame, list]:
+        """Exécute une requête native sur /api/dataset avec nouvelles tentatives et backoff exponentiel."""
+        attempt = 0
+        while True:
+            try:
+                response = self.api.session.post(
+                    f"{self.api.url}/dataset",
+                    headers={
+                        "Content-Type": "application/json",
+                        "X-Metabase-Session": self.api.token,
+                    },
+                    json={
+                        "database": database_id,
+                        "type": "native",
+                        "native": {"query": native_query},
+                    },
+                    timeout=timeout,
+                )
+                response.raise_for_status()
+                data = response.json()["data"]
 
-            df = pd.DataFrame(data["rows"])
-            if not df.empty:
-                df.columns = names
+                # Extraction des noms de colonnes
+                if names is None:
+                    names = [col["display_name"] for col in data["results_metadata"]["columns"]]
 
-            return df, names
+                df = pd.DataFrame(data["rows"])
+                if not df.empty:
+                    df.columns = names
 
-        except requests.exceptions.RequestException as e:
-            raise ValueError(f"Erreur réseau: {e}") from e
-        except (KeyError, TypeError) as e:
-            raise ValueError(f"Structure de réponse invalide: {e}") from e
+                return df, names
+
+            except requests.exceptions.RequestException as e:
+                status = getattr(e.response, "status_code", None)
+                retryable = status is None or status >= 500 or status == 429
+                if not retryable or attempt >= max_retries:
+                    raise ValueError(f"Erreur réseau: {e}") from e
+                time.sleep(backoff_factor * 2**attempt)
+                attempt += 1
+            except (KeyError, TypeError) as e:
+                raise ValueError(f"Structure de réponse invalide: {e}") from e
 
 
 class Api:
@@ -139,4 +610,4 @@ class Api:
             self.token = token
             return session
         except requests.JSONDecodeError as e:
-            raise MetabaseError("Réponse d'authentification invalide") from e
\ No newline at end of file
+            raise MetabaseError("Réponse d'authentification invalide") from e
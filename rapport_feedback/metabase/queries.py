@@ -105,4 +105,34 @@ SELECT DISTINCT
     facility_operators.text as Type_structure
 FROM facilities
 JOIN facility_operators ON facilities.operatedbyid = facility_operators.id
-"""
\ No newline at end of file
+"""
+
+# ----------------------------------------------------------------------------
+# Extraction incrémentale : variantes des requêtes de transmission et d'état de
+# stock qui exposent l'identifiant de la réquisition et acceptent un filtre
+# {requisition_filter} sur les réquisitions à extraire.
+# ----------------------------------------------------------------------------
+QUERY_TRANSMISSION_INCREMENTAL = QUERY_TRANSMISSION.replace(
+    "\nSELECT\n", "\nSELECT\n    r.id AS requisition_id,\n", 1
+).replace("ORDER BY period asc", "    AND {requisition_filter}\nORDER BY period asc")
+
+QUERY_ETAT_STOCK_INCREMENTAL = (
+    QUERY_ETAT_STOCK.replace("\nSELECT\n", "\nSELECT\n    requisitions.id AS requisition_id,\n", 1)
+    + "    AND {requisition_filter}\n"
+)
+
+QUERY_CHANGED_REQUISITIONS = """
+SELECT
+    r.id AS requisition_id,
+    cast(f.code as INTEGER) AS code,
+    to_char(max(rsc.createddate), 'YYYY-MM-DD HH24:MI:SS.US') AS last_change
+FROM requisition_status_changes rsc
+JOIN requisitions r ON r.id = rsc.rnrid
+JOIN processing_periods p ON p.id = r.periodid
+JOIN facilities f ON f.id = r.facilityid
+WHERE r.programid IN ('23','24','25','26','27','31','32','43','22','28','36')
+    AND upper(p.name) in {date_report}
+    AND r.emergency = 'false'
+    AND (rsc.createddate > '{watermark}'::timestamp OR r.id > {max_requisition_id})
+GROUP BY r.id, f.code
+"""
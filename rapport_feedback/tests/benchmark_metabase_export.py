@@ -0,0 +1,109 @@
+"""
+Compare l'extraction Metabase par l'export CSV et par la pagination JSON (durée et mémoire).
+
+Le serveur Metabase simulé (`metabase_stub`) tourne dans un sous-processus, et chaque chemin est
+mesuré dans son propre sous-processus : le pic de RSS (`ru_maxrss`) ne mesure ainsi que
+l'extraction. Chaque chemin est exécuté deux fois : une fois pour la durée et le pic de RSS,
+une fois sous tracemalloc pour le pic des allocations Python (tracemalloc ralentit l'extraction
+et ne voit pas la mémoire allouée par pyarrow).
+
+Usage (depuis le dossier rapport_feedback) :
+    python tests/benchmark_metabase_export.py --rows 1000000
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from metabase.metabase import Metabase
+from metabase_stub import StubMetabase
+
+QUERY = "SELECT id, valeur FROM stub"
+PATHS = {"csv": "Export CSV", "json": "Pagination JSON"}
+
+
+def serve(rows: int) -> None:
+    """Démarre le serveur simulé, affiche son URL et s'arrête à la fermeture de l'entrée standard."""
+    stub = StubMetabase(n_rows=rows)
+    print(stub.url, flush=True)
+    sys.stdin.read()
+    stub.close()
+
+
+def measure(path: str, url: str, traced: bool) -> None:
+    """Extrait toutes les lignes par le chemin `path` et affiche les mesures en JSON."""
+    metabase = Metabase(SimpleNamespace(url=url, username="user", password="secret"))
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if traced:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    df = metabase.fetch_csv_export(QUERY) if path == "csv" else metabase.fetch_paginated(QUERY)
+    seconds = time.perf_counter() - start
+
+    result = {"rows": len(df), "seconds": seconds}
+    if traced:
+        result["traced_peak"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        # ru_maxrss est en kilo-octets sous Linux
+        result["rss_peak"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        result["rss_growth"] = result["rss_peak"] - rss_before * 1024
+    print(json.dumps(result))
+
+
+def run_measure(path: str, url: str, traced: bool) -> dict:
+    args = [sys.executable, __file__, "--measure", path, "--url", url]
+    if traced:
+        args.append("--traced")
+    output = subprocess.run(args, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--measure", choices=PATHS, help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--traced", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.rows)
+    if args.measure:
+        return measure(args.measure, args.url, args.traced)
+
+    server = subprocess.Popen(
+        [sys.executable, __file__, "--serve", "--rows", str(args.rows)],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        url = server.stdout.readline().strip()
+        for path, label in PATHS.items():
+            result = run_measure(path, url, traced=False)
+            traced = run_measure(path, url, traced=True)
+            print(
+                f"{label:<16}: {result['seconds']:.2f}s pour {result['rows']} lignes, "
+                f"pic RSS {result['rss_peak'] / 2**20:.0f} Mo "
+                f"(+{result['rss_growth'] / 2**20:.0f} Mo pendant l'extraction), "
+                f"pic tracemalloc {traced['traced_peak'] / 2**20:.0f} Mo"
+            )
+    finally:
+        server.stdin.close()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Compare la durée des règles de gestion de stock ligne par ligne et vectorisées.
+
+Usage (depuis le dossier rapport_feedback) :
+    python tests/benchmark_stock_status.py --rows 500000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from compute_indicators.compute_indicators import compute_stock_status_columns
+from stock_status_fixtures import make_etat_stock, reference_stock_status_columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    args = parser.parse_args()
+
+    df = make_etat_stock(args.rows)
+
+    start = time.perf_counter()
+    compute_stock_status_columns(df, 31)
+    vectorized = time.perf_counter() - start
+    print(f"Vectorisé     : {vectorized:.2f}s pour {args.rows} lignes")
+
+    start = time.perf_counter()
+    reference_stock_status_columns(df, 31)
+    row_wise = time.perf_counter() - start
+    print(f"Ligne à ligne : {row_wise:.2f}s pour {args.rows} lignes")
+    print(f"Gain          : x{row_wise / vectorized:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Sites attendus et transmissions eSIGL synthétiques, et implémentation de référence ligne par ligne des
+indicateurs de complétude et de promptitude.
+
+La référence reprend à l'identique l'ancien calcul de `compute_indicators_completeness_and_promptness`
+(date limite et promptitude par `DataFrame.apply(axis=1)`) et l'ancienne
+`calculate_completeness_promptness_metrics`, qui comptait les soumissions de chaque cellule par un
+filtre sur toute l'extraction ; elle sert au test de parité.
+"""
+
+import numpy as np
+import pandas as pd
+from compute_indicators.compute_indicators import (
+    convert_reporting_period_to_cutoff_date,
+)
+
+REGIONS = ["DAKAR", "THIES", "LOUGA", "KOLDA", "MATAM"]
+COLONNES_PROGRAMMES = {
+    "ARV": "PNLS/ANTIRETROVIRAUX ET IO",
+    "TRC": "PNLS/TESTS RAPIDES ET CONSOMMABLES",
+    "LAB": "PNLS/PRODUITS DE LABORATOIRE",
+    "CHARGE VIRALE": "PNLS/CHARGES VIRALES",
+    "PNLP": "PNLP/MEDICAMENTS ET INTRANTS",
+    "PNSME": "PNSME/MEDICAMENTS ET INTRANTS",
+    "PNSME-GRAT": "PNSME_GRATUITE:MEDICAMENTS ET INTRANTS",
+    "PNN": "PNN/MEDICAMENTS ET INTRANTS",
+    "TBS": "PNLT/SENSIBLE MEDICAMENTS ET INTRANTS",
+    "TBMR": "PNLT/SENSIBLE MEDICAMENTS ET INTRANTS",
+    "TBLAB": "PNLT/SENSIBLE MEDICAMENTS ET INTRANTS",
+}
+# Périodes mensuelles et trimestrielles, dont une dont la date limite tombe l'année suivante
+PERIODES = ["DECEMBRE 2024", "JANVIER 2025", "FEVRIER 2025", "OCTOBRE DECEMBRE 2024"]
+
+
+def make_expected_sites(n_sites: int, seed: int = 2024) -> pd.DataFrame:
+    """Sites attendus tels que chargés par `load_expected_sites_from_excel` (1 ou "NA" par programme)."""
+    rng = np.random.default_rng(seed)
+    sites = pd.DataFrame(
+        {
+            "Code": [f"SN{i:04d}" for i in range(n_sites)],
+            "Site": [f"Site {i}" for i in range(n_sites)],
+            "District": [f"DS {i % 20}" for i in range(n_sites)],
+            "Region": rng.choice(REGIONS, n_sites),
+        }
+    )
+    for column in COLONNES_PROGRAMMES:
+        sites[column] = ["NA" if not_expected else 1 for not_expected in rng.random(n_sites) < 0.3]
+    return sites
+
+
+def make_transmissions(
+    sites: pd.DataFrame, n_rows: int, with_pnlt: bool = True, seed: int = 2024
+) -> pd.DataFrame:
+    """
+    Transmissions d'une extraction eSIGL, avec les colonnes préparées par
+    `compute_indicators_completeness_and_promptness` avant le calcul de la date limite.
+
+    Plusieurs rapports par site et programme, des codes inconnus, des structures de district et des
+    dates d'autorisation autour de la date limite (la veille, le jour même, le lendemain ou absente).
+    """
+    rng = np.random.default_rng(seed)
+    programmes = sorted(
+        {
+            program
+            for program in COLONNES_PROGRAMMES.values()
+            if with_pnlt or not program.startswith("PNLT")
+        }
+    )
+    codes = np.concatenate([sites["Code"].to_numpy(), ["SN9998", "SN9999"]])
+
+    period = rng.choice(PERIODES, n_rows)
+    facility = np.where(
+        rng.random(n_rows) < 0.3,
+        [f"DISTRICT SANITAIRE {i}" for i in rng.integers(0, 20, n_rows)],
+        [f"Centre de santé {i}" for i in rng.integers(0, 50, n_rows)],
+    )
+    cutoff = pd.Series(
+        [convert_reporting_period_to_cutoff_date(p, f) for p, f in zip(period, facility)]
+    )
+    date_autorisation = cutoff + pd.to_timedelta(rng.integers(-2, 3, n_rows), unit="D")
+    date_autorisation[rng.random(n_rows) < 0.05] = pd.NaT
+
+    return pd.DataFrame(
+        {
+            "region": rng.choice(REGIONS, n_rows),
+            "period": period,
+            "code": rng.choice(codes, n_rows),
+            "facility": facility,
+            "program": rng.choice(programmes, n_rows),
+            "statut": "AUTHORIZED",
+            "date_soumission": date_autorisation,
+            "date_autorisation": date_autorisation,
+            "Transmis": np.where(rng.random(n_rows) < 0.2, "NON", "OUI"),
+        }
+    )
+
+
+def reference_submission_promptness(extract_transmission: pd.DataFrame) -> pd.DataFrame:
+    """Ancien calcul de la date limite et de la promptitude, ligne par ligne."""
+    extract_transmission = extract_transmission.copy()
+
+    # Accès positionnel par `iloc` (les entiers ne sont plus des positions avec pandas 3)
+    extract_transmission["Date limite"] = extract_transmission[["facility", "period"]].apply(
+        lambda x: convert_reporting_period_to_cutoff_date(x.iloc[1], x.iloc[0]), axis=1
+    )
+
+    extract_transmission["Promptitude"] = extract_transmission[
+        ["Transmis", "Date limite", "date_autorisation"]
+    ].apply(lambda x: 1 if x.iloc[1] >= x.iloc[2] and x.iloc[0] == "OUI" else 0, axis=1)
+    return extract_transmission
+
+
+def count_valid_submissions_by_criteria(
+    extract_transmission, element_col, code, program, column_type_table, value_type_table
+):
+    """Compte les soumissions valides selon des critères."""
+    if element_col == "NA":
+        return "NA"
+    if "PNLT" in program:
+        if extract_transmission.loc[extract_transmission.program == program].shape[0] == 0:
+            return "NA"
+        else:
+            return extract_transmission.loc[
+                (extract_transmission.code == code)
+                & (extract_transmission.program == program)
+                & (extract_transmission[column_type_table] == value_type_table)
+            ].shape[0]
+
+    return extract_transmission.loc[
+        (extract_transmission.code == code)
+        & (extract_transmission.program == program)
+        & (extract_transmission[column_type_table] == value_type_table)
+    ].shape[0]
+
+
+def reference_completeness_promptness_metrics(
+    extract_transmission: pd.DataFrame, expected_site: pd.DataFrame, type_table: str = "completude"
+) -> pd.DataFrame:
+    """Ancienne `calculate_completeness_promptness_metrics`, évaluée cellule par cellule."""
+
+    df = expected_site.copy().sort_values(by=["Region", "Code"])
+    df = df.drop(columns="District")
+    if type_table == "completude":
+        column_type_table, value_type_table = "Transmis", "OUI"
+    else:
+        column_type_table, value_type_table = "Promptitude", 1
+
+    columns_to_process = {
+        "ARV": "PNLS/ANTIRETROVIRAUX ET IO",
+        "TRC": "PNLS/TESTS RAPIDES ET CONSOMMABLES",
+        "LAB": "PNLS/PRODUITS DE LABORATOIRE",
+        "CHARGE VIRALE": "PNLS/CHARGES VIRALES",
+        "PNLP": "PNLP/MEDICAMENTS ET INTRANTS",
+        "PNSME": "PNSME/MEDICAMENTS ET INTRANTS",
+        "PNSME-GRAT": "PNSME_GRATUITE:MEDICAMENTS ET INTRANTS",
+        "PNN": "PNN/MEDICAMENTS ET INTRANTS",
+        "PNLT": "PNLT/SENSIBLE MEDICAMENTS ET INTRANTS",
+        "TBS": "PNLT/SENSIBLE MEDICAMENTS ET INTRANTS",
+        "TBMR": "PNLT/SENSIBLE MEDICAMENTS ET INTRANTS",
+        "TBLAB": "PNLT/SENSIBLE MEDICAMENTS ET INTRANTS",
+    }
+    dico_cols = columns_to_process.copy()
+
+    dico_cols_pnlt = {
+        "TBS": "PNLT/SENSIBLE MEDICAMENTS ET INTRANTS",
+        "TBMR": "PNLT/SENSIBLE MEDICAMENTS ET INTRANTS",
+        "TBLAB": "PNLT/SENSIBLE MEDICAMENTS ET INTRANTS",
+    }
+
+    for column, program in dico_cols.items():
+        try:
+            df[column] = df[[column, "Code"]].apply(
+                lambda x: count_valid_submissions_by_criteria(
+                    extract_transmission,
+                    x.iloc[0],
+                    x["Code"],
+                    program,
+                    column_type_table,
+                    value_type_table,
+                ),
+                axis=1,
+            )
+        except KeyError:
+            columns_to_process.pop(column)
+            if column in ("TBS", "TBMR", "TBLAB"):
+                dico_cols_pnlt.pop(column)
+            continue
+
+    df = df[["Code", "Site", "Region"] + list(columns_to_process)]
+
+    # --> Calcul des colonnes aditionnelles
+    columns_to_process = {
+        "ARV": "Taux par Région ARV",
+        "TRC": "Taux par Région TRC",
+        "LAB": "Taux par Région LAB",
+        "CHARGE VIRALE": "Taux par Région Charges virales",
+        "PNLP": "Taux par Région PNLP",
+        "PNSME-GRAT": "Taux par Région PNSME",
+        "PNN": "Taux par Région PNN",
+        "PNLT": "Taux par Région PNLT",
+    }
+    # if "PNSME-GRAT" in df.columns:
+    #     columns_to_process.pop("PNSME")
+
+    for column, new_column in columns_to_process.items():
+        try:
+            df_group = df[df[column] != "NA"].groupby(["Region"])["Code"].count().reset_index()
+
+            df[new_column] = df.apply(
+                lambda x: (
+                    0
+                    if x[column] == "NA" or x[column] == 0
+                    else (x[column] / df_group.loc[df_group.Region == x["Region"], "Code"].iloc[0])
+                    if not df_group.loc[df_group.Region == x["Region"], "Code"].empty
+                    else 0
+                ),
+                axis=1,
+            )
+            del df_group
+        except KeyError:
+            continue
+
+    # if "PNSME" not in list(columns_to_process):
+    #     df_melt = pd.melt(
+    #         df.drop(columns="Code"),
+    #         id_vars="Region",
+    #         value_vars=["PNSME", "PNSME-GRAT"],
+    #         value_name="Code",
+    #     )
+    #     df_group = (
+    #         df_melt.loc[df_melt.Code.ne("NA"), ["Region", "Code"]]
+    #         .groupby("Region")["Code"]
+    #         .count()
+    #         .reset_index()
+    #     )
+    #     df["Taux par Région PNSME"] = df.apply(
+    #         lambda x: sum([e for e in (x["PNSME"], x["PNSME-GRAT"]) if e != "NA"])
+    #         / df_group.loc[df_group.Region == x["Region"], "Code"].iloc[0]
+    #         if not df_group.loc[df_group.Region == x["Region"], "Code"].empty
+    #         else 0,
+    #         axis=1,
+    #     )
+    #     del df_melt, df_group
+
+    # Le taux par Région PNLT à changer dans la nouvelle version de Mars 2024
+    if "PNLT" not in df.columns:
+        cols_pnlt = list(dico_cols_pnlt)
+        df_melt = pd.melt(
+            df.drop(columns="Code"), id_vars="Region", value_vars=cols_pnlt, value_name="Code"
+        )
+        df_group = (
+            df_melt.loc[df_melt.Code.ne("NA"), ["Region", "Code"]]
+            .groupby("Region")["Code"]
+            .count()
+            .reset_index()
+        )
+        df["Taux par Région PNLT"] = df.apply(
+            lambda x: (
+                sum([x[e] for e in cols_pnlt if x[e] != "NA"])
+                / df_group.loc[df_group.Region == x["Region"], "Code"].iloc[0]
+                if not df_group.loc[df_group.Region == x["Region"], "Code"].empty
+                else 0
+            ),
+            axis=1,
+        )
+        del df_melt, df_group
+    # --> Taux par Région PNLS
+    df_melt = pd.melt(
+        df,
+        id_vars=["Region"],
+        value_vars=["ARV", "TRC", "LAB", "CHARGE VIRALE"],
+        value_name="value",
+    )
+
+    df_melt = df_melt.groupby("Region")["value"].value_counts().reset_index()
+
+    df["Taux par Région PNLS"] = df[["Region", "ARV", "TRC", "LAB", "CHARGE VIRALE"]].apply(
+        lambda x: (
+            len(
+                [
+                    element
+                    for element in [x["ARV"], x["TRC"], x["LAB"], x["CHARGE VIRALE"]]
+                    if element == 1
+                ]
+            )
+            / df_melt[(df_melt.Region == x["Region"]) & (df_melt.value != "NA")]["count"].sum()
+        ),
+        axis=1,
+    )
+
+    df["PNLS recu"] = df[["ARV", "TRC", "LAB", "CHARGE VIRALE"]].apply(
+        lambda x: sum(
+            [
+                element
+                for element in [x["ARV"], x["TRC"], x["LAB"], x["CHARGE VIRALE"]]
+                if element != "NA"
+            ]
+        ),
+        axis=1,
+    )
+
+    df["PNLS attendu"] = df[["ARV", "TRC", "LAB", "CHARGE VIRALE"]].apply(
+        lambda x: len(
+            [
+                element
+                for element in [x["ARV"], x["TRC"], x["LAB"], x["CHARGE VIRALE"]]
+                if element != "NA"
+            ]
+        ),
+        axis=1,
+    )
+    cols = [
+        col
+        for col in [
+            "ARV",
+            "TRC",
+            "LAB",
+            "CHARGE VIRALE",
+            "PNLP",
+            "PNSME-GRAT",
+            # "PNSME",
+            "TBS",
+            "TBMR",
+            "TBLAB",
+            "PNN",
+            "PNLT",
+        ]
+        if col in df.columns
+    ]
+    df["Attendu"] = df[cols].apply(
+        lambda row: len([element for element in row if element != "NA"]), axis=1
+    )
+
+    df["Recu"] = df[cols].apply(
+        lambda row: len([element for element in row if element == 1]), axis=1
+    )
+    return df
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Les notebooks importent les modules depuis le dossier rapport_feedback
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
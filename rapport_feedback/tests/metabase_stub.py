@@ -0,0 +1,135 @@
+"""
+Serveur HTTP local imitant les endpoints `/api/session` et `/api/dataset` de Metabase.
+
+Les requêtes natives reconnues sont celles générées par `Metabase` : comptage
+(`SELECT count(*) ... AS metabase_count`), pages `LIMIT n OFFSET m` et pages par clé
+(`WHERE "id" > k ORDER BY "id" LIMIT n`). Comme Metabase, le serveur tronque les pages à `row_limit`.
+Avec `unstable_order`, les requêtes sans `ORDER BY "id"` parcourent les lignes dans un ordre différent
+à chaque requête, comme PostgreSQL peut le faire avec les parcours séquentiels synchronisés.
+L'export `/api/dataset/csv` renvoie toutes les lignes de la requête en une seule réponse.
+"""
+
+import csv
+import io
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COLUMNS = ["id", "valeur"]
+BASE_TYPES = {"id": "type/Integer", "valeur": "type/Text", "total": "type/BigInteger"}
+
+
+class StubMetabase:
+    def __init__(self, n_rows: int, row_limit: int = 2000):
+        self.rows = [[i, f"valeur {i}"] for i in range(1, n_rows + 1)]
+        self.row_limit = row_limit
+        # Incidents simulés par offset de page : nombre de réponses concernées
+        self.errors = Counter()  # réponse 503
+        self.short_pages = Counter()  # page renvoyée avec une ligne en moins
+        self.slow_pages = Counter()  # réponse retardée de `delay` secondes
+        self.delay = 0.0
+        self.csv_export = True  # False : l'export CSV répond 404
+        self.unstable_order = False  # True : ordre des lignes non déterministe sans ORDER BY
+        self.requests = Counter()  # nombre de requêtes reçues par offset
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers["Content-Length"]))
+                if self.path == "/api/session":
+                    return self._send(200, {"id": "token"})
+                if self.headers.get("X-Metabase-Session") != "token":
+                    return self._send(401, {})
+                if self.path == "/api/dataset/csv":
+                    if not stub.csv_export:
+                        return self._send(404, {})
+                    return self._send_csv(stub.rows)
+                body = json.loads(raw)
+                with stub._lock:
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    status, payload = stub.run(body["native"]["query"])
+                    self._send(status, payload)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def _send_csv(self, rows):
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(COLUMNS)
+                writer.writerows(rows)
+                self._send(200, buffer.getvalue().encode(), "text/csv")
+
+            def _send(self, status, payload, content_type="application/json"):
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client parti après expiration de son délai d'attente
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _take(self, counter: Counter, key) -> bool:
+        with self._lock:
+            if counter[key] > 0:
+                counter[key] -= 1
+                return True
+            return False
+
+    def run(self, query: str):
+        if "AS metabase_count" in query:
+            return 200, self._payload(["total"], [[len(self.rows)]])
+
+        if match := re.search(r'WHERE "id" > (\d+)', query):
+            start = next(
+                (i for i, row in enumerate(self.rows) if row[0] > int(match.group(1))),
+                len(self.rows),
+            )
+        elif match := re.search(r"OFFSET (\d+)", query):
+            start = int(match.group(1))
+        else:
+            start = 0
+        limit = int(re.search(r"LIMIT (\d+)", query).group(1))
+
+        with self._lock:
+            self.requests[start] += 1
+        if self._take(self.slow_pages, start):
+            time.sleep(self.delay)
+        if self._take(self.errors, start):
+            return 503, {}
+
+        rows = self.rows
+        if self.unstable_order and 'ORDER BY "id"' not in query:
+            rows = random.sample(rows, len(rows))
+        rows = rows[start : start + min(limit, self.row_limit)]
+        if self._take(self.short_pages, start):
+            rows = rows[:-1]
+        return 200, self._payload(COLUMNS, rows)
+
+    @staticmethod
+    def _payload(names, rows):
+        columns = [{"display_name": name, "base_type": BASE_TYPES[name]} for name in names]
+        return {"data": {"rows": rows, "results_metadata": {"columns": columns}}}
@@ -0,0 +1,306 @@
+"""
+Extraction eSIGL synthétique et implémentation de référence ligne par ligne des niveaux de stock
+national (`stock_lvl_decent`) et régional (`stock_region`).
+
+La référence reprend à l'identique l'ancien calcul de `analyze_product_stock_status_indicators`, par
+masques booléens sur `df_etat_stock` pour chaque clé ; elle sert au test de parité de
+`aggregate_by_keys` et `classify_msd_statut`.
+"""
+
+import numpy as np
+import pandas as pd
+
+PROGRAMMES = ["PNLP-Routine", "PNLT_Adulte", "PNLS-ARV", "PNN", "PNSME-Routine"]
+REGIONS = ["DAKAR", "THIES", "LOUGA", "KOLDA", "MATAM", "SEDHIOU"]
+
+
+def make_esigl_extract(n_rows: int, seed: int = 2024) -> pd.DataFrame:
+    """Extraction eSIGL synthétique : lignes multiples par clé, régions manquantes, sommes nulles."""
+    rng = np.random.default_rng(seed)
+
+    def with_missing(values, share):
+        values = values.astype("float64")
+        values[rng.random(n_rows) < share] = np.nan
+        return values
+
+    code_produit = rng.integers(3_000_000, 3_000_040, n_rows)
+    region = pd.Series(rng.choice(REGIONS, n_rows), dtype=object)
+    region[rng.random(n_rows) < 0.05] = np.nan
+    id_district = rng.integers(20, 160, n_rows)
+
+    return pd.DataFrame(
+        {
+            "programme": rng.choice(PROGRAMMES, n_rows),
+            "code_produit": code_produit,
+            "periode": pd.Timestamp("2025-01-01"),
+            "region": region,
+            "id_region_esigl": rng.integers(1, 15, n_rows),
+            "district": [f"DS {i}" for i in id_district],
+            "id_district_esigl": id_district,
+            "code": [f"ETS{i:04d}" for i in rng.integers(0, 300, n_rows)],
+            "etablissement": "Structure",
+            "type_structure": rng.choice(["Poste de santé", "Centre de santé", "Hôpital"], n_rows),
+            "designation": [f"Produit {code}" for code in code_produit],
+            "unite": "UN",
+            "stock_initial": with_missing(rng.integers(0, 60, n_rows), 0.1),
+            "quantite_recue": with_missing(rng.integers(0, 60, n_rows), 0.1),
+            "quantite_distribuee": with_missing(rng.integers(0, 30, n_rows), 0.1),
+            "perte_ajustement": with_missing(rng.integers(-3, 3, n_rows), 0.1),
+            "nbrejrsrupture": with_missing(rng.integers(0, 32, n_rows), 0.1),
+            # Beaucoup de zéros : clés dont les sommes de SDU ou de CMM sont nulles
+            "sdu": with_missing(rng.integers(0, 4, n_rows) * rng.integers(0, 40, n_rows), 0.1),
+            "cmm": with_missing(rng.integers(0, 3, n_rows) * rng.integers(0, 12, n_rows), 0.1),
+            "quantite_proposee": with_missing(rng.integers(0, 40, n_rows), 0.2),
+            "quantite_commandee": with_missing(rng.integers(-2, 40, n_rows), 0.2),
+            "quantite_approuvee": with_missing(rng.integers(0, 40, n_rows), 0.2),
+            "categorie_produit": rng.choice(["Médicament", "Consommable"], n_rows),
+        }
+    )
+
+
+def make_prod_traceurs() -> pd.DataFrame:
+    """Liste des produits traceurs de la moitié des codes de l'extraction, pour chaque programme."""
+    codes = range(3_000_000, 3_000_040, 2)
+    programmes = sorted({programme.split("-")[0].split("_")[0] for programme in PROGRAMMES})
+    return pd.DataFrame(
+        [
+            {
+                "CODE PRODUIT": code,
+                "PRODUIT": f"Produit {code}",
+                "PROGRAMME": programme,
+                "CODE COMBINE": f"{code}_{programme}",
+                "CATEGORIE PRODUIT": "PRODUIT TRACEUR",
+            }
+            for code in codes
+            for programme in programmes
+        ]
+    )
+
+
+def reference_stock_levels(df_etat_stock: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Ancien calcul de `stock_lvl_decent` et `stock_region` dans
+    `analyze_product_stock_status_indicators`, à partir de `df_etat_stock` retourné par la fonction.
+    """
+    stock_lvl_decent = (
+        df_etat_stock[["CODE", "PROGRAMME"]]
+        .drop_duplicates()
+        .rename(columns={"CODE": "Code", "PROGRAMME": "Programme"})
+    )
+
+    stock_lvl_decent = stock_lvl_decent.drop_duplicates()
+
+    column_to_caculate = {
+        "Designation": "PRODUIT",
+        "Categorie": "CATEGORIE_DU_PRODUIT",
+        "Unite": "UNITE DE RAPPORTAGE",
+        "lvl_decent_conso": "QUANTITE UTILISEE",
+        "lvl_decent_sdu": "SDU",
+        "lvl_decent_cmm": "CMM gestionnaire",
+        "Categorie_produit": "CATEGORIE PRODUIT",
+    }
+
+    for column, col_in_extract_stock in column_to_caculate.items():
+        if column in ("lvl_decent_conso", "lvl_decent_sdu", "lvl_decent_cmm"):
+            stock_lvl_decent[column] = stock_lvl_decent.apply(
+                lambda row: (
+                    df_etat_stock.loc[
+                        (df_etat_stock.CODE == row.Code)
+                        & (df_etat_stock["PROGRAMME"] == row.Programme),
+                        col_in_extract_stock,
+                    ].sum()
+                    if not df_etat_stock.loc[
+                        (df_etat_stock.CODE == row.Code)
+                        & (df_etat_stock["PROGRAMME"] == row.Programme),
+                        col_in_extract_stock,
+                    ].empty
+                    else ""
+                ),
+                axis=1,
+            )
+        else:
+            stock_lvl_decent[column] = stock_lvl_decent.apply(
+                lambda row: (
+                    df_etat_stock.loc[
+                        (df_etat_stock.CODE == row.Code)
+                        & (df_etat_stock["PROGRAMME"] == row.Programme),
+                        col_in_extract_stock,
+                    ].iloc[0]
+                    if not df_etat_stock.loc[
+                        (df_etat_stock.CODE == row.Code)
+                        & (df_etat_stock["PROGRAMME"] == row.Programme),
+                        col_in_extract_stock,
+                    ].empty
+                    else ""
+                ),
+                axis=1,
+            )
+
+    def calculate_msd(row):
+        if sum([row.lvl_decent_conso, row.lvl_decent_sdu, row.lvl_decent_cmm]) == 0:
+            return "NA"
+        else:
+            if row.lvl_decent_sdu == 0 and row.lvl_decent_cmm == 0:
+                return "NA"
+            else:
+                if row.lvl_decent_sdu > 0 and row.lvl_decent_cmm == 0:
+                    return row.lvl_decent_sdu
+                else:
+                    return row.lvl_decent_sdu / row.lvl_decent_cmm
+
+    stock_lvl_decent["lvl_decent_msd"] = stock_lvl_decent.apply(calculate_msd, axis=1)
+
+    def get_satut(row):
+        if row.lvl_decent_msd == "NA":
+            if (
+                df_etat_stock.loc[
+                    (df_etat_stock.CODE == row.Code) & (df_etat_stock.PROGRAMME == row.Programme),
+                    "SDU",
+                ].sum()
+                > 0
+            ):
+                return "STOCK DORMANT"
+            else:
+                return "NA"
+        elif row.lvl_decent_msd < 0.05:
+            return "RUPTURE"
+        elif row.lvl_decent_msd > 0 and row.lvl_decent_msd < 2:
+            return "SOUS-STOCK"
+        elif row.lvl_decent_msd >= 2 and row.lvl_decent_msd <= 4:
+            return "BIEN STOCKE"
+        elif row.lvl_decent_msd > 4:
+            return "SURSTOCK"
+        else:
+            return "ND"
+
+    stock_lvl_decent["lvl_decent_statut"] = stock_lvl_decent.apply(get_satut, axis=1)
+
+    df_count_prog = stock_lvl_decent["Programme"].value_counts().reset_index()
+    df_count_prog["dispo_globale_cible"] = 0.85 / df_count_prog["count"]
+    df_count_prog["dispo_traceur_cible"] = 0.95 / df_count_prog["count"]
+
+    stock_lvl_decent["dispo_globale"] = stock_lvl_decent["Programme"].apply(
+        lambda prog: (
+            df_etat_stock.loc[
+                (df_etat_stock.PROGRAMME == prog) & (df_etat_stock["ETAT DU STOCK"] != "RUPTURE")
+            ].shape[0]
+            / df_count_prog.loc[df_count_prog["Programme"] == prog, "count"].values[0]
+        )
+    )
+    df_ = (
+        df_etat_stock["PROGRAMME"]
+        .value_counts()
+        .reset_index()
+        .rename(columns={"PROGRAMME": "Programme"})
+    )
+    stock_lvl_decent["dispo_globale"] = stock_lvl_decent.apply(
+        lambda row: (
+            row.dispo_globale / df_.loc[df_["Programme"] == row.Programme, "count"].values[0]
+        ),
+        axis=1,
+    )
+
+    stock_lvl_decent["dispo_traceur"] = stock_lvl_decent["Programme"].apply(
+        lambda prog: (
+            df_etat_stock.loc[
+                (df_etat_stock.PROGRAMME == prog)
+                & (df_etat_stock["CATEGORIE PRODUIT"].str.upper() == "PRODUIT TRACEUR")
+                & (df_etat_stock["ETAT DU STOCK"] != "RUPTURE")
+            ].shape[0]
+            / df_count_prog.loc[df_count_prog["Programme"] == prog, "count"].values[0]
+        )
+    )  # Bien mais pour l'heure pas optimale
+
+    df_ = (
+        df_etat_stock.loc[
+            (df_etat_stock["CATEGORIE PRODUIT"].str.upper() == "PRODUIT TRACEUR"), "PROGRAMME"
+        ]
+        .value_counts()
+        .reset_index()
+        .rename(columns={"PROGRAMME": "Programme"})
+    )
+
+    stock_lvl_decent["dispo_traceur"] = stock_lvl_decent.apply(
+        lambda row: (
+            row.dispo_traceur / df_.loc[df_["Programme"] == row.Programme, "count"].values[0]
+        ),
+        axis=1,
+    )
+
+    stock_lvl_decent = stock_lvl_decent.merge(
+        df_count_prog.drop(columns="count"), on="Programme", how="left"
+    )
+
+    cols = [
+        "dispo_globale",
+        "dispo_globale_cible",
+        "dispo_traceur",
+        "dispo_traceur_cible",
+        "Categorie_produit",
+    ]
+
+    stock_lvl_decent = stock_lvl_decent[
+        [col for col in stock_lvl_decent.columns if col not in cols] + cols
+    ]
+
+    stock_region = (
+        df_etat_stock[["CODE", "PROGRAMME", "REGION"]]
+        .drop_duplicates()
+        .rename(columns={"CODE": "Code", "REGION": "Region", "PROGRAMME": "Programme"})
+    )
+
+    df_ = (
+        df_etat_stock.groupby(["CODE", "PROGRAMME", "REGION"])[["CMM gestionnaire", "SDU"]]
+        .sum()
+        .reset_index()
+    )
+
+    def get_msd_region(row):
+        try:
+            filtered_data = df_[
+                (df_.CODE == row.Code)
+                & (df_.REGION == row.Region)
+                & (df_["PROGRAMME"] == row.Programme)
+            ]
+            cmm_sum = filtered_data["CMM gestionnaire"].sum()
+            if cmm_sum == 0:
+                return "NA"
+            else:
+                sdu_sum = filtered_data["SDU"].sum()
+                return sdu_sum / cmm_sum
+        except Exception as e:
+            print(e)
+            return ""
+
+    stock_region["MSD"] = stock_region.apply(get_msd_region, axis=1)
+
+    def get_statut_stock_region(row):
+        try:
+            if row.MSD == "NA":
+                if (
+                    df_[
+                        (df_.CODE == row.Code)
+                        & (df_.REGION == row.Region)
+                        & (df_["PROGRAMME"] == row.Programme)
+                    ]["SDU"].sum()
+                    > 0
+                ):
+                    return "STOCK DORMANT"
+                else:
+                    return "NA"
+            elif row.MSD < 0.05:
+                return "RUPTURE"
+            elif row.MSD > 0 and row.MSD < 2:
+                return "SOUS-STOCK"
+            elif row.MSD >= 2 and row.MSD <= 4:
+                return "BIEN STOCKE"
+            elif row.MSD > 4:
+                return "SURSTOCK"
+            else:
+                return "ND"
+        except Exception:
+            return "ND"
+
+    stock_region["STATUT"] = stock_region.apply(get_statut_stock_region, axis=1)
+
+    return stock_lvl_decent, stock_region
@@ -0,0 +1,139 @@
+"""
+Jeu de données figé et implémentation de référence ligne par ligne des règles de gestion de stock.
+
+La référence reprend à l'identique les anciennes fonctions appliquées avec `DataFrame.apply(axis=1)`
+dans `analyze_product_stock_status_indicators` ; elle sert au test de parité et au benchmark de
+`compute_stock_status_columns`.
+"""
+
+import numpy as np
+import pandas as pd
+
+PROGRAMMES = ["PNLP", "PNLT", "PNLS", "PNN", "PNSME"]
+COLONNES_STATUT = [
+    "CMM gestionnaire",
+    "MSD",
+    "ETAT DU STOCK",
+    "BESOIN CMMMANDE URGENTE",
+    "BESOIN TRANSFERT IN",
+    "QUANTITE A TRANSFERER OUT",
+]
+
+
+def make_etat_stock(n_rows: int, seed: int = 2024) -> pd.DataFrame:
+    """Extraction eSIGL synthétique couvrant les cas limites (valeurs manquantes, zéros, PNLT)."""
+    rng = np.random.default_rng(seed)
+
+    def with_missing(values, share):
+        values = values.astype("float64")
+        values[rng.random(n_rows) < share] = np.nan
+        return values
+
+    periode = pd.Series(pd.Timestamp("2025-01-01"), index=range(n_rows))
+    periode[rng.random(n_rows) < 0.03] = pd.NaT
+
+    return pd.DataFrame(
+        {
+            "abrv_programme": rng.choice(PROGRAMMES, n_rows),
+            "periode": periode,
+            # Petites valeurs entières : beaucoup d'égalités sur les seuils (MSD = 1, 1.5, 2, 3, 4, 6)
+            "quantite_commandee": with_missing(rng.integers(-2, 40, n_rows), 0.2),
+            "cmm": with_missing(rng.integers(0, 12, n_rows), 0.1),
+            "sdu": with_missing(rng.integers(0, 60, n_rows), 0.1),
+            "nbrejrsrupture": with_missing(rng.integers(0, 32, n_rows), 0.1),
+        }
+    )
+
+
+def reference_stock_status_columns(
+    df_etat_stock: pd.DataFrame, nombre_de_jours: int
+) -> pd.DataFrame:
+    """Anciennes règles de `analyze_product_stock_status_indicators`, évaluées ligne par ligne."""
+    df_etat_stock = df_etat_stock.copy()
+
+    def get_cmm_gestionnaire(row):
+        if pd.isna(row.periode):
+            return np.nan
+        else:
+            if pd.isna(row.quantite_commandee):
+                return row.cmm
+            elif row.abrv_programme == "PNLT" and row.quantite_commandee > 0:
+                return (row.quantite_commandee + row.sdu) / 6
+            elif row.quantite_commandee > 0:
+                return (row.quantite_commandee + row.sdu) / 4
+            else:
+                return row.cmm
+
+    df_etat_stock["CMM gestionnaire"] = df_etat_stock.apply(get_cmm_gestionnaire, axis=1)
+
+    df_etat_stock["MSD"] = df_etat_stock[["sdu", "CMM gestionnaire"]].apply(
+        lambda x: np.nan if x.iloc[1] == 0 or pd.isna(x.iloc[1]) else x.iloc[0] / x.iloc[1], axis=1
+    )
+
+    def determine_statut_stock(row):
+        if pd.isna(row["CMM gestionnaire"]) and pd.isna(row["sdu"]):
+            return "NA"
+        elif row["nbrejrsrupture"] >= nombre_de_jours or row["sdu"] == 0:
+            return "RUPTURE"
+        elif row["sdu"] > 0 and row["CMM gestionnaire"] == 0:
+            return "STOCK DORMANT"
+        elif row.abrv_programme == "PNLT":
+            if row["MSD"] > 0 and row["MSD"] <= 1.5:
+                return "EN BAS DU PCU"
+            elif row["MSD"] > 1.5 and row["MSD"] < 3:
+                return "ENTRE PCU et MIN"
+            elif row["MSD"] >= 3 and row["MSD"] <= 6:
+                return "BIEN STOCKE"
+            elif row["MSD"] > 6:
+                return "SURSTOCK"
+            elif row["sdu"] == 0 and row["CMM gestionnaire"] > 0:
+                return "RUPTURE"
+        elif row["MSD"] > 4:
+            return "SURSTOCK"
+        elif row["MSD"] >= 2 and row["MSD"] <= 4:
+            return "BIEN STOCKE"
+        elif row["MSD"] > 1 and row["MSD"] < 2:
+            return "ENTRE PCU et MIN"
+        elif row["MSD"] > 0 and row["MSD"] <= 1:
+            return "EN BAS DU PCU"
+        elif row["sdu"] == 0 and row["CMM gestionnaire"] > 0:
+            return "RUPTURE"
+        else:
+            return "NA"
+
+    df_etat_stock["ETAT DU STOCK"] = df_etat_stock.apply(determine_statut_stock, axis=1)
+    df_etat_stock["ETAT DU STOCK"] = df_etat_stock["ETAT DU STOCK"].fillna("NA")
+
+    def besoin_commande_urgente(row):
+        if row.abrv_programme == "PNLT" and (
+            row["ETAT DU STOCK"] == "EN BAS DU PCU" or row["sdu"] == 0
+        ):
+            return 6 * row["CMM gestionnaire"] - row["sdu"]
+        elif row["ETAT DU STOCK"] == "EN BAS DU PCU" or row["sdu"] == 0:
+            return 4 * row["CMM gestionnaire"] - row["sdu"]
+        else:
+            return np.nan
+
+    def besoin_transfert_in(row):
+        if row.abrv_programme == "PNLT" and (row["ETAT DU STOCK"] or row["sdu"] == 0):
+            return 3 * row["CMM gestionnaire"] - row["sdu"]
+        elif row["ETAT DU STOCK"] == "EN BAS DU PCU" or row["sdu"] == 0:
+            return row["CMM gestionnaire"] - row["sdu"]
+        else:
+            return np.nan
+
+    def quantite_transfert_out(row):
+        if row["ETAT DU STOCK"] == "ND":
+            return np.nan
+        elif row["ETAT DU STOCK"] in ("STOCK DORMANT", "SURSTOCK"):
+            if row.abrv_programme == "PNLT":
+                return row["sdu"] - 6 * row["CMM gestionnaire"]
+            else:
+                return row["sdu"] - 4 * row["CMM gestionnaire"]
+        else:
+            return np.nan
+
+    df_etat_stock["BESOIN CMMMANDE URGENTE"] = df_etat_stock.apply(besoin_commande_urgente, axis=1)
+    df_etat_stock["BESOIN TRANSFERT IN"] = df_etat_stock.apply(besoin_transfert_in, axis=1)
+    df_etat_stock["QUANTITE A TRANSFERER OUT"] = df_etat_stock.apply(quantite_transfert_out, axis=1)
+    return df_etat_stock
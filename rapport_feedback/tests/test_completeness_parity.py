@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+from completeness_fixtures import (
+    PERIODES,
+    make_expected_sites,
+    make_transmissions,
+    reference_completeness_promptness_metrics,
+    reference_submission_promptness,
+)
+from compute_indicators.compute_indicators import (
+    calculate_completeness_promptness_metrics,
+    compute_submission_promptness,
+)
+
+
+@pytest.mark.parametrize("with_pnlt", [True, False])
+def test_completeness_promptness_metrics_match_row_wise_computation(with_pnlt):
+    sites = make_expected_sites(200)
+    transmissions = make_transmissions(sites, 2_000, with_pnlt=with_pnlt)
+
+    result = compute_submission_promptness(transmissions)
+    expected = reference_submission_promptness(transmissions)
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    # Deux dates limites par période : districts sanitaires et autres structures
+    assert result.groupby("period")["Date limite"].nunique().to_dict() == dict.fromkeys(PERIODES, 2)
+    assert set(result["Promptitude"]) == {0, 1}
+
+    for type_table in ("completude", "Promptitude"):
+        pd.testing.assert_frame_equal(
+            calculate_completeness_promptness_metrics(result, sites, type_table),
+            reference_completeness_promptness_metrics(expected, sites, type_table),
+            check_dtype=False,
+        )
@@ -0,0 +1,111 @@
+import re
+
+import pandas as pd
+import pytest
+from metabase.cache import QueryCache
+from metabase.incremental import IncrementalExtractor
+
+PERIOD = "('JANVIER 2025')"
+
+
+class FakeMetabase:
+    """Renvoie les réquisitions modifiées et les lignes de `rows` filtrées comme le ferait eSIGL."""
+
+    def __init__(self, rows: pd.DataFrame):
+        self.rows = rows
+        self.changes = pd.DataFrame()
+        self.queries = []
+
+    def fetch_paginated(self, sql_query: str) -> pd.DataFrame:
+        self.queries.append(("paginated", sql_query))
+        if "requisition_status_changes" in sql_query:
+            return self.changes
+        ids = [int(i) for i in re.search(r"IN \(([\d, ]+)\)", sql_query).group(1).split(",")]
+        rows = self.rows.loc[self.rows["requisition_id"].isin(ids)]
+        # Comme Metabase, un résultat vide n'a pas de colonnes
+        return rows.reset_index(drop=True) if not rows.empty else pd.DataFrame()
+
+    def fetch_csv_export(self, sql_query: str) -> pd.DataFrame:
+        self.queries.append(("csv", sql_query))
+        return self.rows.copy()
+
+
+def changes(*requisitions, day=1):
+    last_change = f"2025-02-{day:02d} 10:00:00.000000"
+    return pd.DataFrame(
+        [
+            {"requisition_id": rid, "code": code, "last_change": last_change}
+            for rid, code in requisitions
+        ]
+    )
+
+
+@pytest.fixture
+def extractor(tmp_path):
+    rows = pd.DataFrame(
+        {"requisition_id": [1, 1, 2, 3], "code": [101, 101, 102, 103], "sdu": [5, 6, 7, 8]}
+    )
+    return IncrementalExtractor(FakeMetabase(rows), QueryCache(tmp_path))
+
+
+def test_first_run_without_changes_extracts_the_whole_period(extractor):
+    # Aucune réquisition modifiée : Metabase renvoie un DataFrame sans colonnes
+    data, changed = extractor.extract("etat_stock", "2025-01-01", PERIOD)
+
+    assert data["sdu"].tolist() == [5, 6, 7, 8]
+    assert changed is None
+    assert [kind for kind, _ in extractor.metabase.queries] == ["paginated", "csv"]
+
+
+def test_later_runs_only_refetch_changed_requisitions(extractor):
+    extractor.metabase.changes = changes((1, 101), (2, 102), (3, 103))
+    extractor.extract("etat_stock", "2025-01-01", PERIOD)
+
+    # Aucun changement depuis le watermark : le jeu en cache est renvoyé tel quel
+    extractor.metabase.changes = pd.DataFrame()
+    data, changed = extractor.extract("etat_stock", "2025-01-01", PERIOD)
+    assert len(data) == 4 and changed == set()
+
+    # La réquisition 2 a changé et la 3 a été rejetée (elle n'est plus renvoyée par la requête)
+    extractor.metabase.rows = extractor.metabase.rows.loc[lambda df: df["requisition_id"] != 3]
+    extractor.metabase.rows.loc[lambda df: df["requisition_id"] == 2, "sdu"] = 70
+    extractor.metabase.changes = changes((2, 102), (3, 103), day=3)
+    extractor.metabase.queries.clear()
+    data, changed = extractor.extract("etat_stock", "2025-01-01", PERIOD)
+
+    assert sorted(data["sdu"].tolist()) == [5, 6, 70]
+    assert changed == {102, 103}
+    assert "requisitions.id IN (2, 3)" in extractor.metabase.queries[-1][1]
+    assert extractor._load_watermarks()[
+        QueryCache.make_key(f"etat_stock:{PERIOD}", "2025-01-01")
+    ] == {"last_change": "2025-02-03 10:00:00.000000", "max_requisition_id": 3}
+
+
+def test_too_many_changes_extract_the_whole_period(extractor):
+    extractor.max_changed_requisitions = 1
+    extractor.metabase.changes = changes((1, 101))
+    extractor.extract("etat_stock", "2025-01-01", PERIOD)
+
+    extractor.metabase.changes = changes((2, 102), (3, 103))
+    data, changed = extractor.extract("etat_stock", "2025-01-01", PERIOD)
+
+    assert len(data) == 4 and changed is None
+    assert extractor.metabase.queries[-1][0] == "csv"
+
+
+def test_uncommitted_watermark_refetches_the_same_requisitions(extractor):
+    extractor.metabase.changes = changes((1, 101), (2, 102), (3, 103))
+    extractor.extract("etat_stock", "2025-01-01", PERIOD)
+
+    extractor.metabase.changes = changes((2, 102), day=5)
+    extractor.extract("etat_stock", "2025-01-01", PERIOD, commit=False)
+    key = QueryCache.make_key(f"etat_stock:{PERIOD}", "2025-01-01")
+    assert extractor._load_watermarks()[key]["last_change"] == "2025-02-01 10:00:00.000000"
+
+    # Le traitement aval a échoué : une nouvelle instance repart de l'ancien watermark
+    extractor = IncrementalExtractor(extractor.metabase, extractor.cache)
+    data, changed = extractor.extract("etat_stock", "2025-01-01", PERIOD, commit=False)
+    assert len(data) == 4 and changed == {102}
+
+    extractor.commit()
+    assert extractor._load_watermarks()[key]["last_change"] == "2025-02-05 10:00:00.000000"
@@ -0,0 +1,55 @@
+import logging
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from metabase.metabase import Metabase
+from metabase_stub import COLUMNS, StubMetabase
+
+QUERY = "SELECT id, valeur FROM stub"
+
+
+@pytest.fixture
+def stub():
+    server = StubMetabase(n_rows=4_500)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def metabase(stub):
+    return Metabase(SimpleNamespace(url=stub.url, username="user", password="secret"))
+
+
+def test_csv_export_matches_paginated_extraction(metabase, stub, tmp_path):
+    paginated = metabase.get_data_from_sql_query(QUERY)
+
+    for destination in (None, tmp_path / "export.csv"):
+        exported = metabase.get_data_from_csv_export(QUERY, destination=destination)
+
+        assert list(exported.columns) == COLUMNS
+        assert exported.values.tolist() == paginated.values.tolist() == stub.rows
+        # Aucune page /api/dataset n'est extraite, seule la requête de métadonnées est envoyée
+        assert stub.requests[2000] == 1
+
+
+def test_csv_export_reads_null_text_as_none(metabase, stub):
+    stub.rows[1][1] = None
+    stub.rows[2][1] = "NA"
+
+    exported = metabase.get_data_from_csv_export(QUERY)
+
+    # Valeur manquante et non chaîne vide, comme avec la pagination JSON
+    pd.testing.assert_frame_equal(exported, metabase.get_data_from_sql_query(QUERY))
+    assert exported["valeur"].isna().tolist()[:3] == [False, True, False]
+    assert exported["valeur"].iloc[2] == "NA"
+
+
+def test_csv_export_falls_back_to_pagination(metabase, stub, caplog):
+    stub.csv_export = False
+
+    with caplog.at_level(logging.WARNING, logger="metabase.metabase"):
+        df = metabase.get_data_from_csv_export(QUERY, backoff_factor=0)
+
+    assert df.values.tolist() == stub.rows
+    assert "repli sur la pagination JSON" in caplog.text
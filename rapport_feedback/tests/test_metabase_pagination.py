@@ -0,0 +1,115 @@
+from types import SimpleNamespace
+
+import pytest
+from metabase.metabase import Metabase
+from metabase_stub import COLUMNS, StubMetabase
+
+QUERY = "SELECT id, valeur FROM stub"
+RETRY = {"backoff_factor": 0, "max_retries": 2}
+
+
+@pytest.fixture
+def stub():
+    server = StubMetabase(n_rows=4_500)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def metabase(stub):
+    return Metabase(SimpleNamespace(url=stub.url, username="user", password="secret"))
+
+
+def assert_all_rows(df, stub):
+    assert list(df.columns) == COLUMNS
+    assert df.values.tolist() == stub.rows
+
+
+@pytest.mark.parametrize(
+    "mode",
+    [{"max_workers": 4, "order_by": "id"}, {"max_workers": 1}, {"keyset_column": "id"}],
+    ids=["concurrent", "sequential", "keyset"],
+)
+def test_every_pagination_mode_returns_all_rows_in_order(metabase, stub, mode):
+    df = metabase.get_data_from_sql_query(QUERY, chunk_size=1000, **mode, **RETRY)
+
+    assert_all_rows(df, stub)
+
+
+def test_concurrent_pages_are_fetched_in_parallel(metabase, stub):
+    stub.slow_pages.update({offset: 1 for offset in range(0, 4_500, 500)})
+    stub.delay = 0.2
+
+    df = metabase.get_data_from_sql_query(
+        QUERY, chunk_size=500, max_workers=4, order_by="id", **RETRY
+    )
+
+    assert_all_rows(df, stub)
+    assert stub.max_in_flight > 1
+
+
+def test_concurrent_pages_are_sorted_when_row_order_changes_between_requests(metabase, stub):
+    stub.unstable_order = True
+
+    df = metabase.get_data_from_sql_query(
+        QUERY, chunk_size=500, max_workers=4, order_by="id", **RETRY
+    )
+
+    assert_all_rows(df, stub)
+
+
+def test_concurrent_pagination_requires_an_order_by_column(metabase, stub):
+    with pytest.raises(ValueError, match="order_by"):
+        metabase.get_data_from_sql_query(QUERY, chunk_size=1000, max_workers=4, **RETRY)
+
+    assert not stub.requests
+
+
+def test_server_errors_are_retried(metabase, stub):
+    stub.errors.update({1000: 2})
+
+    df = metabase.get_data_from_sql_query(
+        QUERY, chunk_size=1000, max_workers=4, order_by="id", **RETRY
+    )
+
+    assert_all_rows(df, stub)
+    assert stub.requests[1000] == 3
+
+
+def test_timed_out_pages_are_retried(metabase, stub):
+    stub.slow_pages.update({2000: 1})
+    stub.delay = 2
+
+    df = metabase.get_data_from_sql_query(
+        QUERY, chunk_size=1000, max_workers=4, order_by="id", timeout=0.5, **RETRY
+    )
+
+    assert_all_rows(df, stub)
+    assert stub.requests[2000] == 2
+
+
+def test_short_pages_are_fetched_again(metabase, stub):
+    stub.short_pages.update({3000: 1})
+
+    df = metabase.get_data_from_sql_query(
+        QUERY, chunk_size=1000, max_workers=4, order_by="id", **RETRY
+    )
+
+    assert_all_rows(df, stub)
+    assert stub.requests[3000] == 2
+
+
+def test_pages_that_stay_short_raise(metabase, stub):
+    stub.short_pages.update({3000: 10})
+
+    with pytest.raises(ValueError, match="Page incomplète à l'offset 3000"):
+        metabase.get_data_from_sql_query(
+            QUERY, chunk_size=1000, max_workers=4, order_by="id", **RETRY
+        )
+
+
+def test_chunk_size_above_metabase_row_limit_is_rejected(metabase):
+    with pytest.raises(ValueError, match="limite de 2000 lignes"):
+        metabase.get_data_from_sql_query(
+            QUERY, chunk_size=5000, max_workers=4, order_by="id", **RETRY
+        )
@@ -0,0 +1,89 @@
+import json
+import multiprocessing
+
+import pandas as pd
+from metabase.cache import QueryCache
+
+
+def extract(key: str) -> pd.DataFrame:
+    return pd.DataFrame({"cle": [key, key], "valeur": [10, 20]})
+
+
+def put_keys(cache_dir, keys) -> None:
+    cache = QueryCache(cache_dir)
+    for key in keys:
+        cache.put(key, extract(key), "2025-01-01")
+
+
+def test_runs_sharing_the_folder_keep_each_other_entries(tmp_path):
+    # Deux exécutions ouvrent le cache avant que l'une ou l'autre n'y écrive
+    first, second = QueryCache(tmp_path), QueryCache(tmp_path)
+
+    first.put("a", extract("a"), "2025-01-01")
+    second.put("b", extract("b"), "2025-02-01")
+
+    index = json.loads((tmp_path / QueryCache.INDEX_FILE).read_text())
+    assert sorted(index) == ["a", "b"]
+    # L'entrée de l'autre exécution est servie, et non supprimée comme absente
+    assert first.get("b").equals(extract("b"))
+    assert second.get("a").equals(extract("a"))
+    assert len(list(tmp_path.glob("*.parquet"))) == 2
+
+
+def test_dropped_entries_stay_dropped_after_a_restart(tmp_path):
+    cache = QueryCache(tmp_path)
+    cache.put("a", extract("a"))
+    cache.put("b", extract("b"))
+    (tmp_path / "a.parquet").unlink()
+
+    assert cache.get("a") is None
+    assert "a" not in QueryCache(tmp_path)._load_index()
+
+    cache.ttl = -1
+    assert cache.get("b") is None
+    assert QueryCache(tmp_path)._load_index() == {}
+    assert list(tmp_path.glob("*.parquet")) == []
+
+
+def test_eviction_sees_the_entries_of_other_runs(tmp_path):
+    extract("a").to_parquet(tmp_path / "taille.parquet", index=False)
+    size = (tmp_path / "taille.parquet").stat().st_size
+    first, second = QueryCache(tmp_path), QueryCache(tmp_path, max_size_bytes=2 * size)
+
+    first.put("a", extract("a"))
+    second.put("b", extract("b"))
+    second.put("c", extract("c"))
+
+    assert first.get("a") is None
+    assert sorted(path.stem for path in tmp_path.glob("*.parquet")) == ["b", "c"]
+
+
+def test_orphaned_files_are_removed(tmp_path):
+    orphan = tmp_path / "orphelin.parquet"
+    extract("orphelin").to_parquet(orphan)
+
+    cache = QueryCache(tmp_path)
+    cache.put("a", extract("a"))
+
+    assert not orphan.exists()
+    cache.clear()
+    assert list(tmp_path.glob("*.parquet")) == []
+
+
+def test_concurrent_processes_do_not_lose_entries(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=put_keys, args=(tmp_path, [f"{run}_{i}" for i in range(15)]))
+        for run in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    cache = QueryCache(tmp_path)
+    for run in range(4):
+        for i in range(15):
+            assert cache.get(f"{run}_{i}") is not None
+    assert len(list(tmp_path.glob("*.parquet"))) == 4 * 15
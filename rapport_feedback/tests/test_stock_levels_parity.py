@@ -0,0 +1,24 @@
+import pandas as pd
+from compute_indicators.compute_indicators import (
+    analyze_product_stock_status_indicators,
+)
+from stock_levels_fixtures import (
+    make_esigl_extract,
+    make_prod_traceurs,
+    reference_stock_levels,
+)
+
+
+def test_stock_levels_match_row_wise_computation():
+    df_etat_stock, stock_lvl_decent, stock_region = analyze_product_stock_status_indicators(
+        make_prod_traceurs(), make_esigl_extract(3_000), "2025-01-31"
+    )
+
+    expected_lvl_decent, expected_region = reference_stock_levels(df_etat_stock)
+
+    pd.testing.assert_frame_equal(stock_lvl_decent, expected_lvl_decent, check_dtype=False)
+    pd.testing.assert_frame_equal(stock_region, expected_region, check_dtype=False)
+    # Les clés sans région sont comptées "NA", comme dans l'ancien calcul
+    assert stock_region["Region"].isna().any()
+    assert (stock_region.loc[stock_region["Region"].isna(), "STATUT"] == "NA").all()
+    assert {"NA", "STOCK DORMANT", "RUPTURE", "SURSTOCK"} <= set(stock_region["STATUT"])
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from compute_indicators.compute_indicators import compute_stock_status_columns
+from stock_status_fixtures import (
+    COLONNES_STATUT,
+    make_etat_stock,
+    reference_stock_status_columns,
+)
+
+
+@pytest.mark.parametrize("nombre_de_jours", [28, 31])
+def test_compute_stock_status_columns_matches_row_wise_rules(nombre_de_jours):
+    df = make_etat_stock(5_000)
+
+    expected = reference_stock_status_columns(df, nombre_de_jours)
+    result = compute_stock_status_columns(df, nombre_de_jours)
+
+    for col in COLONNES_STATUT:
+        if col == "ETAT DU STOCK":
+            assert result[col].tolist() == expected[col].tolist()
+        else:
+            np.testing.assert_allclose(
+                result[col].to_numpy(dtype="float64"),
+                expected[col].to_numpy(dtype="float64"),
+                equal_nan=True,
+                err_msg=col,
+            )
+    pd.testing.assert_frame_equal(result.drop(columns=COLONNES_STATUT), df)
+
+
+def test_compute_stock_status_columns_covers_every_status():
+    result = compute_stock_status_columns(make_etat_stock(5_000), 31)
+
+    assert set(result["ETAT DU STOCK"]) == {
+        "NA",
+        "RUPTURE",
+        "STOCK DORMANT",
+        "EN BAS DU PCU",
+        "ENTRE PCU et MIN",
+        "BIEN STOCKE",
+        "SURSTOCK",
+    }